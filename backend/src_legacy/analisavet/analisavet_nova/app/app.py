@@ -8,16 +8,26 @@ import os
 import logging
 
 from config import config
-from models.models import db, User
+from models.models import db, User, adicionar_colunas_novas
 from routes.auth_routes import auth_bp
 from routes.analysis_routes import analysis_bp
 from routes.report_routes import report_bp
 from routes.payment_routes import payment_bp
 from routes.test_payment_routes import test_payment_bp
+from routes.job_routes import job_bp
+from services.analysis_service import AnalysisService
+from services.job_service import JobService
+from services.parallel_analysis import AnalisadorParalelo
+from services.reference_service import ReferenceService
+from utils.pdf_extraction import configurar_extracao
+from utils.pdf_layouts import configurar_layouts
+from utils.upload import RequisicaoUpload
 
 def create_app(config_name='development'):
     """Cria e configura a aplicação Flask."""
     app = Flask(__name__)
+    # Arquivos enviados em memória ou em temporários com nome, reaproveitados na extração
+    app.request_class = RequisicaoUpload
     app.config.from_object(config[config_name])
     config[config_name].init_app(app)
 
@@ -26,6 +36,13 @@ def create_app(config_name='development'):
 
     # Inicializar extensões
     db.init_app(app)
+    AnalysisService.configurar_cache(app.config['CACHE_ANALISES_TAMANHO'])
+    if app.config['METRICAS_ANALISE']:
+        AnalysisService.ativar_instrumentacao()
+    configurar_extracao(app.config['PDF_BACKEND'], app.config['PDF_PROCESSOS'],
+                        app.config['PDF_TIMEOUT'], app.config['PDF_MEMORIA_MB'],
+                        app.config['PDF_MAX_PAGINAS'])
+    configurar_layouts(app.config['LAYOUTS_ARQUIVO'])
     
     # Configurar login manager
     login_manager = LoginManager()
@@ -42,12 +59,24 @@ def create_app(config_name='development'):
     app.register_blueprint(report_bp)
     app.register_blueprint(payment_bp)
     app.register_blueprint(test_payment_bp)
+    app.register_blueprint(job_bp)
     
     # Criar tabelas do banco de dados
     with app.app_context():
         db.create_all()
+        for coluna in adicionar_colunas_novas():
+            print(f"Coluna {coluna} adicionada ao banco de dados.")
         print("Tabelas do banco de dados verificadas/criadas.")
     
+    # Carregar a versão mais recente das referências e verificar novas versões a cada requisição
+    ReferenceService.init_app(app)
+    
+    # Iniciar a fila de tarefas em segundo plano (re-enfileira tarefas interrompidas)
+    JobService.init_app(app)
+    
+    # Analisador das rotas de lote (os lotes grandes são divididos entre processos)
+    AnalisadorParalelo.init_app(app)
+    
     # Rota para servir arquivos estáticos
     @app.route('/static/<path:filename>')
     def serve_static(filename):
@@ -0,0 +1,308 @@
+"""
+Benchmark do motor de análise de hemogramas do AnalisaVet.
+
+Gera hemogramas sintéticos reprodutíveis (perfis normal, anemia, leucocitose e
+misto, por espécie) e mede a latência da análise unitária, a vazão da análise
+em lote, a taxa de acerto do cache e a memória por exame. O resultado é emitido
+em JSON para comparação entre versões:
+
+    python benchmark_analise.py --saida atual.json
+    python benchmark_analise.py --comparar base.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+
+from services.analysis_service import AnalysisService
+
+PERFIS = ("normal", "anemia", "leucocitose", "misto")
+ESPECIES = ("Cão", "Gato")
+
+# Parâmetros reduzidos na anemia e elevados na leucocitose
+SERIE_VERMELHA = ("hemacias", "hemoglobina", "hematocrito")
+SERIE_BRANCA = ("leucocitos", "segmentados")
+
+# Métricas comparadas entre execuções: (caminho, True se maior for melhor)
+METRICAS_COMPARADAS = (
+    (("latencia_unitaria_us", "p50"), False),
+    (("latencia_unitaria_us", "p95"), False),
+    (("lote", "exames_por_segundo"), True),
+    (("lote", "exames_por_segundo_compacto"), True),
+    (("cache", "latencia_acerto_us"), False),
+    (("memoria", "bytes_por_exame_detalhado"), False),
+    (("memoria", "bytes_por_exame_compacto"), False),
+)
+
+
+def _valor_normal(gerador, ref):
+    """Valor dentro da referência, concentrado no centro da faixa."""
+    centro = (ref["min"] + ref["max"]) / 2
+    desvio = (ref["max"] - ref["min"]) / 6
+    return min(max(gerador.gauss(centro, desvio), ref["min"]), ref["max"])
+
+
+def gerar_hemograma(gerador, especie, perfil):
+    """
+    Gera um hemograma sintético de um perfil.
+
+    Args:
+        gerador: random.Random usado no sorteio
+        especie: Espécie do animal (Cão ou Gato)
+        perfil: "normal", "anemia", "leucocitose" ou "misto"
+
+    Returns:
+        dict: Valores do hemograma
+    """
+    if perfil == "misto":
+        perfil = gerador.choice(PERFIS[:-1])
+
+    hemograma = {}
+    for parametro, ref in AnalysisService.VALORES_REFERENCIA_PADRAO[especie].items():
+        valor = _valor_normal(gerador, ref)
+        if perfil == "anemia" and parametro in SERIE_VERMELHA:
+            valor = ref["min"] * gerador.uniform(0.5, 0.95)
+        elif perfil == "leucocitose" and parametro in SERIE_BRANCA:
+            valor = ref["max"] * gerador.uniform(1.1, 2.5)
+        hemograma[parametro] = round(valor, 2)
+    return hemograma
+
+
+def gerar_hemogramas(quantidade, semente=42, perfil="misto", especies=ESPECIES, repeticao=0.0):
+    """
+    Gera uma lista reprodutível de hemogramas e pacientes.
+
+    Args:
+        quantidade: Quantidade de exames
+        semente: Semente do gerador
+        perfil: Perfil dos hemogramas (ver PERFIS)
+        especies: Espécies sorteadas
+        repeticao: Fração de exames que repetem um hemograma já gerado (reenvios)
+
+    Returns:
+        tuple: (hemogramas, pacientes)
+    """
+    gerador = random.Random(semente)
+    hemogramas = []
+    pacientes = []
+    for _ in range(quantidade):
+        if hemogramas and gerador.random() < repeticao:
+            indice = gerador.randrange(len(hemogramas))
+            hemogramas.append(hemogramas[indice])
+            pacientes.append(pacientes[indice])
+            continue
+        especie = gerador.choice(especies)
+        hemogramas.append(gerar_hemograma(gerador, especie, perfil))
+        pacientes.append({"especie": especie})
+    return hemogramas, pacientes
+
+
+def _percentis_us(duracoes_ns):
+    """Média e percentis de uma lista de durações, em microssegundos."""
+    duracoes = np.asarray(duracoes_ns, dtype=float) / 1000
+    p50, p95, p99 = np.percentile(duracoes, [50, 95, 99])
+    return {
+        "media": round(float(duracoes.mean()), 2),
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2)
+    }
+
+
+def medir_latencia(hemogramas, pacientes):
+    """Latência da análise unitária sem cache (cada exame é calculado)."""
+    AnalysisService.configurar_cache(0)
+    duracoes = []
+    for hemograma, paciente in zip(hemogramas, pacientes):
+        inicio = time.perf_counter_ns()
+        AnalysisService.analisar_hemograma(hemograma, paciente)
+        duracoes.append(time.perf_counter_ns() - inicio)
+    return _percentis_us(duracoes)
+
+
+def _melhor_duracao(funcao, repeticoes):
+    """Menor duração, em segundos, de algumas execuções de funcao."""
+    melhor = None
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor
+
+
+def medir_lote(hemogramas, pacientes, repeticoes=3):
+    """
+    Vazão da análise em lote, detalhada e compacta (melhor de algumas repetições).
+
+    A aceleração compara o lote compacto com a análise unitária sem cache dos
+    mesmos exames, um a um.
+    """
+    AnalysisService.configurar_cache(0)
+    quantidade = len(hemogramas)
+    unitaria = _melhor_duracao(
+        lambda: [AnalysisService.analisar_hemograma(h, p) for h, p in zip(hemogramas, pacientes)], repeticoes)
+    detalhado = _melhor_duracao(lambda: AnalysisService.analisar_hemogramas_lote(hemogramas, pacientes), repeticoes)
+    compacto = _melhor_duracao(
+        lambda: AnalysisService.analisar_hemogramas_lote_compacto(hemogramas, pacientes), repeticoes)
+    return {
+        "exames": quantidade,
+        "segundos": round(detalhado, 4),
+        "exames_por_segundo": round(quantidade / detalhado, 1),
+        "segundos_compacto": round(compacto, 4),
+        "exames_por_segundo_compacto": round(quantidade / compacto, 1),
+        "aceleracao_compacto": round(unitaria / compacto, 2)
+    }
+
+
+def medir_cache(hemogramas, pacientes, capacidade):
+    """Taxa de acerto do cache e latência de acertos e falhas em uma sequência com reenvios."""
+    AnalysisService.configurar_cache(capacidade)
+    acertos, falhas = [], []
+    for hemograma, paciente in zip(hemogramas, pacientes):
+        antes = AnalysisService.estatisticas_cache()["acertos"]
+        inicio = time.perf_counter_ns()
+        AnalysisService.analisar_hemograma(hemograma, paciente)
+        duracao = time.perf_counter_ns() - inicio
+        (acertos if AnalysisService.estatisticas_cache()["acertos"] > antes else falhas).append(duracao)
+
+    estatisticas = AnalysisService.estatisticas_cache()
+    return {
+        "capacidade": capacidade,
+        "taxa_acerto": round(estatisticas["taxa_acerto"], 4),
+        "latencia_acerto_us": _percentis_us(acertos)["p50"] if acertos else None,
+        "latencia_falha_us": _percentis_us(falhas)["p50"] if falhas else None
+    }
+
+
+def _bytes_retidos(funcao, hemogramas, pacientes):
+    """Memória retida pelos resultados de funcao para todos os exames."""
+    tracemalloc.start()
+    inicio = tracemalloc.take_snapshot()
+    resultados = [funcao(hemograma, paciente) for hemograma, paciente in zip(hemogramas, pacientes)]
+    retidos = sum(diferenca.size_diff for diferenca in tracemalloc.take_snapshot().compare_to(inicio, "filename"))
+    tracemalloc.stop()
+    del resultados
+    return retidos
+
+
+def medir_memoria(hemogramas, pacientes):
+    """Memória por exame dos resultados detalhado e compacto (sem cache)."""
+    AnalysisService.configurar_cache(0)
+    quantidade = len(hemogramas)
+    detalhado = _bytes_retidos(AnalysisService.analisar_hemograma, hemogramas, pacientes)
+    compacto = _bytes_retidos(AnalysisService.analisar_hemograma_compacto, hemogramas, pacientes)
+    return {
+        "bytes_por_exame_detalhado": round(detalhado / quantidade),
+        "bytes_por_exame_compacto": round(compacto / quantidade)
+    }
+
+
+def executar(quantidade=2000, semente=42, repeticao=0.3, capacidade_cache=2048):
+    """
+    Executa o benchmark completo.
+
+    Args:
+        quantidade: Exames por medição
+        semente: Semente do gerador
+        repeticao: Fração de reenvios na medição do cache
+        capacidade_cache: Capacidade do cache na medição do cache
+
+    Returns:
+        dict: Métricas e metadados da execução
+    """
+    cache_original = AnalysisService._cache
+    try:
+        por_perfil = {}
+        for perfil in PERFIS:
+            hemogramas, pacientes = gerar_hemogramas(quantidade, semente, perfil)
+            por_perfil[perfil] = medir_latencia(hemogramas, pacientes)
+
+        hemogramas, pacientes = gerar_hemogramas(quantidade, semente)
+        reenvios = gerar_hemogramas(quantidade, semente, repeticao=repeticao)
+        return {
+            "metadados": {
+                "data": datetime.utcnow().isoformat(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "plataforma": platform.platform(),
+                "quantidade": quantidade,
+                "semente": semente
+            },
+            "latencia_unitaria_us": por_perfil["misto"],
+            "latencia_por_perfil_us": por_perfil,
+            "lote": medir_lote(hemogramas, pacientes),
+            "cache": medir_cache(*reenvios, capacidade_cache),
+            "memoria": medir_memoria(hemogramas, pacientes)
+        }
+    finally:
+        AnalysisService._cache = cache_original
+
+
+def comparar(atual, anterior, tolerancia=0.1):
+    """
+    Compara duas execuções e aponta as métricas que pioraram além da tolerância.
+
+    Args:
+        atual: Resultado de executar()
+        anterior: Resultado de uma execução anterior
+        tolerancia: Piora relativa aceita (0.1 = 10%)
+
+    Returns:
+        list: Regressões {"metrica", "anterior", "atual", "variacao"}
+    """
+    regressoes = []
+    for caminho, maior_melhor in METRICAS_COMPARADAS:
+        valor_atual, valor_anterior = atual, anterior
+        for chave in caminho:
+            valor_atual = (valor_atual or {}).get(chave)
+            valor_anterior = (valor_anterior or {}).get(chave)
+        if not valor_atual or not valor_anterior:
+            continue
+
+        variacao = (valor_atual - valor_anterior) / valor_anterior
+        if (-variacao if maior_melhor else variacao) > tolerancia:
+            regressoes.append({
+                "metrica": ".".join(caminho),
+                "anterior": valor_anterior,
+                "atual": valor_atual,
+                "variacao": round(variacao, 4)
+            })
+    return regressoes
+
+
+def main(argumentos=None):
+    """Executa o benchmark pela linha de comando; retorna 1 se houver regressões."""
+    parser = argparse.ArgumentParser(description="Benchmark do motor de análise de hemogramas")
+    parser.add_argument("--quantidade", type=int, default=2000, help="exames por medição")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--repeticao", type=float, default=0.3, help="fração de reenvios na medição do cache")
+    parser.add_argument("--saida", help="arquivo JSON de saída (padrão: saída padrão)")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.1, help="piora relativa aceita na comparação")
+    opcoes = parser.parse_args(argumentos)
+
+    resultado = executar(opcoes.quantidade, opcoes.semente, opcoes.repeticao)
+    if opcoes.comparar:
+        with open(opcoes.comparar, encoding="utf-8") as arquivo:
+            resultado["regressoes"] = comparar(resultado, json.load(arquivo), opcoes.tolerancia)
+
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if opcoes.saida:
+        with open(opcoes.saida, "w", encoding="utf-8") as arquivo:
+            arquivo.write(texto)
+    else:
+        print(texto)
+    return 1 if resultado.get("regressoes") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ Configurações do aplicativo AnalisaVet.
 
 import os
 import secrets
+import tempfile
 
 class Config:
     """Configuração base para o aplicativo Flask."""
@@ -20,6 +21,23 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB
     ALLOWED_EXTENSIONS = {'pdf', 'csv'}
+    UPLOAD_LIMITE_MEMORIA = int(os.environ.get('UPLOAD_LIMITE_MEMORIA', 4 * 1024 * 1024))  # Uploads maiores vão para um arquivo temporário
+    
+    # Configurações da extração de texto de PDFs (pool persistente de processos)
+    PDF_BACKEND = os.environ.get('PDF_BACKEND', 'auto')  # 'pypdf', 'pdftotext' ou 'auto'
+    PDF_PROCESSOS = int(os.environ.get('PDF_PROCESSOS', 2))  # Extrações simultâneas
+    PDF_TIMEOUT = float(os.environ.get('PDF_TIMEOUT', 30))  # Segundos por documento
+    PDF_MEMORIA_MB = int(os.environ.get('PDF_MEMORIA_MB', 512))  # Memória adicional por processo de extração
+    PDF_MAX_PAGINAS = int(os.environ.get('PDF_MAX_PAGINAS', 10))  # Páginas lidas por laudo (0: sem limite)
+    LAYOUTS_ARQUIVO = os.environ.get('LAYOUTS_ARQUIVO') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'layouts.json')  # Layouts de laudos aprendidos
+    
+    # Configurações das tarefas em segundo plano
+    JOBS_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'jobs')
+    JOBS_MAX_WORKERS = int(os.environ.get('JOBS_MAX_WORKERS', 4))
+    JOBS_LIMITE_POR_CLINICA = int(os.environ.get('JOBS_LIMITE_POR_CLINICA', 2))  # Tarefas simultâneas por usuário
+    JOBS_RESERVA_SEGUNDOS = float(os.environ.get('JOBS_RESERVA_SEGUNDOS', 60))  # Reserva de uma tarefa em execução (renovada a cada terço)
+    JOBS_MAX_TENTATIVAS = int(os.environ.get('JOBS_MAX_TENTATIVAS', 3))  # Execuções interrompidas antes de a tarefa ir para erro
+    JOBS_VALIDADE_RESULTADOS_HORAS = float(os.environ.get('JOBS_VALIDADE_RESULTADOS_HORAS', 24))  # Tempo em que o PDF de um laudo concluído fica disponível
     
     # Configurações de sessão
     SESSION_TYPE = 'filesystem'
@@ -31,6 +49,17 @@ class Config:
     
     # Configurações específicas do AnalisaVet
     CREDITOS_POR_ANALISE = 1
+    CACHE_ANALISES_TAMANHO = int(os.environ.get('CACHE_ANALISES_TAMANHO', 2048))  # Resultados memorizados
+    LOTE_MAX_ITENS = 1000  # Hemogramas aceitos por requisição em /api/analysis/batch
+    LOTE_TAMANHO_BLOCO = 100  # Hemogramas analisados (e cobrados) por vez dentro do lote
+    ZIP_MAX_BYTES = int(os.environ.get('ZIP_MAX_BYTES', 512 * 1024 * 1024))  # Tamanho máximo do ZIP em /api/analysis/upload/zip
+    ZIP_MAX_ARQUIVOS = int(os.environ.get('ZIP_MAX_ARQUIVOS', 1000))  # Arquivos aceitos por ZIP
+    ZIP_MAX_BYTES_ARQUIVO = int(os.environ.get('ZIP_MAX_BYTES_ARQUIVO', 16 * 1024 * 1024))  # Tamanho máximo de cada arquivo descompactado
+    ANALISE_PROCESSOS = int(os.environ.get('ANALISE_PROCESSOS', 0))  # Processos da análise paralela (0: um por núcleo)
+    ANALISE_PROCESSOS_BLOCO = int(os.environ.get('ANALISE_PROCESSOS_BLOCO', 500))  # Exames enviados a um processo por vez (lotes menores são analisados no próprio processo)
+    REFERENCIAS_INTERVALO_VERIFICACAO = float(os.environ.get('REFERENCIAS_INTERVALO_VERIFICACAO', 5))  # Segundos entre verificações de nova versão
+    METRICAS_ANALISE = os.environ.get('METRICAS_ANALISE', '').lower() in ('1', 'true', 'sim')  # Registra a duração de cada etapa da análise
+    REFERENCIAS_EDITORES = {e.strip().lower() for e in os.environ.get('REFERENCIAS_EDITORES', '').split(',') if e.strip()}  # E-mails autorizados a publicar referências
     
     # Configurações do Mercado Pago
     MERCADO_PAGO_ACCESS_TOKEN = os.environ.get("MERCADO_PAGO_ACCESS_TOKEN") or "APP_USR-2264711140391280-052816-ced30592a1aec42b7e2a3d10d393760e-547482652"
@@ -70,6 +99,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    JOBS_FOLDER = os.path.join(tempfile.gettempdir(), 'analisavet_jobs_testes')
+    LAYOUTS_ARQUIVO = None  # Layouts aprendidos apenas em memória
+    REFERENCIAS_INTERVALO_VERIFICACAO = 0
     SESSION_COOKIE_SECURE = False
 
 
@@ -89,6 +89,7 @@ class Analysis(db.Model):
     
     # Resultado da análise (armazenado como JSON)
     analysis_result = db.Column(db.Text)
+    reference_version = db.Column(db.Integer)  # Versão do conjunto de referências usado na análise
     
     def set_hemogram_data(self, data):
         """Define os dados do hemograma como JSON."""
@@ -103,8 +104,18 @@ class Analysis(db.Model):
         self.analysis_result = json.dumps(result)
     
     def get_analysis_result(self):
-        """Retorna o resultado da análise como dicionário."""
-        return json.loads(self.analysis_result) if self.analysis_result else {}
+        """Retorna o resultado da análise como dicionário (expandindo o formato compacto)."""
+        if not self.analysis_result:
+            return {}
+        # Importação local: o serviço de análise depende deste módulo
+        from services.analysis_service import AnalysisService
+        return AnalysisService.decodificar_resultado(json.loads(self.analysis_result))
+    
+    def get_compact_result(self):
+        """Retorna o resultado como ResultadoCompacto, sem gerar os textos (None se estiver no formato antigo)."""
+        from services.compact_result import ResultadoCompacto, e_compacto
+        dados = json.loads(self.analysis_result) if self.analysis_result else None
+        return ResultadoCompacto.decodificar(dados) if e_compacto(dados) else None
     
     def get_patient_info(self):
         """Retorna as informações do paciente como dicionário."""
@@ -120,3 +131,206 @@ class Analysis(db.Model):
     
     def __repr__(self):
         return f'<Analysis {self.id} for {self.patient_name}>'
+
+
+class PatientStats(db.Model):
+    """Modelo com as estatísticas acumuladas dos hemogramas de um paciente."""
+    __tablename__ = 'patient_stats'
+    __table_args__ = (db.UniqueConstraint('user_id', 'patient_key'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    patient_key = db.Column(db.String(300), nullable=False)  # Espécie, nome do paciente e do tutor normalizados
+    patient_species = db.Column(db.String(50))
+    patient_name = db.Column(db.String(100))
+    owner_name = db.Column(db.String(100))
+    exams_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    
+    # Estatísticas por parâmetro (armazenadas como JSON): {parametro: [n, media, m2, ultimo_valor, ultima_data]}
+    stats = db.Column(db.Text)
+    
+    def set_stats(self, data):
+        """Define as estatísticas por parâmetro como JSON."""
+        self.stats = json.dumps(data)
+    
+    def get_stats(self):
+        """Retorna as estatísticas por parâmetro como dicionário."""
+        return json.loads(self.stats) if self.stats else {}
+    
+    def __repr__(self):
+        return f'<PatientStats {self.patient_key}>'
+
+
+class QuantileSketch(db.Model):
+    """Modelo com o sketch de quantis de um parâmetro por clínica e espécie."""
+    __tablename__ = 'quantile_sketches'
+    __table_args__ = (db.UniqueConstraint('user_id', 'species', 'parameter'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    species = db.Column(db.String(50), nullable=False)
+    parameter = db.Column(db.String(50), nullable=False)
+    count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    sketch = db.Column(db.LargeBinary, nullable=False)  # SketchKLL serializado (services.quantile_sketch)
+    
+    def __repr__(self):
+        return f'<QuantileSketch {self.user_id} {self.species} {self.parameter}>'
+
+
+class ReferenceSet(db.Model):
+    """Modelo para conjuntos versionados de valores de referência e grupos de interpretação conjunta."""
+    __tablename__ = 'reference_sets'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, unique=True, nullable=False, index=True)  # A maior versão é a ativa
+    description = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    
+    # Referências por espécie e grupos de parâmetros (armazenados como JSON)
+    reference_values = db.Column(db.Text, nullable=False)
+    parameter_groups = db.Column(db.Text, nullable=False)
+    strata = db.Column(db.Text)  # Intervalos por grupo racial e faixa etária
+    rules = db.Column(db.Text)  # Regras diagnósticas (NULL em conjuntos anteriores às regras)
+    
+    def set_reference_values(self, data):
+        """Define os valores de referência como JSON."""
+        self.reference_values = json.dumps(data)
+    
+    def get_reference_values(self):
+        """Retorna os valores de referência como dicionário."""
+        return json.loads(self.reference_values) if self.reference_values else {}
+    
+    def set_parameter_groups(self, data):
+        """Define os grupos de parâmetros como JSON."""
+        self.parameter_groups = json.dumps(data)
+    
+    def get_parameter_groups(self):
+        """Retorna os grupos de parâmetros como dicionário."""
+        return json.loads(self.parameter_groups) if self.parameter_groups else {}
+    
+    def set_strata(self, data):
+        """Define os intervalos estratificados como JSON."""
+        self.strata = json.dumps(data)
+    
+    def get_strata(self):
+        """Retorna os intervalos estratificados como dicionário."""
+        return json.loads(self.strata) if self.strata else {}
+    
+    def set_rules(self, data):
+        """Define as regras diagnósticas como JSON."""
+        self.rules = json.dumps(data)
+    
+    def get_rules(self):
+        """Retorna as regras diagnósticas como lista (None se o conjunto não as define)."""
+        return json.loads(self.rules) if self.rules is not None else None
+    
+    def to_dict(self, incluir_dados=False):
+        """Retorna os metadados do conjunto (e opcionalmente os valores) como dicionário."""
+        dados = {
+            'versao': self.version,
+            'descricao': self.description,
+            'criado_em': self.created_at.isoformat() if self.created_at else None,
+            'criado_por': self.created_by
+        }
+        if incluir_dados:
+            dados['valores'] = self.get_reference_values()
+            dados['grupos'] = self.get_parameter_groups()
+            dados['estratos'] = self.get_strata()
+            dados['regras'] = self.get_rules()
+        return dados
+    
+    def __repr__(self):
+        return f'<ReferenceSet v{self.version}>'
+
+
+class Job(db.Model):
+    """Modelo para tarefas executadas em segundo plano (análises, extrações e laudos)."""
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    job_type = db.Column(db.String(30), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente', index=True)  # pendente, executando, concluido, erro, cancelado
+    cancel_requested = db.Column(db.Boolean, default=False)
+    attempts = db.Column(db.Integer, default=0)
+    locked_by = db.Column(db.String(120))  # Fila (servidor e processo) que executa a tarefa
+    locked_until = db.Column(db.DateTime)  # Fim da reserva; renovada enquanto a tarefa executa
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    
+    # Entrada e saída da tarefa (armazenadas como JSON)
+    payload = db.Column(db.Text)
+    result = db.Column(db.Text)
+    result_path = db.Column(db.String(300))  # Arquivo gerado (ex.: PDF do laudo)
+    error = db.Column(db.Text)
+    
+    def set_payload(self, data):
+        """Define os dados de entrada da tarefa como JSON."""
+        self.payload = json.dumps(data)
+    
+    def get_payload(self):
+        """Retorna os dados de entrada da tarefa como dicionário."""
+        return json.loads(self.payload) if self.payload else {}
+    
+    def set_result(self, result):
+        """Define o resultado da tarefa como JSON."""
+        self.result = json.dumps(result)
+    
+    def get_result(self):
+        """Retorna o resultado da tarefa como dicionário."""
+        return json.loads(self.result) if self.result else None
+    
+    def to_dict(self):
+        """Retorna o estado da tarefa como dicionário."""
+        return {
+            'id': self.id,
+            'tipo': self.job_type,
+            'status': self.status,
+            'cancelamento_solicitado': bool(self.cancel_requested),
+            'tentativas': self.attempts,
+            'criado_em': self.created_at.isoformat() if self.created_at else None,
+            'iniciado_em': self.started_at.isoformat() if self.started_at else None,
+            'finalizado_em': self.finished_at.isoformat() if self.finished_at else None,
+            'possui_arquivo': bool(self.result_path),
+            'erro': self.error
+        }
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.job_type} {self.status}>'
+
+
+# Colunas incluídas em tabelas que já existiam (db.create_all não altera tabelas existentes)
+COLUNAS_ADICIONADAS = (
+    ('analyses', 'reference_version', 'INTEGER'),
+    ('reference_sets', 'strata', 'TEXT'),
+    ('reference_sets', 'rules', 'TEXT'),
+    ('jobs', 'locked_by', 'VARCHAR(120)'),
+    ('jobs', 'locked_until', 'DATETIME'),
+)
+
+
+def adicionar_colunas_novas():
+    """
+    Adiciona ao banco as colunas de COLUNAS_ADICIONADAS que ainda não existem.
+    
+    Pode ser chamada a cada inicialização: tabelas inexistentes (que db.create_all
+    cria já completas) e colunas já presentes são ignoradas.
+    
+    Returns:
+        list: Colunas adicionadas, no formato 'tabela.coluna'
+    """
+    inspetor = db.inspect(db.engine)
+    tabelas = set(inspetor.get_table_names())
+    adicionadas = []
+    for tabela, coluna, tipo in COLUNAS_ADICIONADAS:
+        if tabela not in tabelas:
+            continue
+        if coluna not in {existente['name'] for existente in inspetor.get_columns(tabela)}:
+            db.session.execute(db.text(f'ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}'))
+            adicionadas.append(f'{tabela}.{coluna}')
+    db.session.commit()
+    return adicionadas
@@ -0,0 +1,42 @@
+"""
+Script para reanalisar o histórico de análises do AnalisaVet com as referências em uso.
+
+As análises salvas são reclassificadas em paralelo por um pool de processos
+(ver services.parallel_analysis) e gravadas no formato compacto:
+
+    python reanalisar_historico.py --processos 16
+    python reanalisar_historico.py --usuario 42
+"""
+
+import argparse
+import sys
+import time
+
+from app import create_app
+from services.parallel_analysis import AnalisadorParalelo, reanalisar_historico
+
+def main(argumentos=None):
+    """Reanalisa o histórico; retorna 1 se alguma análise não pôde ser reanalisada."""
+    parser = argparse.ArgumentParser(description="Reanálise do histórico de hemogramas")
+    parser.add_argument("--processos", type=int, help="processos do pool (padrão: ANALISE_PROCESSOS)")
+    parser.add_argument("--bloco", type=int, help="análises enviadas a um processo por vez (padrão: ANALISE_PROCESSOS_BLOCO)")
+    parser.add_argument("--pagina", type=int, default=5000, help="análises gravadas por transação")
+    parser.add_argument("--usuario", type=int, help="reanalisa apenas as análises deste usuário")
+    opcoes = parser.parse_args(argumentos)
+    
+    app = create_app()
+    with app.app_context():
+        inicio = time.perf_counter()
+        with AnalisadorParalelo(opcoes.processos or app.config['ANALISE_PROCESSOS'],
+                                opcoes.bloco or app.config['ANALISE_PROCESSOS_BLOCO']) as analisador:
+            resultado = reanalisar_historico(analisador, opcoes.usuario, opcoes.pagina)
+        duracao = time.perf_counter() - inicio
+    
+    print(f"{resultado['reanalisadas']} análises reanalisadas em {duracao:.1f} s "
+          f"com {analisador.processos} processos.")
+    for erro in resultado['erros']:
+        print(f"Análise {erro['id']}: {erro['erro']}")
+    return 1 if resultado['erros'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
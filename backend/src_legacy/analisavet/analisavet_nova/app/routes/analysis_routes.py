@@ -3,13 +3,22 @@ Correção para a rota de valores de referência no backend principal do Analisa
 Esta correção implementa um tratamento robusto para parâmetros acentuados.
 """
 
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
 from flask_login import login_required, current_user
+from models.models import User, db
 from services.analysis_service import AnalysisService
+from services.bulk_ingestion import extrair_membros, listar_membros
+from services.clinic_quantiles import ClinicQuantileService, QUANTIS_PADRAO
+from services.patient_history import PatientHistoryService
+from services.reference_service import ReferenceService
 from utils.pdf_parser import processar_arquivo_hemograma
+from utils.upload import receber_upload
+import io
+import json
 import os
 import tempfile
 import urllib.parse
+import zipfile
 
 analysis_bp = Blueprint('analysis', __name__)
 
@@ -53,38 +62,84 @@ def get_reference_values():
     if not especie_normalizada:
         especie_normalizada = especie_raw
     
-    valores_ref = AnalysisService.obter_valores_referencia(especie_normalizada)
+    # Raça e idade opcionais selecionam o intervalo estratificado (ex.: galgos, filhotes)
+    tabela = AnalysisService.obter_tabela_estrato(
+        especie_normalizada, request.args.get('raca'), request.args.get('idade'))
     
-    if not valores_ref:
-        # Tentar com valores padrão para Cão como fallback
-        valores_ref = AnalysisService.get_reference_values('Cão')
-        if valores_ref:
-            # Formatar valores de referência para exibição
-            formatted_values = {}
-            for param, info in valores_ref.items():
-                formatted_values[param] = f"{info['min']}-{info['max']} {info['unidade']}"
-            
-            return jsonify({
-                'success': True,
-                'data': formatted_values,
-                'note': f'Espécie não reconhecida: "{especie_raw}". Usando valores padrão para Cão.'
-            }), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': f'Espécie inválida: {especie_raw}. Use "Cão" ou "Gato".'
-            }), 400
+    if tabela is None:
+        return jsonify({
+            'success': False,
+            'error': f'Espécie inválida: {especie_raw}. Use "Cão" ou "Gato".'
+        }), 400
+    
+    # Textos de exibição já formatados na tabela compilada
+    return jsonify({
+        'success': True,
+        'data': tabela.valores_exibicao()
+    }), 200
+
+@analysis_bp.route('/api/analysis/reference-sets', methods=['GET'])
+@login_required
+def list_reference_sets():
+    """Rota para listar as versões publicadas dos valores de referência."""
+    return jsonify({
+        'success': True,
+        'data': {
+            'versao_em_uso': AnalysisService.versao_referencias_publicada(),
+            'conjuntos': ReferenceService.listar()
+        }
+    }), 200
+
+@analysis_bp.route('/api/analysis/reference-sets/<int:version>', methods=['GET'])
+@login_required
+def get_reference_set(version):
+    """Rota para obter os valores e grupos de uma versão publicada."""
+    conjunto = ReferenceService.obter(version)
     
-    # Formatar valores de referência para exibição
-    formatted_values = {}
-    for param, info in valores_ref.items():
-        formatted_values[param] = f"{info['min']}-{info['max']} {info['unidade']}"
+    if not conjunto:
+        return jsonify({
+            'success': False,
+            'error': 'Versão de referência não encontrada.'
+        }), 404
     
     return jsonify({
         'success': True,
-        'data': formatted_values
+        'data': conjunto.to_dict(incluir_dados=True)
     }), 200
 
+@analysis_bp.route('/api/analysis/reference-sets', methods=['POST'])
+@login_required
+def publish_reference_set():
+    """Rota para publicar uma nova versão dos valores de referência (sem reiniciar os workers)."""
+    if current_user.email.lower() not in current_app.config['REFERENCIAS_EDITORES']:
+        return jsonify({
+            'success': False,
+            'error': 'Usuário sem permissão para publicar valores de referência.'
+        }), 403
+    
+    data = request.json
+    
+    if not data or 'valores' not in data:
+        return jsonify({
+            'success': False,
+            'error': 'Informe os valores de referência.'
+        }), 400
+    
+    try:
+        conjunto = ReferenceService.publicar(
+            data['valores'], data.get('grupos'), data.get('descricao'), current_user.id,
+            estratos=data.get('estratos'), regras=data.get('regras'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': conjunto.to_dict()
+    }), 201
+
 @analysis_bp.route('/api/analysis/analyze', methods=['POST'])
 @login_required
 def analyze_hemogram():
@@ -99,6 +154,7 @@ def analyze_hemogram():
     
     # Extrair informações do paciente, se fornecidas
     patient_info = {
+        'especie': data.get('especie'),
         'nome_paciente': data.get('nome_paciente'),
         'raca': data.get('raca'),
         'idade': data.get('idade'),
@@ -109,21 +165,179 @@ def analyze_hemogram():
     # Remover informações do paciente dos dados do hemograma
     hemogram_data = {k: v for k, v in data.items() if k not in patient_info}
     
-    result = AnalysisService.analisar_hemograma(hemogram_data, patient_info)
+    result = AnalysisService.analisar_hemograma(hemogram_data, patient_info, clinica_id=current_user.id)
+    # Mudanças em relação à linha de base do paciente (estatísticas acumuladas, sem reler o histórico)
+    result['delta_historico'] = PatientHistoryService.comparar(current_user.id, patient_info, hemogram_data)
     success = True
     message = "Análise concluída com sucesso."
     
     if success:
-        return jsonify({
+        cronometro = AnalysisService.iniciar_cronometro('resposta')
+        resposta = jsonify({
             'success': True,
             'data': result
-        }), 200
+        })
+        if cronometro is not None:
+            cronometro.marcar('serializacao')
+            cronometro.finalizar()
+        return resposta, 200
     else:
         return jsonify({
             'success': False,
             'error': message
         }), 400
 
+@analysis_bp.route('/api/analysis/batch', methods=['POST'])
+@login_required
+def analyze_batch():
+    """
+    Rota para analisar um lote de hemogramas.
+    
+    Aceita um array JSON ou um fluxo NDJSON (application/x-ndjson) de hemogramas no
+    mesmo formato de /api/analysis/analyze e devolve uma linha NDJSON por exame,
+    à medida que cada bloco é analisado, seguida de uma linha de resumo.
+    """
+    limite = current_app.config['LOTE_MAX_ITENS']
+    
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        itens = _ler_itens_ndjson(request.stream)
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            return jsonify({
+                'success': False,
+                'error': 'Envie um array JSON ou um fluxo NDJSON de hemogramas.'
+            }), 400
+        if len(data) > limite:
+            return jsonify({
+                'success': False,
+                'error': f'O lote excede o limite de {limite} hemogramas.'
+            }), 413
+        itens = ((item, None) for item in data)
+    
+    return Response(stream_with_context(_gerar_resultados_lote(itens, limite)),
+                    mimetype='application/x-ndjson')
+
+def _ler_itens_ndjson(fluxo):
+    """Lê um hemograma por linha do fluxo, devolvendo (item, erro) sem interromper o lote."""
+    for linha in fluxo:
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            yield json.loads(linha), None
+        except ValueError:
+            yield None, 'Linha JSON inválida.'
+
+def _validar_item_lote(item):
+    """Separa hemograma e paciente de um item do lote ou devolve a mensagem de erro."""
+    if not isinstance(item, dict) or not item.get('especie'):
+        return None, None, 'Dados do hemograma inválidos ou incompletos.'
+    
+    patient_info = {
+        'especie': item['especie'],
+        'nome_paciente': item.get('nome_paciente'),
+        'raca': item.get('raca'),
+        'idade': item.get('idade'),
+        'sexo': item.get('sexo'),
+        'nome_tutor': item.get('nome_tutor')
+    }
+    hemogram_data = {k: v for k, v in item.items() if k not in patient_info}
+    
+    tabela = AnalysisService.obter_tabela_referencia(item['especie'])
+    if tabela is None:
+        return None, None, f'Espécie inválida: {item["especie"]}. Use "Cão" ou "Gato".'
+    
+    for parametro in tabela.parametros:
+        valor = hemogram_data.get(parametro)
+        if valor is not None and (isinstance(valor, bool) or not isinstance(valor, (int, float))):
+            return None, None, f'Valor inválido para o parâmetro {parametro}.'
+    
+    return hemogram_data, patient_info, None
+
+def _tamanho_bloco_lote(analisador):
+    """
+    Hemogramas analisados (e cobrados) por bloco nas rotas de lote.
+    
+    Com mais de um processo, o bloco cresce até ocupar todos os processos do pool;
+    blocos de até ANALISE_PROCESSOS_BLOCO exames continuam no próprio processo.
+    """
+    tamanho_bloco = current_app.config['LOTE_TAMANHO_BLOCO']
+    if analisador.processos > 1:
+        return max(tamanho_bloco, analisador.tamanho_lote)
+    return tamanho_bloco
+
+def _gerar_resultados_lote(itens, limite):
+    """Analisa o lote em blocos, debitando os créditos de cada bloco ao concluí-lo."""
+    analisador = current_app.extensions['analisador_paralelo']
+    tamanho_bloco = _tamanho_bloco_lote(analisador)
+    creditos_por_analise = current_app.config['CREDITOS_POR_ANALISE']
+    # O fluxo roda em um novo contexto do aplicativo: o usuário é lido na sessão em que os créditos são gravados
+    usuario = db.session.get(User, current_user.id)
+    total = sucesso = 0
+    bloco = []
+    
+    def processar_bloco(bloco):
+        # Só entram na análise os itens válidos que ainda cabem nos créditos do usuário
+        creditos_disponiveis = usuario.credits // creditos_por_analise if creditos_por_analise else len(bloco)
+        linhas = {}
+        validos = []
+        for indice, item, erro in bloco:
+            if erro is None:
+                hemogram_data, patient_info, erro = _validar_item_lote(item)
+            if erro is None and len(validos) >= creditos_disponiveis:
+                erro = 'Créditos insuficientes.'
+            if erro is None:
+                validos.append((indice, hemogram_data, patient_info))
+            else:
+                linhas[indice] = {'indice': indice, 'success': False, 'error': erro}
+        
+        if validos:
+            resultados = analisador.analisar_lote(
+                [hemograma for _, hemograma, _ in validos],
+                [paciente for _, _, paciente in validos])
+            for (indice, _, _), resultado in zip(validos, resultados):
+                linhas[indice] = {'indice': indice, 'success': True, 'data': resultado}
+            
+            usuario.use_credits(creditos_por_analise * len(validos))
+            db.session.commit()
+        
+        return [json.dumps(linhas[indice], ensure_ascii=False) + '\n' for indice, _, _ in bloco], len(validos)
+    
+    for item, erro in itens:
+        if total >= limite:
+            yield json.dumps({'indice': total, 'success': False,
+                              'error': f'O lote excede o limite de {limite} hemogramas.'}, ensure_ascii=False) + '\n'
+            break
+        bloco.append((total, item, erro))
+        total += 1
+        if len(bloco) >= tamanho_bloco:
+            linhas, analisados = processar_bloco(bloco)
+            sucesso += analisados
+            bloco = []
+            yield ''.join(linhas)
+    
+    if bloco:
+        linhas, analisados = processar_bloco(bloco)
+        sucesso += analisados
+        yield ''.join(linhas)
+    
+    yield json.dumps({'resumo': {
+        'total': total,
+        'sucesso': sucesso,
+        'erros': total - sucesso,
+        'creditos_restantes': usuario.credits
+    }}, ensure_ascii=False) + '\n'
+
+@analysis_bp.route('/api/analysis/cache-stats', methods=['GET'])
+@login_required
+def get_cache_stats():
+    """Rota para obter os contadores do cache de análises."""
+    return jsonify({
+        'success': True,
+        'data': AnalysisService.estatisticas_cache()
+    }), 200
+
 @analysis_bp.route('/api/analysis/upload', methods=['POST'])
 @login_required
 def upload_and_extract():
@@ -152,7 +366,8 @@ def upload_and_extract():
         }), 400
     
     # Processar arquivo
-    extracted_data = processar_arquivo_hemograma(file)
+    extracted_data = processar_arquivo_hemograma(
+        file, limite_memoria=current_app.config['UPLOAD_LIMITE_MEMORIA'])
     
     if not extracted_data:
         return jsonify({
@@ -165,6 +380,236 @@ def upload_and_extract():
         'data': extracted_data
     }), 200
 
+@analysis_bp.route('/api/analysis/upload/zip', methods=['POST'])
+@login_required
+def upload_zip():
+    """
+    Rota para importar um arquivo ZIP com laudos (PDF ou CSV).
+    
+    Os arquivos são extraídos em paralelo e cada hemograma extraído (um por PDF,
+    um por linha de CSV) é analisado e salvo no histórico, com um commit por
+    bloco. A resposta é um fluxo NDJSON com o resultado de cada hemograma ou
+    arquivo e o progresso, seguido de uma linha de resumo.
+    """
+    # O ZIP pode exceder o limite dos demais uploads (limite por requisição: Flask 3.1+)
+    request.max_content_length = current_app.config['ZIP_MAX_BYTES']
+    
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({
+            'success': False,
+            'error': 'Nenhum arquivo enviado.'
+        }), 400
+    
+    # O arquivo do formulário é fechado (e o temporário removido) antes de a resposta
+    # ser enviada: o ZipFile é aberto aqui, com o conteúdo em memória ou com um
+    # descritor próprio do arquivo, válido até o fim do fluxo
+    upload = receber_upload(file, current_app.config['UPLOAD_LIMITE_MEMORIA'])
+    try:
+        arquivo_zip = zipfile.ZipFile(io.BytesIO(upload.origem) if upload.em_memoria else upload.origem)
+    except zipfile.BadZipFile:
+        upload.fechar()
+        return jsonify({
+            'success': False,
+            'error': 'Arquivo ZIP inválido.'
+        }), 400
+    
+    membros = listar_membros(arquivo_zip)
+    limite = current_app.config['ZIP_MAX_ARQUIVOS']
+    if len(membros) > limite:
+        arquivo_zip.close()
+        upload.fechar()
+        return jsonify({
+            'success': False,
+            'error': f'O ZIP excede o limite de {limite} arquivos.'
+        }), 413
+    
+    return Response(stream_with_context(_gerar_resultados_zip(upload, arquivo_zip, membros)),
+                    mimetype='application/x-ndjson')
+
+def _item_extraido(dados):
+    """Converte os dados extraídos de um laudo em um item no formato de /api/analysis/batch."""
+    hemograma = {chave: valor for chave, valor in (dados.get('hemograma') or {}).items() if valor is not None}
+    if not hemograma:
+        erro = (dados.get('extracao') or {}).get('erro')
+        return None, f'Não foi possível extrair dados do arquivo{": " + erro if erro else "."}'
+    
+    paciente = dados.get('paciente') or {}
+    if not paciente.get('especie'):
+        return None, 'Espécie não identificada no laudo.'
+    
+    return dict(hemograma,
+                especie=paciente['especie'],
+                nome_paciente=paciente.get('nome'),
+                raca=paciente.get('raca'),
+                idade=paciente.get('idade'),
+                sexo=paciente.get('sexo'),
+                nome_tutor=paciente.get('tutor')), None
+
+def _gerar_resultados_zip(upload, arquivo_zip, membros):
+    """Gera as linhas NDJSON da importação, fechando o ZIP e removendo o temporário ao final."""
+    with upload, arquivo_zip:
+        yield from _importar_zip(arquivo_zip, membros)
+
+def _importar_zip(arquivo_zip, membros):
+    """Extrai os laudos do ZIP e salva as análises em blocos, debitando os créditos de cada bloco."""
+    analisador = current_app.extensions['analisador_paralelo']
+    tamanho_bloco = _tamanho_bloco_lote(analisador)
+    creditos_por_analise = current_app.config['CREDITOS_POR_ANALISE']
+    # O fluxo roda em um novo contexto do aplicativo: o usuário é lido na sessão em que os créditos são gravados
+    usuario = db.session.get(User, current_user.id)
+    total_arquivos = len(membros)
+    arquivos = arquivos_com_erro = hemogramas = salvos = 0
+    bloco = []
+    
+    def linha(resultado):
+        resultado['progresso'] = {'arquivos': arquivos, 'total_arquivos': total_arquivos}
+        return json.dumps(resultado, ensure_ascii=False) + '\n'
+    
+    def salvar_bloco(bloco):
+        # Só são salvos os hemogramas que ainda cabem nos créditos do usuário
+        creditos_disponiveis = usuario.credits // creditos_por_analise if creditos_por_analise else len(bloco)
+        validos, sem_credito = bloco[:creditos_disponiveis], bloco[creditos_disponiveis:]
+        linhas = []
+        
+        if validos:
+            hemogramas_validos = [hemograma for _, hemograma, _ in validos]
+            pacientes_validos = [paciente for _, _, paciente in validos]
+            # Os resultados são apenas salvos: a forma compacta dispensa os textos da análise
+            resultados = analisador.analisar_lote_compacto(hemogramas_validos, pacientes_validos)
+            usuario.use_credits(creditos_por_analise * len(validos))
+            analyses = AnalysisService.salvar_analises_lote(
+                usuario.id, hemogramas_validos, pacientes_validos, resultados)
+            for (origem, _, paciente), analysis in zip(validos, analyses):
+                linhas.append(linha(dict(origem, success=True, analysis_id=analysis.id,
+                                         paciente=paciente['nome_paciente'], especie=paciente['especie'])))
+        
+        for origem, _, _ in sem_credito:
+            linhas.append(linha(dict(origem, success=False, error='Créditos insuficientes.')))
+        return ''.join(linhas), len(validos)
+    
+    processos = current_app.config['PDF_PROCESSOS']
+    max_bytes = current_app.config['ZIP_MAX_BYTES_ARQUIVO']
+    for nome, extraidos, erro in extrair_membros(arquivo_zip, membros, processos, max_bytes):
+        arquivos += 1
+        if erro is None and not extraidos:
+            erro = 'Nenhum hemograma encontrado no arquivo.'
+        if erro is not None:
+            arquivos_com_erro += 1
+            yield linha({'arquivo': nome, 'success': False, 'error': erro})
+            continue
+        
+        # Os hemogramas válidos aguardam o bloco; o arquivo recebe uma linha de progresso
+        saida = []
+        aguardando = 0
+        for numero, dados in extraidos:
+            hemogramas += 1
+            origem = {'arquivo': nome} if numero is None else {'arquivo': nome, 'linha': numero}
+            item, erro = _item_extraido(dados)
+            if erro is None:
+                hemogram_data, patient_info, erro = _validar_item_lote(item)
+            if erro is not None:
+                saida.append(linha(dict(origem, success=False, error=erro)))
+                continue
+            bloco.append((origem, hemogram_data, patient_info))
+            aguardando += 1
+            if len(bloco) >= tamanho_bloco:
+                linhas, analisados = salvar_bloco(bloco)
+                salvos += analisados
+                bloco = []
+                saida.append(linhas)
+        if aguardando:
+            saida.append(linha({'arquivo': nome, 'extraidos': aguardando}))
+        yield ''.join(saida)
+    
+    if bloco:
+        linhas, analisados = salvar_bloco(bloco)
+        salvos += analisados
+        yield linhas
+    
+    yield json.dumps({'resumo': {
+        'arquivos': total_arquivos,
+        'arquivos_com_erro': arquivos_com_erro,
+        'hemogramas': hemogramas,
+        'salvos': salvos,
+        'erros': hemogramas - salvos,
+        'creditos_restantes': usuario.credits
+    }}, ensure_ascii=False) + '\n'
+
+@analysis_bp.route('/api/analysis/patient-stats', methods=['GET'])
+@login_required
+def get_patient_stats():
+    """Rota para obter as estatísticas acumuladas dos hemogramas de um paciente."""
+    patient_info = {
+        'especie': request.args.get('especie', 'Cão'),
+        'nome_paciente': request.args.get('nome_paciente'),
+        'nome_tutor': request.args.get('nome_tutor')
+    }
+    
+    if not patient_info['nome_paciente']:
+        return jsonify({
+            'success': False,
+            'error': 'Nome do paciente é obrigatório.'
+        }), 400
+    
+    registro = PatientHistoryService.obter(current_user.id, patient_info)
+    
+    if not registro:
+        return jsonify({
+            'success': False,
+            'error': 'Paciente sem histórico.'
+        }), 404
+    
+    return jsonify({
+        'success': True,
+        'data': PatientHistoryService.resumo(registro)
+    }), 200
+
+@analysis_bp.route('/api/analysis/clinic-quantiles', methods=['GET'])
+@login_required
+def get_clinic_quantiles():
+    """Rota para obter a distribuição dos parâmetros entre os exames da clínica."""
+    especie = request.args.get('especie', 'Cão')
+    parametro = request.args.get('parametro')
+    valor = request.args.get('valor', type=float)
+    
+    if valor is not None and not parametro:
+        return jsonify({
+            'success': False,
+            'error': 'Informe o parâmetro para calcular o percentil de um valor.'
+        }), 400
+    
+    quantis = QUANTIS_PADRAO
+    if request.args.get('quantis'):
+        try:
+            quantis = [float(q) for q in request.args['quantis'].split(',')]
+        except ValueError:
+            quantis = None
+        if not quantis or not all(0 <= q <= 1 for q in quantis):
+            return jsonify({
+                'success': False,
+                'error': 'Quantis devem ser frações entre 0 e 1 separadas por vírgula.'
+            }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': ClinicQuantileService.consultar(current_user.id, especie, parametro, quantis, valor)
+    }), 200
+
+@analysis_bp.route('/api/analysis/metrics', methods=['GET'])
+@login_required
+def get_analysis_metrics():
+    """Rota para obter os histogramas de duração por etapa da análise e as estatísticas do cache."""
+    histogramas = AnalysisService.exportar_metricas()
+    return jsonify({
+        'success': True,
+        'data': {
+            'instrumentacao_ativa': histogramas is not None,
+            'histogramas': histogramas or {},
+            'cache': AnalysisService.estatisticas_cache()
+        }
+    }), 200
+
 @analysis_bp.route('/api/analysis/history', methods=['GET'])
 @login_required
 def get_analysis_history():
@@ -0,0 +1,175 @@
+"""
+Rotas de tarefas em segundo plano para o aplicativo AnalisaVet.
+"""
+
+from flask import Blueprint, request, jsonify, send_file
+from flask_login import login_required, current_user
+from models.models import Analysis
+from services.job_service import JobService, CONCLUIDO
+
+job_bp = Blueprint("jobs", __name__)
+
+@job_bp.route("/api/jobs/analysis", methods=["POST"])
+@login_required
+def enqueue_analysis():
+    """Rota para enfileirar a análise de um hemograma."""
+    data = request.json
+
+    if not data or "especie" not in data:
+        return jsonify({
+            "success": False,
+            "error": "Dados do hemograma inválidos ou incompletos."
+        }), 400
+
+    patient_info = {
+        "especie": data.get("especie"),
+        "nome_paciente": data.get("nome_paciente"),
+        "raca": data.get("raca"),
+        "idade": data.get("idade"),
+        "sexo": data.get("sexo"),
+        "nome_tutor": data.get("nome_tutor")
+    }
+    hemogram_data = {k: v for k, v in data.items() if k not in patient_info}
+
+    job = JobService.enfileirar(current_user.id, "analise", {
+        "hemograma": hemogram_data,
+        "paciente": patient_info
+    })
+
+    return jsonify({
+        "success": True,
+        "data": job.to_dict()
+    }), 202
+
+@job_bp.route("/api/jobs/upload", methods=["POST"])
+@login_required
+def enqueue_upload():
+    """Rota para enfileirar a extração de um arquivo de hemograma."""
+    file = request.files.get("file")
+
+    if not file or file.filename == "":
+        return jsonify({
+            "success": False,
+            "error": "Nenhum arquivo enviado."
+        }), 400
+
+    extensao = file.filename.rsplit(".", 1)[1].lower() if "." in file.filename else ""
+    if extensao not in {"pdf", "csv"}:
+        return jsonify({
+            "success": False,
+            "error": "Formato de arquivo não permitido. Use PDF ou CSV."
+        }), 400
+
+    job = JobService.enfileirar_extracao(current_user.id, file, extensao)
+
+    return jsonify({
+        "success": True,
+        "data": job.to_dict()
+    }), 202
+
+@job_bp.route("/api/jobs/reports/<report_type>/<int:analysis_id>", methods=["POST"])
+@login_required
+def enqueue_report(report_type, analysis_id):
+    """Rota para enfileirar a geração de um laudo técnico ou simplificado."""
+    if report_type not in ("technical", "simplified"):
+        return jsonify({
+            "success": False,
+            "error": "Tipo de laudo inválido. Use technical ou simplified."
+        }), 400
+
+    analysis = Analysis.query.filter_by(id=analysis_id, user_id=current_user.id).first()
+    if not analysis:
+        return jsonify({
+            "success": False,
+            "error": "Análise não encontrada ou sem permissão para acessá-la."
+        }), 404
+
+    job = JobService.enfileirar(current_user.id, "laudo", {
+        "analysis_id": analysis_id,
+        "user_id": current_user.id,
+        "tipo_laudo": report_type
+    })
+
+    return jsonify({
+        "success": True,
+        "data": job.to_dict()
+    }), 202
+
+@job_bp.route("/api/jobs/<job_id>", methods=["GET"])
+@login_required
+def get_job_status(job_id):
+    """Rota para consultar o estado de uma tarefa."""
+    job = JobService.obter(job_id, current_user.id)
+
+    if not job:
+        return jsonify({
+            "success": False,
+            "error": "Tarefa não encontrada."
+        }), 404
+
+    return jsonify({
+        "success": True,
+        "data": job.to_dict()
+    }), 200
+
+@job_bp.route("/api/jobs/<job_id>/result", methods=["GET"])
+@login_required
+def get_job_result(job_id):
+    """Rota para obter o resultado de uma tarefa concluída (JSON ou PDF do laudo)."""
+    job = JobService.obter(job_id, current_user.id)
+
+    if not job:
+        return jsonify({
+            "success": False,
+            "error": "Tarefa não encontrada."
+        }), 404
+
+    if job.status != CONCLUIDO:
+        return jsonify({
+            "success": False,
+            "error": f"Tarefa ainda não concluída ({job.status}).",
+            "data": job.to_dict()
+        }), 409
+
+    if job.job_type == "laudo" and not job.result_path:
+        return jsonify({
+            "success": False,
+            "error": "O PDF do laudo expirou. Gere o laudo novamente."
+        }), 410
+
+    if job.result_path:
+        return send_file(
+            job.result_path,
+            as_attachment=True,
+            download_name=f"laudo_{job.id}.pdf",
+            mimetype="application/pdf"
+        )
+
+    return jsonify({
+        "success": True,
+        "data": job.get_result()
+    }), 200
+
+@job_bp.route("/api/jobs/<job_id>", methods=["DELETE"])
+@login_required
+def cancel_job(job_id):
+    """Rota para cancelar uma tarefa."""
+    success, message, job = JobService.cancelar(job_id, current_user.id)
+
+    if not job:
+        return jsonify({
+            "success": False,
+            "error": message
+        }), 404
+
+    if not success:
+        return jsonify({
+            "success": False,
+            "error": message
+        }), 409
+
+    return jsonify({
+        "success": True,
+        "data": job.to_dict(),
+        "message": message
+    }), 200
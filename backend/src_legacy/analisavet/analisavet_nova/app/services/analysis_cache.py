@@ -0,0 +1,136 @@
+"""
+Cache de resultados de análise do AnalisaVet.
+Clínicas reabrem e reenviam o mesmo hemograma com frequência; o cache guarda o
+resultado pela chave canônica (espécie, versão das referências, valores) e o
+devolve sem recalcular.
+"""
+
+import threading
+from collections import OrderedDict
+
+# Quantidade padrão de resultados mantidos em memória
+CAPACIDADE_PADRAO = 2048
+
+
+class CacheAnalises:
+    """
+    Cache LRU de resultados de análise, limitado por quantidade e seguro entre threads.
+
+    A versão das referências e regras faz parte da chave; quando ela muda o cache é
+    esvaziado, de modo que nenhum resultado calculado com regras antigas é devolvido.
+    """
+
+    def __init__(self, capacidade=CAPACIDADE_PADRAO):
+        """
+        Args:
+            capacidade: Quantidade máxima de resultados armazenados (0 desativa o cache)
+        """
+        self.capacidade = capacidade
+        self.acertos = 0
+        self.falhas = 0
+        self._itens = OrderedDict()
+        self._versao = None
+        self._trava = threading.Lock()
+
+    @staticmethod
+    def gerar_chave(especie, versao, parametros, dados_hemograma):
+        """
+        Gera a chave canônica de um hemograma.
+
+        Args:
+            especie: Espécie do animal
+            versao: Versão das referências e regras usadas na análise
+            parametros: Parâmetros na ordem da tabela de referência
+            dados_hemograma: Dados do hemograma
+
+        Returns:
+            tuple: Chave ou None se algum valor não for numérico
+        """
+        valores = []
+        for parametro in parametros:
+            valor = dados_hemograma.get(parametro)
+            if valor is not None:
+                try:
+                    # 10000 e 10000.0 produzem a mesma análise
+                    valor = float(valor)
+                except (TypeError, ValueError):
+                    return None
+            valores.append(valor)
+        return (especie, versao, tuple(valores))
+
+    def obter(self, chave):
+        """
+        Obtém um resultado armazenado.
+
+        Args:
+            chave: Chave gerada por gerar_chave
+
+        Returns:
+            dict: Resultado armazenado ou None
+        """
+        with self._trava:
+            resultado = self._itens.get(chave) if self._sincronizar_versao(chave[1]) else None
+            if resultado is None:
+                self.falhas += 1
+                return None
+
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return resultado
+
+    def armazenar(self, chave, resultado):
+        """
+        Armazena um resultado, descartando o menos usado se o limite for atingido.
+
+        Args:
+            chave: Chave gerada por gerar_chave
+            resultado: Resultado da análise
+        """
+        if self.capacidade <= 0:
+            return
+
+        with self._trava:
+            if not self._sincronizar_versao(chave[1]):
+                return
+            self._itens[chave] = resultado
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.capacidade:
+                self._itens.popitem(last=False)
+
+    def _sincronizar_versao(self, versao):
+        """
+        Ajusta o cache à versão informada (chamado com a trava adquirida).
+
+        Returns:
+            bool: False se a versão for anterior à atual (requisição iniciada antes da troca)
+        """
+        if versao == self._versao:
+            return True
+        if self._versao is not None and versao < self._versao:
+            return False
+        # Referências ou regras mudaram: descartar resultados antigos
+        self._itens.clear()
+        self._versao = versao
+        return True
+
+    def limpar(self):
+        """Remove todos os resultados e zera os contadores."""
+        with self._trava:
+            self._itens.clear()
+            self.acertos = 0
+            self.falhas = 0
+
+    def estatisticas(self):
+        """Retorna os contadores de uso do cache."""
+        with self._trava:
+            consultas = self.acertos + self.falhas
+            return {
+                "tamanho": len(self._itens),
+                "capacidade": self.capacidade,
+                "acertos": self.acertos,
+                "falhas": self.falhas,
+                "taxa_acerto": self.acertos / consultas if consultas else 0.0
+            }
+
+    def __len__(self):
+        return len(self._itens)
@@ -5,8 +5,25 @@ Implementa a regra de 15% e interpretação conjunta de alterações discretas.
 """
 
 import json
+import threading
+from collections import namedtuple
+from operator import itemgetter
+
 import numpy as np
 from models.models import Analysis, User, db
+from services.analysis_cache import CacheAnalises
+from services.clinic_quantiles import ClinicQuantileService
+from services.derived_indices import indices_registrados, registrar_indice, substituir_indices
+from services.compact_result import ResultadoCompacto, e_compacto
+from services.interpretation_catalog import obter_catalogo
+from services.metrics import Cronometro, RegistroMetricas
+from services.patient_history import PatientHistoryService
+from services.reference_tables import CORTES_GRAVIDADE, ConjuntoReferencias
+from services.severity import (Direcao, Gravidade, GRAVIDADE_DO_TIPO, TIPOS_ALTERACAO,
+                               codigo_tipo, contagens_lote, nova_contagem)
+
+# Matriz de uma espécie do lote, com o estrato, os limites e a classificação de cada linha
+LoteEspecie = namedtuple("LoteEspecie", "estratos estratos_lote posicoes lote matriz limites classificacao")
 
 class AnalysisService:
     """Serviço para gerenciar análises de hemograma."""
@@ -59,6 +76,335 @@ class AnalysisService:
         "disturbios_coagulacao": ["plaquetas"]
     }
     
+    # Intervalos por grupo racial e faixa etária que substituem a referência da espécie.
+    # Ordem de aplicação: grupo racial, faixa etária e, por fim, a combinação dos dois.
+    ESTRATOS_REFERENCIA = {
+        "Cão": {
+            "grupos_raciais": {
+                "galgos": ["Greyhound", "Galgo", "Galgo Inglês", "Galgo Espanhol", "Whippet",
+                           "Saluki", "Sloughi", "Borzoi", "Deerhound", "Galgo Afegão"]
+            },
+            "faixas_etarias": [
+                {"nome": "filhote", "max_meses": 6}
+            ],
+            "intervalos": [
+                {
+                    "grupo_racial": "galgos",
+                    "valores": {
+                        "hemacias": {"min": 7.0, "max": 9.5, "unidade": "10⁶/µL"},
+                        "hemoglobina": {"min": 17, "max": 23, "unidade": "g/dL"},
+                        "hematocrito": {"min": 48, "max": 65, "unidade": "%"},
+                        "plaquetas": {"min": 80000, "max": 300000, "unidade": "/µL"}
+                    }
+                },
+                {
+                    "faixa_etaria": "filhote",
+                    "valores": {
+                        "hemacias": {"min": 4.5, "max": 7.5, "unidade": "10⁶/µL"},
+                        "hemoglobina": {"min": 10, "max": 16, "unidade": "g/dL"},
+                        "hematocrito": {"min": 30, "max": 48, "unidade": "%"}
+                    }
+                }
+            ]
+        },
+        "Gato": {
+            "faixas_etarias": [
+                {"nome": "filhote", "max_meses": 6}
+            ],
+            "intervalos": [
+                {
+                    "faixa_etaria": "filhote",
+                    "valores": {
+                        "hemoglobina": {"min": 7, "max": 14, "unidade": "g/dL"},
+                        "hematocrito": {"min": 27, "max": 45, "unidade": "%"}
+                    }
+                }
+            ]
+        }
+    }
+    
+    # Padrões diagnósticos de múltiplos parâmetros (expressões da DSL de services.rule_dsl).
+    # "faixas" classifica a gravidade pelo valor; limites decrescentes indicam gravidade por queda.
+    REGRAS_DIAGNOSTICAS = [
+        {
+            "nome": "relacao_neutrofilo_linfocito",
+            "valor": "segmentados : linfocitos",
+            "faixas": {"leve": 5, "moderada": 8, "grave": 12},
+            "interpretacao": "Relação neutrófilo:linfócito elevada, compatível com estresse, inflamação ou infecção bacteriana."
+        },
+        {
+            "nome": "anemia_microcitica_hipocromica",
+            "condicao": "hematocrito < MIN(hematocrito) and vcm < MIN(vcm) and chcm < MIN(chcm)",
+            "interpretacao": "Anemia microcítica hipocrômica, sugestiva de deficiência de ferro (perda crônica de sangue)."
+        },
+        {
+            "nome": "anemia_regenerativa",
+            "condicao": "hematocrito < MIN(hematocrito) and reticulocitos > MAX(reticulocitos)",
+            "interpretacao": "Anemia com reticulocitose, indicando resposta regenerativa (hemorragia ou hemólise)."
+        },
+        {
+            "nome": "leucograma_de_estresse",
+            "condicao": "segmentados > MAX(segmentados) and (linfocitos < MIN(linfocitos) or eosinofilos < MIN(eosinofilos))",
+            "interpretacao": "Neutrofilia com linfopenia ou eosinopenia, compatível com leucograma de estresse (corticosteroides endógenos ou exógenos)."
+        },
+        {
+            "nome": "pancitopenia",
+            "condicao": "hemacias < MIN(hemacias) and leucocitos < MIN(leucocitos) and plaquetas < MIN(plaquetas)",
+            "interpretacao": "Redução das três linhagens celulares; investigar doença medular, infecciosa ou tóxica."
+        }
+    ]
+    
+    # Referências de fábrica, usadas como primeira versão publicada no banco de dados
+    VALORES_REFERENCIA_PADRAO = VALORES_REFERENCIA
+    GRUPOS_PARAMETROS_PADRAO = GRUPOS_PARAMETROS
+    ESTRATOS_REFERENCIA_PADRAO = ESTRATOS_REFERENCIA
+    REGRAS_DIAGNOSTICAS_PADRAO = REGRAS_DIAGNOSTICAS
+    
+    # Conjunto compilado em uso (trocado por inteiro quando as referências mudam)
+    _referencias = None
+    _versao_referencias = 1
+    _trava_referencias = threading.Lock()
+    
+    # Resultados memorizados por (espécie, versão das regras, valores)
+    _cache = CacheAnalises()
+    
+    # Registro das durações por etapa (None: instrumentação desativada)
+    _metricas = None
+    
+    @staticmethod
+    def referencias_atuais():
+        """
+        Obtém o conjunto de referências compilado em uso.
+        
+        Returns:
+            ConjuntoReferencias: Tabelas, avaliadores de grupos e versão coerentes entre si
+        """
+        referencias = AnalysisService._referencias
+        if referencias is None:
+            referencias = ConjuntoReferencias(
+                AnalysisService.VALORES_REFERENCIA, AnalysisService.GRUPOS_PARAMETROS,
+                geracao=AnalysisService._versao_referencias, estratos=AnalysisService.ESTRATOS_REFERENCIA,
+                regras=AnalysisService.REGRAS_DIAGNOSTICAS)
+            AnalysisService._referencias = referencias
+        return referencias
+    
+    @staticmethod
+    def obter_tabela_referencia(especie):
+        """
+        Obtém a tabela de referência compilada de uma espécie.
+        
+        Args:
+            especie: Espécie do animal (Cão ou Gato)
+            
+        Returns:
+            TabelaReferencia: Tabela compilada ou None se a espécie não tiver referência
+        """
+        return AnalysisService.referencias_atuais().tabelas.get(especie)
+    
+    @staticmethod
+    def obter_tabela_estrato(especie, raca=None, idade=None):
+        """
+        Obtém a tabela de referência do estrato (grupo racial e faixa etária) de um paciente.
+        
+        Args:
+            especie: Espécie do animal (Cão ou Gato)
+            raca: Raça em texto livre (ex.: "Greyhound")
+            idade: Idade em texto livre (ex.: "5 anos", "3 meses")
+            
+        Returns:
+            TabelaReferencia: Tabela do estrato ou None se a espécie não tiver referência
+        """
+        estratos = AnalysisService.referencias_atuais().estratos.get(especie)
+        if estratos is None:
+            return None
+        return estratos.tabelas[estratos.posicao(raca, idade)]
+    
+    @staticmethod
+    def obter_avaliador_grupos(especie):
+        """
+        Obtém os grupos de parâmetros compilados em máscaras de bits para uma espécie.
+        
+        Args:
+            especie: Espécie do animal (Cão ou Gato)
+            
+        Returns:
+            AvaliadorGrupos: Avaliador compilado ou None se a espécie não tiver referência
+        """
+        return AnalysisService.referencias_atuais().avaliadores.get(especie)
+    
+    @staticmethod
+    def versao_regras():
+        """Versão combinada das referências, grupos e catálogo de interpretações."""
+        return (AnalysisService.referencias_atuais().geracao, obter_catalogo().versao)
+    
+    @staticmethod
+    def versao_referencias_publicada():
+        """Versão do banco de dados das referências em uso (None se forem locais)."""
+        return AnalysisService.referencias_atuais().versao
+    
+    @staticmethod
+    def referencias_da_versao(versao):
+        """
+        Obtém o conjunto de referências de uma versão publicada.
+        
+        Args:
+            versao: Versão do banco de dados (None para as referências em uso)
+            
+        Returns:
+            ConjuntoReferencias: Conjunto da versão ou o conjunto em uso se ela não existir
+        """
+        referencias = AnalysisService.referencias_atuais()
+        if versao is None or versao == referencias.versao:
+            return referencias
+        
+        # Importação local: o serviço de referências depende deste módulo
+        from services.reference_service import ReferenceService
+        return ReferenceService.compilado(versao) or referencias
+    
+    @staticmethod
+    def configurar_cache(capacidade):
+        """Substitui o cache de resultados por um novo com a capacidade informada."""
+        AnalysisService._cache = CacheAnalises(capacidade)
+    
+    @staticmethod
+    def estatisticas_cache():
+        """Retorna tamanho, acertos, falhas e taxa de acerto do cache de resultados."""
+        return AnalysisService._cache.estatisticas()
+    
+    @staticmethod
+    def ativar_instrumentacao(registro=None):
+        """
+        Passa a registrar a duração de cada etapa da análise e as contagens de parâmetros e alterações.
+        
+        Args:
+            registro: RegistroMetricas de destino (padrão: um novo registro)
+            
+        Returns:
+            RegistroMetricas: Registro em uso
+        """
+        AnalysisService._metricas = registro if registro is not None else RegistroMetricas()
+        return AnalysisService._metricas
+    
+    @staticmethod
+    def desativar_instrumentacao():
+        """Interrompe o registro de métricas (as análises voltam a não ter custo de medição)."""
+        AnalysisService._metricas = None
+    
+    @staticmethod
+    def iniciar_cronometro(prefixo):
+        """
+        Inicia a medição de uma operação.
+        
+        Args:
+            prefixo: Prefixo dos nomes das métricas (ex.: "analise")
+            
+        Returns:
+            Cronometro: Cronômetro ou None se a instrumentação estiver desativada
+        """
+        metricas = AnalysisService._metricas
+        return Cronometro(metricas, prefixo) if metricas is not None else None
+    
+    @staticmethod
+    def exportar_metricas():
+        """Retorna os histogramas registrados (None se a instrumentação estiver desativada)."""
+        metricas = AnalysisService._metricas
+        return metricas.exportar() if metricas is not None else None
+    
+    @staticmethod
+    def aplicar_referencias(valores, grupos, versao=None, estratos=None, regras=None):
+        """
+        Compila um novo conjunto de referências e o coloca em uso atomicamente.
+        
+        A compilação acontece antes da troca; análises em andamento terminam com o
+        conjunto anterior e as seguintes já usam o novo, sem reiniciar o servidor.
+        
+        Args:
+            valores: Dicionário {especie: {parametro: {"min", "max", "unidade"}}}
+            grupos: Dicionário {grupo: [parametros]}
+            versao: Versão publicada no banco de dados (None para referências locais)
+            estratos: Intervalos por grupo racial e faixa etária (None mantém os atuais)
+            regras: Regras diagnósticas (None mantém as atuais)
+            
+        Returns:
+            ConjuntoReferencias: Conjunto colocado em uso
+        """
+        valores = {
+            especie: {parametro: dict(ref) for parametro, ref in referencias.items()}
+            for especie, referencias in valores.items()
+        }
+        grupos = {grupo: list(parametros) for grupo, parametros in grupos.items()}
+        if estratos is None:
+            estratos = AnalysisService.referencias_atuais().definicao_estratos
+        if regras is None:
+            regras = AnalysisService.referencias_atuais().regras
+        
+        with AnalysisService._trava_referencias:
+            geracao = AnalysisService._versao_referencias + 1
+            # As regras são compiladas aqui, uma única vez por conjunto
+            referencias = ConjuntoReferencias(valores, grupos, versao, geracao, estratos, regras)
+            AnalysisService.VALORES_REFERENCIA = valores
+            AnalysisService.GRUPOS_PARAMETROS = grupos
+            AnalysisService.ESTRATOS_REFERENCIA = estratos
+            AnalysisService.REGRAS_DIAGNOSTICAS = regras
+            AnalysisService._versao_referencias = geracao
+            AnalysisService._referencias = referencias
+        return referencias
+    
+    @staticmethod
+    def registrar_indice_derivado(nome, expressao, referencias=None, preencher=False, descricao=""):
+        """
+        Registra um índice derivado e recompila as referências em uso.
+        
+        O índice é calculado na etapa anterior à classificação, sem alterar
+        analisar_hemograma; a nova geração das referências invalida o cache.
+        
+        Args:
+            nome: Nome do índice (ou do parâmetro preenchido, com preencher=True)
+            expressao: Expressão da DSL de regras ou {especie: expressão}
+            referencias: {especie: {"min", "max", "unidade"}}
+            preencher: Se True, o valor só é usado quando o parâmetro não foi informado
+            descricao: Descrição do índice
+            
+        Returns:
+            IndiceDerivado: Índice registrado
+            
+        Raises:
+            ValueError: Se a expressão for inválida (o registro anterior é mantido)
+        """
+        anteriores = indices_registrados()
+        indice = registrar_indice(nome, expressao, referencias, preencher, descricao)
+        atuais = AnalysisService.referencias_atuais()
+        try:
+            AnalysisService.aplicar_referencias(atuais.valores, atuais.grupos, atuais.versao)
+        except ValueError:
+            substituir_indices(anteriores)
+            raise
+        return indice
+    
+    @staticmethod
+    def definir_valores_referencia(especie, valores):
+        """
+        Substitui localmente os valores de referência de uma espécie.
+        
+        Args:
+            especie: Espécie do animal
+            valores: Dicionário {parametro: {"min", "max", "unidade"}}
+        """
+        # Cópia em vez de alteração no lugar: leitores concorrentes continuam com o dicionário anterior
+        novos_valores = dict(AnalysisService.referencias_atuais().valores)
+        novos_valores[especie] = valores
+        AnalysisService.aplicar_referencias(novos_valores, AnalysisService.GRUPOS_PARAMETROS)
+    
+    @staticmethod
+    def definir_grupos_parametros(grupos):
+        """
+        Substitui localmente os grupos de interpretação conjunta.
+        
+        Args:
+            grupos: Dicionário {grupo: [parametros]}
+        """
+        AnalysisService.aplicar_referencias(AnalysisService.referencias_atuais().valores, grupos)
+    
     @staticmethod
     def aplicar_regra_15_porcento(valor, valor_min, valor_max):
         """
@@ -82,42 +428,43 @@ class AnalysisService:
         limite_inferior_ajustado = valor_min - margem_inferior
         limite_superior_ajustado = valor_max + margem_superior
         
+        codigo, desvio_percentual = AnalysisService._classificar_valor(
+            valor, valor_min, valor_max, limite_inferior_ajustado, limite_superior_ajustado)
+        
+        return {
+            "alterado": codigo != 0,
+            "tipo": TIPOS_ALTERACAO[codigo],
+            "desvio_percentual": desvio_percentual
+        }
+    
+    @staticmethod
+    def _classificar_valor(valor, valor_min, valor_max, limite_inferior_ajustado, limite_superior_ajustado):
+        """
+        Classifica um valor com limites ajustados já calculados (ver TabelaReferencia).
+        
+        Returns:
+            tuple: (código do tipo em TIPOS_ALTERACAO, desvio percentual)
+        """
         if valor < limite_inferior_ajustado:
             # Valor abaixo do normal com mais de 15% de desvio
+            direcao = Direcao.BAIXO
             desvio_percentual = ((valor_min - valor) / valor_min) * 100
-            
-            if desvio_percentual <= 30:
-                tipo_alteracao = "leve"
-            elif desvio_percentual <= 50:
-                tipo_alteracao = "moderada"
-            else:
-                tipo_alteracao = "grave"
-                
-            return {
-                "alterado": True,
-                "tipo": f"baixo_{tipo_alteracao}",
-                "desvio_percentual": desvio_percentual
-            }
-            
         elif valor > limite_superior_ajustado:
             # Valor acima do normal com mais de 15% de desvio
+            direcao = Direcao.ALTO
             desvio_percentual = ((valor - valor_max) / valor_max) * 100
-            
-            if desvio_percentual <= 30:
-                tipo_alteracao = "leve"
-            elif desvio_percentual <= 50:
-                tipo_alteracao = "moderada"
-            else:
-                tipo_alteracao = "grave"
-                
-            return {
-                "alterado": True,
-                "tipo": f"alto_{tipo_alteracao}",
-                "desvio_percentual": desvio_percentual
-            }
         else:
             # Valor dentro dos limites aceitáveis (incluindo margem de 15%)
-            return {"alterado": False, "tipo": "normal", "desvio_percentual": 0}
+            return 0, 0
+        
+        if desvio_percentual <= CORTES_GRAVIDADE[0]:
+            gravidade = Gravidade.LEVE
+        elif desvio_percentual <= CORTES_GRAVIDADE[1]:
+            gravidade = Gravidade.MODERADA
+        else:
+            gravidade = Gravidade.GRAVE
+        
+        return codigo_tipo(direcao, gravidade), desvio_percentual
     
     @staticmethod
     def interpretar_alteracoes_conjuntas(dados_hemograma, especie):
@@ -131,168 +478,545 @@ class AnalysisService:
         Returns:
             list: Lista de interpretações conjuntas identificadas
         """
-        valores_referencia = AnalysisService.VALORES_REFERENCIA.get(especie, {})
-        interpretacoes = []
+        referencias = AnalysisService.referencias_atuais()
+        tabela = referencias.tabelas.get(especie)
+        if tabela is None:
+            return []
         
-        for grupo, parametros in AnalysisService.GRUPOS_PARAMETROS.items():
-            parametros_alterados = []
-            
-            for parametro in parametros:
-                if parametro in dados_hemograma and parametro in valores_referencia:
-                    valor = dados_hemograma[parametro]
-                    ref = valores_referencia[parametro]
-                    
-                    # Verificar se está fora dos valores de referência (mesmo que menos de 15%)
-                    if valor is not None and (valor < ref["min"] or valor > ref["max"]):
-                        parametros_alterados.append(parametro)
-            
-            # Se dois ou mais parâmetros do mesmo grupo estão alterados
-            if len(parametros_alterados) >= 2:
-                interpretacoes.append({
-                    "grupo": grupo,
-                    "parametros_alterados": parametros_alterados,
-                    "recomendacao": f"Múltiplos parâmetros do grupo {grupo} apresentam alterações discretas. Recomenda-se monitoramento e investigação adicional."
-                })
+        # Bit ligado para cada parâmetro fora dos valores de referência (mesmo que menos de 15%)
+        mascara = 0
+        for indice, (parametro, valor_min, valor_max, _, _, _) in enumerate(tabela.linhas):
+            valor = dados_hemograma.get(parametro)
+            if valor is not None and (valor < valor_min or valor > valor_max):
+                mascara |= 1 << indice
         
-        return interpretacoes
+        return referencias.avaliadores[especie].avaliar(mascara)
     
     @staticmethod
-    def analisar_hemograma(dados_hemograma, dados_paciente):
+    def analisar_hemograma(dados_hemograma, dados_paciente, clinica_id=None):
         """
         Analisa um hemograma completo aplicando as regras de 15% e interpretação conjunta.
         
+        Hemogramas idênticos (mesma espécie, versão das regras e valores) são
+        devolvidos do cache sem recálculo. As estruturas internas do resultado são
+        compartilhadas com o cache e não devem ser alteradas; apenas o dicionário
+        de primeiro nível é uma cópia própria.
+        
         Args:
             dados_hemograma: Dados do hemograma
             dados_paciente: Dados do paciente
+            clinica_id: ID do usuário (clínica); se informado, o resultado inclui
+                "percentis_clinica" com a posição de cada valor entre os exames da clínica
             
         Returns:
             dict: Análise completa do hemograma
         """
+        cronometro = AnalysisService.iniciar_cronometro("analise")
+        resultados = dict(AnalysisService._analisar_hemograma_memorizado(dados_hemograma, dados_paciente, cronometro))
+        
+        # Fora do cache: os percentis dependem da clínica e mudam a cada análise salva
+        if clinica_id is not None:
+            resultados["percentis_clinica"] = ClinicQuantileService.percentis(
+                clinica_id, dados_paciente.get("especie", "Cão"), dados_hemograma)
+            if cronometro is not None:
+                cronometro.marcar("percentis_clinica")
+        
+        if cronometro is not None:
+            cronometro.contar("parametros_avaliados", len(resultados["parametros"]))
+            cronometro.contar("alteracoes", len(resultados["interpretacoes_individuais"]))
+            cronometro.finalizar()
+        
+        return resultados
+    
+    @staticmethod
+    def _analisar_hemograma_memorizado(dados_hemograma, dados_paciente, cronometro=None):
+        """Obtém a análise do cache ou a calcula (o resultado é compartilhado com o cache)."""
         especie = dados_paciente.get("especie", "Cão")
-        valores_referencia = AnalysisService.VALORES_REFERENCIA.get(especie, {})
-        
-        resultados = {
-            "parametros": {},
-            "interpretacoes_individuais": [],
-            "interpretacoes_conjuntas": [],
-            "resumo_clinico": "",
-            "recomendacoes": [],
-            "diagnosticos": []
-        }
+        # Um único conjunto por análise, mesmo que as referências sejam trocadas no meio dela
+        referencias = AnalysisService.referencias_atuais()
+        estratos = referencias.estratos.get(especie)
+        if estratos is None:
+            return AnalysisService._analisar_hemograma_sem_cache(
+                dados_hemograma, especie, None, (None, None), referencias, cronometro)
         
-        # Analisar cada parâmetro individualmente
-        for parametro, valor in dados_hemograma.items():
-            if parametro in valores_referencia and valor is not None:
-                ref = valores_referencia[parametro]
-                analise = AnalysisService.aplicar_regra_15_porcento(valor, ref["min"], ref["max"])
-                
-                resultados["parametros"][parametro] = {
-                    "valor": valor,
-                    "referencia": f"{ref['min']} - {ref['max']} {ref['unidade']}",
-                    "status": analise["tipo"],
-                    "alterado": analise["alterado"],
-                    "desvio_percentual": analise["desvio_percentual"]
-                }
+        estrato = estratos.estrato(dados_paciente.get("raca"), dados_paciente.get("idade"))
+        tabela = estratos.tabelas[estratos.posicoes[estrato]]
+        
+        # Antes da chave do cache: os índices dependem também de entradas fora da tabela
+        dados_hemograma = AnalysisService._calcular_indices(dados_hemograma, especie, tabela, referencias)
+        if cronometro is not None:
+            cronometro.marcar("indices_derivados")
+        
+        cache = AnalysisService._cache
+        versao = (referencias.geracao, obter_catalogo().versao)
+        chave = cache.gerar_chave((especie,) + estrato, versao, tabela.parametros, dados_hemograma)
+        if chave is None:
+            return AnalysisService._analisar_hemograma_sem_cache(
+                dados_hemograma, especie, tabela, estrato, referencias, cronometro)
+        
+        resultados = cache.obter(chave)
+        if cronometro is not None:
+            cronometro.marcar("cache")
+        if resultados is None:
+            resultados = AnalysisService._analisar_hemograma_sem_cache(
+                dados_hemograma, especie, tabela, estrato, referencias, cronometro)
+            cache.armazenar(chave, resultados)
+        
+        return resultados
+    
+    @staticmethod
+    def _analisar_hemograma_sem_cache(dados_hemograma, especie, tabela, estrato, referencias, cronometro=None):
+        """Executa a análise completa de um hemograma com a tabela do estrato do paciente."""
+        compacto = AnalysisService._classificar_hemograma(dados_hemograma, especie, tabela, estrato, referencias)
+        if cronometro is not None:
+            cronometro.marcar("classificacao")
+        return compacto.expandir(tabela, referencias.avaliadores.get(especie),
+                                 referencias.avaliadores_regras.get(especie), cronometro)
+    
+    @staticmethod
+    def _classificar_hemograma(dados_hemograma, especie, tabela, estrato, referencias):
+        """Classifica cada parâmetro informado (na ordem da tabela) sem gerar textos."""
+        indices, valores, tipos, desvios = [], [], [], []
+        mascara_fora_faixa = 0
+        linhas = tabela.linhas if tabela is not None else ()
+        for indice, (parametro, valor_min, valor_max, limite_inferior, limite_superior, _) in enumerate(linhas):
+            valor = dados_hemograma.get(parametro)
+            if valor is not None:
+                # Fora da referência (mesmo que menos de 15%), usado na interpretação conjunta
+                if valor < valor_min or valor > valor_max:
+                    mascara_fora_faixa |= 1 << indice
                 
-                # Adicionar interpretações para valores alterados
-                if analise["alterado"]:
-                    resultados["interpretacoes_individuais"].append({
-                        "parametro": parametro,
-                        "tipo_alteracao": analise["tipo"],
-                        "desvio": analise["desvio_percentual"],
-                        "interpretacao": AnalysisService._obter_interpretacao_parametro(parametro, analise["tipo"], especie)
-                    })
+                codigo, desvio = AnalysisService._classificar_valor(
+                    valor, valor_min, valor_max, limite_inferior, limite_superior)
+                indices.append(indice)
+                valores.append(valor)
+                tipos.append(codigo)
+                desvios.append(desvio)
         
-        # Analisar alterações conjuntas
-        resultados["interpretacoes_conjuntas"] = AnalysisService.interpretar_alteracoes_conjuntas(dados_hemograma, especie)
+        return ResultadoCompacto(especie, estrato, referencias.versao, tuple(indices), tuple(valores),
+                                 tuple(tipos), tuple(desvios), mascara_fora_faixa, tabela=tabela)
+    
+    @staticmethod
+    def analisar_hemograma_compacto(dados_hemograma, dados_paciente):
+        """
+        Analisa um hemograma sem gerar os textos do resultado.
         
-        # Gerar resumo clínico
-        resultados["resumo_clinico"] = AnalysisService._gerar_resumo_clinico(resultados)
+        Args:
+            dados_hemograma: Dados do hemograma
+            dados_paciente: Dados do paciente
+            
+        Returns:
+            ResultadoCompacto: Resultado codificado (ver expandir_resultado)
+        """
+        especie = dados_paciente.get("especie", "Cão")
+        referencias = AnalysisService.referencias_atuais()
+        estratos = referencias.estratos.get(especie)
+        if estratos is None:
+            return AnalysisService._classificar_hemograma(
+                dados_hemograma, especie, None, (None, None), referencias)
         
-        # Gerar recomendações
-        resultados["recomendacoes"] = AnalysisService._gerar_recomendacoes(resultados)
+        estrato = estratos.estrato(dados_paciente.get("raca"), dados_paciente.get("idade"))
+        tabela = estratos.tabelas[estratos.posicoes[estrato]]
+        dados_hemograma = AnalysisService._calcular_indices(dados_hemograma, especie, tabela, referencias)
+        return AnalysisService._classificar_hemograma(dados_hemograma, especie, tabela, estrato, referencias)
+    
+    @staticmethod
+    def _calcular_indices(dados_hemograma, especie, tabela, referencias):
+        """Etapa de índices derivados: devolve o hemograma acrescido dos índices calculados."""
+        etapa = referencias.etapas_indices.get(especie)
+        if etapa is None:
+            return dados_hemograma
+        return etapa.aplicar(dados_hemograma, tabela.minimos_escalares, tabela.maximos_escalares)
+    
+    @staticmethod
+    def _tabela_do_resultado(referencias, especie, estrato):
+        """Tabela e avaliadores do estrato registrado em um resultado (None se a espécie não existir)."""
+        estratos = referencias.estratos.get(especie)
+        if estratos is None:
+            return None, None, None
+        posicao = estratos.posicoes.get(tuple(estrato), estratos.posicoes[(None, None)])
+        return estratos.tabelas[posicao], referencias.avaliadores[especie], referencias.avaliadores_regras[especie]
+    
+    @staticmethod
+    def expandir_resultado(compacto):
+        """
+        Expande um resultado compacto para o formato detalhado de analisar_hemograma.
+        
+        Os textos de referência vêm da versão de referências registrada no resultado;
+        as interpretações vêm do catálogo em uso.
         
-        resultados["diagnosticos"] = resultados["interpretacoes_individuais"] + resultados["interpretacoes_conjuntas"]
+        Args:
+            compacto: ResultadoCompacto
+            
+        Returns:
+            dict: Resultado detalhado
+        """
+        referencias = AnalysisService.referencias_da_versao(compacto.versao_referencia)
+        tabela, avaliador, regras = AnalysisService._tabela_do_resultado(
+            referencias, compacto.especie, compacto.estrato)
+        return compacto.expandir(tabela, avaliador, regras)
     
     @staticmethod
-    def _obter_interpretacao_parametro(parametro, tipo_alteracao, especie):
+    def decodificar_resultado(dados):
         """
-        Obtém a interpretação clínica para um parâmetro específico alterado.
+        Converte o resultado armazenado de uma análise para o formato detalhado.
+        
+        Args:
+            dados: Resultado armazenado (compacto ou detalhado, de análises antigas)
+            
+        Returns:
+            dict: Resultado detalhado
         """
-        interpretacoes = {
-            "hemacias": {
-                "baixo_leve": "Discreta diminuição no número de hemácias, possivelmente relacionada a anemia leve.",
-                "baixo_moderada": "Diminuição moderada no número de hemácias, sugerindo anemia que requer investigação.",
-                "baixo_grave": "Diminuição grave no número de hemácias, indicando anemia severa que necessita atenção imediata.",
-                "alto_leve": "Discreto aumento no número de hemácias, possivelmente relacionado a desidratação ou policitemia leve.",
-                "alto_moderada": "Aumento moderado no número de hemácias, sugerindo policitemia que requer avaliação.",
-                "alto_grave": "Aumento grave no número de hemácias, indicando policitemia severa."
-            },
-            "hemoglobina": {
-                "baixo_leve": "Discreta diminuição da hemoglobina, sugerindo anemia leve.",
-                "baixo_moderada": "Diminuição moderada da hemoglobina, indicando anemia que requer investigação.",
-                "baixo_grave": "Diminuição grave da hemoglobina, indicando anemia severa que necessita atenção imediata.",
-                "alto_leve": "Discreto aumento da hemoglobina, possivelmente relacionado a desidratação.",
-                "alto_moderada": "Aumento moderado da hemoglobina, sugerindo policitemia.",
-                "alto_grave": "Aumento grave da hemoglobina, indicando policitemia severa."
-            },
-            "leucocitos": {
-                "baixo_leve": "Discreta diminuição dos leucócitos (leucopenia leve), possivelmente relacionada a infecção viral ou estresse.",
-                "baixo_moderada": "Diminuição moderada dos leucócitos, sugerindo supressão imunológica que requer investigação.",
-                "baixo_grave": "Diminuição grave dos leucócitos, indicando imunossupressão severa.",
-                "alto_leve": "Discreto aumento dos leucócitos, possivelmente relacionado a estresse ou inflamação leve.",
-                "alto_moderada": "Aumento moderado dos leucócitos, sugerindo infecção ou inflamação.",
-                "alto_grave": "Aumento grave dos leucócitos, indicando infecção severa ou processo inflamatório intenso."
-            },
-            "plaquetas": {
-                "baixo_leve": "Discreta diminuição das plaquetas (trombocitopenia leve), requer monitoramento.",
-                "baixo_moderada": "Diminuição moderada das plaquetas, aumentando risco de sangramento.",
-                "baixo_grave": "Diminuição grave das plaquetas, risco significativo de sangramento espontâneo.",
-                "alto_leve": "Discreto aumento das plaquetas, possivelmente reacional.",
-                "alto_moderada": "Aumento moderado das plaquetas, sugerindo processo inflamatório ou reacional.",
-                "alto_grave": "Aumento grave das plaquetas, possível distúrbio mieloproliferativo."
+        if e_compacto(dados):
+            return AnalysisService.expandir_resultado(ResultadoCompacto.decodificar(dados))
+        return dados
+
+    @staticmethod
+    def analisar_hemogramas_lote(lista_hemogramas, lista_pacientes):
+        """
+        Analisa um lote de hemogramas de forma vetorizada.
+
+        Os valores de cada espécie são carregados em uma matriz N × parâmetros e a
+        regra de 15%, a classificação leve/moderada/grave e o desvio percentual são
+        calculados em uma única passagem com NumPy.
+
+        Args:
+            lista_hemogramas: Lista de dicionários com os dados de cada hemograma
+            lista_pacientes: Lista de dicionários com os dados de cada paciente
+                (ou um único dicionário aplicado a todo o lote)
+
+        Returns:
+            list: Análises na mesma ordem e estrutura de analisar_hemograma
+        """
+        total = len(lista_hemogramas)
+        if isinstance(lista_pacientes, dict):
+            lista_pacientes = [lista_pacientes] * total
+        if len(lista_pacientes) != total:
+            raise ValueError("Quantidade de pacientes diferente da quantidade de hemogramas.")
+
+        resultados = [None] * total
+        cronometro = AnalysisService.iniciar_cronometro("lote")
+
+        AnalysisService._analisar_lote_por_especie(
+            lista_hemogramas, lista_pacientes, AnalysisService.referencias_atuais(), resultados)
+
+        if cronometro is not None:
+            cronometro.contar("exames", total)
+            cronometro.finalizar()
+
+        return resultados
+
+    @staticmethod
+    def analisar_hemogramas_lote_compacto(lista_hemogramas, lista_pacientes):
+        """
+        Analisa um lote de hemogramas sem gerar os textos do resultado.
+
+        A classificação é a mesma de analisar_hemogramas_lote, mas cada exame recebe
+        apenas o ResultadoCompacto lido das matrizes; os textos são gerados só se o
+        resultado for expandido (ver expandir_resultado). É a forma usada quando os
+        resultados são apenas salvos, como na importação de ZIP.
+
+        Args:
+            lista_hemogramas: Lista de dicionários com os dados de cada hemograma
+            lista_pacientes: Lista de dicionários com os dados de cada paciente
+                (ou um único dicionário aplicado a todo o lote)
+
+        Returns:
+            list: ResultadoCompacto de cada exame, na mesma ordem
+        """
+        total = len(lista_hemogramas)
+        if isinstance(lista_pacientes, dict):
+            lista_pacientes = [lista_pacientes] * total
+        if len(lista_pacientes) != total:
+            raise ValueError("Quantidade de pacientes diferente da quantidade de hemogramas.")
+
+        resultados = [None] * total
+        cronometro = AnalysisService.iniciar_cronometro("lote_compacto")
+
+        AnalysisService._compactar_lote_por_especie(
+            lista_hemogramas, lista_pacientes, AnalysisService.referencias_atuais(), resultados)
+
+        if cronometro is not None:
+            cronometro.contar("exames", total)
+            cronometro.finalizar()
+
+        return resultados
+
+    @staticmethod
+    def _matrizes_lote(lista_hemogramas, lista_pacientes, referencias):
+        """
+        Prepara o lote em uma matriz por espécie, já classificada pela regra de 15%.
+
+        Exames de estratos diferentes (raça, idade) da mesma espécie ficam na mesma
+        matriz; os limites de cada linha vêm das matrizes empilhadas dos estratos.
+
+        Yields:
+            tuple: (espécie, índices dos exames no lote, LoteEspecie ou None se a espécie não tiver referência)
+        """
+        # Agrupar os exames por espécie: todos os estratos da espécie têm a mesma ordem de parâmetros
+        indices_por_especie = {}
+        for indice, dados_paciente in enumerate(lista_pacientes):
+            especie = dados_paciente.get("especie", "Cão")
+            indices_por_especie.setdefault(especie, []).append(indice)
+
+        for especie, indices in indices_por_especie.items():
+            estratos = referencias.estratos.get(especie)
+            if estratos is None:
+                yield especie, indices, None
+                continue
+
+            # Estrato de cada exame; pares (raça, idade) repetidos no lote são resolvidos uma única vez
+            estratos_conhecidos = {}
+            estratos_lote = []
+            for indice in indices:
+                dados_paciente = lista_pacientes[indice]
+                chave = (dados_paciente.get("raca"), dados_paciente.get("idade"))
+                estrato = estratos_conhecidos.get(chave)
+                if estrato is None:
+                    estrato = estratos.estrato(*chave)
+                    estratos_conhecidos[chave] = estrato
+                estratos_lote.append(estrato)
+            posicoes = [estratos.posicoes[estrato] for estrato in estratos_lote]
+
+            parametros = estratos.base.parametros
+            lote = [lista_hemogramas[indice] for indice in indices]
+
+            posicoes_distintas = set(posicoes)
+            if len(posicoes_distintas) == 1:
+                # Um único estrato: os vetores da tabela são aplicados a todas as linhas
+                tabela = estratos.tabelas[posicoes[0]]
+                limites = (tabela.minimos, tabela.maximos, tabela.limites_inferiores, tabela.limites_superiores)
+            else:
+                vetor_posicoes = np.array(posicoes)
+                limites = (estratos.minimos[vetor_posicoes], estratos.maximos[vetor_posicoes],
+                           estratos.limites_inferiores[vetor_posicoes], estratos.limites_superiores[vetor_posicoes])
+
+            etapa_indices = referencias.etapas_indices.get(especie)
+            if etapa_indices is not None:
+                # Índices derivados calculados por coluna; o lote passa a conter os valores calculados
+                matriz, lote = etapa_indices.aplicar_lote(lote, limites[0], limites[1])
+            else:
+                # None vira NaN na conversão para float64
+                matriz = np.array([list(map(hemograma.get, parametros)) for hemograma in lote], dtype=float)
+                matriz = matriz.reshape(len(lote), len(parametros))
+
+            yield especie, indices, LoteEspecie(
+                estratos, estratos_lote, posicoes, lote, matriz, limites,
+                AnalysisService._classificar_matriz(matriz, *limites))
+
+    @staticmethod
+    def _analisar_lote_por_especie(lista_hemogramas, lista_pacientes, referencias, resultados):
+        """Preenche resultados com as análises detalhadas do lote, processando uma matriz por espécie."""
+        for especie, indices, dados in AnalysisService._matrizes_lote(lista_hemogramas, lista_pacientes, referencias):
+            if dados is None:
+                # Sem referência não há o que vetorizar; o caminho unitário já trata o caso
+                for indice in indices:
+                    resultados[indice] = AnalysisService._analisar_hemograma_sem_cache(
+                        lista_hemogramas[indice], especie, None, (None, None), referencias)
+                continue
+
+            estratos, lote, matriz, limites, classificacao = (
+                dados.estratos, dados.lote, dados.matriz, dados.limites, dados.classificacao)
+            parametros = estratos.base.parametros
+
+            # Textos calculados uma única vez por lote: interpretação de cada tipo por parâmetro
+            # e, para cada estrato presente, a referência de cada coluna
+            interpretacoes_parametros = [
+                [None] + [AnalysisService._obter_interpretacao_parametro(parametro, tipo, especie)
+                          for tipo in TIPOS_ALTERACAO[1:]]
+                for parametro in parametros
+            ]
+            colunas_estratos = {
+                posicao: list(zip(parametros, estratos.tabelas[posicao].textos_referencia, interpretacoes_parametros))
+                for posicao in set(dados.posicoes)
             }
+
+            # Uma máscara por exame; os grupos são avaliados com AND e contagem de bits sobre o vetor
+            avaliador = referencias.avaliadores[especie]
+            conjuntas_lote = avaliador.avaliar_lote(avaliador.mascaras_lote(classificacao["fora_faixa"]))
+            
+            # Regras diagnósticas avaliadas como expressões NumPy sobre a matriz inteira
+            padroes_lote = referencias.avaliadores_regras[especie].avaliar_lote(matriz, limites[0], limites[1])
+
+            linhas = zip(
+                lote,
+                dados.posicoes,
+                dados.estratos_lote,
+                classificacao["presente"].tolist(),
+                classificacao["tipo"].tolist(),
+                classificacao["desvio"].tolist(),
+                conjuntas_lote,
+                padroes_lote,
+                contagens_lote(classificacao["tipo"], classificacao["presente"])
+            )
+
+            for linha, (hemograma, posicao, estrato, presentes, tipos, desvios, conjuntas, padroes, contagem) in enumerate(linhas):
+                parametros_resultado = {}
+                individuais = []
+
+                for (parametro, referencia, interpretacoes), presente, codigo, desvio in zip(
+                        colunas_estratos[posicao], presentes, tipos, desvios):
+                    if not presente:
+                        continue
+
+                    tipo = TIPOS_ALTERACAO[codigo]
+                    if codigo:
+                        parametros_resultado[parametro] = {
+                            "valor": hemograma[parametro],
+                            "referencia": referencia,
+                            "status": tipo,
+                            "alterado": True,
+                            "desvio_percentual": desvio
+                        }
+                        individuais.append({
+                            "parametro": parametro,
+                            "tipo_alteracao": tipo,
+                            "desvio": desvio,
+                            "interpretacao": interpretacoes[codigo]
+                        })
+                    else:
+                        parametros_resultado[parametro] = {
+                            "valor": hemograma[parametro],
+                            "referencia": referencia,
+                            "status": tipo,
+                            "alterado": False,
+                            "desvio_percentual": 0
+                        }
+
+                resultados[indices[linha]] = {
+                    "parametros": parametros_resultado,
+                    "interpretacoes_individuais": individuais,
+                    "interpretacoes_conjuntas": conjuntas,
+                    "resumo_clinico": AnalysisService._gerar_resumo_clinico(contagem),
+                    "recomendacoes": AnalysisService._gerar_recomendacoes(contagem, bool(conjuntas)),
+                    "diagnosticos": individuais + conjuntas,
+                    "padroes_diagnosticos": padroes,
+                    "versao_referencia": referencias.versao,
+                    "estrato_referencia": {"grupo_racial": estrato[0], "faixa_etaria": estrato[1]}
+                }
+
+
+    @staticmethod
+    def _compactar_lote_por_especie(lista_hemogramas, lista_pacientes, referencias, resultados):
+        """
+        Preenche resultados com os resultados compactos do lote, lidos das matrizes.
+
+        Os exames com os mesmos parâmetros informados são lidos juntos: as colunas,
+        os tipos e os desvios de cada grupo saem de um único recorte das matrizes.
+        """
+        for especie, indices, dados in AnalysisService._matrizes_lote(lista_hemogramas, lista_pacientes, referencias):
+            if dados is None:
+                for indice in indices:
+                    resultados[indice] = AnalysisService._classificar_hemograma(
+                        lista_hemogramas[indice], especie, None, (None, None), referencias)
+                continue
+
+            classificacao = dados.classificacao
+            presente = classificacao["presente"]
+            tipos = classificacao["tipo"]
+            desvios = np.where(tipos != 0, classificacao["desvio"], 0.0)
+            mascaras = referencias.avaliadores[especie].mascaras_lote(classificacao["fora_faixa"]).tolist()
+            parametros = dados.estratos.base.parametros
+            tabelas = dados.estratos.tabelas
+
+            # Um código por linha com um bit por parâmetro informado
+            codigos = (presente * (1 << np.arange(presente.shape[1], dtype=np.int64))).sum(axis=1)
+            padroes, grupo_da_linha = np.unique(codigos, return_inverse=True)
+            for grupo in range(len(padroes)):
+                linhas = np.flatnonzero(grupo_da_linha == grupo)
+                colunas = np.flatnonzero(presente[linhas[0]])
+                posicoes = tuple(colunas.tolist())
+                ler_valores = itemgetter(*(parametros[coluna] for coluna in posicoes)) if posicoes else None
+                recorte = np.ix_(linhas, colunas)
+
+                for linha, tipos_linha, desvios_linha in zip(
+                        linhas.tolist(), tipos[recorte].tolist(), desvios[recorte].tolist()):
+                    valores = ler_valores(dados.lote[linha]) if posicoes else ()
+                    resultados[indices[linha]] = ResultadoCompacto(
+                        especie, dados.estratos_lote[linha], referencias.versao, posicoes,
+                        valores if len(posicoes) != 1 else (valores,), tuple(tipos_linha), tuple(desvios_linha),
+                        mascaras[linha], tabela=tabelas[dados.posicoes[linha]])
+
+    # Mantido por compatibilidade; ver services.severity
+    _TIPOS_ALTERACAO = TIPOS_ALTERACAO
+
+    @staticmethod
+    def _classificar_matriz(matriz, valores_min, valores_max, limite_inferior_ajustado, limite_superior_ajustado):
+        """
+        Aplica a regra de 15% sobre uma matriz de valores (exames × parâmetros).
+
+        Usa exatamente as mesmas operações de aplicar_regra_15_porcento, de modo que
+        o resultado é idêntico ao do caminho unitário.
+
+        Args:
+            matriz: Matriz float64 com NaN para valores ausentes, colunas na ordem da tabela
+            valores_min, valores_max: Referências por parâmetro (vetor) ou por exame e parâmetro (matriz)
+            limite_inferior_ajustado, limite_superior_ajustado: Limites com a margem de 15%, no mesmo formato
+
+        Returns:
+            dict: Matrizes "presente", "tipo" (código em TIPOS_ALTERACAO),
+                "desvio" e "fora_faixa" (fora da referência, mesmo sem a margem de 15%)
+        """
+        presente = ~np.isnan(matriz)
+        baixo = matriz < limite_inferior_ajustado
+        alto = matriz > limite_superior_ajustado
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            desvio = np.where(
+                baixo,
+                ((valores_min - matriz) / valores_min) * 100,
+                np.where(alto, ((matriz - valores_max) / valores_max) * 100, 0.0)
+            )
+
+        corte_leve, corte_moderado = CORTES_GRAVIDADE
+        gravidade = np.where(desvio <= corte_leve, 1, np.where(desvio <= corte_moderado, 2, 3))
+        tipo = np.where(baixo, gravidade, np.where(alto, gravidade + 3, 0))
+
+        return {
+            "presente": presente,
+            "tipo": tipo,
+            "desvio": desvio,
+            "fora_faixa": presente & ((matriz < valores_min) | (matriz > valores_max))
         }
-        
-        return interpretacoes.get(parametro, {}).get(tipo_alteracao, f"Alteração {tipo_alteracao} no parâmetro {parametro}.")
+
+    @staticmethod
+    def _obter_interpretacao_parametro(parametro, tipo_alteracao, especie):
+        """
+        Obtém a interpretação clínica para um parâmetro específico alterado.
+        """
+        return obter_catalogo().obter(especie, parametro, tipo_alteracao)
     
     @staticmethod
-    def _gerar_resumo_clinico(resultados):
+    def _gerar_resumo_clinico(contagem):
         """
-        Gera um resumo clínico baseado nos resultados da análise.
+        Gera um resumo clínico a partir da contagem de alterações por gravidade.
         """
-        alteracoes_graves = [r for r in resultados["interpretacoes_individuais"] if "grave" in r["tipo_alteracao"]]
-        alteracoes_moderadas = [r for r in resultados["interpretacoes_individuais"] if "moderada" in r["tipo_alteracao"]]
-        alteracoes_leves = [r for r in resultados["interpretacoes_individuais"] if "leve" in r["tipo_alteracao"]]
-        
-        if alteracoes_graves:
-            return f"Hemograma apresenta {len(alteracoes_graves)} alteração(ões) grave(s) que requer(em) atenção imediata."
-        elif alteracoes_moderadas:
-            return f"Hemograma apresenta {len(alteracoes_moderadas)} alteração(ões) moderada(s) que requer(em) investigação."
-        elif alteracoes_leves:
-            return f"Hemograma apresenta {len(alteracoes_leves)} alteração(ões) leve(s) que requer(em) monitoramento."
+        if contagem[Gravidade.GRAVE]:
+            return f"Hemograma apresenta {contagem[Gravidade.GRAVE]} alteração(ões) grave(s) que requer(em) atenção imediata."
+        elif contagem[Gravidade.MODERADA]:
+            return f"Hemograma apresenta {contagem[Gravidade.MODERADA]} alteração(ões) moderada(s) que requer(em) investigação."
+        elif contagem[Gravidade.LEVE]:
+            return f"Hemograma apresenta {contagem[Gravidade.LEVE]} alteração(ões) leve(s) que requer(em) monitoramento."
         else:
             return "Hemograma dentro dos parâmetros de normalidade considerando a margem de 15%."
     
     @staticmethod
-    def _gerar_recomendacoes(resultados):
+    def _gerar_recomendacoes(contagem, possui_conjuntas):
         """
-        Gera recomendações baseadas nos resultados da análise.
+        Gera recomendações a partir da contagem de alterações e das interpretações conjuntas.
         """
         recomendacoes = []
         
         # Recomendações baseadas em alterações graves
-        alteracoes_graves = [r for r in resultados["interpretacoes_individuais"] if "grave" in r["tipo_alteracao"]]
-        if alteracoes_graves:
+        if contagem[Gravidade.GRAVE]:
             recomendacoes.append("Consulta veterinária urgente devido a alterações graves identificadas.")
         
         # Recomendações baseadas em alterações moderadas
-        alteracoes_moderadas = [r for r in resultados["interpretacoes_individuais"] if "moderada" in r["tipo_alteracao"]]
-        if alteracoes_moderadas:
+        if contagem[Gravidade.MODERADA]:
             recomendacoes.append("Consulta veterinária para investigação das alterações moderadas identificadas.")
         
         # Recomendações baseadas em interpretações conjuntas
-        if resultados["interpretacoes_conjuntas"]:
+        if possui_conjuntas:
             recomendacoes.append("Monitoramento adicional recomendado devido a múltiplas alterações discretas relacionadas.")
         
         # Recomendações gerais
@@ -304,36 +1028,30 @@ class AnalysisService:
     @staticmethod
     def obter_valores_referencia(especie):
         """Obtém os valores de referência para uma espécie específica."""
-        return AnalysisService.VALORES_REFERENCIA.get(especie, {})
+        return AnalysisService.referencias_atuais().valores.get(especie, {})
     
     @staticmethod
     def salvar_analise(user_id, dados_hemograma, dados_paciente, resultados_analise):
         """
         Salva uma análise de hemograma no banco de dados.
         
+        O resultado salvo recebe a seção "delta_historico" (mudanças em relação à
+        linha de base do paciente) e o hemograma é acumulado nas estatísticas do
+        paciente e nos sketches de quantis da clínica. Resultados no formato de
+        analisar_hemograma são gravados na forma compacta (ver ResultadoCompacto).
+        
         Args:
             user_id: ID do usuário
             dados_hemograma: Dados do hemograma
             dados_paciente: Dados do paciente
-            resultados_analise: Resultados da análise
+            resultados_analise: Resultados da análise, detalhados ou ResultadoCompacto
+                (registra a versão de referência usada)
             
         Returns:
             Analysis: Instância da análise salva
         """
         try:
-            analysis = Analysis(
-                user_id=user_id,
-                patient_name=dados_paciente.get("nome", ""),
-                patient_species=dados_paciente.get("especie", ""),
-                patient_breed=dados_paciente.get("raca", ""),
-                patient_age=dados_paciente.get("idade", ""),
-                patient_sex=dados_paciente.get("sexo", ""),
-                owner_name=dados_paciente.get("tutor", ""),
-                hemogram_data=json.dumps(dados_hemograma),
-                analysis_results=json.dumps(resultados_analise)
-            )
-            
-            db.session.add(analysis)
+            analysis = AnalysisService._nova_analise(user_id, dados_hemograma, dados_paciente, resultados_analise)
             db.session.commit()
             
             return analysis
@@ -342,6 +1060,88 @@ class AnalysisService:
             db.session.rollback()
             raise e
     
+    @staticmethod
+    def salvar_analises_lote(user_id, lista_hemogramas, lista_pacientes, lista_resultados):
+        """
+        Salva um lote de análises com um único commit.
+        
+        Cada análise é gravada como em salvar_analise; se alguma falhar, nenhuma
+        análise do lote é salva.
+        
+        Args:
+            user_id: ID do usuário
+            lista_hemogramas: Dados de cada hemograma
+            lista_pacientes: Dados de cada paciente
+            lista_resultados: Resultado da análise de cada hemograma
+            
+        Returns:
+            list: Instâncias das análises salvas, na mesma ordem
+        """
+        try:
+            analyses = [AnalysisService._nova_analise(user_id, dados_hemograma, dados_paciente, resultados_analise)
+                        for dados_hemograma, dados_paciente, resultados_analise
+                        in zip(lista_hemogramas, lista_pacientes, lista_resultados)]
+            db.session.commit()
+            
+            return analyses
+            
+        except Exception as e:
+            db.session.rollback()
+            raise e
+    
+    @staticmethod
+    def _nova_analise(user_id, dados_hemograma, dados_paciente, resultados_analise):
+        """Cria a análise na sessão e acumula o hemograma nas estatísticas (sem commit)."""
+        delta = PatientHistoryService.comparar(user_id, dados_paciente, dados_hemograma)
+        cronometro = AnalysisService.iniciar_cronometro("armazenamento")
+        armazenado = AnalysisService._compactar_resultado(resultados_analise, dados_paciente)
+        if armazenado is None:
+            armazenado = dict(resultados_analise)
+            armazenado["delta_historico"] = delta
+            versao_referencia = armazenado.get("versao_referencia")
+        else:
+            armazenado.extras = dict(armazenado.extras, delta_historico=delta)
+            versao_referencia = armazenado.versao_referencia
+            armazenado = armazenado.codificar()
+        
+        analysis = Analysis(
+            user_id=user_id,
+            patient_name=dados_paciente.get("nome") or dados_paciente.get("nome_paciente", ""),
+            patient_species=dados_paciente.get("especie", ""),
+            patient_breed=dados_paciente.get("raca", ""),
+            patient_age=dados_paciente.get("idade", ""),
+            patient_gender=dados_paciente.get("sexo", ""),
+            owner_name=dados_paciente.get("tutor") or dados_paciente.get("nome_tutor", ""),
+            reference_version=versao_referencia,
+            hemogram_data=json.dumps(dados_hemograma),
+            analysis_result=json.dumps(armazenado, separators=(",", ":"))
+        )
+        if cronometro is not None:
+            cronometro.marcar("serializacao")
+            cronometro.finalizar()
+        
+        db.session.add(analysis)
+        PatientHistoryService.registrar(user_id, dados_paciente, dados_hemograma)
+        ClinicQuantileService.registrar(user_id, dados_paciente.get("especie", "Cão"), dados_hemograma)
+        return analysis
+    
+    @staticmethod
+    def _compactar_resultado(resultados_analise, dados_paciente):
+        """Cópia compacta do resultado (None se ele não estiver no formato de analisar_hemograma)."""
+        if isinstance(resultados_analise, ResultadoCompacto):
+            return ResultadoCompacto(
+                resultados_analise.especie, resultados_analise.estrato, resultados_analise.versao_referencia,
+                resultados_analise.indices, resultados_analise.valores, resultados_analise.tipos,
+                resultados_analise.desvios, resultados_analise.mascara, resultados_analise.extras,
+                resultados_analise.tabela)
+        
+        especie = dados_paciente.get("especie", "Cão")
+        referencias = AnalysisService.referencias_da_versao(resultados_analise.get("versao_referencia"))
+        estrato = resultados_analise.get("estrato_referencia") or {}
+        tabela, _, _ = AnalysisService._tabela_do_resultado(
+            referencias, especie, (estrato.get("grupo_racial"), estrato.get("faixa_etaria")))
+        return ResultadoCompacto.de_resultado(resultados_analise, especie, tabela)
+    
     @staticmethod
     def obter_analises_usuario(user_id, limit=10):
         """
@@ -0,0 +1,114 @@
+"""
+Importação em massa de laudos enviados em um arquivo ZIP.
+
+Os membros do ZIP são lidos um de cada vez, direto do arquivo compactado para a
+memória, sem extrair o ZIP em disco. Cada membro é processado em uma thread; a
+extração de texto dos PDFs roda no pool persistente de processos de
+utils.pdf_extraction, que limita as extrações simultâneas. No máximo dois
+membros por processo ficam em andamento, e os resultados voltam na ordem do ZIP.
+
+Cada PDF gera um hemograma, e cada linha de um CSV gera outro.
+"""
+
+import os
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.csv_hemograma import ler_hemogramas_csv
+from utils.pdf_parser import processar_caminho_hemograma
+
+EXTENSOES_LAUDO = {"pdf", "csv"}
+
+# Tamanho máximo padrão de cada arquivo descompactado
+MAX_BYTES_ARQUIVO_PADRAO = 16 * 1024 * 1024
+
+
+def listar_membros(arquivo_zip):
+    """
+    Lista os arquivos do ZIP, sem pastas nem metadados do macOS.
+
+    Args:
+        arquivo_zip: zipfile.ZipFile aberto
+
+    Returns:
+        list: ZipInfo dos arquivos, na ordem do ZIP
+    """
+    membros = []
+    for info in arquivo_zip.infolist():
+        nome = os.path.basename(info.filename)
+        if info.is_dir() or info.filename.startswith("__MACOSX/") or not nome or nome.startswith("."):
+            continue
+        membros.append(info)
+    return membros
+
+
+def _ler_membro(arquivo_zip, info, max_bytes):
+    """Conteúdo do membro, lido até max_bytes (o tamanho declarado no ZIP não é confiável)."""
+    if info.file_size > max_bytes:
+        return None, f"O arquivo excede o limite de {max_bytes // (1024 * 1024)} MB."
+    try:
+        with arquivo_zip.open(info) as membro:
+            conteudo = membro.read(max_bytes + 1)
+    except (zipfile.BadZipFile, RuntimeError, NotImplementedError, OSError, zlib.error) as e:
+        # Membro corrompido, criptografado ou com compressão não suportada
+        return None, f"Não foi possível ler o arquivo do ZIP: {e}"
+    if len(conteudo) > max_bytes:
+        return None, f"O arquivo excede o limite de {max_bytes // (1024 * 1024)} MB."
+    return conteudo, None
+
+
+def _processar_membro(extensao, conteudo):
+    """
+    Extrai os hemogramas de um membro do ZIP.
+
+    Returns:
+        list: (linha do CSV ou None, dados extraídos separados em hemograma e paciente)
+    """
+    if extensao == "pdf":
+        return [(None, processar_caminho_hemograma(conteudo, "pdf"))]
+    return list(enumerate(ler_hemogramas_csv(conteudo), start=1))
+
+
+def extrair_membros(arquivo_zip, membros, processos, max_bytes=MAX_BYTES_ARQUIVO_PADRAO):
+    """
+    Extrai os hemogramas dos membros do ZIP em paralelo.
+
+    Args:
+        arquivo_zip: zipfile.ZipFile aberto
+        membros: ZipInfo dos arquivos a processar (ver listar_membros)
+        processos: Extrações simultâneas (em geral, os processos do pool de extração)
+        max_bytes: Tamanho máximo de cada arquivo descompactado
+
+    Yields:
+        tuple: (nome do arquivo, lista de (linha, dados) ou None, erro), na ordem do ZIP
+    """
+    processos = max(1, processos)
+    pendentes = deque()
+    with ThreadPoolExecutor(max_workers=processos, thread_name_prefix="analisavet-zip") as executor:
+        for info in membros:
+            nome = info.filename
+            extensao = nome.rsplit(".", 1)[1].lower() if "." in nome else ""
+            if extensao not in EXTENSOES_LAUDO:
+                pendentes.append((nome, None, "Formato de arquivo não permitido. Use PDF ou CSV."))
+            else:
+                conteudo, erro = _ler_membro(arquivo_zip, info, max_bytes)
+                tarefa = executor.submit(_processar_membro, extensao, conteudo) if erro is None else None
+                pendentes.append((nome, tarefa, erro))
+
+            # Os membros já lidos ficam em memória até seu resultado ser entregue
+            while len(pendentes) > 2 * processos or (pendentes and pendentes[0][1] is None):
+                yield _resultado(*pendentes.popleft())
+        while pendentes:
+            yield _resultado(*pendentes.popleft())
+
+
+def _resultado(nome, tarefa, erro):
+    """Aguarda o processamento de um membro e devolve (nome, hemogramas, erro)."""
+    if tarefa is None:
+        return nome, None, erro
+    try:
+        return nome, tarefa.result(), None
+    except Exception as e:
+        return nome, None, f"Não foi possível extrair dados do arquivo: {e}"
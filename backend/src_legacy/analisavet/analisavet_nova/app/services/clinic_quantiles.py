@@ -0,0 +1,175 @@
+"""
+Distribuição dos parâmetros por clínica para o aplicativo AnalisaVet.
+Cada clínica mantém um sketch KLL por espécie e parâmetro, atualizado a cada
+análise salva; a posição percentual de um valor ("hematócrito no percentil 8
+dos seus gatos") é estimada sem percorrer as análises armazenadas.
+"""
+
+import datetime
+import math
+
+from sqlalchemy.exc import IntegrityError
+
+from models.models import Analysis, QuantileSketch, db
+from services.quantile_sketch import SketchKLL
+
+# Valores necessários para que o percentil da clínica seja exibido
+MINIMO_AMOSTRAS = 20
+
+# Quantis devolvidos quando a consulta não informa quais
+QUANTIS_PADRAO = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+
+def _valores_numericos(dados_hemograma):
+    """Filtra os parâmetros com valor numérico do hemograma."""
+    return {
+        parametro: valor for parametro, valor in dados_hemograma.items()
+        if not isinstance(valor, bool) and isinstance(valor, (int, float)) and not math.isnan(valor)
+    }
+
+
+class ClinicQuantileService:
+    """Serviço para atualizar e consultar os sketches de quantis de cada clínica."""
+
+    @staticmethod
+    def _registros(user_id, especie, parametros=None, bloquear=False):
+        """Obtém os registros de sketch da clínica e espécie indexados por parâmetro."""
+        consulta = QuantileSketch.query.filter_by(user_id=user_id, species=especie)
+        if parametros is not None:
+            consulta = consulta.filter(QuantileSketch.parameter.in_(list(parametros)))
+        if bloquear:
+            # Evita que dois workers atualizem o mesmo sketch ao mesmo tempo (ignorado pelo SQLite)
+            consulta = consulta.with_for_update()
+        return {registro.parameter: registro for registro in consulta.all()}
+
+    @staticmethod
+    def registrar(user_id, especie, dados_hemograma):
+        """
+        Acumula os valores de um hemograma nos sketches da clínica (sem commit).
+
+        Args:
+            user_id: ID do usuário (clínica)
+            especie: Espécie do animal
+            dados_hemograma: Dados do hemograma
+        """
+        valores = _valores_numericos(dados_hemograma)
+        if not valores:
+            return
+
+        registros = ClinicQuantileService._registros(user_id, especie, valores, bloquear=True)
+        agora = datetime.datetime.utcnow()
+        for parametro, valor in valores.items():
+            registro = registros.get(parametro)
+            if registro is None:
+                registro = ClinicQuantileService._criar(user_id, especie, parametro)
+            sketch = SketchKLL.desserializar(registro.sketch)
+
+            sketch.atualizar(valor)
+            registro.sketch = sketch.serializar()
+            registro.count = sketch.n
+            registro.updated_at = agora
+
+    @staticmethod
+    def _criar(user_id, especie, parametro):
+        """
+        Cria o sketch vazio do primeiro valor de um parâmetro da clínica.
+
+        A inserção é feita em um savepoint: se outra requisição criou o sketch
+        depois da consulta, a chave única recusa a inserção e o valor é acumulado
+        no sketch existente.
+
+        Returns:
+            QuantileSketch: Registro novo ou o criado pela outra requisição
+        """
+        registro = QuantileSketch(user_id=user_id, species=especie, parameter=parametro,
+                                  sketch=SketchKLL().serializar(), count=0)
+        try:
+            with db.session.begin_nested():
+                db.session.add(registro)
+        except IntegrityError:
+            registro = QuantileSketch.query.filter_by(
+                user_id=user_id, species=especie, parameter=parametro).with_for_update().one()
+        return registro
+
+    @staticmethod
+    def percentis(user_id, especie, dados_hemograma):
+        """
+        Estima o percentil de cada valor do hemograma na distribuição da clínica.
+
+        Args:
+            user_id: ID do usuário (clínica)
+            especie: Espécie do animal
+            dados_hemograma: Dados do hemograma
+
+        Returns:
+            dict: {parametro: percentil (0-100)} para os parâmetros com amostras suficientes
+        """
+        valores = _valores_numericos(dados_hemograma)
+        if not valores:
+            return {}
+
+        resultado = {}
+        for parametro, registro in ClinicQuantileService._registros(user_id, especie, valores).items():
+            if registro.count < MINIMO_AMOSTRAS:
+                continue
+            posicao = SketchKLL.desserializar(registro.sketch).posicao(valores[parametro])
+            resultado[parametro] = round(posicao * 100, 1)
+        return resultado
+
+    @staticmethod
+    def consultar(user_id, especie, parametro=None, quantis=QUANTIS_PADRAO, valor=None):
+        """
+        Obtém os quantis estimados da clínica para uma espécie.
+
+        Args:
+            user_id: ID do usuário (clínica)
+            especie: Espécie do animal
+            parametro: Parâmetro específico (padrão: todos com sketch)
+            quantis: Frações desejadas
+            valor: Valor cujo percentil deve ser estimado (exige parametro)
+
+        Returns:
+            dict: {parametro: {"amostras", "quantis", "percentil"?}}
+        """
+        parametros = [parametro] if parametro else None
+        resultado = {}
+        for nome, registro in ClinicQuantileService._registros(user_id, especie, parametros).items():
+            sketch = SketchKLL.desserializar(registro.sketch)
+            dados = {
+                "amostras": sketch.n,
+                "quantis": {str(q): v for q, v in zip(quantis, sketch.quantis(quantis))}
+            }
+            if valor is not None:
+                dados["percentil"] = round(sketch.posicao(valor) * 100, 1)
+            resultado[nome] = dados
+        return resultado
+
+    @staticmethod
+    def reconstruir(user_id):
+        """
+        Recalcula do zero os sketches de uma clínica a partir das análises salvas.
+
+        Args:
+            user_id: ID do usuário (clínica)
+
+        Returns:
+            int: Quantidade de sketches gerados
+        """
+        sketches = {}
+        for analysis in Analysis.query.filter_by(user_id=user_id).order_by(Analysis.id).all():
+            especie = analysis.patient_species or "Cão"
+            for parametro, valor in _valores_numericos(analysis.get_hemogram_data()).items():
+                sketch = sketches.get((especie, parametro))
+                if sketch is None:
+                    sketch = sketches[(especie, parametro)] = SketchKLL()
+                sketch.atualizar(valor)
+
+        QuantileSketch.query.filter_by(user_id=user_id).delete()
+        agora = datetime.datetime.utcnow()
+        for (especie, parametro), sketch in sketches.items():
+            db.session.add(QuantileSketch(
+                user_id=user_id, species=especie, parameter=parametro,
+                count=sketch.n, updated_at=agora, sketch=sketch.serializar()
+            ))
+        db.session.commit()
+        return len(sketches)
@@ -0,0 +1,257 @@
+"""
+Representação compacta do resultado de análise do AnalisaVet.
+O resultado guarda apenas códigos (índice do parâmetro na tabela, código do tipo
+de alteração, desvio e máscara "fora da faixa"); textos de referência,
+interpretações, resumo e recomendações são derivados na expansão para o formato
+detalhado, feita apenas quando uma resposta da API ou um laudo precisa dele.
+
+Os índices derivados são gravados pelo nome: a posição deles na tabela depende dos
+índices registrados no processo que fez a análise.
+"""
+
+import math
+
+from services.interpretation_catalog import obter_catalogo
+from services.severity import GRAVIDADE_DO_TIPO, TIPOS_ALTERACAO, nova_contagem
+
+# Chave que identifica um resultado compacto armazenado (resultados antigos são detalhados)
+MARCADOR = "c"
+FORMATO = 1
+
+# Chaves do resultado detalhado geradas na expansão; as demais são preservadas como extras
+CHAVES_DERIVADAS = frozenset((
+    "parametros", "interpretacoes_individuais", "interpretacoes_conjuntas", "resumo_clinico",
+    "recomendacoes", "diagnosticos", "padroes_diagnosticos", "versao_referencia", "estrato_referencia"
+))
+
+
+class ResultadoCompacto:
+    """Resultado de análise codificado: uma posição por parâmetro informado, na ordem da tabela."""
+
+    __slots__ = ("especie", "estrato", "versao_referencia", "indices", "valores",
+                 "tipos", "desvios", "mascara", "extras", "tabela")
+
+    def __init__(self, especie, estrato, versao_referencia, indices, valores, tipos, desvios, mascara,
+                 extras=None, tabela=None):
+        """
+        Args:
+            especie: Espécie do animal
+            estrato: Tupla (grupo racial, faixa etária) da tabela usada
+            versao_referencia: Versão do conjunto de referências
+            indices: Índices dos parâmetros informados na tabela de referência (nos resultados
+                decodificados, os índices derivados vêm pelo nome)
+            valores: Valores informados, alinhados a indices
+            tipos: Códigos de tipo (TIPOS_ALTERACAO), alinhados a indices
+            desvios: Desvios percentuais (0 para normais), alinhados a indices
+            mascara: Inteiro com um bit por parâmetro fora da referência
+            extras: Seções adicionais preservadas sem alteração (ex.: delta_historico)
+            tabela: TabelaReferencia da análise, usada para gravar os índices derivados pelo nome
+        """
+        self.especie = especie
+        self.estrato = tuple(estrato)
+        self.versao_referencia = versao_referencia
+        self.indices = indices
+        self.valores = valores
+        self.tipos = tipos
+        self.desvios = desvios
+        self.mascara = mascara
+        self.extras = extras or {}
+        self.tabela = tabela
+
+    def _posicoes(self, tabela):
+        """
+        Posições dos parâmetros na tabela e a máscara "fora da faixa" correspondente.
+
+        Os índices derivados gravados pelo nome são procurados na tabela; os que não
+        existem nela (índice não registrado neste processo) ficam com posição None.
+
+        Returns:
+            tuple: (lista de (posição, parâmetro), máscara)
+        """
+        if not any(isinstance(indice, str) for indice in self.indices):
+            return [(indice, tabela.parametros[indice]) for indice in self.indices], self.mascara
+
+        posicoes = []
+        mascara = self.mascara
+        for indice, valor in zip(self.indices, self.valores):
+            if isinstance(indice, str):
+                parametro, indice = indice, tabela.indices.get(indice)
+                if indice is not None and not (
+                        tabela.minimos_escalares[indice] <= valor <= tabela.maximos_escalares[indice]):
+                    mascara |= 1 << indice
+            else:
+                parametro = tabela.parametros[indice]
+            posicoes.append((indice, parametro))
+        return posicoes, mascara
+
+    def contagem(self):
+        """Contagem [normais, leves, moderadas, graves] das alterações."""
+        contagem = nova_contagem()
+        for codigo in self.tipos:
+            contagem[GRAVIDADE_DO_TIPO[codigo]] += 1
+        return contagem
+
+    def expandir(self, tabela, avaliador, regras=None, cronometro=None):
+        """
+        Gera o resultado no formato detalhado de analisar_hemograma.
+
+        Args:
+            tabela: TabelaReferencia do estrato (None se a espécie não tiver referência)
+            avaliador: AvaliadorGrupos da espécie (None se a espécie não tiver referência)
+            regras: AvaliadorRegras da espécie (None se a espécie não tiver referência)
+            cronometro: Cronometro que registra a duração de cada etapa (opcional)
+
+        Returns:
+            dict: Resultado detalhado
+        """
+        # Importação local: o serviço de análise depende deste módulo
+        from services.analysis_service import AnalysisService
+
+        catalogo = obter_catalogo()
+        parametros = {}
+        individuais = []
+        posicoes, mascara = self._posicoes(tabela) if tabela is not None else ([], self.mascara)
+
+        if tabela is not None:
+            for (indice, parametro), valor, codigo, desvio in zip(posicoes, self.valores, self.tipos, self.desvios):
+                tipo = TIPOS_ALTERACAO[codigo]
+                parametros[parametro] = {
+                    "valor": valor,
+                    "referencia": tabela.textos_referencia[indice] if indice is not None else "",
+                    "status": tipo,
+                    "alterado": codigo != 0,
+                    "desvio_percentual": desvio
+                }
+                if codigo:
+                    individuais.append({
+                        "parametro": parametro,
+                        "tipo_alteracao": tipo,
+                        "desvio": desvio,
+                        "interpretacao": catalogo.obter(self.especie, parametro, tipo)
+                    })
+
+        if cronometro is not None:
+            cronometro.marcar("interpretacao_individual")
+
+        conjuntas = avaliador.avaliar(mascara) if avaliador is not None else []
+        if cronometro is not None:
+            cronometro.marcar("interpretacao_conjunta")
+
+        padroes = []
+        if regras is not None and len(regras):
+            valores = [math.nan] * len(tabela.parametros)
+            for (indice, _), valor in zip(posicoes, self.valores):
+                if indice is not None:
+                    valores[indice] = float(valor)
+            padroes = regras.avaliar(valores, tabela.minimos_escalares, tabela.maximos_escalares)
+        if cronometro is not None:
+            cronometro.marcar("regras_diagnosticas")
+
+        contagem = self.contagem()
+        resumo = AnalysisService._gerar_resumo_clinico(contagem)
+        if cronometro is not None:
+            cronometro.marcar("resumo")
+
+        recomendacoes = AnalysisService._gerar_recomendacoes(contagem, bool(conjuntas))
+        if cronometro is not None:
+            cronometro.marcar("recomendacoes")
+
+        resultado = {
+            "parametros": parametros,
+            "interpretacoes_individuais": individuais,
+            "interpretacoes_conjuntas": conjuntas,
+            "resumo_clinico": resumo,
+            "recomendacoes": recomendacoes,
+            "diagnosticos": individuais + conjuntas,
+            "padroes_diagnosticos": padroes,
+            "versao_referencia": self.versao_referencia,
+            "estrato_referencia": {"grupo_racial": self.estrato[0], "faixa_etaria": self.estrato[1]}
+        }
+        resultado.update(self.extras)
+        return resultado
+
+    def codificar(self):
+        """
+        Codifica o resultado para armazenamento em JSON.
+
+        Os tipos viram uma cadeia de dígitos e apenas os desvios das alterações são gravados.
+        Os índices derivados são gravados pelo nome, sem o bit na máscara (recalculado na expansão).
+        """
+        indices = list(self.indices)
+        mascara = self.mascara
+        derivados = self.tabela.derivados if self.tabela is not None else ()
+        if derivados:
+            for posicao, indice in enumerate(indices):
+                if indice in derivados:
+                    indices[posicao] = self.tabela.parametros[indice]
+                    mascara &= ~(1 << indice)
+        return {
+            MARCADOR: FORMATO,
+            "e": self.especie,
+            "s": list(self.estrato),
+            "r": self.versao_referencia,
+            "i": indices,
+            "v": list(self.valores),
+            "t": "".join(map(str, self.tipos)),
+            "d": [desvio for codigo, desvio in zip(self.tipos, self.desvios) if codigo],
+            "m": mascara,
+            **({"x": self.extras} if self.extras else {})
+        }
+
+    @classmethod
+    def decodificar(cls, dados):
+        """Reconstrói um resultado codificado por codificar()."""
+        if dados.get(MARCADOR) != FORMATO:
+            raise ValueError("Resultado compacto em formato desconhecido.")
+
+        tipos = tuple(map(int, dados["t"]))
+        desvios_alterados = iter(dados["d"])
+        desvios = tuple(next(desvios_alterados) if codigo else 0 for codigo in tipos)
+        return cls(dados["e"], dados["s"], dados["r"], tuple(dados["i"]), tuple(dados["v"]),
+                   tipos, desvios, dados["m"], dados.get("x"))
+
+    @classmethod
+    def de_resultado(cls, resultado, especie, tabela):
+        """
+        Converte um resultado detalhado de analisar_hemograma para a forma compacta.
+
+        Args:
+            resultado: Resultado detalhado
+            especie: Espécie do animal
+            tabela: TabelaReferencia usada na análise
+
+        Returns:
+            ResultadoCompacto: Resultado compacto ou None se o dicionário não tiver o formato esperado
+        """
+        if tabela is None or "parametros" not in resultado or "versao_referencia" not in resultado:
+            return None
+
+        indices, valores, tipos, desvios = [], [], [], []
+        mascara = 0
+        try:
+            # Mesma ordem da tabela, como na análise
+            for parametro, dados in sorted(resultado["parametros"].items(), key=lambda item: tabela.indices[item[0]]):
+                indice = tabela.indices[parametro]
+                valor = dados["valor"]
+                indices.append(indice)
+                valores.append(valor)
+                tipos.append(TIPOS_ALTERACAO.index(dados["status"]))
+                desvios.append(dados["desvio_percentual"])
+                if valor < tabela.minimos[indice] or valor > tabela.maximos[indice]:
+                    mascara |= 1 << indice
+        except (KeyError, ValueError, TypeError):
+            return None
+
+        estrato = resultado.get("estrato_referencia") or {}
+        extras = {chave: valor for chave, valor in resultado.items() if chave not in CHAVES_DERIVADAS}
+        return cls(especie, (estrato.get("grupo_racial"), estrato.get("faixa_etaria")),
+                   resultado["versao_referencia"], tuple(indices), tuple(valores), tuple(tipos),
+                   tuple(desvios), mascara, extras, tabela)
+
+    def __repr__(self):
+        return f'<ResultadoCompacto {self.especie} ({len(self.indices)} parâmetros)>'
+
+
+def e_compacto(dados):
+    """Verifica se um resultado armazenado está no formato compacto."""
+    return isinstance(dados, dict) and MARCADOR in dados
@@ -0,0 +1,308 @@
+"""
+Índices hematológicos derivados do AnalisaVet.
+
+Os índices são calculados em uma etapa própria, antes da classificação, a partir
+dos parâmetros informados: contagens absolutas a partir do diferencial relativo,
+reticulócitos corrigidos e a consistência do CHCM.
+Cada índice é uma expressão da DSL de services.rule_dsl (mesma semântica de NaN),
+compilada para um exame e para a matriz do lote. Índices com referência entram
+na tabela da espécie e são classificados como os demais parâmetros.
+
+Novos índices são registrados com registrar_indice (ou
+AnalysisService.registrar_indice_derivado, que recompila as referências em uso).
+Os índices registrados em tempo de execução não existem em outros processos nem
+após um reinício; por isso os resultados gravados identificam os índices com
+linha na tabela pelo nome, e não pela posição (ver ResultadoCompacto.codificar).
+"""
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from services.rule_dsl import RegraInvalida, compilar_expressao, nomes_expressao
+
+# Parâmetros do diferencial leucocitário que podem vir em percentual ("<parametro>_percentual")
+DIFERENCIAL_LEUCOCITARIO = ("segmentados", "linfocitos", "monocitos", "eosinofilos", "basofilos")
+
+
+class IndiceDerivado:
+    """Definição de um índice derivado."""
+
+    __slots__ = ("nome", "expressoes", "referencias", "preencher", "descricao")
+
+    def __init__(self, nome, expressao, referencias=None, preencher=False, descricao=""):
+        """
+        Args:
+            nome: Nome do índice (ou do parâmetro preenchido)
+            expressao: Expressão da DSL ou {especie: expressão}
+            referencias: {especie: {"min", "max", "unidade"}}; sem referência o índice
+                não é classificado (exceto quando preenche um parâmetro da tabela)
+            preencher: Se True, o valor só é usado quando o parâmetro nome não foi informado
+            descricao: Descrição do índice
+        """
+        self.nome = nome
+        self.expressoes = expressao if isinstance(expressao, dict) else None
+        if self.expressoes is None:
+            self.expressoes = {None: expressao}
+        self.referencias = referencias or {}
+        self.preencher = preencher
+        self.descricao = descricao
+
+    def expressao(self, especie):
+        """Expressão do índice para a espécie (None se não se aplica)."""
+        return self.expressoes.get(especie, self.expressoes.get(None))
+
+
+# Índices na ordem de cálculo: um índice pode usar os calculados antes dele
+_REGISTRO = OrderedDict()
+
+
+def registrar_indice(nome, expressao, referencias=None, preencher=False, descricao=""):
+    """
+    Registra (ou substitui) um índice derivado.
+
+    As referências já compiladas só passam a usá-lo após a recompilação
+    (ver AnalysisService.registrar_indice_derivado).
+
+    Args:
+        nome: Nome do índice
+        expressao: Expressão da DSL ou {especie: expressão}
+        referencias: {especie: {"min", "max", "unidade"}}
+        preencher: Se True, só preenche o parâmetro nome quando ausente
+        descricao: Descrição do índice
+
+    Returns:
+        IndiceDerivado: Índice registrado
+    """
+    indice = IndiceDerivado(nome, expressao, referencias, preencher, descricao)
+    _REGISTRO[nome] = indice
+    return indice
+
+
+def remover_indice(nome):
+    """Remove um índice registrado (sem efeito se não existir)."""
+    _REGISTRO.pop(nome, None)
+
+
+def indices_registrados():
+    """Retorna os índices registrados, na ordem de cálculo."""
+    return list(_REGISTRO.values())
+
+
+def substituir_indices(indices):
+    """
+    Substitui todos os índices registrados (ex.: para restaurar um estado anterior).
+
+    Args:
+        indices: Lista de IndiceDerivado, na ordem de cálculo (ver indices_registrados)
+    """
+    _REGISTRO.clear()
+    for indice in indices:
+        _REGISTRO[indice.nome] = indice
+
+
+def nomes_com_referencia():
+    """Nomes dos índices com referência (os que podem virar linhas da tabela de uma espécie)."""
+    return frozenset(indice.nome for indice in _REGISTRO.values() if indice.referencias)
+
+
+def valores_com_indices(valores_referencia):
+    """
+    Acrescenta às referências de cada espécie as dos índices derivados.
+
+    Args:
+        valores_referencia: Dicionário {especie: {parametro: {"min", "max", "unidade"}}}
+
+    Returns:
+        dict: Novo dicionário com os índices após os parâmetros da espécie
+    """
+    resultado = {}
+    for especie, valores in valores_referencia.items():
+        valores = dict(valores)
+        for indice in _REGISTRO.values():
+            referencia = indice.referencias.get(especie)
+            if referencia is not None and indice.nome not in valores and indice.expressao(especie):
+                valores[indice.nome] = referencia
+        resultado[especie] = valores
+    return resultado
+
+
+def _numero(valor):
+    """Converte o valor informado em float (NaN se ausente ou não numérico)."""
+    if valor is None:
+        return math.nan
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+class EtapaIndices:
+    """
+    Índices de uma espécie compilados sobre o espaço de entrada: os parâmetros da
+    tabela seguidos das entradas extras usadas nas expressões (ex.: segmentados_percentual).
+    """
+
+    __slots__ = ("espaco", "quantidade_tabela", "calculos")
+
+    def __init__(self, especie, parametros, indices=None):
+        """
+        Args:
+            especie: Espécie da tabela
+            parametros: Parâmetros na ordem da tabela de referência (já com os índices)
+            indices: Índices a compilar (padrão: os registrados)
+        """
+        parametros = tuple(parametros)
+        posicoes_tabela = {parametro: posicao for posicao, parametro in enumerate(parametros)}
+        aplicaveis = []
+        extras = []
+        for indice in (_REGISTRO.values() if indices is None else indices):
+            expressao = indice.expressao(especie)
+            # Sem linha na tabela, o valor não teria onde ser classificado
+            if not expressao or indice.nome not in posicoes_tabela:
+                continue
+            for nome in nomes_expressao(expressao):
+                if nome not in posicoes_tabela and nome not in extras:
+                    extras.append(nome)
+            aplicaveis.append((indice, expressao))
+
+        self.espaco = parametros + tuple(extras)
+        self.quantidade_tabela = len(parametros)
+
+        calculos = []
+        vazio = [math.nan] * len(self.espaco)
+        limites_vazios = [math.nan] * len(parametros)
+        for indice, expressao in aplicaveis:
+            try:
+                numerico, funcao, funcao_vetor = compilar_expressao(expressao, self.espaco)
+            except RegraInvalida as erro:
+                raise RegraInvalida(f"Índice {indice.nome!r}: {erro}") from None
+            if numerico:
+                raise RegraInvalida(f"Índice {indice.nome!r}: a expressão deve ser numérica.")
+            try:
+                funcao(vazio, limites_vazios, limites_vazios)
+            except IndexError:
+                raise RegraInvalida(f"Índice {indice.nome!r}: MIN/MAX só valem para parâmetros da tabela.") from None
+            calculos.append((indice.nome, posicoes_tabela[indice.nome], funcao, funcao_vetor, indice.preencher))
+        self.calculos = tuple(calculos)
+
+    def aplicar(self, dados_hemograma, minimos, maximos):
+        """
+        Calcula os índices de um exame.
+
+        Args:
+            dados_hemograma: Dados do hemograma
+            minimos: Lista de mínimos do estrato do paciente
+            maximos: Lista de máximos do estrato do paciente
+
+        Returns:
+            dict: Hemograma com os índices calculados (o próprio dicionário se nenhum foi calculado)
+        """
+        valores = [_numero(dados_hemograma.get(nome)) for nome in self.espaco]
+        calculados = {}
+        for nome, posicao, funcao, _, preencher in self.calculos:
+            if preencher and valores[posicao] == valores[posicao]:
+                continue
+            valor = funcao(valores, minimos, maximos)
+            if valor == valor:
+                valores[posicao] = valor
+                calculados[nome] = valor
+        if not calculados:
+            return dados_hemograma
+        return {**dados_hemograma, **calculados}
+
+    def aplicar_lote(self, lote, minimos, maximos):
+        """
+        Calcula os índices de um lote com operações sobre colunas.
+
+        Args:
+            lote: Lista de hemogramas
+            minimos: Vetor de mínimos ou matriz com os mínimos de cada linha
+            maximos: Vetor de máximos ou matriz com os máximos de cada linha
+
+        Returns:
+            tuple: (matriz exames × parâmetros da tabela, lista de hemogramas com os índices)
+        """
+        # None vira NaN na conversão; com algum valor não numérico, cada valor é convertido por _numero
+        try:
+            matriz = np.array([list(map(h.get, self.espaco)) for h in lote], dtype=float)
+        except (TypeError, ValueError):
+            matriz = np.array([[_numero(h.get(nome)) for nome in self.espaco] for h in lote], dtype=float)
+        matriz = matriz.reshape(len(lote), len(self.espaco))
+
+        colunas_calculadas = {}
+        for nome, posicao, _, funcao_vetor, preencher in self.calculos:
+            atual = matriz[:, posicao]
+            valores = np.broadcast_to(np.asarray(funcao_vetor(matriz, minimos, maximos), dtype=float), atual.shape)
+            calculado = ~np.isnan(valores)
+            if preencher:
+                calculado &= np.isnan(atual)
+            if calculado.any():
+                matriz[:, posicao] = np.where(calculado, valores, atual)
+                colunas_calculadas[nome] = (calculado, matriz[:, posicao].copy())
+
+        if colunas_calculadas:
+            lote = list(lote)
+            linhas_alteradas = np.flatnonzero(np.logical_or.reduce([c for c, _ in colunas_calculadas.values()]))
+            for linha in linhas_alteradas.tolist():
+                lote[linha] = dict(lote[linha])
+            for nome, (calculado, valores) in colunas_calculadas.items():
+                for linha, valor in zip(np.flatnonzero(calculado).tolist(), valores[calculado].tolist()):
+                    lote[linha][nome] = valor
+
+        return matriz[:, :self.quantidade_tabela], lote
+
+    def __len__(self):
+        return len(self.calculos)
+
+
+def compilar_etapas(parametros_por_especie):
+    """
+    Compila a etapa de índices de cada espécie.
+
+    Args:
+        parametros_por_especie: Dicionário {especie: parâmetros da tabela}
+
+    Returns:
+        dict: {especie: EtapaIndices} (apenas espécies com algum índice aplicável)
+    """
+    etapas = {}
+    for especie, parametros in parametros_por_especie.items():
+        etapa = EtapaIndices(especie, parametros)
+        if len(etapa):
+            etapas[especie] = etapa
+    return etapas
+
+
+# Contagens absolutas a partir do diferencial relativo (percentual sobre os leucócitos)
+for _parametro in DIFERENCIAL_LEUCOCITARIO:
+    registrar_indice(
+        _parametro, f"leucocitos * {_parametro}_percentual / 100", preencher=True,
+        descricao=f"Contagem absoluta de {_parametro} a partir do percentual do diferencial."
+    )
+
+# A relação neutrófilo:linfócito não é um índice: ela é classificada pela regra
+# diagnóstica de mesmo nome (AnalysisService.REGRAS_DIAGNOSTICAS), sobre os valores já preenchidos
+
+registrar_indice(
+    "reticulocitos_corrigidos",
+    {
+        "Cão": "reticulocitos_percentual * hematocrito / 45",
+        "Gato": "reticulocitos_percentual * hematocrito / 37"
+    },
+    referencias={
+        "Cão": {"min": 0, "max": 1.0, "unidade": "%"},
+        "Gato": {"min": 0, "max": 0.4, "unidade": "%"}
+    },
+    descricao="Percentual de reticulócitos corrigido pelo hematócrito normal da espécie."
+)
+
+registrar_indice(
+    "consistencia_chcm", "chcm / (hemoglobina * 100 / hematocrito)",
+    referencias={
+        "Cão": {"min": 0.95, "max": 1.05, "unidade": ""},
+        "Gato": {"min": 0.95, "max": 1.05, "unidade": ""}
+    },
+    descricao="CHCM informado dividido pelo calculado (hemoglobina / hematócrito); desvios indicam erro de medição ou hemólise."
+)
@@ -0,0 +1,120 @@
+"""
+Catálogo de interpretações clínicas para o serviço de análise do AnalisaVet.
+Os textos ficam em data/interpretacoes.json e são carregados uma única vez,
+permitindo que veterinários ampliem o catálogo sem alterar o código.
+"""
+
+import json
+import os
+import sys
+
+# Arquivo padrão distribuído com o aplicativo
+CAMINHO_PADRAO = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'interpretacoes.json')
+
+# Arquivo opcional com textos adicionais da clínica, mesclado sobre o padrão
+VARIAVEL_EXTRAS = 'ANALISAVET_INTERPRETACOES'
+
+_catalogo = None
+
+
+class CatalogoInterpretacoes:
+    """
+    Catálogo imutável de textos indexado por (espécie, parâmetro, tipo de alteração).
+
+    Os textos padrão são copiados para cada espécie do arquivo na carga, de modo que
+    a consulta de uma espécie conhecida é um único acesso ao dicionário.
+    """
+
+    __slots__ = ("_textos", "versao")
+
+    def __init__(self, dados, versao=1):
+        """
+        Args:
+            dados: Dicionário {"padrao": {...}, "especies": {especie: {...}}}
+            versao: Número da versão do catálogo
+        """
+        textos = {}
+        padrao = dados.get("padrao", {})
+        especies = dados.get("especies", {})
+
+        for especie in (None,) + tuple(especies):
+            especie = sys.intern(especie) if especie is not None else None
+            for origem in (padrao, especies.get(especie, {})):
+                for parametro, tipos in origem.items():
+                    parametro = sys.intern(parametro)
+                    for tipo, texto in tipos.items():
+                        textos[(especie, parametro, sys.intern(tipo))] = texto
+
+        self._textos = textos
+        self.versao = versao
+
+    def obter(self, especie, parametro, tipo_alteracao):
+        """
+        Obtém a interpretação de um parâmetro alterado.
+
+        Args:
+            especie: Espécie do animal (Cão ou Gato)
+            parametro: Nome do parâmetro
+            tipo_alteracao: Tipo da alteração (ex.: baixo_leve)
+
+        Returns:
+            str: Texto de interpretação
+        """
+        texto = self._textos.get((especie, parametro, tipo_alteracao))
+        if texto is None:
+            texto = self._textos.get((None, parametro, tipo_alteracao))
+            if texto is None:
+                texto = f"Alteração {tipo_alteracao} no parâmetro {parametro}."
+        return texto
+
+    def __len__(self):
+        return len(self._textos)
+
+
+def _mesclar(base, extras):
+    """Mescla os textos de extras sobre base, nível a nível."""
+    for chave, valor in extras.items():
+        if isinstance(valor, dict) and isinstance(base.get(chave), dict):
+            _mesclar(base[chave], valor)
+        else:
+            base[chave] = valor
+    return base
+
+
+def carregar_catalogo(caminho=None, caminho_extras=None):
+    """
+    Carrega o catálogo de interpretações a partir dos arquivos JSON.
+
+    Args:
+        caminho: Arquivo principal (padrão: data/interpretacoes.json)
+        caminho_extras: Arquivo com textos adicionais (padrão: variável ANALISAVET_INTERPRETACOES)
+
+    Returns:
+        CatalogoInterpretacoes: Catálogo carregado
+    """
+    with open(caminho or CAMINHO_PADRAO, encoding='utf-8') as arquivo:
+        dados = json.load(arquivo)
+
+    caminho_extras = caminho_extras or os.environ.get(VARIAVEL_EXTRAS)
+    if caminho_extras:
+        with open(caminho_extras, encoding='utf-8') as arquivo:
+            _mesclar(dados, json.load(arquivo))
+
+    return CatalogoInterpretacoes(dados, versao=_catalogo.versao + 1 if _catalogo else 1)
+
+
+def obter_catalogo():
+    """Retorna o catálogo carregado na importação do módulo."""
+    return _catalogo
+
+
+def recarregar_catalogo(caminho=None, caminho_extras=None):
+    """Recarrega o catálogo dos arquivos e o substitui atomicamente."""
+    global _catalogo
+    _catalogo = carregar_catalogo(caminho, caminho_extras)
+    return _catalogo
+
+
+# Pré-carregado para que nenhuma análise pague o custo de leitura do arquivo
+_catalogo = carregar_catalogo()
@@ -0,0 +1,389 @@
+"""
+Serviço de tarefas em segundo plano para o aplicativo AnalisaVet.
+Análises, extrações de PDF/CSV e geração de laudos são enfileiradas na tabela
+jobs e executadas por um pool de threads, liberando os workers HTTP.
+
+Cada tarefa em execução fica reservada para a fila que a iniciou (locked_by) até
+locked_until; a fila renova as reservas das suas tarefas enquanto está ativa. Uma
+reserva vencida indica que o processo parou, e a tarefa volta à fila (ou vai para
+erro depois de JOBS_MAX_TENTATIVAS execuções interrompidas).
+
+Os PDFs de laudos concluídos ficam na pasta de tarefas para download por
+JOBS_VALIDADE_RESULTADOS_HORAS e depois são removidos pela mesma manutenção.
+"""
+
+import datetime
+import os
+import shutil
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from models.models import Analysis, Job, User, db
+
+# Estados possíveis de uma tarefa
+PENDENTE = 'pendente'
+EXECUTANDO = 'executando'
+CONCLUIDO = 'concluido'
+ERRO = 'erro'
+CANCELADO = 'cancelado'
+
+ESTADOS_FINAIS = (CONCLUIDO, ERRO, CANCELADO)
+
+
+class TarefaCancelada(Exception):
+    """Sinaliza que a tarefa foi cancelada durante a execução."""
+
+
+def _executar_analise(payload, pasta_resultados, job_id):
+    """Analisa um hemograma."""
+    from services.analysis_service import AnalysisService
+    return AnalysisService.analisar_hemograma(payload['hemograma'], payload['paciente']), None
+
+
+def _executar_extracao(payload, pasta_resultados, job_id):
+    """Extrai os dados de um arquivo de hemograma salvo na pasta de tarefas."""
+    from utils.pdf_parser import processar_caminho_hemograma
+    try:
+        return processar_caminho_hemograma(payload['caminho'], payload['extensao']), None
+    finally:
+        if os.path.exists(payload['caminho']):
+            os.remove(payload['caminho'])
+
+
+def _executar_laudo(payload, pasta_resultados, job_id):
+    """Gera o PDF de um laudo técnico ou simplificado."""
+    from services.report_service import ReportService
+
+    analysis = Analysis.query.filter_by(id=payload['analysis_id'], user_id=payload['user_id']).first()
+    if not analysis:
+        raise ValueError('Análise não encontrada ou sem permissão para acessá-la.')
+
+    user = db.session.get(User, payload['user_id'])
+    clinic_info = user.get_clinic_info()
+
+    if payload['tipo_laudo'] == 'technical':
+        pdf_path = ReportService.generate_technical_report(
+            analysis.get_analysis_result(), analysis.get_patient_info(), clinic_info)
+    else:
+        pdf_path = ReportService.generate_simplified_report(
+            analysis.get_analysis_result(), analysis.get_patient_info(), clinic_info)
+
+    if not pdf_path:
+        raise RuntimeError('Erro ao gerar laudo.')
+
+    # Mover o PDF temporário para a pasta de tarefas, onde fica até ser baixado
+    destino = os.path.join(pasta_resultados, f'{job_id}.pdf')
+    shutil.move(pdf_path, destino)
+    return {'analysis_id': analysis.id, 'tipo_laudo': payload['tipo_laudo']}, destino
+
+
+# Funções executadas para cada tipo de tarefa: (payload, pasta, job_id) -> (resultado, arquivo)
+EXECUTORES = {
+    'analise': _executar_analise,
+    'extracao': _executar_extracao,
+    'laudo': _executar_laudo
+}
+
+
+class FilaJobs:
+    """
+    Fila de tarefas persistida na tabela jobs e executada por um pool de threads.
+
+    O despacho respeita o limite global de workers e o limite de tarefas simultâneas
+    por clínica (usuário), para que uma clínica não monopolize o pool.
+    """
+
+    def __init__(self, app, max_workers, limite_por_clinica, pasta, reserva_segundos=60, max_tentativas=3,
+                 validade_resultados_segundos=24 * 3600):
+        self.app = app
+        self.max_workers = max_workers
+        self.limite_por_clinica = limite_por_clinica
+        self.pasta = pasta
+        self.reserva = datetime.timedelta(seconds=reserva_segundos)
+        self.max_tentativas = max_tentativas
+        self.validade_resultados = datetime.timedelta(seconds=validade_resultados_segundos)
+        # Identifica a fila nas reservas: servidor, processo e a instância
+        self.identificador = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analisavet-job')
+        self._trava = threading.Lock()
+        self._em_execucao = {}
+        self._total_em_execucao = 0
+        self._parar = threading.Event()
+        self._manutencao = None
+
+    def recuperar(self):
+        """
+        Devolve à fila as tarefas com a reserva vencida e as despacha.
+
+        A reserva vence quando a fila que executava a tarefa parou; tarefas sem
+        reserva (iniciadas antes da criação das colunas) também são recuperadas.
+        Tarefas que já somam max_tentativas execuções vão para erro em vez de
+        voltar à fila.
+
+        Returns:
+            int: Quantidade de tarefas devolvidas à fila
+        """
+        agora = datetime.datetime.utcnow()
+        devolvidas = 0
+        with self.app.app_context():
+            vencidas = Job.query.filter(
+                Job.status == EXECUTANDO,
+                db.or_(Job.locked_until.is_(None), Job.locked_until < agora)
+            ).all()
+            for job in vencidas:
+                # Atualização condicional: outra fila pode ter recuperado a tarefa ou renovado a reserva
+                reserva = Job.query.filter_by(id=job.id, status=EXECUTANDO,
+                                              locked_by=job.locked_by, locked_until=job.locked_until)
+                if (job.attempts or 0) >= self.max_tentativas:
+                    reserva.update({
+                        'status': ERRO,
+                        'error': f'Tarefa interrompida em {job.attempts} execuções.',
+                        'finished_at': agora,
+                        'locked_by': None,
+                        'locked_until': None
+                    })
+                else:
+                    devolvidas += reserva.update({
+                        'status': PENDENTE,
+                        'started_at': None,
+                        'locked_by': None,
+                        'locked_until': None
+                    })
+            db.session.commit()
+        self.despachar()
+        return devolvidas
+
+    def renovar_reservas(self):
+        """Estende a reserva das tarefas em execução nesta fila."""
+        with self.app.app_context():
+            Job.query.filter_by(status=EXECUTANDO, locked_by=self.identificador).update({
+                'locked_until': datetime.datetime.utcnow() + self.reserva
+            })
+            db.session.commit()
+
+    def limpar_resultados(self):
+        """
+        Remove os arquivos das tarefas concluídas há mais de validade_resultados.
+
+        A tarefa continua concluída, sem result_path; o download passa a indicar que o arquivo expirou.
+
+        Returns:
+            int: Quantidade de arquivos removidos
+        """
+        limite = datetime.datetime.utcnow() - self.validade_resultados
+        removidos = 0
+        with self.app.app_context():
+            expiradas = Job.query.filter(
+                Job.status == CONCLUIDO,
+                Job.result_path.isnot(None),
+                Job.finished_at < limite
+            ).all()
+            for job in expiradas:
+                if os.path.exists(job.result_path):
+                    os.remove(job.result_path)
+                    removidos += 1
+                job.result_path = None
+            db.session.commit()
+        return removidos
+
+    def iniciar_manutencao(self):
+        """Inicia a thread que renova as reservas desta fila, recupera as de filas paradas e remove resultados expirados."""
+        if self._manutencao is None:
+            self._manutencao = threading.Thread(target=self._manter, name='analisavet-job-reservas', daemon=True)
+            self._manutencao.start()
+
+    def _manter(self):
+        """Renova e recupera as reservas e limpa os resultados a cada terço da duração da reserva, até encerrar()."""
+        while not self._parar.wait(self.reserva.total_seconds() / 3):
+            try:
+                self.renovar_reservas()
+                self.recuperar()
+                self.limpar_resultados()
+            except Exception as e:
+                print(f"FilaJobs: erro na manutenção das tarefas: {e}")
+
+    def despachar(self):
+        """Inicia as tarefas pendentes mais antigas enquanto houver vagas."""
+        with self._trava, self.app.app_context():
+            vagas = self.max_workers - self._total_em_execucao
+            if vagas <= 0:
+                return
+
+            pendentes = Job.query.filter_by(status=PENDENTE).order_by(Job.created_at).all()
+            for job in pendentes:
+                if vagas <= 0:
+                    break
+                if self._em_execucao.get(job.user_id, 0) >= self.limite_por_clinica:
+                    continue
+
+                # Atualização condicional: um cancelamento concorrente vence o despacho
+                agora = datetime.datetime.utcnow()
+                iniciada = Job.query.filter_by(id=job.id, status=PENDENTE).update({
+                    'status': EXECUTANDO,
+                    'started_at': agora,
+                    'attempts': (job.attempts or 0) + 1,
+                    'locked_by': self.identificador,
+                    'locked_until': agora + self.reserva
+                })
+                db.session.commit()
+                if not iniciada:
+                    continue
+
+                self._em_execucao[job.user_id] = self._em_execucao.get(job.user_id, 0) + 1
+                self._total_em_execucao += 1
+                vagas -= 1
+                self._executor.submit(self._executar, job.id, job.user_id)
+
+    def _executar(self, job_id, user_id):
+        """Executa uma tarefa no pool e registra o resultado."""
+        try:
+            with self.app.app_context():
+                job = db.session.get(Job, job_id)
+                try:
+                    if job.cancel_requested:
+                        raise TarefaCancelada()
+
+                    resultado, arquivo = EXECUTORES[job.job_type](job.get_payload(), self.pasta, job_id)
+
+                    # O cancelamento pode ter sido pedido enquanto a tarefa executava
+                    db.session.refresh(job)
+                    if job.cancel_requested:
+                        if arquivo and os.path.exists(arquivo):
+                            os.remove(arquivo)
+                        raise TarefaCancelada()
+
+                    job.set_result(resultado)
+                    job.result_path = arquivo
+                    job.status = CONCLUIDO
+                except TarefaCancelada:
+                    job.status = CANCELADO
+                except Exception as e:
+                    db.session.rollback()
+                    job = db.session.get(Job, job_id)
+                    job.status = ERRO
+                    job.error = str(e)
+
+                job.finished_at = datetime.datetime.utcnow()
+                job.locked_by = None
+                job.locked_until = None
+                db.session.commit()
+        finally:
+            with self._trava:
+                self._em_execucao[user_id] -= 1
+                self._total_em_execucao -= 1
+            self.despachar()
+
+    def encerrar(self, aguardar=True):
+        """Encerra a manutenção das reservas e o pool de threads."""
+        self._parar.set()
+        self._executor.shutdown(wait=aguardar)
+
+
+class JobService:
+    """Serviço para enfileirar, consultar e cancelar tarefas em segundo plano."""
+
+    @staticmethod
+    def init_app(app):
+        """
+        Cria a fila de tarefas do aplicativo, recupera tarefas interrompidas, remove resultados
+        expirados e inicia a manutenção das tarefas.
+
+        Args:
+            app: Aplicação Flask
+        """
+        pasta = app.config['JOBS_FOLDER']
+        os.makedirs(pasta, exist_ok=True)
+
+        fila = FilaJobs(app, app.config['JOBS_MAX_WORKERS'], app.config['JOBS_LIMITE_POR_CLINICA'], pasta,
+                        app.config['JOBS_RESERVA_SEGUNDOS'], app.config['JOBS_MAX_TENTATIVAS'],
+                        app.config['JOBS_VALIDADE_RESULTADOS_HORAS'] * 3600)
+        app.extensions['fila_jobs'] = fila
+        fila.recuperar()
+        fila.limpar_resultados()
+        fila.iniciar_manutencao()
+        return fila
+
+    @staticmethod
+    def _fila():
+        from flask import current_app
+        return current_app.extensions['fila_jobs']
+
+    @staticmethod
+    def enfileirar(user_id, tipo, payload):
+        """
+        Enfileira uma tarefa e tenta despachá-la imediatamente.
+
+        Args:
+            user_id: ID do usuário (clínica) dono da tarefa
+            tipo: Tipo da tarefa ('analise', 'extracao' ou 'laudo')
+            payload: Dados de entrada da tarefa
+
+        Returns:
+            Job: Tarefa criada
+        """
+        if tipo not in EXECUTORES:
+            raise ValueError(f'Tipo de tarefa desconhecido: {tipo}')
+
+        job = Job(id=uuid.uuid4().hex, user_id=user_id, job_type=tipo, status=PENDENTE)
+        job.set_payload(payload)
+        db.session.add(job)
+        db.session.commit()
+
+        JobService._fila().despachar()
+        return job
+
+    @staticmethod
+    def enfileirar_extracao(user_id, arquivo, extensao):
+        """
+        Salva o arquivo enviado na pasta de tarefas e enfileira sua extração.
+
+        Args:
+            user_id: ID do usuário
+            arquivo: Objeto de arquivo do Flask (request.files)
+            extensao: Extensão do arquivo ('pdf' ou 'csv')
+
+        Returns:
+            Job: Tarefa criada
+        """
+        caminho = os.path.join(JobService._fila().pasta, f'upload_{uuid.uuid4().hex}.{extensao}')
+        arquivo.save(caminho)
+        return JobService.enfileirar(user_id, 'extracao', {'caminho': caminho, 'extensao': extensao})
+
+    @staticmethod
+    def obter(job_id, user_id):
+        """Obtém uma tarefa do usuário ou None."""
+        return Job.query.filter_by(id=job_id, user_id=user_id).first()
+
+    @staticmethod
+    def cancelar(job_id, user_id):
+        """
+        Cancela uma tarefa pendente ou solicita o cancelamento de uma em execução.
+
+        Returns:
+            Tupla (sucesso, mensagem, tarefa)
+        """
+        job = JobService.obter(job_id, user_id)
+        if not job:
+            return False, 'Tarefa não encontrada.', None
+
+        if job.status in ESTADOS_FINAIS:
+            return False, f'A tarefa já foi finalizada ({job.status}).', job
+
+        # Atualização condicional: se o despacho iniciou a tarefa antes, só resta pedir o cancelamento
+        cancelada = Job.query.filter_by(id=job.id, status=PENDENTE).update({
+            'status': CANCELADO,
+            'finished_at': datetime.datetime.utcnow()
+        })
+        if cancelada:
+            if job.job_type == 'extracao':
+                caminho = job.get_payload().get('caminho')
+                if caminho and os.path.exists(caminho):
+                    os.remove(caminho)
+        else:
+            job.cancel_requested = True
+        db.session.commit()
+        db.session.refresh(job)
+
+        return True, 'Cancelamento registrado.', job
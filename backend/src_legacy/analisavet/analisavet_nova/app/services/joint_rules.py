@@ -0,0 +1,122 @@
+"""
+Avaliação compilada das interpretações conjuntas do AnalisaVet.
+Cada grupo de GRUPOS_PARAMETROS vira uma máscara de bits sobre o índice fixo de
+parâmetros da tabela de referência; um exame produz uma única máscara "fora da
+faixa" e cada grupo é avaliado com um AND e uma contagem de bits.
+"""
+
+import numpy as np
+
+# Quantidade mínima de parâmetros alterados para o grupo ser considerado
+MINIMO_ALTERADOS = 2
+
+
+def _contar_bits(valores):
+    """Conta os bits ligados de um array uint64 (np.bitwise_count só existe no NumPy 2)."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(valores)
+    contagem = np.zeros(valores.shape, dtype=np.uint8)
+    for deslocamento in range(0, 64, 8):
+        contagem += _BITS_POR_BYTE[(valores >> np.uint64(deslocamento)) & np.uint64(0xFF)]
+    return contagem
+
+
+_BITS_POR_BYTE = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.uint8)
+
+
+class AvaliadorGrupos:
+    """Grupos de parâmetros compilados em máscaras de bits para uma tabela de referência."""
+
+    __slots__ = ("grupos", "mascaras", "membros", "_vetor_mascaras", "_pesos")
+
+    def __init__(self, grupos_parametros, parametros):
+        """
+        Args:
+            grupos_parametros: Dicionário {grupo: [parametros]}
+            parametros: Parâmetros na ordem da tabela de referência (define o bit de cada um)
+        """
+        if len(parametros) > 64:
+            raise ValueError("A máscara de parâmetros comporta no máximo 64 parâmetros.")
+
+        indices = {parametro: indice for indice, parametro in enumerate(parametros)}
+        grupos = []
+        mascaras = []
+        membros = []
+
+        for grupo, parametros_grupo in grupos_parametros.items():
+            # Os membros mantêm a ordem declarada no grupo, como no relatório original
+            bits = tuple((1 << indices[p], p) for p in parametros_grupo if p in indices)
+            mascara = 0
+            for bit, _ in bits:
+                mascara |= bit
+            grupos.append(grupo)
+            mascaras.append(mascara)
+            membros.append(bits)
+
+        self.grupos = tuple(grupos)
+        self.mascaras = tuple(mascaras)
+        self.membros = tuple(membros)
+        self._vetor_mascaras = np.array(mascaras, dtype=np.uint64)
+        self._pesos = np.array([1 << indice for indice in range(len(parametros))], dtype=np.uint64)
+
+    def mascaras_lote(self, fora_faixa):
+        """
+        Converte a matriz booleana exames × parâmetros em um vetor de máscaras.
+
+        Args:
+            fora_faixa: Matriz booleana com os parâmetros fora da referência
+
+        Returns:
+            np.ndarray: Vetor uint64 com uma máscara por exame
+        """
+        return (fora_faixa * self._pesos).sum(axis=1, dtype=np.uint64)
+
+    def avaliar(self, mascara):
+        """
+        Avalia os grupos para a máscara de um exame.
+
+        Args:
+            mascara: Inteiro com um bit ligado por parâmetro fora da referência
+
+        Returns:
+            list: Interpretações conjuntas no formato de interpretar_alteracoes_conjuntas
+        """
+        interpretacoes = []
+        for grupo, mascara_grupo, membros in zip(self.grupos, self.mascaras, self.membros):
+            if (mascara & mascara_grupo).bit_count() >= MINIMO_ALTERADOS:
+                interpretacoes.append(_interpretacao(grupo, membros, mascara))
+        return interpretacoes
+
+    def avaliar_lote(self, mascaras):
+        """
+        Avalia todos os grupos para um vetor de máscaras de uma só vez.
+
+        Args:
+            mascaras: Vetor uint64 com uma máscara por exame
+
+        Returns:
+            list: Lista (uma por exame) de interpretações conjuntas
+        """
+        disparados = _contar_bits(mascaras[:, None] & self._vetor_mascaras[None, :]) >= MINIMO_ALTERADOS
+        grupos = tuple(zip(self.grupos, self.membros))
+
+        resultados = []
+        for mascara, linha in zip(mascaras.tolist(), disparados.tolist()):
+            if True in linha:
+                resultados.append([
+                    _interpretacao(grupo, membros, mascara)
+                    for (grupo, membros), disparado in zip(grupos, linha)
+                    if disparado
+                ])
+            else:
+                resultados.append([])
+        return resultados
+
+
+def _interpretacao(grupo, membros, mascara):
+    """Monta o dicionário de interpretação conjunta de um grupo disparado."""
+    return {
+        "grupo": grupo,
+        "parametros_alterados": [parametro for bit, parametro in membros if mascara & bit],
+        "recomendacao": f"Múltiplos parâmetros do grupo {grupo} apresentam alterações discretas. Recomenda-se monitoramento e investigação adicional."
+    }
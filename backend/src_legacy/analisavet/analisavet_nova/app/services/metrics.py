@@ -0,0 +1,113 @@
+"""
+Métricas de desempenho em processo para o AnalisaVet.
+Quando a instrumentação está ativa, cada análise registra a duração de suas
+etapas (classificação, interpretações, resumo, recomendações, serialização) e
+contagens (parâmetros avaliados, alterações) em histogramas com faixas fixas.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+# Limites superiores das faixas de duração (microssegundos)
+FAIXAS_DURACAO_US = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 50000, 250000)
+
+# Limites superiores das faixas de contagem (parâmetros, alterações, exames)
+FAIXAS_CONTAGEM = (0, 1, 2, 3, 5, 8, 13, 21, 50, 100, 1000)
+
+
+class Histograma:
+    """Histograma de faixas fixas (a última faixa, "+Inf", recebe os valores acima do maior limite)."""
+
+    __slots__ = ("faixas", "contagens", "soma", "total")
+
+    def __init__(self, faixas):
+        self.faixas = tuple(faixas)
+        self.contagens = [0] * (len(self.faixas) + 1)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        """Acrescenta um valor à faixa correspondente."""
+        self.contagens[bisect_left(self.faixas, valor)] += 1
+        self.soma += valor
+        self.total += 1
+
+    def exportar(self):
+        """Retorna faixas, contagens por faixa, soma e total."""
+        return {
+            "faixas": [*self.faixas, "+Inf"],
+            "contagens": list(self.contagens),
+            "soma": round(self.soma, 3),
+            "total": self.total,
+            "media": round(self.soma / self.total, 3) if self.total else None
+        }
+
+
+class RegistroMetricas:
+    """Conjunto de histogramas nomeados, seguro entre threads."""
+
+    def __init__(self):
+        self._histogramas = {}
+        self._trava = threading.Lock()
+
+    def registrar(self, observacoes):
+        """
+        Registra várias observações de uma vez (uma única aquisição da trava).
+
+        Args:
+            observacoes: Iterável de (nome, valor, faixas)
+        """
+        with self._trava:
+            for nome, valor, faixas in observacoes:
+                histograma = self._histogramas.get(nome)
+                if histograma is None:
+                    histograma = self._histogramas[nome] = Histograma(faixas)
+                histograma.observar(valor)
+
+    def observar(self, nome, valor, faixas=FAIXAS_DURACAO_US):
+        """Registra uma observação."""
+        self.registrar(((nome, valor, faixas),))
+
+    def exportar(self):
+        """Retorna todos os histogramas, ordenados pelo nome."""
+        with self._trava:
+            return {nome: self._histogramas[nome].exportar() for nome in sorted(self._histogramas)}
+
+    def limpar(self):
+        """Descarta todas as observações."""
+        with self._trava:
+            self._histogramas.clear()
+
+
+class Cronometro:
+    """Mede as etapas de uma operação e as registra juntas ao final."""
+
+    __slots__ = ("registro", "prefixo", "inicio", "ultimo", "observacoes")
+
+    def __init__(self, registro, prefixo):
+        """
+        Args:
+            registro: RegistroMetricas de destino
+            prefixo: Prefixo dos nomes das métricas (ex.: "analise")
+        """
+        self.registro = registro
+        self.prefixo = prefixo
+        self.inicio = self.ultimo = time.perf_counter_ns()
+        self.observacoes = []
+
+    def marcar(self, etapa):
+        """Registra a duração desde a marcação anterior como a etapa informada."""
+        agora = time.perf_counter_ns()
+        self.observacoes.append((f"{self.prefixo}.etapa.{etapa}_us", (agora - self.ultimo) / 1000, FAIXAS_DURACAO_US))
+        self.ultimo = agora
+
+    def contar(self, nome, valor):
+        """Registra uma contagem (ex.: parâmetros avaliados)."""
+        self.observacoes.append((f"{self.prefixo}.{nome}", valor, FAIXAS_CONTAGEM))
+
+    def finalizar(self):
+        """Registra a duração total e envia todas as observações ao registro."""
+        total = (time.perf_counter_ns() - self.inicio) / 1000
+        self.observacoes.append((f"{self.prefixo}.total_us", total, FAIXAS_DURACAO_US))
+        self.registro.registrar(self.observacoes)
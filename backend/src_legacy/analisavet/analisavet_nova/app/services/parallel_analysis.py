@@ -0,0 +1,324 @@
+"""
+Execução paralela de análises em lote e reanálises do AnalisaVet.
+
+O lote é dividido em blocos analisados por um pool de processos. Cada processo
+recebe, ao iniciar, as definições das referências em uso (valores, grupos,
+estratos, regras, índices derivados e catálogo de interpretações) e as compila
+uma única vez; os blocos seguintes usam as tabelas já compiladas. Os resultados
+voltam na ordem de entrada. Quando as referências mudam, o pool é recriado.
+
+O aplicativo mantém um analisador (init_app) usado pelas rotas de lote e de
+importação de ZIP: blocos maiores que ANALISE_PROCESSOS_BLOCO vão para o pool,
+os menores são analisados no próprio processo.
+
+A reanálise do histórico lê as análises salvas em páginas por id, reclassifica
+os hemogramas nos processos (que devolvem o JSON compacto já serializado) e
+grava as atualizações em lote, uma transação por página.
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from services import derived_indices, interpretation_catalog
+from services.analysis_service import AnalysisService
+from services.compact_result import CHAVES_DERIVADAS, ResultadoCompacto, e_compacto
+
+# Blocos enviados a cada processo por vez (um bloco menor que isso é analisado no próprio processo)
+TAMANHO_BLOCO_PADRAO = 500
+
+# "spawn" evita herdar travas de threads (fila de tarefas, SQLAlchemy) em um fork
+METODO_INICIO_PADRAO = "spawn"
+
+
+def _estado_referencias():
+    """Definições das referências e do catálogo em uso, para recompilação em outro processo."""
+    referencias = AnalysisService.referencias_atuais()
+    return {
+        "valores": referencias.valores,
+        "grupos": referencias.grupos,
+        "versao": referencias.versao,
+        "estratos": referencias.definicao_estratos,
+        "regras": referencias.regras,
+        "indices": derived_indices.indices_registrados(),
+        "catalogo": interpretation_catalog.obter_catalogo()
+    }
+
+
+def _inicializar_processo(estado):
+    """Compila, no processo do pool, as referências recebidas do processo principal."""
+    derived_indices.substituir_indices(estado["indices"])
+    interpretation_catalog._catalogo = estado["catalogo"]
+    # Exames de um bloco raramente se repetem; o cache só ocuparia memória em cada processo
+    AnalysisService.configurar_cache(0)
+    AnalysisService.aplicar_referencias(
+        estado["valores"], estado["grupos"], estado["versao"], estado["estratos"], estado["regras"])
+
+
+def _analisar_bloco(hemogramas, pacientes):
+    """Analisa um bloco no processo do pool."""
+    return AnalysisService.analisar_hemogramas_lote(hemogramas, pacientes)
+
+
+def _analisar_bloco_compacto(hemogramas, pacientes):
+    """Analisa um bloco no processo do pool, devolvendo os resultados compactos codificados."""
+    resultados = AnalysisService.analisar_hemogramas_lote_compacto(hemogramas, pacientes)
+    return [resultado.codificar() for resultado in resultados]
+
+
+def _extras_armazenados(armazenado):
+    """Seções do resultado salvo que não são geradas pela análise (ex.: delta_historico)."""
+    if e_compacto(armazenado):
+        return dict(armazenado.get("x") or {})
+    if isinstance(armazenado, dict):
+        return {chave: valor for chave, valor in armazenado.items() if chave not in CHAVES_DERIVADAS}
+    return {}
+
+
+def _reanalisar_bloco(linhas):
+    """
+    Reanalisa um bloco de análises salvas no processo do pool.
+
+    Args:
+        linhas: Lista de (id, hemogram_data, analysis_result, dados do paciente)
+
+    Returns:
+        list: (id, versão de referência, resultado serializado, erro) de cada linha
+    """
+    saida = []
+    for analysis_id, hemograma_json, resultado_json, paciente in linhas:
+        try:
+            hemograma = json.loads(hemograma_json or "{}")
+            compacto = AnalysisService.analisar_hemograma_compacto(hemograma, paciente)
+            compacto.extras = _extras_armazenados(json.loads(resultado_json) if resultado_json else None)
+            texto = json.dumps(compacto.codificar(), separators=(",", ":"))
+            saida.append((analysis_id, compacto.versao_referencia, texto, None))
+        except (ValueError, TypeError, AttributeError) as e:
+            saida.append((analysis_id, None, None, str(e)))
+    return saida
+
+
+def _dividir(itens, tamanho):
+    """Divide uma lista em blocos consecutivos de até tamanho itens."""
+    return [itens[inicio:inicio + tamanho] for inicio in range(0, len(itens), tamanho)]
+
+
+class AnalisadorParalelo:
+    """
+    Pool de processos para análises em lote, com as referências pré-compiladas em cada processo.
+
+    O pool é criado no primeiro uso e recriado quando as referências ou o catálogo
+    em uso mudam; use encerrar() (ou um bloco with) para liberar os processos.
+    """
+
+    def __init__(self, processos=None, tamanho_bloco=TAMANHO_BLOCO_PADRAO, metodo_inicio=METODO_INICIO_PADRAO):
+        """
+        Args:
+            processos: Quantidade de processos (None ou 0: um por núcleo)
+            tamanho_bloco: Exames enviados a um processo por vez
+            metodo_inicio: Método de início dos processos ("spawn", "forkserver" ou "fork")
+        """
+        self.processos = processos or os.cpu_count() or 1
+        self.tamanho_bloco = max(1, tamanho_bloco)
+        self.metodo_inicio = metodo_inicio
+        self._executor = None
+        self._versao = None
+        # As requisições compartilham o analisador do aplicativo
+        self._trava = threading.Lock()
+
+    @staticmethod
+    def init_app(app):
+        """
+        Cria o analisador usado pelas rotas de lote do aplicativo (o pool só é criado no primeiro lote grande).
+
+        Args:
+            app: Aplicação Flask
+        """
+        analisador = AnalisadorParalelo(app.config['ANALISE_PROCESSOS'], app.config['ANALISE_PROCESSOS_BLOCO'])
+        app.extensions['analisador_paralelo'] = analisador
+        return analisador
+
+    @property
+    def tamanho_lote(self):
+        """Exames que ocupam todos os processos com um bloco cada (o tamanho do bloco sem paralelismo)."""
+        return self.tamanho_bloco * self.processos
+
+    def _obter_executor(self):
+        """Pool com as referências em uso, recriado se elas mudaram desde a criação."""
+        versao = AnalysisService.versao_regras()
+        with self._trava:
+            if self._executor is None or self._versao != versao:
+                self._encerrar_executor()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.processos,
+                    mp_context=multiprocessing.get_context(self.metodo_inicio),
+                    initializer=_inicializar_processo,
+                    initargs=(_estado_referencias(),)
+                )
+                self._versao = versao
+            return self._executor
+
+    def _mapear(self, funcao_local, funcao_bloco, lista_hemogramas, lista_pacientes):
+        """
+        Aplica funcao_bloco a blocos do lote nos processos, ou funcao_local ao lote inteiro se ele for pequeno.
+
+        Returns:
+            tuple: (resultados na ordem de entrada, True se o lote foi analisado no pool)
+        """
+        total = len(lista_hemogramas)
+        if isinstance(lista_pacientes, dict):
+            lista_pacientes = [lista_pacientes] * total
+        if len(lista_pacientes) != total:
+            raise ValueError("Quantidade de pacientes diferente da quantidade de hemogramas.")
+
+        # Um único bloco não compensa a ida e volta entre processos
+        if self.processos == 1 or total <= self.tamanho_bloco:
+            return funcao_local(lista_hemogramas, lista_pacientes), False
+
+        # Blocos menores que o padrão quando o lote não ocupa todos os processos
+        tamanho = min(self.tamanho_bloco, -(-total // self.processos))
+        resultados = []
+        for bloco in self._obter_executor().map(
+                funcao_bloco, _dividir(list(lista_hemogramas), tamanho), _dividir(list(lista_pacientes), tamanho)):
+            resultados.extend(bloco)
+        return resultados, True
+
+    def analisar_lote(self, lista_hemogramas, lista_pacientes):
+        """
+        Analisa um lote dividindo-o entre os processos do pool.
+
+        Args:
+            lista_hemogramas: Lista de dicionários com os dados de cada hemograma
+            lista_pacientes: Lista de dicionários com os dados de cada paciente
+                (ou um único dicionário aplicado a todo o lote)
+
+        Returns:
+            list: Análises na mesma ordem e estrutura de analisar_hemograma
+        """
+        resultados, _ = self._mapear(
+            AnalysisService.analisar_hemogramas_lote, _analisar_bloco, lista_hemogramas, lista_pacientes)
+        return resultados
+
+    def analisar_lote_compacto(self, lista_hemogramas, lista_pacientes):
+        """
+        Analisa um lote sem gerar os textos do resultado, dividindo-o entre os processos do pool.
+
+        Os processos devolvem os resultados codificados, que são decodificados aqui.
+
+        Args:
+            lista_hemogramas: Lista de dicionários com os dados de cada hemograma
+            lista_pacientes: Lista de dicionários com os dados de cada paciente
+                (ou um único dicionário aplicado a todo o lote)
+
+        Returns:
+            list: ResultadoCompacto de cada exame, na mesma ordem
+        """
+        resultados, no_pool = self._mapear(
+            AnalysisService.analisar_hemogramas_lote_compacto, _analisar_bloco_compacto,
+            lista_hemogramas, lista_pacientes)
+        if no_pool:
+            return [ResultadoCompacto.decodificar(codificado) for codificado in resultados]
+        return resultados
+
+    def reanalisar(self, linhas):
+        """
+        Reanalisa análises salvas, mantendo no máximo dois blocos por processo em andamento.
+
+        Args:
+            linhas: Iterável de (id, hemogram_data, analysis_result, dados do paciente)
+
+        Yields:
+            tuple: (id, versão de referência, resultado serializado, erro), na ordem de entrada
+        """
+        executor = self._obter_executor()
+        pendentes = deque()
+        bloco = []
+        for linha in linhas:
+            bloco.append(linha)
+            if len(bloco) >= self.tamanho_bloco:
+                pendentes.append(executor.submit(_reanalisar_bloco, bloco))
+                bloco = []
+                if len(pendentes) >= 2 * self.processos:
+                    yield from pendentes.popleft().result()
+        if bloco:
+            pendentes.append(executor.submit(_reanalisar_bloco, bloco))
+        while pendentes:
+            yield from pendentes.popleft().result()
+
+    def encerrar(self):
+        """Encerra os processos do pool."""
+        with self._trava:
+            self._encerrar_executor()
+
+    def _encerrar_executor(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.encerrar()
+
+
+def _linhas_historico(user_id, tamanho_pagina):
+    """Lê as análises salvas em páginas ordenadas por id (sem carregar os objetos do modelo)."""
+    from models.models import Analysis
+
+    ultimo_id = 0
+    while True:
+        consulta = Analysis.query.with_entities(
+            Analysis.id, Analysis.hemogram_data, Analysis.analysis_result, Analysis.patient_species,
+            Analysis.patient_breed, Analysis.patient_age
+        ).filter(Analysis.id > ultimo_id)
+        if user_id is not None:
+            consulta = consulta.filter(Analysis.user_id == user_id)
+        pagina = consulta.order_by(Analysis.id).limit(tamanho_pagina).all()
+        if not pagina:
+            return
+        for analysis_id, hemograma, resultado, especie, raca, idade in pagina:
+            yield analysis_id, hemograma, resultado, {"especie": especie or "Cão", "raca": raca, "idade": idade}
+        ultimo_id = pagina[-1][0]
+
+
+def reanalisar_historico(analisador, user_id=None, tamanho_pagina=5000):
+    """
+    Reanalisa as análises salvas com as referências em uso, gravando o resultado compacto.
+
+    As seções que não vêm da análise (delta_historico) são preservadas. Deve ser
+    chamada dentro do contexto do aplicativo.
+
+    Args:
+        analisador: AnalisadorParalelo usado na reanálise
+        user_id: Reanalisa apenas as análises deste usuário (None: todas)
+        tamanho_pagina: Análises lidas e gravadas por transação
+
+    Returns:
+        dict: {"reanalisadas", "erros": [{"id", "erro"}]}
+    """
+    from models.models import Analysis, db
+
+    reanalisadas = 0
+    erros = []
+    atualizacoes = []
+    for analysis_id, versao, texto, erro in analisador.reanalisar(_linhas_historico(user_id, tamanho_pagina)):
+        if erro is not None:
+            erros.append({"id": analysis_id, "erro": erro})
+            continue
+        atualizacoes.append({"id": analysis_id, "analysis_result": texto, "reference_version": versao})
+        if len(atualizacoes) >= tamanho_pagina:
+            db.session.bulk_update_mappings(Analysis, atualizacoes)
+            db.session.commit()
+            reanalisadas += len(atualizacoes)
+            atualizacoes = []
+
+    if atualizacoes:
+        db.session.bulk_update_mappings(Analysis, atualizacoes)
+        db.session.commit()
+        reanalisadas += len(atualizacoes)
+
+    return {"reanalisadas": reanalisadas, "erros": erros}
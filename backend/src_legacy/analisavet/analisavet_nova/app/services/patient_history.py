@@ -0,0 +1,281 @@
+"""
+Histórico longitudinal de pacientes do AnalisaVet.
+Cada paciente mantém, por parâmetro, contagem, média e variância (algoritmo de
+Welford), último valor e data do último exame. As estatísticas são atualizadas a
+cada análise salva, de modo que comparar um hemograma com o histórico custa
+O(parâmetros), sem reler as análises anteriores.
+"""
+
+import datetime
+import math
+import unicodedata
+
+from sqlalchemy.exc import IntegrityError
+
+from models.models import Analysis, PatientStats, db
+
+# Exames anteriores necessários para que a variância do paciente seja considerada
+MINIMO_EXAMES = 3
+
+# Distância mínima da média do paciente, em desvios-padrão, para uma mudança ser significativa
+LIMIAR_Z = 2.0
+
+# Desvio-padrão mínimo como fração da média: evita que históricos quase constantes
+# transformem variações irrelevantes em mudanças "significativas"
+DESVIO_MINIMO_RELATIVO = 0.05
+
+# Posições da lista de estatísticas de cada parâmetro
+N, MEDIA, M2, ULTIMO_VALOR, ULTIMA_DATA = range(5)
+
+
+def _normalizar(texto):
+    """Remove acentos, espaços repetidos e diferenças de caixa."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    return " ".join("".join(c for c in texto if not unicodedata.combining(c)).lower().split())
+
+
+def chave_paciente(dados_paciente):
+    """
+    Gera a chave que identifica um paciente dentro da clínica.
+
+    Args:
+        dados_paciente: Dados do paciente (especie, nome/nome_paciente, tutor/nome_tutor)
+
+    Returns:
+        str: Chave normalizada ou None se o paciente não tiver nome
+    """
+    nome = dados_paciente.get("nome") or dados_paciente.get("nome_paciente")
+    if not nome:
+        return None
+    tutor = dados_paciente.get("tutor") or dados_paciente.get("nome_tutor")
+    return "|".join(_normalizar(parte) for parte in (dados_paciente.get("especie", "Cão"), nome, tutor))
+
+
+def atualizar_estatisticas(estatisticas, dados_hemograma, data):
+    """
+    Acumula os valores de um hemograma nas estatísticas do paciente (Welford).
+
+    Args:
+        estatisticas: Dicionário {parametro: [n, media, m2, ultimo_valor, ultima_data]}, alterado no lugar
+        dados_hemograma: Dados do hemograma
+        data: Data do exame em ISO 8601
+    """
+    for parametro, valor in dados_hemograma.items():
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)) or math.isnan(valor):
+            continue
+
+        atual = estatisticas.get(parametro)
+        if atual is None:
+            estatisticas[parametro] = [1, float(valor), 0.0, valor, data]
+            continue
+
+        n = atual[N] + 1
+        diferenca = valor - atual[MEDIA]
+        media = atual[MEDIA] + diferenca / n
+        atual[N] = n
+        atual[MEDIA] = media
+        atual[M2] += diferenca * (valor - media)
+        atual[ULTIMO_VALOR] = valor
+        atual[ULTIMA_DATA] = data
+
+
+def desvio_padrao(estatistica):
+    """Desvio-padrão amostral de um parâmetro (None com menos de dois exames)."""
+    if estatistica[N] < 2:
+        return None
+    return math.sqrt(estatistica[M2] / (estatistica[N] - 1))
+
+
+def comparar_com_historico(estatisticas, dados_hemograma, total_exames):
+    """
+    Compara um hemograma com a linha de base do próprio paciente.
+
+    Args:
+        estatisticas: Estatísticas acumuladas do paciente
+        dados_hemograma: Dados do novo hemograma
+        total_exames: Quantidade de exames anteriores do paciente
+
+    Returns:
+        dict: Seção "delta_historico" com as mudanças significativas
+    """
+    alteracoes = []
+    for parametro, valor in dados_hemograma.items():
+        estatistica = estatisticas.get(parametro)
+        if estatistica is None or estatistica[N] < MINIMO_EXAMES:
+            continue
+        if isinstance(valor, bool) or not isinstance(valor, (int, float)):
+            continue
+
+        media = estatistica[MEDIA]
+        desvio = max(desvio_padrao(estatistica), abs(media) * DESVIO_MINIMO_RELATIVO)
+        if desvio == 0:
+            continue
+
+        z = (valor - media) / desvio
+        if abs(z) < LIMIAR_Z:
+            continue
+
+        ultimo_valor = estatistica[ULTIMO_VALOR]
+        alteracoes.append({
+            "parametro": parametro,
+            "valor": valor,
+            "media_historica": media,
+            "desvio_padrao": desvio,
+            "escore_z": z,
+            "direcao": "aumento" if z > 0 else "queda",
+            "ultimo_valor": ultimo_valor,
+            "ultima_data": estatistica[ULTIMA_DATA],
+            "variacao_percentual": ((valor - ultimo_valor) / ultimo_valor) * 100 if ultimo_valor else None,
+            "exames_considerados": estatistica[N]
+        })
+
+    return {
+        "exames_anteriores": total_exames,
+        "alteracoes_significativas": alteracoes
+    }
+
+
+class PatientHistoryService:
+    """Serviço para manter e consultar as estatísticas longitudinais dos pacientes."""
+
+    @staticmethod
+    def obter(user_id, dados_paciente):
+        """
+        Obtém as estatísticas acumuladas de um paciente.
+
+        Returns:
+            PatientStats: Registro do paciente ou None
+        """
+        chave = chave_paciente(dados_paciente)
+        if chave is None:
+            return None
+        return PatientStats.query.filter_by(user_id=user_id, patient_key=chave).first()
+
+    @staticmethod
+    def comparar(user_id, dados_paciente, dados_hemograma):
+        """
+        Calcula a seção "delta_historico" de um hemograma.
+
+        Args:
+            user_id: ID do usuário (clínica)
+            dados_paciente: Dados do paciente
+            dados_hemograma: Dados do novo hemograma
+
+        Returns:
+            dict: Mudanças significativas em relação ao histórico ou None se não houver histórico
+        """
+        registro = PatientHistoryService.obter(user_id, dados_paciente)
+        if registro is None:
+            return None
+        return comparar_com_historico(registro.get_stats(), dados_hemograma, registro.exams_count)
+
+    @staticmethod
+    def registrar(user_id, dados_paciente, dados_hemograma, data=None):
+        """
+        Acumula um hemograma nas estatísticas do paciente (sem commit).
+
+        Args:
+            user_id: ID do usuário (clínica)
+            dados_paciente: Dados do paciente
+            dados_hemograma: Dados do hemograma
+            data: Data do exame (padrão: agora)
+
+        Returns:
+            PatientStats: Registro atualizado ou None se o paciente não puder ser identificado
+        """
+        chave = chave_paciente(dados_paciente)
+        if chave is None:
+            return None
+
+        registro = PatientStats.query.filter_by(user_id=user_id, patient_key=chave).first()
+        if registro is None:
+            registro = PatientHistoryService._criar(user_id, chave, dados_paciente)
+
+        data = data or datetime.datetime.utcnow()
+        estatisticas = registro.get_stats()
+        atualizar_estatisticas(estatisticas, dados_hemograma, data.isoformat())
+        registro.set_stats(estatisticas)
+        registro.exams_count = (registro.exams_count or 0) + 1
+        registro.updated_at = data
+        return registro
+
+    @staticmethod
+    def _criar(user_id, chave, dados_paciente):
+        """
+        Cria o registro do primeiro exame de um paciente.
+
+        A inserção é feita em um savepoint: se outra requisição criou o registro
+        depois da consulta, a chave única recusa a inserção e o exame é acumulado
+        no registro existente.
+
+        Returns:
+            PatientStats: Registro novo ou o criado pela outra requisição
+        """
+        registro = PatientStats(
+            user_id=user_id,
+            patient_key=chave,
+            patient_species=dados_paciente.get("especie", "Cão"),
+            patient_name=dados_paciente.get("nome") or dados_paciente.get("nome_paciente"),
+            owner_name=dados_paciente.get("tutor") or dados_paciente.get("nome_tutor"),
+            exams_count=0
+        )
+        try:
+            with db.session.begin_nested():
+                db.session.add(registro)
+        except IntegrityError:
+            registro = PatientStats.query.filter_by(user_id=user_id, patient_key=chave).one()
+        return registro
+
+    @staticmethod
+    def resumo(registro):
+        """Converte o registro de um paciente em dicionário para a API."""
+        estatisticas = registro.get_stats()
+        return {
+            "especie": registro.patient_species,
+            "nome": registro.patient_name,
+            "tutor": registro.owner_name,
+            "exames": registro.exams_count,
+            "atualizado_em": registro.updated_at.isoformat() if registro.updated_at else None,
+            "parametros": {
+                parametro: {
+                    "exames": estatistica[N],
+                    "media": estatistica[MEDIA],
+                    "desvio_padrao": desvio_padrao(estatistica),
+                    "ultimo_valor": estatistica[ULTIMO_VALOR],
+                    "ultima_data": estatistica[ULTIMA_DATA]
+                }
+                for parametro, estatistica in estatisticas.items()
+            }
+        }
+
+    @staticmethod
+    def reconstruir(user_id):
+        """
+        Recalcula do zero as estatísticas dos pacientes de uma clínica a partir das análises salvas.
+
+        Usado uma única vez para clínicas com análises anteriores ao histórico incremental.
+
+        Args:
+            user_id: ID do usuário (clínica)
+
+        Returns:
+            int: Quantidade de pacientes reconstruídos
+        """
+        PatientStats.query.filter_by(user_id=user_id).delete()
+        db.session.flush()
+
+        analises = Analysis.query.filter_by(user_id=user_id).order_by(Analysis.created_at, Analysis.id).all()
+        chaves = set()
+        for analysis in analises:
+            dados_paciente = {
+                "especie": analysis.patient_species,
+                "nome": analysis.patient_name,
+                "tutor": analysis.owner_name
+            }
+            registro = PatientHistoryService.registrar(
+                user_id, dados_paciente, analysis.get_hemogram_data(), analysis.created_at)
+            if registro is not None:
+                chaves.add(registro.patient_key)
+
+        db.session.commit()
+        return len(chaves)
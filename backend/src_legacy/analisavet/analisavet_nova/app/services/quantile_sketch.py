@@ -0,0 +1,176 @@
+"""
+Sketch de quantis KLL (Karnin, Lang e Liberty) para o AnalisaVet.
+Resume um fluxo de valores em memória limitada (alguns k itens por nível),
+permite estimar quantis e a posição percentual de um valor com erro de rank
+da ordem de 1/k, e pode ser mesclado com outros sketches do mesmo parâmetro.
+"""
+
+import math
+import random
+import struct
+
+import numpy as np
+
+# Tamanho do compactor de nível mais alto; define a precisão (erro de rank ~1,7/k)
+K_PADRAO = 200
+
+# Razão entre as capacidades de níveis consecutivos
+RAZAO_CAPACIDADE = 2 / 3
+
+# Cabeçalho serializado: versão do formato, k, total de valores, quantidade de níveis
+_CABECALHO = struct.Struct("<BHQH")
+_FORMATO = 1
+
+
+class SketchKLL:
+    """Sketch KLL de quantis com compactores por nível (itens do nível h pesam 2^h)."""
+
+    __slots__ = ("k", "n", "compactores", "tamanho", "tamanho_maximo", "_aleatorio")
+
+    def __init__(self, k=K_PADRAO, semente=None):
+        """
+        Args:
+            k: Capacidade do compactor de nível mais alto
+            semente: Semente do sorteio das compactações (para resultados reprodutíveis)
+        """
+        self.k = k
+        self.n = 0
+        self.compactores = []
+        self.tamanho = 0
+        self.tamanho_maximo = 0
+        self._aleatorio = random.Random(semente)
+        self._crescer()
+
+    def _capacidade(self, nivel):
+        profundidade = len(self.compactores) - nivel - 1
+        return int(math.ceil(self.k * RAZAO_CAPACIDADE ** profundidade)) + 1
+
+    def _crescer(self):
+        self.compactores.append([])
+        self.tamanho_maximo = sum(self._capacidade(nivel) for nivel in range(len(self.compactores)))
+
+    def atualizar(self, valor):
+        """Acrescenta um valor ao sketch."""
+        self.compactores[0].append(float(valor))
+        self.n += 1
+        self.tamanho += 1
+        if self.tamanho >= self.tamanho_maximo:
+            self._compactar()
+
+    def _compactar(self):
+        """Promove metade dos itens dos níveis cheios ao nível seguinte até caber na capacidade."""
+        while self.tamanho >= self.tamanho_maximo:
+            for nivel in range(len(self.compactores)):
+                compactor = self.compactores[nivel]
+                if len(compactor) < self._capacidade(nivel):
+                    continue
+                if nivel + 1 >= len(self.compactores):
+                    self._crescer()
+
+                # Um item sobra no nível quando a quantidade é ímpar
+                sobra = compactor.pop() if len(compactor) % 2 else None
+                compactor.sort()
+                deslocamento = self._aleatorio.random() < 0.5
+                self.compactores[nivel + 1].extend(compactor[deslocamento::2])
+                compactor.clear()
+                if sobra is not None:
+                    compactor.append(sobra)
+
+                self.tamanho = sum(len(c) for c in self.compactores)
+                if self.tamanho < self.tamanho_maximo:
+                    break
+
+    def mesclar(self, outro):
+        """
+        Incorpora outro sketch (por exemplo, de outra clínica ou outro worker).
+
+        Args:
+            outro: SketchKLL com o mesmo k
+        """
+        while len(self.compactores) < len(outro.compactores):
+            self._crescer()
+        for nivel, compactor in enumerate(outro.compactores):
+            self.compactores[nivel].extend(compactor)
+        self.n += outro.n
+        self.tamanho = sum(len(c) for c in self.compactores)
+        self._compactar()
+
+    def _itens_ponderados(self):
+        """Itens ordenados e pesos acumulados."""
+        itens = []
+        pesos = []
+        for nivel, compactor in enumerate(self.compactores):
+            itens.extend(compactor)
+            pesos.extend([1 << nivel] * len(compactor))
+        if not itens:
+            return np.empty(0), np.empty(0)
+        itens = np.array(itens)
+        ordem = np.argsort(itens, kind="stable")
+        return itens[ordem], np.cumsum(np.array(pesos)[ordem])
+
+    def posicao(self, valor):
+        """
+        Estima a fração dos valores menores ou iguais a valor.
+
+        Returns:
+            float: Rank normalizado entre 0 e 1 (None se o sketch estiver vazio)
+        """
+        itens, acumulado = self._itens_ponderados()
+        if not len(itens):
+            return None
+        indice = np.searchsorted(itens, valor, side="right")
+        return float(acumulado[indice - 1] / acumulado[-1]) if indice else 0.0
+
+    def quantis(self, fracoes):
+        """
+        Estima os quantis informados.
+
+        Args:
+            fracoes: Frações entre 0 e 1 (ex.: [0.05, 0.5, 0.95])
+
+        Returns:
+            list: Valores estimados (None para sketch vazio)
+        """
+        itens, acumulado = self._itens_ponderados()
+        if not len(itens):
+            return [None] * len(fracoes)
+        alvos = np.asarray(fracoes, dtype=float) * acumulado[-1]
+        indices = np.minimum(np.searchsorted(acumulado, alvos, side="left"), len(itens) - 1)
+        return itens[indices].tolist()
+
+    def serializar(self):
+        """Serializa o sketch em bytes: cabeçalho, tamanho de cada nível e itens em float64."""
+        tamanhos = [len(compactor) for compactor in self.compactores]
+        itens = [item for compactor in self.compactores for item in compactor]
+        return (
+            _CABECALHO.pack(_FORMATO, self.k, self.n, len(tamanhos))
+            + struct.pack(f"<{len(tamanhos)}I", *tamanhos)
+            + np.asarray(itens, dtype="<f8").tobytes()
+        )
+
+    @classmethod
+    def desserializar(cls, dados, semente=None):
+        """Reconstrói um sketch serializado por serializar()."""
+        formato, k, n, niveis = _CABECALHO.unpack_from(dados)
+        if formato != _FORMATO:
+            raise ValueError(f"Formato de sketch desconhecido: {formato}")
+
+        inicio = _CABECALHO.size
+        tamanhos = struct.unpack_from(f"<{niveis}I", dados, inicio)
+        itens = np.frombuffer(dados, dtype="<f8", offset=inicio + 4 * niveis).tolist()
+
+        sketch = cls(k, semente)
+        sketch.compactores = []
+        for tamanho in tamanhos:
+            sketch.compactores.append(itens[:tamanho])
+            itens = itens[tamanho:]
+        sketch.tamanho_maximo = sum(sketch._capacidade(nivel) for nivel in range(niveis))
+        sketch.tamanho = sum(tamanhos)
+        sketch.n = n
+        return sketch
+
+    def __len__(self):
+        return self.n
+
+    def __repr__(self):
+        return f'<SketchKLL k={self.k} n={self.n} itens={self.tamanho}>'
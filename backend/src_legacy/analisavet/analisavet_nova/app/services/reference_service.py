@@ -0,0 +1,301 @@
+"""
+Serviço de conjuntos de referência versionados para o aplicativo AnalisaVet.
+Os valores de referência e os grupos de interpretação conjunta ficam na tabela
+reference_sets; cada worker compila a versão mais recente em memória e verifica
+periodicamente se outra foi publicada, trocando as tabelas sem reiniciar.
+"""
+
+import numbers
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+
+from models.models import ReferenceSet, db
+from services.analysis_service import AnalysisService
+from services.reference_tables import ConjuntoReferencias
+from services.rule_dsl import validar_regras
+
+# Quantidade máxima de parâmetros por espécie (limite da máscara de bits da interpretação conjunta)
+MAXIMO_PARAMETROS = 64
+
+# Tentativas de publicação quando outro worker publica a mesma versão ao mesmo tempo
+TENTATIVAS_PUBLICACAO = 3
+
+# Versões antigas mantidas compiladas para expandir análises salvas
+MAXIMO_COMPILADOS = 8
+
+
+class ReferenceService:
+    """Serviço para publicar, consultar e recarregar conjuntos de referência."""
+
+    _ultima_verificacao = 0.0
+    _trava = threading.Lock()
+    _compilados = {}
+
+    @staticmethod
+    def init_app(app):
+        """
+        Publica as referências de fábrica se o banco estiver vazio, carrega a versão
+        mais recente e passa a verificar novas versões antes das requisições.
+
+        Args:
+            app: Aplicação Flask
+        """
+        ReferenceService._compilados.clear()
+        with app.app_context():
+            if ReferenceService.versao_publicada() is None:
+                ReferenceService.publicar(
+                    AnalysisService.VALORES_REFERENCIA_PADRAO,
+                    AnalysisService.GRUPOS_PARAMETROS_PADRAO,
+                    descricao='Referências padrão',
+                    estratos=AnalysisService.ESTRATOS_REFERENCIA_PADRAO,
+                    regras=AnalysisService.REGRAS_DIAGNOSTICAS_PADRAO
+                )
+            ReferenceService.carregar()
+
+        @app.before_request
+        def verificar_referencias():
+            ReferenceService.verificar_atualizacao(current_app.config['REFERENCIAS_INTERVALO_VERIFICACAO'])
+
+    @staticmethod
+    def versao_publicada():
+        """Retorna a versão mais recente publicada no banco de dados (ou None)."""
+        return db.session.query(func.max(ReferenceSet.version)).scalar()
+
+    @staticmethod
+    def validar(valores, grupos, estratos=None, regras=None):
+        """
+        Valida a estrutura de um conjunto de referências.
+
+        Args:
+            valores: Dicionário {especie: {parametro: {"min", "max", "unidade"}}}
+            grupos: Dicionário {grupo: [parametros]}
+            estratos: Dicionário {especie: {"grupos_raciais", "faixas_etarias", "intervalos"}}
+            regras: Lista de regras diagnósticas (compiladas para cada espécie)
+
+        Raises:
+            ValueError: Se o conjunto estiver incompleto ou inconsistente
+        """
+        if not isinstance(valores, dict) or not valores:
+            raise ValueError('Informe os valores de referência de ao menos uma espécie.')
+
+        for especie, referencias in valores.items():
+            if not isinstance(referencias, dict) or not referencias:
+                raise ValueError(f'Valores de referência inválidos para a espécie {especie}.')
+            if len(referencias) > MAXIMO_PARAMETROS:
+                raise ValueError(f'A espécie {especie} excede {MAXIMO_PARAMETROS} parâmetros.')
+
+            for parametro, ref in referencias.items():
+                _validar_faixa(f'{especie}/{parametro}', ref)
+
+        if not isinstance(grupos, dict):
+            raise ValueError('Os grupos de parâmetros devem ser um dicionário {grupo: [parametros]}.')
+        for grupo, parametros in grupos.items():
+            if not isinstance(parametros, list) or not all(isinstance(p, str) for p in parametros):
+                raise ValueError(f'Grupo {grupo}: informe uma lista de parâmetros.')
+
+        for especie, definicao in (estratos or {}).items():
+            ReferenceService._validar_estratos(especie, definicao, valores)
+
+        # RegraInvalida é um ValueError: a mensagem indica a regra e o problema na expressão
+        validar_regras([] if regras is None else regras, {especie: tuple(referencias) for especie, referencias in valores.items()})
+
+    @staticmethod
+    def _validar_estratos(especie, definicao, valores):
+        """Valida os grupos raciais, faixas etárias e intervalos estratificados de uma espécie."""
+        if especie not in valores:
+            raise ValueError(f'Estratos informados para a espécie {especie}, que não tem referência.')
+        if not isinstance(definicao, dict):
+            raise ValueError(f'Estratos inválidos para a espécie {especie}.')
+
+        grupos_raciais = definicao.get('grupos_raciais', {})
+        if not isinstance(grupos_raciais, dict) or not all(
+                isinstance(racas, list) and all(isinstance(r, str) for r in racas)
+                for racas in grupos_raciais.values()):
+            raise ValueError(f'{especie}: grupos_raciais deve ser um dicionário {{grupo: [racas]}}.')
+
+        nomes_faixas = set()
+        for faixa in definicao.get('faixas_etarias', []):
+            if not isinstance(faixa, dict) or not isinstance(faixa.get('nome'), str):
+                raise ValueError(f'{especie}: cada faixa etária precisa de um nome.')
+            inicio = faixa.get('min_meses', 0)
+            fim = faixa.get('max_meses', float('inf'))
+            if not all(_numerico(v) for v in (inicio, fim)) or inicio < 0 or inicio >= fim:
+                raise ValueError(f"{especie}/{faixa['nome']}: faixa etária inválida.")
+            nomes_faixas.add(faixa['nome'])
+
+        for intervalo in definicao.get('intervalos', []):
+            grupo = intervalo.get('grupo_racial')
+            faixa = intervalo.get('faixa_etaria')
+            if grupo is None and faixa is None:
+                raise ValueError(f'{especie}: cada intervalo precisa de grupo_racial e/ou faixa_etaria.')
+            if grupo is not None and grupo not in grupos_raciais:
+                raise ValueError(f'{especie}: grupo racial desconhecido ({grupo}).')
+            if faixa is not None and faixa not in nomes_faixas:
+                raise ValueError(f'{especie}: faixa etária desconhecida ({faixa}).')
+            for parametro, ref in intervalo.get('valores', {}).items():
+                if parametro not in valores[especie]:
+                    raise ValueError(f'{especie}: parâmetro {parametro} não existe na referência da espécie.')
+                _validar_faixa(f'{especie}/{grupo or faixa}/{parametro}', ref)
+
+    @staticmethod
+    def publicar(valores, grupos=None, descricao=None, user_id=None, estratos=None, regras=None):
+        """
+        Publica um novo conjunto de referências com a próxima versão e o coloca em uso.
+
+        Os demais workers passam a usá-lo na próxima verificação de versão.
+
+        Args:
+            valores: Dicionário {especie: {parametro: {"min", "max", "unidade"}}}
+            grupos: Dicionário {grupo: [parametros]} (padrão: grupos da versão em uso)
+            descricao: Descrição da alteração
+            user_id: ID do usuário que publicou
+            estratos: Intervalos por grupo racial e faixa etária (padrão: os da versão em uso)
+            regras: Regras diagnósticas (padrão: as da versão em uso)
+
+        Returns:
+            ReferenceSet: Conjunto publicado
+        """
+        if grupos is None:
+            grupos = AnalysisService.referencias_atuais().grupos
+        if estratos is None:
+            estratos = {
+                especie: definicao
+                for especie, definicao in AnalysisService.referencias_atuais().definicao_estratos.items()
+                if especie in valores
+            }
+        if regras is None:
+            regras = AnalysisService.referencias_atuais().regras
+        ReferenceService.validar(valores, grupos, estratos, regras)
+
+        for tentativa in range(TENTATIVAS_PUBLICACAO):
+            conjunto = ReferenceSet(
+                version=(ReferenceService.versao_publicada() or 0) + 1,
+                description=descricao,
+                created_by=user_id
+            )
+            conjunto.set_reference_values(valores)
+            conjunto.set_parameter_groups(grupos)
+            conjunto.set_strata(estratos)
+            conjunto.set_rules(regras)
+            db.session.add(conjunto)
+            try:
+                db.session.commit()
+                break
+            except IntegrityError:
+                # Outro worker publicou a mesma versão: tentar com a seguinte
+                db.session.rollback()
+                if tentativa == TENTATIVAS_PUBLICACAO - 1:
+                    raise
+
+        AnalysisService.aplicar_referencias(valores, grupos, conjunto.version, estratos, regras)
+        return conjunto
+
+    @staticmethod
+    def carregar(versao=None):
+        """
+        Compila um conjunto publicado e o coloca em uso.
+
+        Args:
+            versao: Versão a carregar (padrão: a mais recente)
+
+        Returns:
+            ReferenceSet: Conjunto carregado ou None se não houver conjuntos publicados
+        """
+        consulta = ReferenceSet.query
+        if versao is None:
+            conjunto = consulta.order_by(ReferenceSet.version.desc()).first()
+        else:
+            conjunto = consulta.filter_by(version=versao).first()
+
+        if conjunto is not None:
+            AnalysisService.aplicar_referencias(
+                conjunto.get_reference_values(), conjunto.get_parameter_groups(),
+                conjunto.version, conjunto.get_strata(), conjunto.get_rules())
+        return conjunto
+
+    @staticmethod
+    def verificar_atualizacao(intervalo=0):
+        """
+        Recarrega as referências se a versão publicada for diferente da versão em uso.
+
+        Args:
+            intervalo: Segundos mínimos entre duas consultas ao banco de dados
+
+        Returns:
+            bool: True se um novo conjunto foi carregado
+        """
+        agora = time.monotonic()
+        if agora - ReferenceService._ultima_verificacao < intervalo:
+            return False
+
+        # Apenas uma thread por worker consulta o banco; as demais seguem com o conjunto atual
+        if not ReferenceService._trava.acquire(blocking=False):
+            return False
+        try:
+            ReferenceService._ultima_verificacao = agora
+            publicada = ReferenceService.versao_publicada()
+            if publicada is None or publicada == AnalysisService.versao_referencias_publicada():
+                return False
+            return ReferenceService.carregar(publicada) is not None
+        finally:
+            ReferenceService._trava.release()
+
+    @staticmethod
+    def listar():
+        """Retorna os metadados de todos os conjuntos publicados, do mais recente ao mais antigo."""
+        return [conjunto.to_dict() for conjunto in ReferenceSet.query.order_by(ReferenceSet.version.desc()).all()]
+
+    @staticmethod
+    def obter(versao):
+        """Obtém um conjunto publicado pela versão ou None."""
+        return ReferenceSet.query.filter_by(version=versao).first()
+
+    @staticmethod
+    def compilado(versao):
+        """
+        Obtém uma versão publicada compilada, sem colocá-la em uso.
+
+        Os conjuntos publicados não mudam, então as versões compiladas são
+        memorizadas (as mais antigas são descartadas acima de MAXIMO_COMPILADOS).
+
+        Args:
+            versao: Versão publicada
+
+        Returns:
+            ConjuntoReferencias: Conjunto compilado ou None se a versão não existir
+        """
+        compilados = ReferenceService._compilados
+        referencias = compilados.get(versao)
+        if referencias is None:
+            conjunto = ReferenceService.obter(versao)
+            if conjunto is None:
+                return None
+            regras = conjunto.get_rules()
+            referencias = ConjuntoReferencias(
+                conjunto.get_reference_values(), conjunto.get_parameter_groups(),
+                conjunto.version, estratos=conjunto.get_strata(),
+                regras=AnalysisService.REGRAS_DIAGNOSTICAS_PADRAO if regras is None else regras)
+            if len(compilados) >= MAXIMO_COMPILADOS:
+                compilados.pop(next(iter(compilados)), None)
+            compilados[versao] = referencias
+        return referencias
+
+
+def _numerico(valor):
+    """Verifica se o valor é um número (bool não conta)."""
+    return isinstance(valor, numbers.Real) and not isinstance(valor, bool)
+
+
+def _validar_faixa(rotulo, ref):
+    """Valida um intervalo {"min", "max", "unidade"} de um parâmetro."""
+    if not isinstance(ref, dict) or not {'min', 'max', 'unidade'} <= ref.keys():
+        raise ValueError(f'{rotulo}: informe min, max e unidade.')
+    valor_min, valor_max = ref['min'], ref['max']
+    if not (_numerico(valor_min) and _numerico(valor_max)):
+        raise ValueError(f'{rotulo}: min e max devem ser numéricos.')
+    if valor_min < 0 or valor_min > valor_max:
+        raise ValueError(f'{rotulo}: faixa inválida ({valor_min} - {valor_max}).')
@@ -0,0 +1,198 @@
+"""
+Intervalos de referência estratificados por grupo racial e faixa etária.
+Para cada espécie, todas as combinações (grupo racial, faixa etária) são
+compiladas antecipadamente em tabelas de referência; a resolução de um paciente
+é uma consulta a dicionário, e idades e raças em texto livre são interpretadas
+uma única vez e memorizadas.
+"""
+
+import bisect
+import re
+import unicodedata
+from functools import lru_cache
+
+import numpy as np
+
+from services.reference_tables import TabelaReferencia
+
+# Fatores de conversão das unidades de idade para meses
+_MESES_POR_UNIDADE = {
+    "ano": 12.0, "anos": 12.0, "a": 12.0, "y": 12.0,
+    "mes": 1.0, "meses": 1.0, "m": 1.0,
+    "semana": 12.0 / 52, "semanas": 12.0 / 52, "sem": 12.0 / 52, "s": 12.0 / 52,
+    "dia": 12.0 / 365, "dias": 12.0 / 365, "d": 12.0 / 365,
+}
+
+_PADRAO_IDADE = re.compile(r"(\d+(?:[.,]\d+)?)\s*([a-z]*)")
+
+
+def _sem_acentos(texto):
+    """Remove acentos e converte para minúsculas."""
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+@lru_cache(maxsize=4096)
+def interpretar_idade(idade):
+    """
+    Converte uma idade em texto livre para meses.
+
+    Aceita "5 anos", "3 meses", "1 ano e 6 meses", "2a", "8m", "10 semanas" ou
+    "1,5 ano"; números sem unidade são interpretados como anos.
+
+    Args:
+        idade: Idade em texto ou número (anos)
+
+    Returns:
+        float: Idade em meses ou None se não for possível interpretar
+    """
+    if idade is None or isinstance(idade, bool):
+        return None
+    if isinstance(idade, (int, float)):
+        return float(idade) * 12 if idade >= 0 else None
+
+    meses = 0.0
+    encontrou = False
+    for numero, unidade in _PADRAO_IDADE.findall(_sem_acentos(str(idade))):
+        if unidade and unidade not in _MESES_POR_UNIDADE:
+            continue
+        meses += float(numero.replace(",", ".")) * _MESES_POR_UNIDADE.get(unidade, 12.0)
+        encontrou = True
+    return meses if encontrou else None
+
+
+@lru_cache(maxsize=1024)
+def normalizar_raca(raca):
+    """Normaliza o nome de uma raça para consulta (sem acentos, minúsculas, espaços simples)."""
+    if not raca:
+        return ""
+    return " ".join(_sem_acentos(str(raca)).replace("-", " ").split())
+
+
+class EstratosEspecie:
+    """
+    Tabelas de referência de uma espécie para cada combinação de grupo racial e faixa etária.
+
+    As tabelas compartilham a ordem de parâmetros da tabela base, de modo que os
+    limites de todos os estratos ficam empilhados em matrizes (estratos × parâmetros)
+    e o lote seleciona os limites de cada exame por indexação.
+    """
+
+    __slots__ = (
+        "especie", "base", "grupos_por_raca", "inicios_faixas", "faixas",
+        "tabelas", "posicoes", "minimos", "maximos",
+        "limites_inferiores", "limites_superiores"
+    )
+
+    def __init__(self, especie, valores_base, definicao=None):
+        """
+        Args:
+            especie: Espécie do animal
+            valores_base: Dicionário {parametro: {"min", "max", "unidade"}} da espécie
+            definicao: Dicionário com "grupos_raciais", "faixas_etarias" e "intervalos"
+        """
+        definicao = definicao or {}
+        base = TabelaReferencia(especie, valores_base)
+
+        grupos_por_raca = {}
+        for grupo, racas in definicao.get("grupos_raciais", {}).items():
+            for raca in racas:
+                grupos_por_raca[normalizar_raca(raca)] = grupo
+
+        # Faixas ordenadas pelo início; cada uma vale de min_meses (inclusive) a max_meses (exclusive)
+        faixas = sorted(
+            (
+                (faixa.get("min_meses", 0), faixa.get("max_meses", float("inf")), faixa["nome"])
+                for faixa in definicao.get("faixas_etarias", [])
+            )
+        )
+
+        # Sobreposições aplicadas da menos para a mais específica
+        intervalos = definicao.get("intervalos", [])
+
+        def valores_estrato(grupo, faixa):
+            valores = {parametro: dict(ref) for parametro, ref in valores_base.items()}
+            for criterio in ((grupo, None), (None, faixa), (grupo, faixa)):
+                if criterio == (None, None):
+                    continue
+                for intervalo in intervalos:
+                    if (intervalo.get("grupo_racial"), intervalo.get("faixa_etaria")) == criterio:
+                        for parametro, ref in intervalo["valores"].items():
+                            if parametro in valores:
+                                valores[parametro] = dict(ref)
+            return valores
+
+        tabelas = [base]
+        valores_tabelas = [valores_base]
+        posicoes = {}
+        for grupo in [None] + sorted(set(grupos_por_raca.values())):
+            for faixa in [None] + [nome for _, _, nome in faixas]:
+                valores = valores_estrato(grupo, faixa)
+                # Combinações com os mesmos valores (ex.: sem sobreposição) compartilham a tabela
+                if valores in valores_tabelas:
+                    posicoes[(grupo, faixa)] = valores_tabelas.index(valores)
+                    continue
+                posicoes[(grupo, faixa)] = len(tabelas)
+                tabelas.append(TabelaReferencia(especie, valores))
+                valores_tabelas.append(valores)
+
+        atribuir = object.__setattr__
+        atribuir(self, "especie", especie)
+        atribuir(self, "base", base)
+        atribuir(self, "grupos_por_raca", grupos_por_raca)
+        atribuir(self, "inicios_faixas", [inicio for inicio, _, _ in faixas])
+        atribuir(self, "faixas", tuple(faixas))
+        atribuir(self, "tabelas", tuple(tabelas))
+        atribuir(self, "posicoes", posicoes)
+        for atributo in ("minimos", "maximos", "limites_inferiores", "limites_superiores"):
+            matriz = np.stack([getattr(tabela, atributo) for tabela in tabelas])
+            matriz.setflags(write=False)
+            atribuir(self, atributo, matriz)
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("EstratosEspecie é imutável.")
+
+    def faixa_etaria(self, idade):
+        """
+        Obtém a faixa etária de uma idade em texto livre.
+
+        Returns:
+            str: Nome da faixa ou None (adulto, sem faixa específica)
+        """
+        meses = interpretar_idade(idade)
+        if meses is None or not self.faixas:
+            return None
+        posicao = bisect.bisect_right(self.inicios_faixas, meses) - 1
+        if posicao < 0:
+            return None
+        _, fim, nome = self.faixas[posicao]
+        return nome if meses < fim else None
+
+    def estrato(self, raca, idade):
+        """Retorna a chave (grupo racial, faixa etária) de um paciente."""
+        grupo = self.grupos_por_raca.get(normalizar_raca(raca)) if raca else None
+        return grupo, self.faixa_etaria(idade)
+
+    def posicao(self, raca, idade):
+        """Retorna o índice da tabela do paciente em tabelas e nas matrizes de limites."""
+        return self.posicoes[self.estrato(raca, idade)]
+
+    def __repr__(self):
+        return f'<EstratosEspecie {self.especie} ({len(self.tabelas)} tabelas)>'
+
+
+def compilar_estratos(valores_referencia, estratos):
+    """
+    Compila os estratos de todas as espécies com referência.
+
+    Args:
+        valores_referencia: Dicionário {especie: {parametro: {"min", "max", "unidade"}}}
+        estratos: Dicionário {especie: definição dos estratos}
+
+    Returns:
+        dict: {especie: EstratosEspecie}
+    """
+    return {
+        especie: EstratosEspecie(especie, valores, estratos.get(especie))
+        for especie, valores in valores_referencia.items()
+    }
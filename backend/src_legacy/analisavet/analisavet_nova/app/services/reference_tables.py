@@ -0,0 +1,179 @@
+"""
+Tabelas de referência compiladas para o serviço de análise do AnalisaVet.
+Pré-calcula, uma única vez por espécie, os limites ajustados pela regra de 15%
+e os textos de exibição das referências.
+"""
+
+import numpy as np
+
+from services.derived_indices import compilar_etapas, nomes_com_referencia, valores_com_indices
+from services.joint_rules import AvaliadorGrupos
+from services.rule_dsl import AvaliadorRegras
+
+# Margem tolerada pela regra de 15%
+MARGEM_REGRA = 0.15
+
+# Desvio percentual máximo das alterações leves e moderadas (acima disso é grave)
+CORTES_GRAVIDADE = (30, 50)
+
+
+class TabelaReferencia:
+    """
+    Tabela imutável com os valores de referência de uma espécie.
+
+    Os vetores NumPy (somente leitura) atendem a análise em lote e as tuplas de
+    floats atendem o caminho unitário sem o custo de indexar arrays escalares.
+    """
+
+    __slots__ = (
+        "especie", "parametros", "indices", "unidades",
+        "minimos", "maximos", "minimos_escalares", "maximos_escalares",
+        "limites_inferiores", "limites_superiores",
+        "textos_referencia", "textos_exibicao", "linhas", "derivados"
+    )
+
+    def __init__(self, especie, valores_referencia):
+        """
+        Compila a tabela a partir do dicionário de referências de uma espécie.
+
+        Args:
+            especie: Espécie do animal (Cão ou Gato)
+            valores_referencia: Dicionário {parametro: {"min", "max", "unidade"}}
+        """
+        parametros = tuple(valores_referencia)
+        minimos = [valores_referencia[p]["min"] for p in parametros]
+        maximos = [valores_referencia[p]["max"] for p in parametros]
+        unidades = tuple(valores_referencia[p]["unidade"] for p in parametros)
+
+        # Mesmas operações de aplicar_regra_15_porcento, para resultados idênticos
+        limites_inferiores = [v_min - v_min * MARGEM_REGRA for v_min in minimos]
+        limites_superiores = [v_max + v_max * MARGEM_REGRA for v_max in maximos]
+
+        # Os textos usam os valores originais para preservar a formatação (12 e não 12.0)
+        textos_referencia = tuple(
+            f"{v_min} - {v_max} {unidade}" for v_min, v_max, unidade in zip(minimos, maximos, unidades))
+        textos_exibicao = tuple(
+            f"{v_min}-{v_max} {unidade}" for v_min, v_max, unidade in zip(minimos, maximos, unidades))
+
+        atribuir = object.__setattr__
+        atribuir(self, "especie", especie)
+        atribuir(self, "parametros", parametros)
+        atribuir(self, "indices", {parametro: indice for indice, parametro in enumerate(parametros)})
+        atribuir(self, "unidades", unidades)
+        atribuir(self, "minimos", _vetor_somente_leitura(minimos))
+        atribuir(self, "maximos", _vetor_somente_leitura(maximos))
+        atribuir(self, "minimos_escalares", tuple(float(v) for v in minimos))
+        atribuir(self, "maximos_escalares", tuple(float(v) for v in maximos))
+        atribuir(self, "limites_inferiores", _vetor_somente_leitura(limites_inferiores))
+        atribuir(self, "limites_superiores", _vetor_somente_leitura(limites_superiores))
+        atribuir(self, "textos_referencia", textos_referencia)
+        atribuir(self, "textos_exibicao", textos_exibicao)
+        atribuir(self, "linhas", tuple(zip(
+            parametros, minimos, maximos, limites_inferiores, limites_superiores, textos_referencia)))
+        # Posições das linhas de índices derivados, que dependem dos índices registrados no processo
+        indices_derivados = nomes_com_referencia()
+        atribuir(self, "derivados", frozenset(
+            indice for indice, parametro in enumerate(parametros) if parametro in indices_derivados))
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("TabelaReferencia é imutável.")
+
+    def __delattr__(self, nome):
+        raise AttributeError("TabelaReferencia é imutável.")
+
+    def __len__(self):
+        return len(self.parametros)
+
+    def valores_exibicao(self):
+        """Retorna {parametro: "min-max unidade"} para exibição no frontend."""
+        return dict(zip(self.parametros, self.textos_exibicao))
+
+    def __repr__(self):
+        return f'<TabelaReferencia {self.especie} ({len(self.parametros)} parâmetros)>'
+
+
+def _vetor_somente_leitura(valores):
+    """Converte uma lista em array float64 protegido contra escrita."""
+    vetor = np.array(valores, dtype=float)
+    vetor.setflags(write=False)
+    return vetor
+
+
+def compilar_tabelas(valores_referencia):
+    """
+    Compila as tabelas de todas as espécies.
+
+    Args:
+        valores_referencia: Dicionário {especie: {parametro: {"min", "max", "unidade"}}}
+
+    Returns:
+        dict: {especie: TabelaReferencia}
+    """
+    return {
+        especie: TabelaReferencia(especie, valores)
+        for especie, valores in valores_referencia.items()
+    }
+
+
+class ConjuntoReferencias:
+    """
+    Referências compiladas de todas as espécies com os grupos de interpretação conjunta,
+    as regras diagnósticas e os intervalos estratificados por grupo racial e faixa etária.
+
+    O serviço de análise troca o conjunto inteiro com uma única atribuição; quem já
+    obteve um conjunto continua usando tabelas, avaliadores e versão coerentes entre si.
+    """
+
+    __slots__ = ("versao", "geracao", "valores", "grupos", "definicao_estratos",
+                 "estratos", "tabelas", "avaliadores", "regras", "avaliadores_regras", "etapas_indices")
+
+    def __init__(self, valores_referencia, grupos_parametros, versao=None, geracao=0, estratos=None, regras=None):
+        """
+        Args:
+            valores_referencia: Dicionário {especie: {parametro: {"min", "max", "unidade"}}}
+            grupos_parametros: Dicionário {grupo: [parametros]}
+            versao: Versão publicada no banco de dados (None para referências locais)
+            geracao: Contador local que identifica o conjunto no cache de análises
+            estratos: Dicionário {especie: definição dos estratos} (ver reference_strata)
+            regras: Lista de regras diagnósticas (ver rule_dsl)
+        """
+        # Importação local: reference_strata depende de TabelaReferencia
+        from services.reference_strata import compilar_estratos
+
+        estratos = estratos or {}
+        regras = regras or []
+        # Os índices derivados com referência viram linhas da tabela, após os parâmetros informados
+        estratos_compilados = compilar_estratos(valores_com_indices(valores_referencia), estratos)
+
+        atribuir = object.__setattr__
+        atribuir(self, "versao", versao)
+        atribuir(self, "geracao", geracao)
+        atribuir(self, "valores", valores_referencia)
+        atribuir(self, "grupos", grupos_parametros)
+        atribuir(self, "definicao_estratos", estratos)
+        atribuir(self, "estratos", estratos_compilados)
+        # Tabela base de cada espécie (sem estrato); os estratos mantêm a mesma ordem de parâmetros
+        atribuir(self, "tabelas", {
+            especie: estratos_especie.base for especie, estratos_especie in estratos_compilados.items()
+        })
+        atribuir(self, "avaliadores", {
+            especie: AvaliadorGrupos(grupos_parametros, estratos_especie.base.parametros)
+            for especie, estratos_especie in estratos_compilados.items()
+        })
+        atribuir(self, "etapas_indices", compilar_etapas({
+            especie: estratos_especie.base.parametros for especie, estratos_especie in estratos_compilados.items()
+        }))
+        atribuir(self, "regras", regras)
+        atribuir(self, "avaliadores_regras", {
+            especie: AvaliadorRegras(regras, especie, estratos_especie.base.parametros)
+            for especie, estratos_especie in estratos_compilados.items()
+        })
+
+    def __setattr__(self, nome, valor):
+        raise AttributeError("ConjuntoReferencias é imutável.")
+
+    def __delattr__(self, nome):
+        raise AttributeError("ConjuntoReferencias é imutável.")
+
+    def __repr__(self):
+        return f'<ConjuntoReferencias versão {self.versao} ({len(self.tabelas)} espécies)>'
@@ -0,0 +1,439 @@
+"""
+Regras diagnósticas configuráveis do AnalisaVet.
+
+Cada regra é uma expressão sobre os parâmetros do hemograma, por exemplo:
+
+    hematocrito < MIN(hematocrito) and reticulocitos > MAX(reticulocitos)
+    segmentados : linfocitos                      (relação neutrófilo:linfócito)
+
+com operadores aritméticos (+ - * / e ":" como razão), comparações (< <= > >=),
+and/or (ou e/ou) e as referências MIN(parametro) e MAX(parametro) do estrato do
+paciente. Parâmetros ausentes e divisões por zero valem NaN, e qualquer
+comparação com NaN é falsa.
+
+As expressões são analisadas uma única vez e compiladas em funções Python (para
+um exame) e em expressões NumPy (para as matrizes do lote); a compilação é
+memorizada por expressão e ordem de parâmetros.
+"""
+
+import math
+import re
+from functools import lru_cache
+
+import numpy as np
+
+# Gravidades aceitas nas faixas das regras, da mais leve à mais grave
+GRAVIDADES_REGRA = ("leve", "moderada", "grave")
+
+_TOKEN = re.compile(r"\s*(?:(?P<numero>\d+(?:\.\d+)?)|(?P<nome>[A-Za-z_][A-Za-z0-9_]*)|(?P<simbolo><=|>=|[<>()+\-*/:]))")
+_E = frozenset(("and", "e"))
+_OU = frozenset(("or", "ou"))
+_COMPARACOES = frozenset(("<", "<=", ">", ">="))
+_REFERENCIAS = {"min": "mn", "max": "mx"}
+
+
+class RegraInvalida(ValueError):
+    """Expressão ou definição de regra diagnóstica inválida."""
+
+
+class ParametroDesconhecido(RegraInvalida):
+    """A expressão usa um parâmetro que não existe na tabela da espécie."""
+
+
+def _dividir(a, b):
+    return a / b if b else math.nan
+
+
+def _dividir_vetor(a, b):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(b == 0, np.nan, np.divide(a, b))
+
+
+def _tokens(texto):
+    """Divide a expressão em tokens (tipo, valor)."""
+    tokens = []
+    posicao = 0
+    texto = texto.rstrip()
+    while posicao < len(texto):
+        encontrado = _TOKEN.match(texto, posicao)
+        if encontrado is None or encontrado.end() == posicao:
+            raise RegraInvalida(f"Caractere inesperado na posição {posicao}: {texto[posicao:posicao + 10]!r}")
+        tipo = encontrado.lastgroup
+        tokens.append((tipo, encontrado.group(tipo)))
+        posicao = encontrado.end()
+    return tokens
+
+
+def nomes_expressao(texto):
+    """
+    Lista os nomes de parâmetros usados em uma expressão (sem operadores e referências).
+
+    Args:
+        texto: Expressão da DSL
+
+    Returns:
+        list: Nomes em minúsculas, na ordem em que aparecem (sem repetição)
+    """
+    nomes = []
+    for tipo, valor in _tokens(texto):
+        nome = valor.lower()
+        if tipo == "nome" and nome not in _E | _OU and nome not in _REFERENCIAS and nome not in nomes:
+            nomes.append(nome)
+    return nomes
+
+
+class _Analisador:
+    """Analisador descendente recursivo que gera o código Python e o código NumPy da expressão."""
+
+    def __init__(self, texto, indices):
+        self.tokens = _tokens(texto)
+        self.posicao = 0
+        self.indices = indices
+
+    def _atual(self):
+        return self.tokens[self.posicao] if self.posicao < len(self.tokens) else (None, None)
+
+    def _palavra(self, palavras):
+        tipo, valor = self._atual()
+        if tipo == "nome" and valor.lower() in palavras:
+            self.posicao += 1
+            return True
+        return False
+
+    def _simbolo(self, simbolos):
+        tipo, valor = self._atual()
+        if tipo == "simbolo" and valor in simbolos:
+            self.posicao += 1
+            return valor
+        return None
+
+    def _esperar(self, simbolo):
+        if self._simbolo((simbolo,)) is None:
+            raise RegraInvalida(f"Esperado {simbolo!r} na posição do token {self.posicao + 1}.")
+
+    def analisar(self):
+        """Retorna (booleana, código escalar, código vetorizado)."""
+        no = self._ou()
+        if self.posicao != len(self.tokens):
+            raise RegraInvalida(f"Token inesperado: {self._atual()[1]!r}")
+        return no
+
+    def _logico(self, proximo, palavras, juncao_escalar, juncao_vetor):
+        nos = [proximo()]
+        while self._palavra(palavras):
+            nos.append(proximo())
+        if len(nos) == 1:
+            return nos[0]
+        if not all(booleano for booleano, _, _ in nos):
+            raise RegraInvalida("and/or exigem comparações dos dois lados.")
+        return (True,
+                "(" + juncao_escalar.join(escalar for _, escalar, _ in nos) + ")",
+                "(" + juncao_vetor.join(vetor for _, _, vetor in nos) + ")")
+
+    def _ou(self):
+        return self._logico(self._e, _OU, " or ", " | ")
+
+    def _e(self):
+        return self._logico(self._comparacao, _E, " and ", " & ")
+
+    def _comparacao(self):
+        esquerda = self._soma()
+        operador = self._simbolo(_COMPARACOES)
+        if operador is None:
+            return esquerda
+        direita = self._soma()
+        if esquerda[0] or direita[0]:
+            raise RegraInvalida("Comparações exigem valores numéricos dos dois lados.")
+        return (True,
+                f"({esquerda[1]} {operador} {direita[1]})",
+                f"({esquerda[2]} {operador} {direita[2]})")
+
+    def _aritmetica(self, proximo, simbolos):
+        esquerda = proximo()
+        operador = self._simbolo(simbolos)
+        while operador is not None:
+            direita = proximo()
+            if esquerda[0] or direita[0]:
+                raise RegraInvalida(f"O operador {operador!r} exige valores numéricos.")
+            if operador in ("/", ":"):
+                esquerda = (False, f"_dividir({esquerda[1]}, {direita[1]})",
+                            f"_dividir_vetor({esquerda[2]}, {direita[2]})")
+            else:
+                esquerda = (False, f"({esquerda[1]} {operador} {direita[1]})",
+                            f"({esquerda[2]} {operador} {direita[2]})")
+            operador = self._simbolo(simbolos)
+        return esquerda
+
+    def _soma(self):
+        return self._aritmetica(self._produto, ("+", "-"))
+
+    def _produto(self):
+        return self._aritmetica(self._unario, ("*", "/", ":"))
+
+    def _unario(self):
+        if self._simbolo(("-",)):
+            booleano, escalar, vetor = self._unario()
+            if booleano:
+                raise RegraInvalida("O sinal negativo exige um valor numérico.")
+            return (False, f"(-{escalar})", f"(-{vetor})")
+        return self._atomo()
+
+    def _parametro(self, nome):
+        indice = self.indices.get(nome.lower())
+        if indice is None:
+            raise ParametroDesconhecido(f"Parâmetro desconhecido: {nome}")
+        return indice
+
+    def _atomo(self):
+        tipo, valor = self._atual()
+        if tipo == "numero":
+            self.posicao += 1
+            numero = repr(float(valor))
+            return (False, numero, numero)
+        if tipo == "nome":
+            self.posicao += 1
+            referencia = _REFERENCIAS.get(valor.lower())
+            if referencia is not None and self._simbolo(("(",)):
+                tipo_parametro, nome = self._atual()
+                if tipo_parametro != "nome":
+                    raise RegraInvalida(f"{valor.upper()} exige o nome de um parâmetro.")
+                self.posicao += 1
+                self._esperar(")")
+                indice = self._parametro(nome)
+                return (False, f"{referencia}[{indice}]", f"{referencia}[..., {indice}]")
+            indice = self._parametro(valor)
+            return (False, f"v[{indice}]", f"m[:, {indice}]")
+        if self._simbolo(("(",)):
+            no = self._ou()
+            self._esperar(")")
+            return no
+        raise RegraInvalida(f"Expressão incompleta ou token inesperado: {valor!r}")
+
+
+@lru_cache(maxsize=1024)
+def compilar_expressao(texto, parametros):
+    """
+    Compila uma expressão da DSL para a ordem de parâmetros de uma tabela.
+
+    Args:
+        texto: Expressão da regra
+        parametros: Tupla de parâmetros na ordem da tabela de referência
+
+    Returns:
+        tuple: (booleana, função(v, mn, mx), função vetorizada(m, mn, mx))
+    """
+    indices = {parametro.lower(): indice for indice, parametro in enumerate(parametros)}
+    booleano, escalar, vetor = _Analisador(texto, indices).analisar()
+    # O código é gerado apenas a partir dos tokens validados (índices, números e operadores)
+    ambiente = {"__builtins__": {}, "_dividir": _dividir, "_dividir_vetor": _dividir_vetor}
+    funcao = eval(compile(f"lambda v, mn, mx: {escalar}", "<regra>", "eval"), ambiente)
+    funcao_vetor = eval(compile(f"lambda m, mn, mx: {vetor}", "<regra>", "eval"), ambiente)
+    return booleano, funcao, funcao_vetor
+
+
+class RegraDiagnostica:
+    """Regra compilada: condição opcional, valor opcional com faixas de gravidade e texto."""
+
+    __slots__ = ("nome", "interpretacao", "condicao", "condicao_vetor", "valor", "valor_vetor",
+                 "limites", "gravidades", "decrescente")
+
+    def __init__(self, definicao, parametros):
+        """
+        Args:
+            definicao: Dicionário {"nome", "interpretacao", "condicao"?, "valor"?, "faixas"?}
+                (faixas: {gravidade: limite}; limites decrescentes indicam gravidade por queda)
+            parametros: Tupla de parâmetros na ordem da tabela de referência
+        """
+        if not isinstance(definicao, dict) or not definicao.get("nome"):
+            raise RegraInvalida("Toda regra precisa de um nome.")
+        nome = definicao["nome"]
+        condicao = definicao.get("condicao")
+        valor = definicao.get("valor")
+        faixas = definicao.get("faixas") or {}
+
+        if any(e is not None and not isinstance(e, str) for e in (condicao, valor)):
+            raise RegraInvalida(f"As expressões da regra {nome!r} devem ser textos.")
+        if not isinstance(faixas, dict):
+            raise RegraInvalida(f"As faixas da regra {nome!r} devem ser um dicionário {{gravidade: limite}}.")
+        if condicao is None and not faixas:
+            raise RegraInvalida(f"A regra {nome!r} precisa de uma condição ou de faixas de gravidade.")
+        if faixas and valor is None:
+            raise RegraInvalida(f"A regra {nome!r} tem faixas de gravidade sem a expressão de valor.")
+        desconhecidas = set(faixas) - set(GRAVIDADES_REGRA)
+        if desconhecidas:
+            raise RegraInvalida(f"Gravidades desconhecidas na regra {nome!r}: {sorted(desconhecidas)}")
+
+        self.nome = nome
+        self.interpretacao = definicao.get("interpretacao", "")
+        self.condicao = self.condicao_vetor = self.valor = self.valor_vetor = None
+        try:
+            if condicao is not None:
+                booleano, self.condicao, self.condicao_vetor = compilar_expressao(condicao, parametros)
+                if not booleano:
+                    raise RegraInvalida("a condição deve ser uma comparação")
+            if valor is not None:
+                booleano, self.valor, self.valor_vetor = compilar_expressao(valor, parametros)
+                if booleano:
+                    raise RegraInvalida("o valor deve ser uma expressão numérica")
+        except RegraInvalida as erro:
+            raise type(erro)(f"Regra {nome!r}: {erro}") from None
+
+        self.gravidades = tuple(g for g in GRAVIDADES_REGRA if g in faixas)
+        self.limites = tuple(float(faixas[g]) for g in self.gravidades)
+        self.decrescente = len(self.limites) > 1 and self.limites[0] > self.limites[-1]
+        ordenados = sorted(self.limites, reverse=self.decrescente)
+        if list(self.limites) != ordenados or len(set(self.limites)) != len(self.limites):
+            raise RegraInvalida(f"As faixas da regra {nome!r} devem ser monotônicas da leve à grave.")
+
+    def _nivel(self, valor):
+        if self.decrescente:
+            return sum(valor <= limite for limite in self.limites)
+        return sum(valor >= limite for limite in self.limites)
+
+    def _resultado(self, nivel, valor):
+        return {
+            "regra": self.nome,
+            "gravidade": self.gravidades[nivel - 1] if nivel else None,
+            "valor": round(valor, 2) if self.valor is not None and not math.isnan(valor) else None,
+            "interpretacao": self.interpretacao
+        }
+
+    def avaliar(self, v, mn, mx):
+        """Avalia a regra para um exame; retorna o padrão identificado ou None."""
+        if self.condicao is not None and not self.condicao(v, mn, mx):
+            return None
+        valor = self.valor(v, mn, mx) if self.valor is not None else math.nan
+        nivel = self._nivel(valor) if self.limites else 0
+        if self.limites and not nivel:
+            return None
+        return self._resultado(nivel, valor)
+
+    def avaliar_lote(self, m, mn, mx):
+        """
+        Avalia a regra para todas as linhas da matriz.
+
+        Returns:
+            tuple: (linhas disparadas, níveis de gravidade, valores) como listas
+        """
+        total = m.shape[0]
+        disparou = np.ones(total, dtype=bool)
+        if self.condicao_vetor is not None:
+            disparou &= np.broadcast_to(self.condicao_vetor(m, mn, mx), (total,))
+        if self.valor_vetor is not None:
+            valores = np.broadcast_to(np.asarray(self.valor_vetor(m, mn, mx), dtype=float), (total,))
+        else:
+            valores = np.full(total, np.nan)
+
+        niveis = np.zeros(total, dtype=np.int8)
+        if self.limites:
+            for limite in self.limites:
+                niveis += (valores <= limite) if self.decrescente else (valores >= limite)
+            disparou &= niveis > 0
+
+        linhas = np.flatnonzero(disparou)
+        return linhas.tolist(), niveis[linhas].tolist(), valores[linhas].tolist()
+
+
+class AvaliadorRegras:
+    """Regras diagnósticas de uma espécie compiladas para a ordem de parâmetros da tabela."""
+
+    __slots__ = ("regras",)
+
+    def __init__(self, definicoes, especie, parametros):
+        """
+        Args:
+            definicoes: Lista de definições de regra (ver RegraDiagnostica)
+            especie: Espécie da tabela; regras com "especies" que não a incluem são ignoradas,
+                assim como regras com parâmetros que a tabela da espécie não tem
+            parametros: Parâmetros na ordem da tabela de referência
+        """
+        parametros = tuple(parametros)
+        regras = []
+        for definicao in definicoes:
+            if not _aplicavel(definicao, especie):
+                continue
+            try:
+                regras.append(RegraDiagnostica(definicao, parametros))
+            except ParametroDesconhecido:
+                continue
+        self.regras = tuple(regras)
+
+    def avaliar(self, valores, minimos, maximos):
+        """
+        Avalia as regras para um exame.
+
+        Args:
+            valores: Lista de floats na ordem da tabela (NaN para ausentes)
+            minimos: Lista de mínimos do estrato do paciente
+            maximos: Lista de máximos do estrato do paciente
+
+        Returns:
+            list: Padrões identificados, na ordem das regras
+        """
+        padroes = []
+        for regra in self.regras:
+            padrao = regra.avaliar(valores, minimos, maximos)
+            if padrao is not None:
+                padroes.append(padrao)
+        return padroes
+
+    def avaliar_lote(self, matriz, minimos, maximos):
+        """
+        Avalia as regras para uma matriz exames × parâmetros (NaN para ausentes).
+
+        Args:
+            matriz: Matriz de valores
+            minimos: Vetor de mínimos ou matriz com os mínimos de cada linha
+            maximos: Vetor de máximos ou matriz com os máximos de cada linha
+
+        Returns:
+            list: Lista (uma por exame) de padrões identificados
+        """
+        resultados = [[] for _ in range(matriz.shape[0])]
+        for regra in self.regras:
+            for linha, nivel, valor in zip(*regra.avaliar_lote(matriz, minimos, maximos)):
+                resultados[linha].append(regra._resultado(nivel, valor))
+        return resultados
+
+    def __len__(self):
+        return len(self.regras)
+
+
+def validar_regras(definicoes, parametros_por_especie):
+    """
+    Valida um conjunto de regras compilando-o para cada espécie.
+
+    Args:
+        definicoes: Lista de definições de regra
+        parametros_por_especie: Dicionário {especie: parametros}
+
+    Raises:
+        RegraInvalida: Se alguma regra não puder ser compilada
+    """
+    if not isinstance(definicoes, list) or not all(isinstance(d, dict) for d in definicoes):
+        raise RegraInvalida("As regras devem ser uma lista de objetos.")
+    nomes = [definicao.get("nome") for definicao in definicoes]
+    if len(set(nomes)) != len(nomes):
+        raise RegraInvalida("Os nomes das regras devem ser únicos.")
+
+    for definicao in definicoes:
+        if not isinstance(definicao.get("especies", []), list):
+            raise RegraInvalida(f"Regra {definicao.get('nome')!r}: especies deve ser uma lista.")
+        # Um parâmetro ausente em uma espécie apenas desativa a regra nela; em todas, é erro
+        erros = []
+        compiladas = 0
+        for especie, parametros in parametros_por_especie.items():
+            if not _aplicavel(definicao, especie):
+                continue
+            try:
+                RegraDiagnostica(definicao, tuple(parametros))
+                compiladas += 1
+            except ParametroDesconhecido as erro:
+                erros.append(erro)
+        if erros and not compiladas:
+            raise erros[0]
+
+
+def _aplicavel(definicao, especie):
+    """Verifica se a regra se aplica à espécie (sem "especies", vale para todas)."""
+    return especie in definicao.get("especies", (especie,))
@@ -0,0 +1,67 @@
+"""
+Códigos de gravidade e direção das alterações do AnalisaVet.
+A classificação trabalha com inteiros pequenos e só converte para texto
+("baixo_leve", "alto_grave", ...) na montagem do resultado.
+"""
+
+from enum import IntEnum
+
+import numpy as np
+
+
+class Gravidade(IntEnum):
+    """Gravidade de uma alteração segundo a regra de 15%."""
+    NORMAL = 0
+    LEVE = 1
+    MODERADA = 2
+    GRAVE = 3
+
+
+class Direcao(IntEnum):
+    """Direção de uma alteração em relação à faixa de referência."""
+    NORMAL = 0
+    BAIXO = 1
+    ALTO = 2
+
+
+# Código do tipo de alteração: 0 = normal, 1-3 = baixo leve/moderada/grave, 4-6 = alto leve/moderada/grave
+TIPOS_ALTERACAO = ("normal", "baixo_leve", "baixo_moderada", "baixo_grave",
+                   "alto_leve", "alto_moderada", "alto_grave")
+
+# Gravidade e direção de cada código de tipo
+GRAVIDADE_DO_TIPO = (Gravidade.NORMAL, Gravidade.LEVE, Gravidade.MODERADA, Gravidade.GRAVE,
+                     Gravidade.LEVE, Gravidade.MODERADA, Gravidade.GRAVE)
+DIRECAO_DO_TIPO = (Direcao.NORMAL, Direcao.BAIXO, Direcao.BAIXO, Direcao.BAIXO,
+                   Direcao.ALTO, Direcao.ALTO, Direcao.ALTO)
+
+# Versões em array para indexação vetorizada no lote
+GRAVIDADE_DO_TIPO_VETOR = np.array(GRAVIDADE_DO_TIPO, dtype=np.int8)
+DIRECAO_DO_TIPO_VETOR = np.array(DIRECAO_DO_TIPO, dtype=np.int8)
+
+
+def codigo_tipo(direcao, gravidade):
+    """Combina direção e gravidade no código do tipo de alteração."""
+    if direcao == Direcao.NORMAL:
+        return 0
+    return (direcao - 1) * 3 + gravidade
+
+
+def nova_contagem():
+    """Contador de alterações indexado por Gravidade: [normais, leves, moderadas, graves]."""
+    return [0, 0, 0, 0]
+
+
+def contagens_lote(tipos, presentes):
+    """
+    Conta as alterações de cada gravidade por exame a partir da matriz de códigos.
+
+    Args:
+        tipos: Matriz exames × parâmetros com os códigos de tipo
+        presentes: Matriz booleana dos valores informados
+
+    Returns:
+        list: Uma contagem [normais, leves, moderadas, graves] por exame
+    """
+    gravidades = np.where(presentes, GRAVIDADE_DO_TIPO_VETOR[tipos], -1)
+    contagens = np.stack([(gravidades == gravidade).sum(axis=1) for gravidade in Gravidade], axis=1)
+    return contagens.tolist()
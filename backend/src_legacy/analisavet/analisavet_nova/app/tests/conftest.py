@@ -4,9 +4,11 @@ Configurações para testes do aplicativo AnalisaVet.
 
 import pytest
 import os
+import random
 import tempfile
 from app import create_app
 from models.models import db, User
+from services.analysis_service import AnalysisService
 
 @pytest.fixture
 def app():
@@ -34,6 +36,8 @@ def app():
     yield app
     
     # Limpar após os testes
+    app.extensions['fila_jobs'].encerrar()
+    app.extensions['analisador_paralelo'].encerrar()
     os.close(db_fd)
     os.unlink(db_path)
 
@@ -46,3 +50,37 @@ def client(app):
 def runner(app):
     """Cria um runner de linha de comando para o aplicativo Flask."""
     return app.test_cli_runner()
+
+@pytest.fixture
+def restaurar_referencias(monkeypatch):
+    """Restaura o conjunto de referências em uso ao final do teste."""
+    for atributo in ('VALORES_REFERENCIA', 'GRUPOS_PARAMETROS', 'ESTRATOS_REFERENCIA', 'REGRAS_DIAGNOSTICAS',
+                     '_referencias', '_versao_referencias'):
+        monkeypatch.setattr(AnalysisService, atributo, getattr(AnalysisService, atributo))
+
+def _gerar_hemogramas(quantidade, semente=42):
+    """Gera hemogramas aleatórios (e os dados dos pacientes) em torno dos valores de referência."""
+    gerador = random.Random(semente)
+    hemogramas = []
+    pacientes = []
+    for _ in range(quantidade):
+        especie = gerador.choice(['Cão', 'Gato'])
+        referencias = AnalysisService.VALORES_REFERENCIA[especie]
+        hemograma = {}
+        for parametro, ref in referencias.items():
+            if gerador.random() < 0.1:
+                hemograma[parametro] = None
+            else:
+                hemograma[parametro] = round(gerador.uniform(ref['min'] * 0.3, ref['max'] * 1.8 + 1), 2)
+        hemogramas.append(hemograma)
+        pacientes.append({
+            'especie': especie,
+            'raca': gerador.choice([None, 'SRD', 'Greyhound', 'whippet']),
+            'idade': gerador.choice([None, '3 meses', '5 anos', '1 ano e 2 meses', 2, 'idade ignorada'])
+        })
+    return hemogramas, pacientes
+
+@pytest.fixture
+def gerar_hemogramas():
+    """Gerador de hemogramas aleatórios: gerar_hemogramas(quantidade, semente=42)."""
+    return _gerar_hemogramas
@@ -5,6 +5,9 @@ Testes para as rotas de análise e valores de referência do aplicativo AnalisaV
 import json
 import pytest
 import io
+from models.models import User, db
+from services.analysis_service import AnalysisService
+from services.parallel_analysis import AnalisadorParalelo
 
 def test_valores_referencia_cao(client):
     """Testa a obtenção de valores de referência para cães."""
@@ -149,3 +152,107 @@ def test_upload_arquivo_requer_login(client):
     
     # Deve redirecionar para login ou retornar 401/403
     assert response.status_code in [302, 401, 403]
+
+def test_analise_hemograma_usa_especie_informada(client):
+    """Testa que a espécie informada define as referências da análise."""
+    client.post('/api/auth/login', 
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+    
+    response = client.post('/api/analysis/analyze', json={'especie': 'Gato', 'hemacias': 6.0})
+    data = json.loads(response.data)
+    
+    assert response.status_code == 200
+    assert data['data']['parametros']['hemacias']['referencia'] == '5.0 - 10.0 10⁶/µL'
+    assert 'especie' not in data['data']['parametros']
+
+def _ler_ndjson(response):
+    """Converte a resposta NDJSON em lista de objetos."""
+    return [json.loads(linha) for linha in response.data.decode('utf-8').splitlines() if linha]
+
+def _creditos_gravados(app):
+    """Lê do banco os créditos do usuário de teste."""
+    with app.app_context():
+        return User.query.filter_by(email='teste@example.com').first().credits
+
+def test_analise_lote_array_json(client, app):
+    """Testa a análise em lote a partir de um array JSON."""
+    client.post('/api/auth/login', 
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+    
+    lote = [
+        {'especie': 'Cão', 'nome_paciente': 'Rex', 'hemacias': 6.5, 'hemoglobina': 15.0},
+        {'especie': 'Gato', 'hemacias': 2.0, 'hemoglobina': 4.0},
+        {'hemacias': 6.5}
+    ]
+    response = client.post('/api/analysis/batch', json=lote)
+    linhas = _ler_ndjson(response)
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert [linha['indice'] for linha in linhas[:3]] == [0, 1, 2]
+    assert linhas[0]['success'] == True
+    assert linhas[1]['data']['parametros']['hemacias']['status'] == 'baixo_grave'
+    assert linhas[2]['success'] == False
+    assert linhas[3]['resumo'] == {'total': 3, 'sucesso': 2, 'erros': 1, 'creditos_restantes': 8}
+    assert _creditos_gravados(app) == 8
+
+def test_analise_lote_ndjson_com_erros_por_item(client):
+    """Testa que erros em itens NDJSON não interrompem o lote."""
+    client.post('/api/auth/login', 
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+    
+    corpo = '\n'.join([
+        json.dumps({'especie': 'Cão', 'hemacias': 6.5}),
+        '{linha invalida',
+        json.dumps({'especie': 'Cão', 'hemacias': 'muitas'}),
+        json.dumps({'especie': 'Gato', 'plaquetas': 300000})
+    ])
+    response = client.post('/api/analysis/batch', data=corpo, content_type='application/x-ndjson')
+    linhas = _ler_ndjson(response)
+    
+    assert [linha.get('success') for linha in linhas[:4]] == [True, False, False, True]
+    assert 'inválida' in linhas[1]['error']
+    assert 'hemacias' in linhas[2]['error']
+
+def test_analise_lote_creditos_insuficientes(client, app):
+    """Testa que itens além dos créditos disponíveis são recusados individualmente."""
+    client.post('/api/auth/login', 
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+    
+    response = client.post('/api/analysis/batch',
+                           json=[{'especie': 'Cão', 'hemacias': 6.5}] * 12)
+    linhas = _ler_ndjson(response)
+    
+    assert sum(1 for linha in linhas[:12] if linha['success']) == 10
+    assert linhas[11]['error'] == 'Créditos insuficientes.'
+    assert linhas[12]['resumo']['creditos_restantes'] == 0
+    assert _creditos_gravados(app) == 0
+
+def test_analise_lote_excede_limite(client, app):
+    """Testa a recusa de lotes maiores que o limite configurado."""
+    app.config['LOTE_MAX_ITENS'] = 2
+    client.post('/api/auth/login', 
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+    
+    response = client.post('/api/analysis/batch', json=[{'especie': 'Cão'}] * 3)
+    
+    assert response.status_code == 413
+
+def test_analise_lote_grande_usa_processos(client, app, gerar_hemogramas):
+    """Testa que um lote maior que o bloco dos processos é analisado no pool, com o mesmo resultado."""
+    with app.app_context():
+        User.query.filter_by(email='teste@example.com').first().credits = 100
+        db.session.commit()
+    analisador = app.extensions['analisador_paralelo'] = AnalisadorParalelo(processos=2, tamanho_bloco=20)
+    hemogramas, pacientes = gerar_hemogramas(60, semente=5)
+    client.post('/api/auth/login', 
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+    
+    response = client.post('/api/analysis/batch',
+                           json=[dict(hemograma, **paciente) for hemograma, paciente in zip(hemogramas, pacientes)])
+    linhas = _ler_ndjson(response)
+    
+    assert analisador._executor is not None
+    assert [linha['data'] for linha in linhas[:60]] == \
+        json.loads(json.dumps(AnalysisService.analisar_hemogramas_lote(hemogramas, pacientes)))
+    assert linhas[60]['resumo']['creditos_restantes'] == 40
@@ -0,0 +1,280 @@
+"""
+Testes para o serviço de análise de hemograma do aplicativo AnalisaVet.
+"""
+
+import json
+import random
+import numpy as np
+import pytest
+from services.analysis_cache import CacheAnalises
+from services.analysis_service import AnalysisService
+from services.interpretation_catalog import carregar_catalogo, obter_catalogo
+from services.joint_rules import AvaliadorGrupos, _contar_bits
+from services.reference_strata import EstratosEspecie, interpretar_idade
+from services.severity import Direcao, Gravidade, codigo_tipo
+
+HEMOGRAMA_NORMAL_CAO = {
+    'hemacias': 6.5,
+    'hemoglobina': 15.0,
+    'hematocrito': 45.0,
+    'vcm': 70.0,
+    'hcm': 22.0,
+    'chcm': 33.0,
+    'leucocitos': 10000,
+    'segmentados': 7000,
+    'linfocitos': 2500,
+    'monocitos': 500,
+    'eosinofilos': 200,
+    'basofilos': 50,
+    'plaquetas': 300000,
+    'proteina': 7.0
+}
+
+def test_analise_hemograma_normal():
+    """Testa que um hemograma normal não gera alterações."""
+    resultado = AnalysisService.analisar_hemograma(HEMOGRAMA_NORMAL_CAO, {'especie': 'Cão'})
+
+    assert resultado['interpretacoes_individuais'] == []
+    assert resultado['parametros']['hemacias']['status'] == 'normal'
+    assert 'normalidade' in resultado['resumo_clinico']
+
+def test_analise_lote_igual_a_unitaria(gerar_hemogramas):
+    """Testa que o lote vetorizado produz o mesmo resultado do caminho unitário."""
+    hemogramas, pacientes = gerar_hemogramas(300)
+
+    resultados_lote = AnalysisService.analisar_hemogramas_lote(hemogramas, pacientes)
+
+    assert len(resultados_lote) == len(hemogramas)
+    for hemograma, paciente, resultado in zip(hemogramas, pacientes, resultados_lote):
+        assert resultado == AnalysisService.analisar_hemograma(hemograma, paciente)
+
+def test_analise_lote_paciente_unico_e_especie_desconhecida():
+    """Testa o lote com um único dicionário de paciente e espécie sem referência."""
+    resultados = AnalysisService.analisar_hemogramas_lote(
+        [HEMOGRAMA_NORMAL_CAO, {'hemacias': 2.0}], {'especie': 'Cavalo'})
+
+    assert [r['parametros'] for r in resultados] == [{}, {}]
+
+def test_analise_lote_tamanhos_diferentes():
+    """Testa que listas de tamanhos diferentes são rejeitadas."""
+    with pytest.raises(ValueError):
+        AnalysisService.analisar_hemogramas_lote([HEMOGRAMA_NORMAL_CAO], [])
+
+def test_tabela_referencia_compilada():
+    """Testa os limites ajustados e textos pré-calculados da tabela de referência."""
+    tabela = AnalysisService.obter_tabela_referencia('Cão')
+    indice = tabela.indices['hemoglobina']
+
+    assert tabela.limites_inferiores[indice] == 12 - 12 * 0.15
+    assert tabela.limites_superiores[indice] == 18 + 18 * 0.15
+    assert tabela.textos_referencia[indice] == '12 - 18 g/dL'
+    assert tabela.valores_exibicao()['hemoglobina'] == '12-18 g/dL'
+    assert AnalysisService.obter_tabela_referencia('Cavalo') is None
+
+def test_tabela_referencia_imutavel():
+    """Testa que a tabela compilada não pode ser alterada."""
+    tabela = AnalysisService.obter_tabela_referencia('Gato')
+
+    with pytest.raises(AttributeError):
+        tabela.especie = 'Cão'
+    with pytest.raises(ValueError):
+        tabela.minimos[0] = 0
+
+def test_definir_valores_referencia_recompila_tabela(restaurar_referencias):
+    """Testa que alterar as referências recompila a tabela da espécie."""
+    referencias = dict(AnalysisService.VALORES_REFERENCIA['Cão'])
+    referencias['hemoglobina'] = {'min': 14, 'max': 20, 'unidade': 'g/dL'}
+
+    AnalysisService.definir_valores_referencia('Cão', referencias)
+    resultado = AnalysisService.analisar_hemograma({'hemoglobina': 15.0}, {'especie': 'Cão'})
+
+    assert resultado['parametros']['hemoglobina']['referencia'] == '14 - 20 g/dL'
+
+@pytest.mark.parametrize('idade, meses', [
+    ('5 anos', 60),
+    ('3 meses', 3),
+    ('1 ano e 6 meses', 18),
+    ('1,5 ano', 18),
+    ('8m', 8),
+    ('2 A', 24),
+    (3, 36),
+    ('filhote', None),
+    (None, None),
+])
+def test_interpretar_idade(idade, meses):
+    """Testa a interpretação de idades em texto livre."""
+    assert interpretar_idade(idade) == meses
+
+def test_estrato_por_raca_e_idade():
+    """Testa a resolução do intervalo de galgos e filhotes."""
+    galgo = AnalysisService.obter_tabela_estrato('Cão', 'Greyhound', '4 anos')
+    filhote = AnalysisService.obter_tabela_estrato('Cão', 'srd', '3 meses')
+    adulto = AnalysisService.obter_tabela_estrato('Cão', 'SRD', '4 anos')
+
+    assert galgo.valores_exibicao()['hematocrito'] == '48-65 %'
+    assert filhote.valores_exibicao()['hematocrito'] == '30-48 %'
+    assert adulto is AnalysisService.obter_tabela_referencia('Cão')
+    assert galgo.parametros == adulto.parametros
+
+def test_estratos_sem_sobreposicao_compartilham_tabela():
+    """Testa que combinações sem intervalo próprio reaproveitam a tabela base."""
+    estratos = EstratosEspecie('Gato', AnalysisService.VALORES_REFERENCIA['Gato'], {
+        'grupos_raciais': {'siameses': ['Siamês']},
+        'faixas_etarias': [{'nome': 'idoso', 'min_meses': 120}],
+        'intervalos': [{'faixa_etaria': 'idoso', 'valores': {'hematocrito': {'min': 28, 'max': 45, 'unidade': '%'}}}]
+    })
+
+    assert len(estratos.tabelas) == 2
+    assert estratos.estrato('siamês', '12 anos') == ('siameses', 'idoso')
+    assert estratos.posicao('Siamês', '2 anos') == 0
+    assert estratos.posicao('Siamês', '12 anos') == estratos.posicao(None, '10 anos') == 1
+
+def test_analise_usa_estrato_do_paciente():
+    """Testa que o hematócrito normal de um galgo não é classificado como alto."""
+    hemograma = dict(HEMOGRAMA_NORMAL_CAO, hematocrito=62.0, hemoglobina=22.0)
+
+    comum = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão', 'raca': 'SRD'})
+    galgo = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão', 'raca': 'Greyhound'})
+
+    assert comum['parametros']['hematocrito']['status'] == 'normal'
+    assert comum['parametros']['hemoglobina']['status'] == 'alto_leve'
+    assert galgo['parametros']['hemoglobina']['status'] == 'normal'
+    assert galgo['estrato_referencia'] == {'grupo_racial': 'galgos', 'faixa_etaria': None}
+
+def test_catalogo_interpretacoes_cobre_todos_parametros():
+    """Testa que o catálogo tem texto próprio para todos os parâmetros e tipos."""
+    catalogo = obter_catalogo()
+
+    for especie, referencias in AnalysisService.VALORES_REFERENCIA.items():
+        for parametro in referencias:
+            for tipo in AnalysisService._TIPOS_ALTERACAO[1:]:
+                assert not catalogo.obter(especie, parametro, tipo).startswith('Alteração ')
+
+def test_catalogo_interpretacoes_por_especie():
+    """Testa que textos específicos da espécie substituem o texto padrão."""
+    catalogo = obter_catalogo()
+
+    texto_gato = catalogo.obter('Gato', 'linfocitos', 'alto_leve')
+    assert 'gatos' in texto_gato
+    assert catalogo.obter('Cão', 'linfocitos', 'alto_leve') != texto_gato
+    assert catalogo.obter('Cavalo', 'linfocitos', 'alto_leve') == catalogo.obter('Cão', 'linfocitos', 'alto_leve')
+
+def test_catalogo_interpretacoes_arquivo_extra(tmp_path):
+    """Testa que um arquivo extra amplia o catálogo sem alterar o código."""
+    extras = tmp_path / 'extras.json'
+    extras.write_text(json.dumps({
+        'especies': {'Gato': {'proteina': {'alto_grave': 'Texto da clínica.'}}}
+    }), encoding='utf-8')
+
+    catalogo = carregar_catalogo(caminho_extras=str(extras))
+
+    assert catalogo.obter('Gato', 'proteina', 'alto_grave') == 'Texto da clínica.'
+    assert catalogo.obter('Cão', 'proteina', 'alto_grave') != 'Texto da clínica.'
+
+def test_interpretacao_conjunta_por_mascara():
+    """Testa que os grupos compilados identificam dois ou mais parâmetros fora da faixa."""
+    hemograma = dict(HEMOGRAMA_NORMAL_CAO, hemoglobina=11.5, hematocrito=36.0, leucocitos=18000)
+
+    conjuntas = AnalysisService.interpretar_alteracoes_conjuntas(hemograma, 'Cão')
+
+    assert [c['grupo'] for c in conjuntas] == ['anemia']
+    assert conjuntas[0]['parametros_alterados'] == ['hemoglobina', 'hematocrito']
+    assert AnalysisService.interpretar_alteracoes_conjuntas(hemograma, 'Cavalo') == []
+
+def test_avaliador_grupos_lote_igual_a_unitario():
+    """Testa que a avaliação vetorizada das máscaras coincide com a avaliação unitária."""
+    avaliador = AvaliadorGrupos(AnalysisService.GRUPOS_PARAMETROS,
+                                AnalysisService.obter_tabela_referencia('Cão').parametros)
+    gerador = random.Random(7)
+    mascaras = [gerador.getrandbits(15) for _ in range(200)]
+
+    resultados = avaliador.avaliar_lote(np.array(mascaras, dtype=np.uint64))
+
+    assert resultados == [avaliador.avaliar(mascara) for mascara in mascaras]
+
+def test_contagem_de_bits_sem_bitwise_count(monkeypatch):
+    """Testa a contagem de bits alternativa para versões antigas do NumPy."""
+    valores = np.array([0, 1, 0b1011, 2 ** 63 + 5], dtype=np.uint64)
+    monkeypatch.delattr(np, 'bitwise_count', raising=False)
+
+    assert _contar_bits(valores).tolist() == [0, 1, 3, 3]
+
+def test_aplicar_regra_15_porcento():
+    """Testa a classificação da regra de 15% por faixa de desvio."""
+    assert AnalysisService.aplicar_regra_15_porcento(10.5, 12, 18) == {
+        "alterado": False, "tipo": "normal", "desvio_percentual": 0}
+    assert AnalysisService.aplicar_regra_15_porcento(9, 12, 18)["tipo"] == "baixo_leve"
+    assert AnalysisService.aplicar_regra_15_porcento(7, 12, 18)["tipo"] == "baixo_moderada"
+    assert AnalysisService.aplicar_regra_15_porcento(30, 12, 18)["tipo"] == "alto_grave"
+    assert AnalysisService.aplicar_regra_15_porcento(None, 12, 18)["alterado"] is False
+
+def test_cortes_de_gravidade_configurados(monkeypatch):
+    """Testa que os caminhos unitário e em lote usam os cortes de gravidade da tabela."""
+    monkeypatch.setattr('services.analysis_service.CORTES_GRAVIDADE', (10, 20))
+    monkeypatch.setattr(AnalysisService, '_cache', CacheAnalises(capacidade=0))
+    # Hemoglobina 9.5: 20,8% abaixo do mínimo (leve com os cortes padrão 30/50)
+    hemograma = {'hemoglobina': 9.5}
+
+    unitario = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})
+    lote = AnalysisService.analisar_hemogramas_lote([hemograma], {'especie': 'Cão'})
+
+    assert unitario['parametros']['hemoglobina']['status'] == 'baixo_grave'
+    assert lote == [unitario]
+
+def test_resumo_e_recomendacoes_por_contagem():
+    """Testa o resumo clínico e as recomendações gerados pela contagem de gravidades."""
+    hemograma = dict(HEMOGRAMA_NORMAL_CAO, hemoglobina=5.0, plaquetas=50000, leucocitos=24000)
+    # Sem CHCM, para que a consistência do CHCM (índice derivado) não entre na contagem
+    del hemograma['chcm']
+
+    resultado = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})
+
+    assert resultado['resumo_clinico'] == (
+        "Hemograma apresenta 2 alteração(ões) grave(s) que requer(em) atenção imediata.")
+    assert resultado['recomendacoes'] == [
+        "Consulta veterinária urgente devido a alterações graves identificadas.",
+        "Consulta veterinária para investigação das alterações moderadas identificadas."
+    ]
+    assert codigo_tipo(Direcao.ALTO, Gravidade.MODERADA) == 5
+
+def test_cache_devolve_resultado_memorizado(monkeypatch):
+    """Testa que hemogramas idênticos são servidos pelo cache."""
+    monkeypatch.setattr(AnalysisService, '_cache', CacheAnalises(capacidade=10))
+
+    primeiro = AnalysisService.analisar_hemograma(HEMOGRAMA_NORMAL_CAO, {'especie': 'Cão'})
+    hemograma_equivalente = dict(HEMOGRAMA_NORMAL_CAO, leucocitos=10000.0)
+    segundo = AnalysisService.analisar_hemograma(hemograma_equivalente, {'especie': 'Cão'})
+
+    assert segundo == primeiro
+    assert segundo['parametros'] is primeiro['parametros']
+    assert AnalysisService.estatisticas_cache()['acertos'] == 1
+    assert AnalysisService.estatisticas_cache()['falhas'] == 1
+
+def test_cache_invalidado_quando_referencias_mudam(monkeypatch, restaurar_referencias):
+    """Testa que a troca de referências invalida os resultados memorizados."""
+    monkeypatch.setattr(AnalysisService, '_cache', CacheAnalises(capacidade=10))
+    AnalysisService.analisar_hemograma(HEMOGRAMA_NORMAL_CAO, {'especie': 'Cão'})
+
+    referencias = dict(AnalysisService.VALORES_REFERENCIA['Cão'])
+    referencias['hemoglobina'] = {'min': 16, 'max': 20, 'unidade': 'g/dL'}
+    AnalysisService.definir_valores_referencia('Cão', referencias)
+    resultado = AnalysisService.analisar_hemograma(HEMOGRAMA_NORMAL_CAO, {'especie': 'Cão'})
+
+    assert resultado['parametros']['hemoglobina']['referencia'] == '16 - 20 g/dL'
+    assert AnalysisService.estatisticas_cache()['acertos'] == 0
+    assert AnalysisService.estatisticas_cache()['tamanho'] == 1
+
+def test_cache_descarta_menos_usado():
+    """Testa o descarte LRU quando a capacidade é atingida."""
+    cache = CacheAnalises(capacidade=2)
+    chaves = [('Cão', 1, (float(valor),)) for valor in range(3)]
+
+    cache.armazenar(chaves[0], {'a': 0})
+    cache.armazenar(chaves[1], {'a': 1})
+    cache.obter(chaves[0])
+    cache.armazenar(chaves[2], {'a': 2})
+
+    assert cache.obter(chaves[1]) is None
+    assert cache.obter(chaves[0]) == {'a': 0}
+    assert cache.obter(('Cão', 0, (0.0,))) is None
+    assert CacheAnalises.gerar_chave('Cão', 1, ('hemacias',), {'hemacias': 'x'}) is None
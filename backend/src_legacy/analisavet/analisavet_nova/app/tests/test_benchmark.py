@@ -0,0 +1,54 @@
+"""
+Testes para o benchmark do motor de análise do AnalisaVet.
+"""
+
+import json
+import benchmark_analise
+from services.analysis_service import AnalysisService
+
+def test_gerador_reprodutivel_e_perfis():
+    """Testa que a semente reproduz os exames e que cada perfil gera as alterações esperadas."""
+    assert benchmark_analise.gerar_hemogramas(50, semente=3) == benchmark_analise.gerar_hemogramas(50, semente=3)
+
+    for especie in benchmark_analise.ESPECIES:
+        referencias = AnalysisService.VALORES_REFERENCIA_PADRAO[especie]
+        hemogramas, _ = benchmark_analise.gerar_hemogramas(20, perfil='normal', especies=(especie,))
+        assert all(referencias[p]['min'] <= v <= referencias[p]['max'] for h in hemogramas for p, v in h.items())
+
+        hemogramas, _ = benchmark_analise.gerar_hemogramas(20, perfil='anemia', especies=(especie,))
+        assert all(h['hematocrito'] < referencias['hematocrito']['min'] for h in hemogramas)
+
+        hemogramas, _ = benchmark_analise.gerar_hemogramas(20, perfil='leucocitose', especies=(especie,))
+        assert all(h['leucocitos'] > referencias['leucocitos']['max'] for h in hemogramas)
+
+def test_executar_emite_metricas_em_json():
+    """Testa uma execução curta do benchmark e que o cache original é restaurado."""
+    cache = AnalysisService._cache
+    resultado = json.loads(json.dumps(benchmark_analise.executar(quantidade=40, repeticao=0.5)))
+
+    assert AnalysisService._cache is cache
+    assert set(resultado['latencia_por_perfil_us']) == set(benchmark_analise.PERFIS)
+    assert resultado['lote']['exames'] == 40
+    assert resultado['cache']['taxa_acerto'] > 0
+    assert resultado['memoria']['bytes_por_exame_compacto'] < resultado['memoria']['bytes_por_exame_detalhado']
+
+def test_comparar_aponta_regressoes():
+    """Testa que apenas pioras acima da tolerância são apontadas."""
+    anterior = {'latencia_unitaria_us': {'p50': 30.0, 'p95': 50.0}, 'lote': {'exames_por_segundo': 1000.0}}
+    atual = {'latencia_unitaria_us': {'p50': 40.0, 'p95': 52.0}, 'lote': {'exames_por_segundo': 800.0}}
+
+    regressoes = benchmark_analise.comparar(atual, anterior, tolerancia=0.1)
+
+    assert [r['metrica'] for r in regressoes] == ['latencia_unitaria_us.p50', 'lote.exames_por_segundo']
+
+def test_lote_compacto_mais_rapido_que_a_analise_unitaria():
+    """Testa que o lote compacto é várias vezes mais rápido que analisar os mesmos exames um a um."""
+    cache = AnalysisService._cache
+    hemogramas, pacientes = benchmark_analise.gerar_hemogramas(2000)
+    try:
+        lote = benchmark_analise.medir_lote(hemogramas, pacientes)
+    finally:
+        AnalysisService._cache = cache
+
+    assert lote['exames_por_segundo_compacto'] > lote['exames_por_segundo']
+    assert lote['aceleracao_compacto'] >= 3
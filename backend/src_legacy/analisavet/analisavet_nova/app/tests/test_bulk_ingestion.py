@@ -0,0 +1,104 @@
+"""
+Testes para a importação de laudos em arquivo ZIP do aplicativo AnalisaVet.
+"""
+
+import io
+import json
+import os
+import zipfile
+from models.models import Analysis, User
+from services.bulk_ingestion import extrair_membros, listar_membros
+
+LAUDOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'laudos_teste')
+
+CSV = ("Nome;Espécie;Tutor;Hemácias;Hemoglobina;Leucócitos\n"
+       "Mimi;Felina;Carlos;7,5;12,1;11.000\n"
+       "Bidu;;Ana;6,1;14,0;9.500\n"
+       "Thor;Canina;Ana;6,8;15,5;10.200\n")
+
+def _zip(arquivos):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+        for nome, conteudo in arquivos.items():
+            arquivo_zip.writestr(nome, conteudo)
+    buffer.seek(0)
+    return buffer
+
+def _laudo(nome):
+    with open(os.path.join(LAUDOS, nome), 'rb') as arquivo:
+        return arquivo.read()
+
+def _ler_ndjson(response):
+    return [json.loads(linha) for linha in response.data.decode('utf-8').splitlines() if linha]
+
+def _login(client):
+    client.post('/api/auth/login', json={'email': 'teste@example.com', 'password': 'senha123'})
+
+def test_upload_zip_requer_login(client):
+    """Testa que a importação de ZIP requer login."""
+    response = client.post('/api/analysis/upload/zip', data={'file': (_zip({}), 'laudos.zip')})
+
+    assert response.status_code in [302, 401, 403]
+
+def test_upload_zip_salva_analises_em_blocos(client, app):
+    """Testa a importação de PDFs e CSVs do ZIP, com erros por arquivo e commits por bloco."""
+    app.config['LOTE_TAMANHO_BLOCO'] = 2
+    _login(client)
+    arquivo = _zip({
+        'laudos/laudo_tecnico_1.pdf': _laudo('laudo_tecnico_1.pdf'),
+        'laudos/exames.csv': CSV,
+        'laudos/notas.txt': 'sem hemograma',
+        'laudos/quebrado.pdf': b'%PDF-1.4 corrompido',
+        '__MACOSX/laudos/._laudo_tecnico_1.pdf': b'metadados',
+    })
+
+    response = client.post('/api/analysis/upload/zip', data={'file': (arquivo, 'laudos.zip')},
+                           content_type='multipart/form-data')
+    linhas = _ler_ndjson(response)
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    resumo = linhas[-1]['resumo']
+    assert resumo == {'arquivos': 4, 'arquivos_com_erro': 1, 'hemogramas': 5, 'salvos': 3, 'erros': 2,
+                      'creditos_restantes': 7}
+
+    salvos = {(linha['arquivo'], linha.get('linha')): linha for linha in linhas if linha.get('success')}
+    assert set(salvos) == {('laudos/laudo_tecnico_1.pdf', None), ('laudos/exames.csv', 1),
+                           ('laudos/exames.csv', 3)}
+    assert salvos[('laudos/exames.csv', 1)]['especie'] == 'Gato'
+    erros = {linha['arquivo']: linha['error'] for linha in linhas if linha.get('success') is False}
+    assert erros['laudos/exames.csv'] == 'Espécie não identificada no laudo.'
+    assert 'Formato de arquivo' in erros['laudos/notas.txt']
+    assert erros['laudos/quebrado.pdf'].startswith('Não foi possível extrair dados do arquivo')
+    assert linhas[-2]['progresso'] == {'arquivos': 4, 'total_arquivos': 4}
+
+    with app.app_context():
+        analyses = Analysis.query.order_by(Analysis.id).all()
+        assert [analysis.id for analysis in analyses] == sorted(linha['analysis_id'] for linha in salvos.values())
+        assert {analysis.patient_name for analysis in analyses} == {'Rex', 'Mimi', 'Thor'}
+        assert User.query.filter_by(email='teste@example.com').first().credits == 7
+
+def test_upload_zip_invalido_ou_grande_demais(client, app):
+    """Testa a recusa de arquivos que não são ZIP e de ZIPs com arquivos demais."""
+    _login(client)
+    response = client.post('/api/analysis/upload/zip', data={'file': (io.BytesIO(b'texto'), 'laudos.zip')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 400
+
+    app.config['ZIP_MAX_ARQUIVOS'] = 2
+    arquivo = _zip({f'exame_{numero}.csv': CSV for numero in range(3)})
+    response = client.post('/api/analysis/upload/zip', data={'file': (arquivo, 'laudos.zip')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 413
+
+def test_extrair_membros_na_ordem_e_com_limite_de_tamanho():
+    """Testa que os resultados voltam na ordem do ZIP e que arquivos grandes demais são recusados."""
+    arquivos = {f'exame_{numero:02d}.csv': CSV for numero in range(12)}
+    arquivos['grande.csv'] = CSV * 1000
+    with zipfile.ZipFile(_zip(arquivos)) as arquivo_zip:
+        membros = listar_membros(arquivo_zip)
+        resultados = list(extrair_membros(arquivo_zip, membros, processos=3, max_bytes=64 * 1024))
+
+    assert [nome for nome, _, _ in resultados] == list(arquivos)
+    assert all(len(extraidos) == 3 for _, extraidos, _ in resultados[:-1])
+    assert resultados[-1][1] is None and 'limite' in resultados[-1][2]
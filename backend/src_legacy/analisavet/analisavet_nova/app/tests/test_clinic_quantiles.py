@@ -0,0 +1,112 @@
+"""
+Testes para os sketches de quantis por clínica do aplicativo AnalisaVet.
+"""
+
+import json
+import numpy as np
+import pytest
+from models.models import QuantileSketch, User, db
+from services.analysis_service import AnalysisService
+from services.clinic_quantiles import MINIMO_AMOSTRAS, ClinicQuantileService
+from services.quantile_sketch import SketchKLL
+
+def _login(client):
+    client.post('/api/auth/login',
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+
+def _valores(quantidade, semente=7):
+    return np.random.default_rng(semente).normal(38, 6, quantidade)
+
+def test_sketch_estima_quantis_e_posicao():
+    """Testa que o erro de rank do sketch fica dentro do esperado para k=200."""
+    valores = _valores(50000)
+    sketch = SketchKLL(semente=1)
+    for valor in valores:
+        sketch.atualizar(valor)
+
+    assert sketch.n == len(valores)
+    assert sketch.tamanho < 1000
+    for fracao, estimado in zip((0.05, 0.5, 0.95), sketch.quantis([0.05, 0.5, 0.95])):
+        assert (valores <= estimado).mean() == pytest.approx(fracao, abs=0.02)
+    assert sketch.posicao(30.0) == pytest.approx((valores <= 30.0).mean(), abs=0.02)
+
+def test_sketch_mesclar_e_serializar():
+    """Testa a mescla de sketches e a serialização compacta."""
+    valores = _valores(20000)
+    primeiro, segundo = SketchKLL(semente=1), SketchKLL(semente=2)
+    for valor in valores[:12000]:
+        primeiro.atualizar(valor)
+    for valor in valores[12000:]:
+        segundo.atualizar(valor)
+
+    primeiro.mesclar(segundo)
+    restaurado = SketchKLL.desserializar(primeiro.serializar())
+
+    assert restaurado.n == 20000
+    assert restaurado.compactores == primeiro.compactores
+    assert len(primeiro.serializar()) < 10000
+    assert restaurado.posicao(38.0) == pytest.approx(0.5, abs=0.02)
+
+def test_sketch_vazio():
+    """Testa as consultas sobre um sketch sem valores."""
+    sketch = SketchKLL()
+
+    assert sketch.posicao(10) is None
+    assert sketch.quantis([0.5]) == [None]
+
+def test_percentil_incluido_apos_amostras_minimas(client, app):
+    """Testa que as análises salvas alimentam o percentil da clínica."""
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        paciente = {'especie': 'Gato'}
+        for valor in range(25, 25 + MINIMO_AMOSTRAS):
+            hemograma = {'hematocrito': float(valor), 'hemoglobina': 12.0}
+            AnalysisService.salvar_analise(user.id, hemograma, paciente, {})
+
+        registro = QuantileSketch.query.filter_by(user_id=user.id, species='Gato', parameter='hematocrito').first()
+        resultado = AnalysisService.analisar_hemograma({'hematocrito': 27.0}, paciente, clinica_id=user.id)
+
+        assert registro.count == MINIMO_AMOSTRAS
+        assert resultado['percentis_clinica'] == {'hematocrito': 15.0}
+        assert 'percentis_clinica' not in AnalysisService.analisar_hemograma({'hematocrito': 27.0}, paciente)
+        assert ClinicQuantileService.percentis(user.id, 'Cão', {'hematocrito': 27.0}) == {}
+
+    _login(client)
+    response = client.get('/api/analysis/clinic-quantiles?especie=Gato&parametro=hematocrito&valor=34&quantis=0.5')
+    data = json.loads(response.data)['data']['hematocrito']
+    assert data['amostras'] == MINIMO_AMOSTRAS
+    assert data['quantis'] == {'0.5': 34.0}
+    assert data['percentil'] == 50.0
+
+    response = client.get('/api/analysis/clinic-quantiles?especie=Gato&quantis=2')
+    assert response.status_code == 400
+
+def test_reconstruir_sketches(app):
+    """Testa a reconstrução dos sketches a partir das análises salvas."""
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        for valor in (30.0, 35.0, 40.0):
+            AnalysisService.salvar_analise(user.id, {'hematocrito': valor}, {'especie': 'Gato'}, {})
+
+        assert ClinicQuantileService.reconstruir(user.id) == 1
+        dados = ClinicQuantileService.consultar(user.id, 'Gato', quantis=[0.5])
+        assert dados['hematocrito'] == {'amostras': 3, 'quantis': {'0.5': 35.0}}
+
+def test_criacao_concorrente_usa_sketch_existente(app, monkeypatch):
+    """Testa que, se outra requisição criou o sketch após a consulta, o valor é acumulado no sketch dela."""
+    with app.app_context():
+        user_id = User.query.filter_by(email='teste@example.com').first().id
+        sketch = SketchKLL()
+        sketch.atualizar(30.0)
+        # A outra requisição grava o sketch em sua própria transação, depois da consulta desta
+        with db.engine.begin() as conexao:
+            conexao.execute(QuantileSketch.__table__.insert().values(
+                user_id=user_id, species='Gato', parameter='hematocrito', count=1, sketch=sketch.serializar()))
+        monkeypatch.setattr(ClinicQuantileService, '_registros', lambda *args, **kwargs: {})
+
+        ClinicQuantileService.registrar(user_id, 'Gato', {'hematocrito': 40.0})
+        db.session.commit()
+
+        registros = QuantileSketch.query.filter_by(user_id=user_id).all()
+        assert len(registros) == 1
+        assert registros[0].count == 2
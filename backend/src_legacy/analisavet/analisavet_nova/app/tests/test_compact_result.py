@@ -0,0 +1,81 @@
+"""
+Testes para a representação compacta dos resultados de análise do AnalisaVet.
+"""
+
+import copy
+import json
+from models.models import db, Analysis, User
+from services.analysis_service import AnalysisService
+from services.compact_result import ResultadoCompacto
+from services.reference_service import ReferenceService
+
+def test_expansao_igual_a_analise(gerar_hemogramas):
+    """Testa que o resultado compacto, após codificar e decodificar, expande para o resultado detalhado."""
+    hemogramas, pacientes = gerar_hemogramas(300, semente=11)
+    pacientes.append({'especie': 'Coelho'})
+    hemogramas.append({'hematocrito': 40.0})
+
+    for hemograma, paciente in zip(hemogramas, pacientes):
+        hemograma = {parametro: valor for parametro, valor in hemograma.items() if valor is not None}
+        compacto = AnalysisService.analisar_hemograma_compacto(hemograma, paciente)
+        restaurado = ResultadoCompacto.decodificar(json.loads(json.dumps(compacto.codificar())))
+
+        assert AnalysisService.expandir_resultado(restaurado) == \
+            AnalysisService.analisar_hemograma(hemograma, paciente)
+
+def test_lote_compacto_igual_ao_unitario(gerar_hemogramas):
+    """Testa que o lote compacto, lido das matrizes, codifica e expande como a análise unitária."""
+    hemogramas, pacientes = gerar_hemogramas(300, semente=13)
+    pacientes.append({'especie': 'Coelho'})
+    hemogramas.append({'hematocrito': 40.0})
+
+    lote = AnalysisService.analisar_hemogramas_lote_compacto(hemogramas, pacientes)
+
+    assert len(lote) == len(hemogramas)
+    for hemograma, paciente, compacto in zip(hemogramas, pacientes, lote):
+        unitario = AnalysisService.analisar_hemograma_compacto(hemograma, paciente)
+        assert compacto.codificar() == unitario.codificar()
+        assert AnalysisService.expandir_resultado(compacto) == AnalysisService.analisar_hemograma(hemograma, paciente)
+
+def test_salvar_analise_grava_formato_compacto(app):
+    """Testa que a análise salva ocupa menos espaço e é expandida na leitura."""
+    hemograma = {'hemacias': 4.0, 'hemoglobina': 10.0, 'hematocrito': 30.0, 'leucocitos': 25.0}
+    paciente = {'especie': 'Cão', 'raca': 'Greyhound', 'idade': '5 anos'}
+
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        resultado = AnalysisService.analisar_hemograma(hemograma, paciente)
+        analysis = AnalysisService.salvar_analise(user.id, hemograma, paciente, resultado)
+
+        esperado = dict(resultado, delta_historico=analysis.get_analysis_result()['delta_historico'])
+        assert analysis.get_analysis_result() == esperado
+        assert analysis.get_compact_result().estrato == ('galgos', None)
+        assert len(analysis.analysis_result) * 3 < len(json.dumps(resultado))
+
+def test_resultado_expandido_com_versao_da_analise(app, restaurar_referencias):
+    """Testa que os textos de referência de uma análise salva vêm da versão usada nela."""
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        hemograma = {'hemoglobina': 15.0}
+        compacto = AnalysisService.analisar_hemograma_compacto(hemograma, {'especie': 'Cão'})
+        analysis = AnalysisService.salvar_analise(user.id, hemograma, {'especie': 'Cão'}, compacto)
+
+        valores = copy.deepcopy(AnalysisService.VALORES_REFERENCIA_PADRAO)
+        valores['Cão']['hemoglobina'] = {'min': 14, 'max': 20, 'unidade': 'g/dL'}
+        ReferenceService.publicar(valores, descricao='Hemoglobina')
+
+        resultado = Analysis.query.get(analysis.id).get_analysis_result()
+        assert resultado['versao_referencia'] == 1
+        assert resultado['parametros']['hemoglobina']['referencia'] == '12 - 18 g/dL'
+
+def test_resultado_antigo_continua_legivel(app):
+    """Testa que resultados gravados no formato detalhado são lidos sem alteração."""
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        antigo = {'parametros': {'hematocrito': {'valor': 40}}, 'resumo_clinico': 'Texto antigo'}
+        analysis = Analysis(user_id=user.id, analysis_result=json.dumps(antigo))
+        db.session.add(analysis)
+        db.session.commit()
+
+        assert analysis.get_analysis_result() == antigo
+        assert analysis.get_compact_result() is None
@@ -0,0 +1,69 @@
+"""
+Testes para a importação de hemogramas de arquivos CSV do aplicativo AnalisaVet.
+"""
+
+import tracemalloc
+import pytest
+from utils.csv_hemograma import ler_hemogramas_csv
+from utils.pdf_parser import parse_csv_hemograma
+
+@pytest.mark.parametrize('conteudo, esperado', [
+    ("hemacias,hemoglobina,leucocitos\n6.5,15.2,12000\n", (6.5, 15.2, 12000.0)),
+    ("Hemácias;Hemoglobina;Leucócitos\n6,5;15,2;12.000\n", (6.5, 15.2, 12000.0)),
+    ("RBC\tHGB\tWBC\n6.5\t15.2\t12000\n", (6.5, 15.2, 12000.0)),
+    ('hemacias,hemoglobina,leucocitos\n"6,5","15,2",12000\n', (6.5, 15.2, 12000.0)),
+    ("hemacias|hb|leuco\n6,5|15|x\n", (6.5, 15.0, None)),
+])
+def test_delimitador_e_virgula_decimal(conteudo, esperado):
+    """Testa a detecção do delimitador, da vírgula decimal e dos apelidos das colunas."""
+    hemograma = next(ler_hemogramas_csv(conteudo.encode('utf-8')))['hemograma']
+
+    assert (hemograma['hemacias'], hemograma['hemoglobina'], hemograma['leucocitos']) == esperado
+    assert hemograma['plaquetas'] is None
+
+def test_um_hemograma_por_linha():
+    """Testa que cada linha gera um hemograma, com os dados do paciente, ignorando linhas vazias."""
+    conteudo = ("\ufeffNome;Animal;Tutor;Hemoglobina\n"
+                "Rex;Canina;Ana;15,2\n"
+                ";;;\n"
+                "Mimi;Felino;Carlos;9,8\n")
+    linhas = list(ler_hemogramas_csv(conteudo.encode('utf-8')))
+
+    assert [linha['hemograma']['hemoglobina'] for linha in linhas] == [15.2, 9.8]
+    assert linhas[1]['paciente'] == {'nome': 'Mimi', 'raca': None, 'idade': None, 'sexo': None,
+                                     'tutor': 'Carlos', 'especie': 'Gato'}
+    # "nome" tem prioridade sobre "animal" para o nome; "animal" ainda informa a espécie
+    assert linhas[0]['paciente']['nome'] == 'Rex' and linhas[0]['paciente']['especie'] == 'Cão'
+
+def test_arquivo_grande_com_memoria_constante(tmp_path):
+    """Testa que um arquivo com milhares de linhas é lido sem carregá-lo em memória."""
+    caminho = tmp_path / 'exportacao.csv'
+    with open(caminho, 'w', encoding='utf-8') as arquivo:
+        arquivo.write('paciente;hemacias;hemoglobina;hematocrito;leucocitos;plaquetas\n')
+        for numero in range(50000):
+            arquivo.write(f'Animal {numero};6,{numero % 10};15,2;45;12.{numero % 1000:03d};250.000\n')
+
+    tracemalloc.start()
+    try:
+        total = 0
+        for linha in ler_hemogramas_csv(str(caminho)):
+            total += 1
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert total == 50000
+    assert linha['paciente']['nome'] == 'Animal 49999'
+    assert linha['hemograma']['leucocitos'] == 12999.0
+    assert pico < caminho.stat().st_size / 4
+
+def test_parse_csv_usa_primeira_linha(tmp_path):
+    """Testa que parse_csv_hemograma continua devolvendo apenas a primeira linha."""
+    caminho = tmp_path / 'exame.csv'
+    caminho.write_text("hemoglobina,nome\n15.2,Rex\n9.8,Mimi\n", encoding='utf-8')
+
+    dados = parse_csv_hemograma(str(caminho))
+
+    assert dados['hemograma']['hemoglobina'] == 15.2
+    assert dados['paciente']['nome'] == 'Rex'
+    assert parse_csv_hemograma(b"hemoglobina\n") == {"hemograma": {}, "paciente": {}}
@@ -0,0 +1,148 @@
+"""
+Testes para os índices hematológicos derivados do aplicativo AnalisaVet.
+"""
+
+import json
+import random
+import pytest
+from models.models import db, Analysis, User
+from services.analysis_service import AnalysisService
+from services.derived_indices import (EtapaIndices, IndiceDerivado, indices_registrados, remover_indice,
+                                      substituir_indices)
+from services.rule_dsl import RegraInvalida
+
+def test_contagens_absolutas_a_partir_do_percentual():
+    """Testa que o diferencial relativo preenche apenas as contagens absolutas ausentes."""
+    hemograma = {'leucocitos': 10000.0, 'segmentados_percentual': 70.0,
+                 'linfocitos_percentual': 20.0, 'linfocitos': 1000.0}
+    resultado = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})
+    parametros = resultado['parametros']
+
+    assert parametros['segmentados']['valor'] == pytest.approx(7000.0)
+    assert parametros['linfocitos']['valor'] == 1000.0
+    assert 'segmentados_percentual' not in parametros
+    # A relação N:L usa a contagem preenchida e é apontada uma única vez, pela regra diagnóstica
+    assert 'relacao_neutrofilo_linfocito' not in parametros
+    assert [(p['regra'], p['gravidade'], p['valor']) for p in resultado['padroes_diagnosticos']] == \
+        [('relacao_neutrofilo_linfocito', 'leve', pytest.approx(7.0))]
+
+def test_reticulocitos_corrigidos_por_especie():
+    """Testa a correção dos reticulócitos pelo hematócrito normal de cada espécie."""
+    hemograma = {'hematocrito': 18.0, 'reticulocitos_percentual': 4.0}
+    cao = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})['parametros']
+    gato = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Gato'})['parametros']
+
+    assert cao['reticulocitos_corrigidos']['valor'] == pytest.approx(1.6)
+    assert gato['reticulocitos_corrigidos']['valor'] == pytest.approx(4.0 * 18.0 / 37)
+    assert cao['reticulocitos_corrigidos']['referencia'] == '0 - 1.0 %'
+
+def test_consistencia_do_chcm():
+    """Testa que um CHCM incompatível com hemoglobina e hematócrito é apontado."""
+    consistente = {'hemoglobina': 15.0, 'hematocrito': 45.0, 'chcm': 33.3}
+    inconsistente = {'hemoglobina': 10.0, 'hematocrito': 45.0, 'chcm': 33.3}
+
+    normal = AnalysisService.analisar_hemograma(consistente, {'especie': 'Cão'})['parametros']
+    alterado = AnalysisService.analisar_hemograma(inconsistente, {'especie': 'Cão'})['parametros']
+
+    assert normal['consistencia_chcm']['alterado'] is False
+    assert alterado['consistencia_chcm']['status'].startswith('alto')
+    assert 'consistencia_chcm' not in AnalysisService.analisar_hemograma({'chcm': 33.0}, {'especie': 'Cão'})['parametros']
+
+def test_indices_no_lote_iguais_a_analise_unitaria():
+    """Testa que os índices calculados no lote coincidem com os da análise unitária."""
+    gerador = random.Random(17)
+    hemogramas, pacientes = [], []
+    for _ in range(300):
+        especie = gerador.choice(['Cão', 'Gato'])
+        hemograma = {
+            'leucocitos': gerador.choice([None, round(gerador.uniform(3000, 40000), 1)]),
+            'hemoglobina': round(gerador.uniform(5, 20), 1),
+            'hematocrito': gerador.choice([None, 0, round(gerador.uniform(10, 60), 1)]),
+            'chcm': round(gerador.uniform(28, 38), 1),
+            'reticulocitos_percentual': gerador.choice([None, round(gerador.uniform(0, 6), 2)])
+        }
+        for parametro in ('segmentados', 'linfocitos', 'monocitos'):
+            if gerador.random() < 0.5:
+                hemograma[f'{parametro}_percentual'] = round(gerador.uniform(0, 80), 1)
+            else:
+                hemograma[parametro] = gerador.choice([None, round(gerador.uniform(0, 15000), 1)])
+        hemogramas.append(hemograma)
+        pacientes.append({'especie': especie})
+
+    lote = AnalysisService.analisar_hemogramas_lote(hemogramas, pacientes)
+
+    assert any('reticulocitos_corrigidos' in r['parametros'] for r in lote)
+    for hemograma, paciente, resultado in zip(hemogramas, pacientes, lote):
+        assert resultado == AnalysisService.analisar_hemograma(hemograma, paciente)
+
+def test_registrar_indice_derivado(restaurar_referencias):
+    """Testa que um índice registrado entra em uso sem alterar a análise."""
+    hemograma = {'hemoglobina': 15.0, 'hemacias': 5.0}
+    assert 'hemoglobina_por_hemacia' not in \
+        AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})['parametros']
+
+    try:
+        AnalysisService.registrar_indice_derivado(
+            'hemoglobina_por_hemacia', 'hemoglobina / hemacias',
+            referencias={'Cão': {'min': 2.0, 'max': 2.5, 'unidade': 'g/dL por 10⁶/µL'}}
+        )
+        parametros = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})['parametros']
+        assert parametros['hemoglobina_por_hemacia']['valor'] == pytest.approx(3.0)
+        assert parametros['hemoglobina_por_hemacia']['status'].startswith('alto')
+        assert 'hemoglobina_por_hemacia' not in \
+            AnalysisService.analisar_hemograma(hemograma, {'especie': 'Gato'})['parametros']
+
+        with pytest.raises(ValueError):
+            AnalysisService.registrar_indice_derivado(
+                'invalido', 'hemoglobina >', referencias={'Cão': {'min': 0, 'max': 1, 'unidade': ''}}
+            )
+        assert AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})['parametros'] == parametros
+    finally:
+        remover_indice('hemoglobina_por_hemacia')
+        remover_indice('invalido')
+
+@pytest.mark.parametrize('expressao', ['hematocrito > 1', 'MIN(extra) + 1', 'hematocrito +'])
+def test_indices_invalidos(expressao):
+    """Testa que expressões inválidas de índices são recusadas na compilação."""
+    indice = IndiceDerivado('indice', expressao)
+    with pytest.raises(RegraInvalida):
+        EtapaIndices('Cão', ('hematocrito', 'indice'), [indice])
+
+def test_indices_registrados_gravados_pelo_nome(app, restaurar_referencias):
+    """Testa que análises salvas com índices registrados continuam legíveis após um reinício."""
+    originais = indices_registrados()
+    hemograma = {'hemoglobina': 15.0, 'hemacias': 5.0, 'hematocrito': 45.0}
+    referencias_cao = {'Cão': {'min': 2.0, 'max': 2.5, 'unidade': ''}}
+
+    def reiniciar(*indices):
+        # Outro processo (ou um reinício) só conhece os índices de fábrica e os que registrar
+        substituir_indices(originais)
+        for nome, expressao in indices:
+            AnalysisService.registrar_indice_derivado(nome, expressao, referencias=referencias_cao)
+        atuais = AnalysisService.referencias_atuais()
+        AnalysisService.aplicar_referencias(atuais.valores, atuais.grupos, atuais.versao)
+
+    try:
+        with app.app_context():
+            user = User.query.filter_by(email='teste@example.com').first()
+            reiniciar(('hemoglobina_por_hemacia', 'hemoglobina / hemacias'),
+                      ('hematocrito_por_hemacia', 'hematocrito / hemacias'))
+            resultado = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})
+            analysis = AnalysisService.salvar_analise(user.id, hemograma, {'especie': 'Cão'}, resultado)
+            gravado = json.loads(analysis.analysis_result)
+            assert {'hemoglobina_por_hemacia', 'hematocrito_por_hemacia'} <= set(gravado['i'])
+
+            # Ordem de registro diferente: as posições na tabela mudam, os nomes não
+            reiniciar(('hematocrito_por_hemacia', 'hematocrito / hemacias'),
+                      ('hemoglobina_por_hemacia', 'hemoglobina / hemacias'))
+            lido = db.session.get(Analysis, analysis.id).get_analysis_result()
+            assert lido['parametros'] == resultado['parametros']
+
+            # Sem os índices registrados, os valores gravados continuam na leitura, sem referência
+            reiniciar()
+            parametros = db.session.get(Analysis, analysis.id).get_analysis_result()['parametros']
+            assert parametros['hemoglobina_por_hemacia']['valor'] == pytest.approx(3.0)
+            assert parametros['hemoglobina_por_hemacia']['referencia'] == ''
+            assert parametros['hemoglobina'] == resultado['parametros']['hemoglobina']
+    finally:
+        substituir_indices(originais)
@@ -0,0 +1,171 @@
+"""
+Testes para as rotas de tarefas em segundo plano do aplicativo AnalisaVet.
+"""
+
+import datetime
+import io
+import json
+import os
+import time
+import uuid
+import pytest
+from models.models import db, Job, User
+
+def _login(client):
+    client.post('/api/auth/login', 
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+
+def _aguardar_tarefa(client, job_id, limite=5.0):
+    """Consulta a tarefa até que ela chegue a um estado final."""
+    inicio = time.time()
+    while time.time() - inicio < limite:
+        data = json.loads(client.get(f'/api/jobs/{job_id}').data)
+        if data['data']['status'] in ('concluido', 'erro', 'cancelado'):
+            return data['data']
+        time.sleep(0.02)
+    pytest.fail('Tarefa não finalizou no tempo esperado.')
+
+def test_tarefa_analise_concluida(client):
+    """Testa o enfileiramento, a consulta de estado e o resultado de uma análise."""
+    _login(client)
+    
+    response = client.post('/api/jobs/analysis',
+                           json={'especie': 'Gato', 'hemacias': 2.0, 'hemoglobina': 12.0})
+    data = json.loads(response.data)
+    
+    assert response.status_code == 202
+    estado = _aguardar_tarefa(client, data['data']['id'])
+    assert estado['status'] == 'concluido'
+    
+    response = client.get(f"/api/jobs/{data['data']['id']}/result")
+    resultado = json.loads(response.data)
+    assert resultado['data']['parametros']['hemacias']['status'] == 'baixo_grave'
+
+def test_tarefa_extracao_csv(client):
+    """Testa a extração de um CSV em segundo plano."""
+    _login(client)
+    
+    conteudo = b'especie,hemacias,hemoglobina\nGato,7.5,12.0\n'
+    response = client.post('/api/jobs/upload',
+                           data={'file': (io.BytesIO(conteudo), 'exame.csv')})
+    job_id = json.loads(response.data)['data']['id']
+    
+    assert _aguardar_tarefa(client, job_id)['status'] == 'concluido'
+    resultado = json.loads(client.get(f'/api/jobs/{job_id}/result').data)
+    assert resultado['data']['hemograma']['hemacias'] == 7.5
+
+def test_cancelar_tarefa_pendente(client, app):
+    """Testa o cancelamento de uma tarefa que ainda não começou."""
+    _login(client)
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        job = Job(id=uuid.uuid4().hex, user_id=user.id, job_type='analise', status='pendente')
+        job.set_payload({'hemograma': {}, 'paciente': {'especie': 'Cão'}})
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+    
+    response = client.delete(f'/api/jobs/{job_id}')
+    
+    assert response.status_code == 200
+    assert json.loads(response.data)['data']['status'] == 'cancelado'
+    assert client.delete(f'/api/jobs/{job_id}').status_code == 409
+
+def test_recuperar_tarefas_interrompidas(client, app):
+    """Testa que tarefas em execução durante uma parada voltam à fila e são concluídas."""
+    _login(client)
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        job = Job(id=uuid.uuid4().hex, user_id=user.id, job_type='analise', status='executando')
+        job.set_payload({'hemograma': {'hemacias': 6.5}, 'paciente': {'especie': 'Cão'}})
+        db.session.add(job)
+        db.session.commit()
+        job_id = job.id
+    
+    assert app.extensions['fila_jobs'].recuperar() == 1
+    
+    assert _aguardar_tarefa(client, job_id)['status'] == 'concluido'
+
+def _tarefa_em_execucao(user_id, reservada_por, reserva_ate, tentativas=1):
+    """Cria uma tarefa de análise em execução com a reserva informada."""
+    job = Job(id=uuid.uuid4().hex, user_id=user_id, job_type='analise', status='executando',
+              attempts=tentativas, locked_by=reservada_por, locked_until=reserva_ate)
+    job.set_payload({'hemograma': {'hemacias': 6.5}, 'paciente': {'especie': 'Cão'}})
+    db.session.add(job)
+    return job.id
+
+def test_recuperar_apenas_reservas_vencidas(client, app):
+    """Testa que só tarefas com a reserva vencida voltam à fila e que as tentativas são limitadas."""
+    _login(client)
+    fila = app.extensions['fila_jobs']
+    agora = datetime.datetime.utcnow()
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        ativa = _tarefa_em_execucao(user.id, 'outro:1:a', agora + datetime.timedelta(minutes=5))
+        vencida = _tarefa_em_execucao(user.id, 'outro:2:b', agora - datetime.timedelta(seconds=1))
+        esgotada = _tarefa_em_execucao(user.id, 'outro:2:b', agora - datetime.timedelta(seconds=1),
+                                       tentativas=fila.max_tentativas)
+        db.session.commit()
+    
+    assert fila.recuperar() == 1
+    
+    assert _aguardar_tarefa(client, vencida)['status'] == 'concluido'
+    assert _aguardar_tarefa(client, esgotada)['erro'] == 'Tarefa interrompida em 3 execuções.'
+    with app.app_context():
+        job = db.session.get(Job, ativa)
+        assert (job.status, job.locked_by) == ('executando', 'outro:1:a')
+        assert db.session.get(Job, vencida).locked_by is None
+
+def test_renovar_reservas_da_propria_fila(client, app):
+    """Testa que a fila estende apenas as reservas das tarefas que ela executa."""
+    fila = app.extensions['fila_jobs']
+    prazo = datetime.datetime.utcnow() + datetime.timedelta(seconds=5)
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        propria = _tarefa_em_execucao(user.id, fila.identificador, prazo)
+        alheia = _tarefa_em_execucao(user.id, 'outro:1:a', prazo)
+        db.session.commit()
+    
+    fila.renovar_reservas()
+    
+    with app.app_context():
+        assert db.session.get(Job, propria).locked_until > prazo + datetime.timedelta(seconds=30)
+        assert db.session.get(Job, alheia).locked_until == prazo
+
+def test_pdf_de_laudo_removido_apos_validade(client, app):
+    """Testa que o PDF de um laudo concluído é removido após a validade e o download indica a expiração."""
+    _login(client)
+    fila = app.extensions['fila_jobs']
+    agora = datetime.datetime.utcnow()
+    tarefas = {}
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        for nome, concluida_em in (('expirada', agora - fila.validade_resultados - datetime.timedelta(minutes=1)),
+                                   ('recente', agora)):
+            job_id = uuid.uuid4().hex
+            caminho = os.path.join(fila.pasta, f'{job_id}.pdf')
+            with open(caminho, 'wb') as arquivo:
+                arquivo.write(b'%PDF-1.4')
+            db.session.add(Job(id=job_id, user_id=user.id, job_type='laudo', status='concluido',
+                               finished_at=concluida_em, result_path=caminho))
+            tarefas[nome] = (job_id, caminho)
+        db.session.commit()
+
+    assert fila.limpar_resultados() == 1
+
+    expirada, recente = tarefas['expirada'], tarefas['recente']
+    assert not os.path.exists(expirada[1])
+    assert client.get(f'/api/jobs/{expirada[0]}/result').status_code == 410
+    response = client.get(f'/api/jobs/{recente[0]}/result')
+    assert response.status_code == 200
+    assert response.data == b'%PDF-1.4'
+    response.close()
+    os.remove(recente[1])
+
+def test_tarefa_de_outro_usuario_nao_encontrada(client):
+    """Testa que tarefas inexistentes ou de outros usuários não são expostas."""
+    _login(client)
+    
+    response = client.get('/api/jobs/inexistente')
+    
+    assert response.status_code == 404
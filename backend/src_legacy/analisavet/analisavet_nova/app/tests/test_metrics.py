@@ -0,0 +1,67 @@
+"""
+Testes para a instrumentação por etapa da análise do AnalisaVet.
+"""
+
+import json
+import pytest
+from services.analysis_service import AnalysisService
+from services.metrics import Histograma
+
+HEMOGRAMA = {'hemacias': 4.0, 'hemoglobina': 10.0, 'hematocrito': 30.0, 'leucocitos': 9000}
+
+def _login(client):
+    client.post('/api/auth/login',
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+
+@pytest.fixture
+def instrumentacao(monkeypatch):
+    """Ativa a instrumentação com cache vazio e a desativa ao final do teste."""
+    monkeypatch.setattr(AnalysisService, '_cache', AnalysisService._cache)
+    monkeypatch.setattr(AnalysisService, '_metricas', None)
+    AnalysisService.configurar_cache(16)
+    return AnalysisService.ativar_instrumentacao()
+
+def test_histograma_faixas():
+    """Testa a distribuição dos valores nas faixas e a faixa +Inf."""
+    histograma = Histograma((1, 10))
+    for valor in (0.5, 1, 5, 50):
+        histograma.observar(valor)
+
+    assert histograma.exportar()['contagens'] == [2, 1, 1]
+    assert histograma.exportar()['total'] == 4
+
+def test_etapas_e_contagens_registradas(instrumentacao):
+    """Testa que cada etapa da análise calculada e as contagens são registradas."""
+    AnalysisService.analisar_hemograma(HEMOGRAMA, {'especie': 'Cão'})
+    AnalysisService.analisar_hemograma(HEMOGRAMA, {'especie': 'Cão'})
+    metricas = AnalysisService.exportar_metricas()
+
+    for etapa in ('cache', 'classificacao', 'interpretacao_individual', 'interpretacao_conjunta',
+                  'resumo', 'recomendacoes'):
+        assert f'analise.etapa.{etapa}_us' in metricas
+    assert metricas['analise.total_us']['total'] == 2
+    assert metricas['analise.etapa.classificacao_us']['total'] == 1
+    assert metricas['analise.parametros_avaliados']['soma'] == 8
+    assert metricas['analise.alteracoes']['soma'] == 6
+
+def test_desativada_nao_registra(instrumentacao):
+    """Testa que nada é medido com a instrumentação desativada."""
+    AnalysisService.desativar_instrumentacao()
+    AnalysisService.analisar_hemograma(HEMOGRAMA, {'especie': 'Cão'})
+    AnalysisService.analisar_hemogramas_lote([HEMOGRAMA], {'especie': 'Cão'})
+
+    assert AnalysisService.exportar_metricas() is None
+    assert instrumentacao.exportar() == {}
+
+def test_rota_metricas(client, instrumentacao):
+    """Testa a exportação dos histogramas pela rota, incluindo a serialização da resposta."""
+    _login(client)
+    client.post('/api/analysis/analyze', json=dict(HEMOGRAMA, especie='Cão'))
+
+    response = client.get('/api/analysis/metrics')
+    data = json.loads(response.data)['data']
+
+    assert data['instrumentacao_ativa'] is True
+    assert data['histogramas']['resposta.etapa.serializacao_us']['total'] == 1
+    assert data['histogramas']['analise.total_us']['faixas'][-1] == '+Inf'
+    assert data['cache']['falhas'] >= 1
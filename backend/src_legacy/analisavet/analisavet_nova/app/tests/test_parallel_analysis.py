@@ -0,0 +1,78 @@
+"""
+Testes para a análise paralela em lote e a reanálise do histórico do aplicativo AnalisaVet.
+"""
+
+import copy
+import json
+import pytest
+from models.models import Analysis, User, db
+from services.analysis_service import AnalysisService
+from services.parallel_analysis import AnalisadorParalelo, reanalisar_historico
+
+@pytest.fixture
+def analisador():
+    """Pool com dois processos e blocos pequenos, encerrado ao final do teste."""
+    with AnalisadorParalelo(processos=2, tamanho_bloco=40) as analisador:
+        yield analisador
+
+def test_lote_paralelo_igual_ao_lote(analisador, gerar_hemogramas):
+    """Testa que o lote dividido entre processos volta completo e na ordem de entrada."""
+    hemogramas, pacientes = gerar_hemogramas(300, semente=21)
+
+    assert analisador.analisar_lote(hemogramas, pacientes) == \
+        AnalysisService.analisar_hemogramas_lote(hemogramas, pacientes)
+    assert analisador.analisar_lote(hemogramas[:10], {'especie': 'Gato'}) == \
+        AnalysisService.analisar_hemogramas_lote(hemogramas[:10], {'especie': 'Gato'})
+    with pytest.raises(ValueError):
+        analisador.analisar_lote(hemogramas, pacientes[:-1])
+
+def test_lote_compacto_paralelo_igual_ao_lote(analisador, gerar_hemogramas):
+    """Testa que os resultados compactos vindos dos processos codificam como os do lote local."""
+    hemogramas, pacientes = gerar_hemogramas(200, semente=22)
+
+    paralelo = analisador.analisar_lote_compacto(hemogramas, pacientes)
+
+    assert [resultado.codificar() for resultado in paralelo] == \
+        [resultado.codificar() for resultado in AnalysisService.analisar_hemogramas_lote_compacto(hemogramas, pacientes)]
+
+def test_pool_recompilado_quando_referencias_mudam(analisador, restaurar_referencias, gerar_hemogramas):
+    """Testa que os processos passam a usar as referências aplicadas depois da criação do pool."""
+    hemogramas, pacientes = gerar_hemogramas(120, semente=4)
+    analisador.analisar_lote(hemogramas, pacientes)
+
+    valores = copy.deepcopy(AnalysisService.VALORES_REFERENCIA)
+    valores['Cão']['hematocrito'] = {'min': 10, 'max': 20, 'unidade': '%'}
+    AnalysisService.aplicar_referencias(valores, AnalysisService.GRUPOS_PARAMETROS)
+
+    assert analisador.analisar_lote(hemogramas, pacientes) == \
+        AnalysisService.analisar_hemogramas_lote(hemogramas, pacientes)
+
+def test_reanalise_do_historico(app, analisador, restaurar_referencias, gerar_hemogramas):
+    """Testa que a reanálise grava o resultado com as referências em uso e preserva o delta do histórico."""
+    hemogramas, pacientes = gerar_hemogramas(90, semente=8)
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        for hemograma, paciente in zip(hemogramas, pacientes):
+            AnalysisService.salvar_analise(
+                user.id, hemograma, paciente, AnalysisService.analisar_hemograma(hemograma, paciente))
+        corrompida = Analysis(user_id=user.id, patient_species='Cão', hemogram_data='{invalido',
+                              analysis_result='{}')
+        db.session.add(corrompida)
+        db.session.commit()
+        deltas = {a.id: a.get_analysis_result()['delta_historico'] for a in Analysis.query.all() if a.id != corrompida.id}
+
+        valores = copy.deepcopy(AnalysisService.VALORES_REFERENCIA)
+        valores['Cão']['leucocitos'] = {'min': 1000, 'max': 2000, 'unidade': '/µL'}
+        AnalysisService.aplicar_referencias(valores, AnalysisService.GRUPOS_PARAMETROS)
+
+        resultado = reanalisar_historico(analisador, user.id, tamanho_pagina=25)
+
+        assert resultado['reanalisadas'] == 90
+        assert [erro['id'] for erro in resultado['erros']] == [corrompida.id]
+        for analysis in Analysis.query.filter(Analysis.id != corrompida.id).order_by(Analysis.id):
+            esperado = AnalysisService.analisar_hemograma(analysis.get_hemogram_data(), analysis.get_patient_info())
+            salvo = analysis.get_analysis_result()
+            assert json.loads(analysis.analysis_result)['c'] == 1
+            assert salvo['delta_historico'] == deltas[analysis.id]
+            assert salvo['parametros'] == esperado['parametros']
+            assert salvo['padroes_diagnosticos'] == esperado['padroes_diagnosticos']
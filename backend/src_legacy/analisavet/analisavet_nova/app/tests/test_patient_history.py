@@ -0,0 +1,124 @@
+"""
+Testes para o histórico longitudinal de pacientes do aplicativo AnalisaVet.
+"""
+
+import json
+import numpy as np
+import pytest
+from models.models import db, PatientStats, User
+from services.analysis_service import AnalysisService
+from services.patient_history import (PatientHistoryService, atualizar_estatisticas,
+                                      chave_paciente, comparar_com_historico, desvio_padrao)
+
+PACIENTE = {'especie': 'Cão', 'nome_paciente': 'Rex', 'nome_tutor': 'Ana'}
+
+def _login(client):
+    client.post('/api/auth/login',
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+
+def _salvar_historico(app, valores_hematocrito):
+    """Salva uma análise por valor de hematócrito para o paciente de teste."""
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        for valor in valores_hematocrito:
+            hemograma = {'hematocrito': valor, 'hemoglobina': 15.0}
+            resultado = AnalysisService.analisar_hemograma(hemograma, PACIENTE)
+            AnalysisService.salvar_analise(user.id, hemograma, PACIENTE, resultado)
+        return user.id
+
+def test_welford_igual_a_numpy():
+    """Testa que média e desvio-padrão incrementais coincidem com o cálculo direto."""
+    valores = [45.0, 47.5, 44.2, 49.1, 46.3, 43.8]
+    estatisticas = {}
+    for valor in valores:
+        atualizar_estatisticas(estatisticas, {'hematocrito': valor, 'observacao': 'texto'}, '2026-01-01')
+
+    assert estatisticas['hematocrito'][0] == len(valores)
+    assert estatisticas['hematocrito'][1] == pytest.approx(np.mean(valores))
+    assert desvio_padrao(estatisticas['hematocrito']) == pytest.approx(np.std(valores, ddof=1))
+    assert 'observacao' not in estatisticas
+
+def test_comparacao_aponta_mudanca_significativa():
+    """Testa que apenas desvios relevantes em relação à linha de base são apontados."""
+    estatisticas = {}
+    for valor in (45.0, 46.0, 44.0, 45.5):
+        atualizar_estatisticas(estatisticas, {'hematocrito': valor, 'hemoglobina': 15.0}, '2026-01-01')
+
+    delta = comparar_com_historico(estatisticas, {'hematocrito': 33.0, 'hemoglobina': 15.2}, 4)
+
+    assert delta['exames_anteriores'] == 4
+    assert [a['parametro'] for a in delta['alteracoes_significativas']] == ['hematocrito']
+    assert delta['alteracoes_significativas'][0]['direcao'] == 'queda'
+    assert delta['alteracoes_significativas'][0]['ultimo_valor'] == 45.5
+
+def test_chave_paciente_normalizada():
+    """Testa que acentos, caixa e espaços não separam o mesmo paciente."""
+    assert chave_paciente({'especie': 'Cão', 'nome': ' REX ', 'tutor': 'Ána'}) == \
+        chave_paciente({'especie': 'cao', 'nome_paciente': 'rex', 'nome_tutor': 'ana'})
+    assert chave_paciente({'especie': 'Cão'}) is None
+
+def test_salvar_analise_atualiza_historico(app):
+    """Testa que cada análise salva atualiza as estatísticas e recebe o delta do histórico."""
+    user_id = _salvar_historico(app, [45.0, 46.0, 44.0, 30.0])
+
+    with app.app_context():
+        registro = PatientHistoryService.obter(user_id, PACIENTE)
+        ultima = AnalysisService.obter_analises_usuario(user_id, limit=1)[0].get_analysis_result()
+
+        assert registro.exams_count == 4
+        assert registro.get_stats()['hematocrito'][0] == 4
+        assert ultima['delta_historico']['exames_anteriores'] == 3
+        assert ultima['delta_historico']['alteracoes_significativas'][0]['parametro'] == 'hematocrito'
+
+def test_reconstruir_igual_ao_incremental(app):
+    """Testa que a reconstrução a partir das análises salvas reproduz as estatísticas incrementais."""
+    user_id = _salvar_historico(app, [45.0, 46.0, 44.0, 30.0])
+
+    with app.app_context():
+        incremental = PatientHistoryService.obter(user_id, PACIENTE).get_stats()
+        assert PatientHistoryService.reconstruir(user_id) == 1
+        reconstruido = PatientHistoryService.obter(user_id, PACIENTE).get_stats()
+
+        assert PatientStats.query.count() == 1
+        for parametro, estatistica in incremental.items():
+            assert reconstruido[parametro][:3] == pytest.approx(estatistica[:3])
+
+def test_rotas_delta_e_estatisticas(client, app):
+    """Testa o delta do histórico na análise e a rota de estatísticas do paciente."""
+    _salvar_historico(app, [45.0, 46.0, 44.0])
+    _login(client)
+
+    response = client.post('/api/analysis/analyze',
+                           json={'especie': 'Cão', 'nome_paciente': 'Rex', 'nome_tutor': 'Ana',
+                                 'hematocrito': 60.0, 'hemoglobina': 15.0})
+    delta = json.loads(response.data)['data']['delta_historico']
+    assert delta['alteracoes_significativas'][0]['direcao'] == 'aumento'
+
+    response = client.get('/api/analysis/patient-stats?especie=Cão&nome_paciente=Rex&nome_tutor=Ana')
+    data = json.loads(response.data)
+    assert data['data']['exames'] == 3
+    assert data['data']['parametros']['hematocrito']['media'] == pytest.approx(45.0)
+
+    response = client.get('/api/analysis/patient-stats?nome_paciente=Desconhecido')
+    assert response.status_code == 404
+
+def test_criacao_concorrente_usa_registro_existente(app):
+    """Testa que, se outra requisição criou o paciente após a consulta, o exame vai para o registro dela."""
+    with app.app_context():
+        user_id = User.query.filter_by(email='teste@example.com').first().id
+        chave = chave_paciente(PACIENTE)
+        estatisticas = {}
+        atualizar_estatisticas(estatisticas, {'hematocrito': 45.0}, '2024-01-01T00:00:00')
+        # A outra requisição grava o registro em sua própria transação
+        with db.engine.begin() as conexao:
+            conexao.execute(PatientStats.__table__.insert().values(
+                user_id=user_id, patient_key=chave, exams_count=1, stats=json.dumps(estatisticas)))
+
+        registro = PatientHistoryService._criar(user_id, chave, PACIENTE)
+        registro.exams_count += 1
+        db.session.commit()
+
+        registros = PatientStats.query.filter_by(user_id=user_id).all()
+        assert len(registros) == 1
+        assert registros[0].exams_count == 2
+        assert registros[0].get_stats()['hematocrito'][0] == 1
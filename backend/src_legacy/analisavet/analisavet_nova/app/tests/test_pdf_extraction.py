@@ -0,0 +1,164 @@
+"""
+Testes para o pool de extração de texto de PDFs do aplicativo AnalisaVet.
+"""
+
+import os
+import time
+import pytest
+from utils import pdf_extraction
+from utils.pdf_extraction import PoolExtracao, registrar_backend, resolver_backend
+from utils.pdf_parser import LeitorHemograma, processar_caminho_hemograma
+
+LAUDO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     'laudos_teste', 'laudo_tecnico_1.pdf')
+
+class BackendLento:
+    """Backend que nunca termina a tempo."""
+    nome = 'teste_lento'
+
+    def __init__(self, timeout=None):
+        pass
+
+    @staticmethod
+    def disponivel():
+        return True
+
+    def extrair(self, caminho_pdf):
+        time.sleep(30)
+
+class BackendGuloso:
+    """Backend que tenta alocar mais memória do que o limite."""
+    nome = 'teste_guloso'
+
+    def __init__(self, timeout=None):
+        pass
+
+    @staticmethod
+    def disponivel():
+        return True
+
+    def extrair(self, caminho_pdf):
+        return str(len(bytearray(1024 * 1024 * 1024)))
+
+PAGINA_HEMOGRAMA = """Paciente: Rex   Espécie: Canina   Raça: Labrador
+Idade: 3 anos   Sexo: Macho   Tutor: Ana Souza
+Hemácias 6,5  Hemoglobina 15,2  Hematócrito 45  VCM 69  HCM 23  CHCM 33,8
+Reticulócitos 0,5  Leucócitos 12.000  Segmentados 8.000  Linfócitos 2.500
+Monócitos 500  Eosinófilos 400  Basófilos 0  Plaquetas 250.000  Proteína 7,1
+"""
+
+class BackendAnexos:
+    """Backend de um laudo com o hemograma na primeira página seguido de anexos."""
+    nome = 'teste_anexos'
+
+    def __init__(self, timeout=None):
+        pass
+
+    @staticmethod
+    def disponivel():
+        return True
+
+    def extrair(self, caminho_pdf):
+        return "".join(self.paginas(caminho_pdf))
+
+    def paginas(self, documento, max_paginas=None):
+        yield PAGINA_HEMOGRAMA
+        yield "Bioquímica sérica\n"
+        for numero in range(3, 21):
+            raise RuntimeError(f"A página {numero} não deveria ser extraída.")
+
+@pytest.fixture
+def backends_de_teste(monkeypatch):
+    """Registra os backends de teste apenas durante o teste."""
+    monkeypatch.setattr(pdf_extraction, 'BACKENDS', dict(pdf_extraction.BACKENDS))
+    registrar_backend(BackendLento)
+    registrar_backend(BackendGuloso)
+    registrar_backend(BackendAnexos)
+
+def test_pool_reutiliza_processo_e_informa_backend():
+    """Testa que as extrações reutilizam o processo do pool e informam backend e duração."""
+    pool = PoolExtracao('pypdf', processos=2)
+    try:
+        resultados = [pool.extrair(LAUDO) for _ in range(3)]
+
+        assert all(r.erro is None and 'Rex' in r.texto for r in resultados)
+        assert {r.backend for r in resultados} == {'pypdf'}
+        assert all(r.duracao_ms > 0 for r in resultados)
+        assert len(pool._ativos) == 1
+
+        erro = pool.extrair('/caminho/inexistente.pdf')
+        assert erro.texto is None and erro.erro
+        assert pool.extrair(LAUDO).erro is None
+    finally:
+        pool.encerrar()
+
+def test_timeout_substitui_processo(backends_de_teste):
+    """Testa que um documento que excede o tempo é interrompido sem travar o pool."""
+    pool = PoolExtracao('teste_lento', processos=1, timeout=0.2)
+    try:
+        inicio = time.perf_counter()
+        resultado = pool.extrair(LAUDO)
+
+        assert time.perf_counter() - inicio < 10
+        assert 'Tempo de extração excedido' in resultado.erro
+        assert resultado.backend == 'teste_lento'
+        assert len(pool._ativos) == 0
+    finally:
+        pool.encerrar()
+
+@pytest.mark.skipif(pdf_extraction.resource is None, reason='limite de memória indisponível na plataforma')
+def test_limite_de_memoria(backends_de_teste):
+    """Testa que um documento que excede o limite de memória falha sem derrubar o aplicativo."""
+    pool = PoolExtracao('teste_guloso', processos=1, memoria_mb=64)
+    try:
+        assert pool.extrair(LAUDO).erro == 'Limite de memória excedido.'
+    finally:
+        pool.encerrar()
+
+def test_backend_desconhecido_ou_indisponivel(backends_de_teste, monkeypatch):
+    """Testa a seleção do backend pela configuração."""
+    with pytest.raises(ValueError):
+        resolver_backend('inexistente')
+    monkeypatch.setattr(pdf_extraction.BackendPdftotext, 'disponivel', staticmethod(lambda: False))
+    assert resolver_backend('auto') == 'pypdf'
+    with pytest.raises(ValueError):
+        resolver_backend('pdftotext')
+
+def test_processar_pdf_informa_extracao():
+    """Testa que os dados extraídos de um PDF trazem o backend e a duração da extração."""
+    dados = processar_caminho_hemograma(LAUDO, 'pdf')
+
+    assert dados['paciente']['nome'] == 'Rex'
+    assert dados['extracao']['erro'] is None
+    assert dados['extracao']['backend'] in pdf_extraction.BACKENDS
+    assert dados['extracao']['duracao_ms'] > 0
+
+def test_extracao_para_quando_os_campos_sao_encontrados(backends_de_teste):
+    """Testa que as páginas após o hemograma não são extraídas quando todos os campos já foram lidos."""
+    pool = PoolExtracao('teste_anexos', processos=1)
+    try:
+        leitor = LeitorHemograma()
+        resultado = pool.extrair(LAUDO, consumidor=leitor.alimentar)
+
+        assert resultado.erro is None
+        assert resultado.paginas == 1 and resultado.texto is None
+        assert leitor.completo
+        assert leitor.resultado()['paciente']['tutor'] == 'Ana Souza'
+        assert leitor.resultado()['hemograma']['proteina'] == 7.1
+
+        # O mesmo processo atende o documento seguinte
+        assert pool.extrair(LAUDO, consumidor=lambda texto: True).paginas == 1
+        assert len(pool._ativos) == 1
+    finally:
+        pool.encerrar()
+
+def test_orcamento_de_paginas(backends_de_teste):
+    """Testa que o orçamento de páginas limita a leitura de um documento sem todos os campos."""
+    pool = PoolExtracao('teste_anexos', processos=1, max_paginas=2)
+    try:
+        resultado = pool.extrair(LAUDO, consumidor=lambda texto: False)
+        assert resultado.erro is None and resultado.paginas == 2
+
+        assert pool.extrair(LAUDO).texto == PAGINA_HEMOGRAMA + "Bioquímica sérica\n"
+    finally:
+        pool.encerrar()
@@ -0,0 +1,103 @@
+"""
+Testes para o registro de layouts de laudos do aplicativo AnalisaVet.
+"""
+
+import time
+from utils.pdf_layouts import RegistroLayouts, impressao_layout
+from utils.pdf_parser import LeitorHemograma, extrair_dados_hemograma
+
+MODELO = """LABORATÓRIO VETERINÁRIO PET DIAGNÓSTICO
+Rua das Flores, 100 - Telefone (11) 5555-0000
+Paciente: {nome}   Espécie: {especie}   Raça: {raca}
+Idade: {idade}   Sexo: Macho   Tutor: {tutor}
+ERITROGRAMA
+Hemácias ........ {hemacias} x10⁶/µL   5,5 - 8,5
+Hemoglobina ..... {hemoglobina} g/dL      12 - 18
+Hematócrito ..... {hematocrito} %           37 - 55
+VCM ............. 69 fL
+HCM ............. 23 pg
+CHCM ............ 33,8 %
+LEUCOGRAMA
+Leucócitos ...... {leucocitos} /µL
+Segmentados ..... 8.000
+Linfócitos ...... 2.500
+Plaquetas ....... 250.000
+Observação: amostra sem hemólise. Hb dentro do esperado.
+"""
+
+def _laudo(**valores):
+    padrao = dict(nome='Rex', especie='Canina', raca='Labrador', idade='3 anos', tutor='Ana Souza',
+                  hemacias='6,50', hemoglobina='15,2', hematocrito='45', leucocitos='12.000')
+    padrao.update(valores)
+    return MODELO.format(**padrao)
+
+def _ler(registro, texto):
+    leitor = LeitorHemograma(registro)
+    leitor.alimentar(texto)
+    dados = leitor.resultado()
+    leitor.aprender_layout()
+    return leitor, dados
+
+def test_impressao_ignora_dados_do_paciente():
+    """Testa que a impressão depende do cabeçalho e da geometria, não dos valores do laudo."""
+    outro = _laudo(nome='Mimi', especie='Felina', tutor='Carlos', hemoglobina='9,1')
+
+    assert impressao_layout(_laudo()) == impressao_layout(outro)
+    assert impressao_layout(_laudo()) != impressao_layout(_laudo().replace('PET DIAGNÓSTICO', 'VIDA ANIMAL'))
+    assert impressao_layout(_laudo()) != impressao_layout(_laudo() + 'Assinatura\n')
+
+def test_layout_aprendido_e_usado():
+    """Testa que o primeiro laudo ensina o layout e os seguintes são lidos pelas linhas dos campos."""
+    registro = RegistroLayouts()
+    primeiro, _ = _ler(registro, _laudo())
+    assert primeiro.layout is None and primeiro.impressao in registro
+
+    texto = _laudo(nome='Mimi', especie='Felina', tutor='Carlos Lima', hemoglobina='9,1', leucocitos='21.500')
+    segundo, dados = _ler(registro, texto)
+
+    assert segundo.layout is not None
+    assert dados == extrair_dados_hemograma(texto)
+    assert dados['hemograma']['hemoglobina'] == 9.1
+    assert dados['paciente']['especie'] == 'Gato'
+
+def test_laudo_fora_do_layout_volta_ao_generico():
+    """Testa que um laudo com a mesma impressão e campos em outras linhas é lido pelo caminho genérico."""
+    registro = RegistroLayouts()
+    _ler(registro, _laudo())
+    linhas = _laudo(hemoglobina='11,0').split('\n')
+    linhas[6], linhas[10] = linhas[10], linhas[6]
+    texto = '\n'.join(linhas)
+
+    leitor, dados = _ler(registro, texto)
+
+    assert leitor.layout is None
+    assert dados == extrair_dados_hemograma(texto)
+    assert dados['hemograma']['hemoglobina'] == 11.0
+    # O layout é reaprendido com as novas posições
+    assert registro.obter(leitor.impressao).campos['hemoglobina'][1] == 10
+
+def test_registro_persiste_entre_reinicios(tmp_path):
+    """Testa que os layouts aprendidos são salvos e carregados de novo."""
+    caminho = str(tmp_path / 'layouts.json')
+    leitor, _ = _ler(RegistroLayouts(caminho), _laudo())
+
+    recarregado = RegistroLayouts(caminho)
+
+    assert leitor.impressao in recarregado
+    assert recarregado.obter(leitor.impressao).campos['hemoglobina'] == (0, 6, 'hemoglobina')
+    assert _ler(recarregado, _laudo(nome='Thor'))[0].layout is not None
+
+def test_layout_conhecido_mais_rapido():
+    """Testa que a leitura pelo layout é mais rápida que a genérica em um laudo com observações longas."""
+    observacoes = "Observação clínica do responsável técnico sem valores de exame.\n" * 200
+    texto = _laudo() + observacoes
+    registro = RegistroLayouts()
+    _ler(registro, texto)
+
+    def medir(registro_usado):
+        inicio = time.perf_counter()
+        for _ in range(50):
+            _ler(registro_usado, texto)
+        return time.perf_counter() - inicio
+
+    assert medir(registro) * 2 < medir(None)
@@ -0,0 +1,95 @@
+"""
+Testes para a extração de dados do texto de laudos em PDF do aplicativo AnalisaVet.
+"""
+
+import os
+import time
+import pytest
+from utils.pdf_parser import extrair_dados_hemograma, processar_caminho_hemograma
+
+LAUDOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'laudos_teste')
+
+LAUDO = """LABORATÓRIO VETERINÁRIO
+Nome do Paciente: Rex     Espécie: Canina
+Raça: Labrador, Idade: 1 ano e 2 meses
+Sexo: Macho   Tutor: Ana Souza
+ERITROGRAMA
+Hemácias ........ 6,50 x10⁶/µL   5,5 - 8,5
+Hemoglobina ..... 15,2 g/dL      12 - 18
+Hematócrito ..... 45 %           37 - 55
+CHCM ............ 33,8 %
+HCM ............. 23 pg
+LEUCOGRAMA
+Leucócitos ...... 12.000 /µL
+Segmentados ..... 8.000
+Plaquetas ....... 250.000
+"""
+
+def test_extrai_hemograma_e_paciente():
+    """Testa a extração dos campos do hemograma e do paciente em uma única passagem."""
+    dados = extrair_dados_hemograma(LAUDO)
+    hemograma, paciente = dados['hemograma'], dados['paciente']
+
+    assert hemograma['hemacias'] == 6.5
+    assert hemograma['hematocrito'] == 45.0
+    assert hemograma['chcm'] == 33.8
+    assert hemograma['hcm'] == 23.0
+    assert hemograma['leucocitos'] == 12000.0
+    assert hemograma['plaquetas'] == 250000.0
+    assert hemograma['reticulocitos'] is None
+    assert paciente == {'nome': 'Rex', 'especie': 'Cão', 'raca': 'Labrador', 'idade': '1 ano e 2 meses',
+                        'sexo': 'Macho', 'tutor': 'Ana Souza'}
+
+def test_valores_nao_atravessam_linhas():
+    """Testa que um rótulo sem valor na própria linha não captura o número da linha seguinte."""
+    texto = "Reticulócitos\nLeucócitos: 9.500\nPaciente:\n15 Hb 13,1\nPaciente | Mimi | Gato\n"
+    dados = extrair_dados_hemograma(texto)
+
+    assert dados['hemograma']['reticulocitos'] is None
+    assert dados['hemograma']['leucocitos'] == 9500.0
+    assert dados['hemograma']['hemoglobina'] == 13.1
+    assert dados['paciente']['nome'] == 'Mimi'
+    assert dados['paciente']['especie'] == 'Gato'
+
+@pytest.mark.parametrize('texto, especie', [
+    ('Laudo de felino com suspeita de anemia', 'Gato'),
+    ('Paciente felino, contactante de cão', 'Cão'),
+    ('Espécie: Felina', 'Gato'),
+    ('Espécie: Equina', 'Equina'),
+    ('Hemoglobina 12', None),
+])
+def test_especie(texto, especie):
+    """Testa a espécie informada (normalizada) e a detectada por palavras-chave."""
+    assert extrair_dados_hemograma(texto)['paciente']['especie'] == especie
+
+def test_laudo_longo_uma_passagem():
+    """Testa que um laudo de muitas páginas é lido sem reprocessar o texto para cada campo."""
+    observacoes = "Observação clínica do responsável técnico sem valores de exame.\n" * 5000
+    texto = LAUDO.replace("ERITROGRAMA", observacoes + "ERITROGRAMA")
+
+    inicio = time.perf_counter()
+    dados = extrair_dados_hemograma(texto)
+
+    assert time.perf_counter() - inicio < 0.5
+    assert dados['hemograma']['plaquetas'] == 250000.0
+    assert dados['paciente']['tutor'] == 'Ana Souza'
+
+@pytest.mark.parametrize('numero, valor', [
+    ('35.0', 35.0), ('10000.0', 10000.0), ('12.000', 12000.0), ('1.234.567', 1234567.0),
+    ('6,50', 6.5), ('12.000,5', 12000.5), ('45', 45.0),
+])
+def test_ponto_decimal_e_de_milhar(numero, valor):
+    """Testa que o ponto só é tratado como separador de milhar em grupos de três dígitos."""
+    assert extrair_dados_hemograma(f"Hematócrito {numero}\n")['hemograma']['hematocrito'] == valor
+
+@pytest.mark.parametrize('arquivo, esperado', [
+    ('laudo_tecnico_1.pdf', {'hemacias': 5.0, 'hemoglobina': 11.0, 'hematocrito': 35.0, 'leucocitos': 10000.0,
+                             'plaquetas': 300000.0, 'proteina': 7.0}),
+    ('laudo_tecnico_2.pdf', {'hemacias': 3.0, 'hematocrito': 14.0, 'segmentados': 10000.0, 'proteina': 6.5}),
+    ('laudo_tecnico_4.pdf', {'hemoglobina': 12.0, 'vcm': 45.0, 'plaquetas': 30000.0, 'proteina': 6.5}),
+])
+def test_valores_dos_laudos_de_teste(arquivo, esperado):
+    """Testa os valores extraídos dos laudos em PDF de exemplo."""
+    hemograma = processar_caminho_hemograma(os.path.join(LAUDOS, arquivo), 'pdf')['hemograma']
+
+    assert {parametro: hemograma[parametro] for parametro in esperado} == esperado
@@ -0,0 +1,133 @@
+"""
+Testes para os conjuntos de referência versionados do aplicativo AnalisaVet.
+"""
+
+import copy
+import json
+import pytest
+from models.models import db, Analysis, ReferenceSet, User, adicionar_colunas_novas
+from services.analysis_service import AnalysisService
+from services.reference_service import ReferenceService
+
+def _login(client):
+    client.post('/api/auth/login',
+               json={'email': 'teste@example.com', 'password': 'senha123'})
+
+def _valores_com_hemoglobina(minimo, maximo):
+    """Referências de fábrica com a faixa de hemoglobina do cão alterada."""
+    valores = copy.deepcopy(AnalysisService.VALORES_REFERENCIA_PADRAO)
+    valores['Cão']['hemoglobina'] = {'min': minimo, 'max': maximo, 'unidade': 'g/dL'}
+    return valores
+
+def test_referencias_padrao_publicadas_na_inicializacao(app, restaurar_referencias):
+    """Testa que o banco vazio recebe as referências de fábrica como versão 1."""
+    with app.app_context():
+        conjunto = ReferenceService.obter(1)
+
+        assert ReferenceService.versao_publicada() == 1
+        assert conjunto.get_reference_values() == AnalysisService.VALORES_REFERENCIA_PADRAO
+        assert AnalysisService.versao_referencias_publicada() == 1
+
+def test_publicar_troca_referencias_sem_reiniciar(app, restaurar_referencias):
+    """Testa que a publicação coloca a nova versão em uso e a registra no resultado."""
+    with app.app_context():
+        conjunto = ReferenceService.publicar(_valores_com_hemoglobina(14, 20), descricao='Hemoglobina')
+        resultado = AnalysisService.analisar_hemograma({'hemoglobina': 15.0}, {'especie': 'Cão'})
+
+        assert conjunto.version == 2
+        assert resultado['versao_referencia'] == 2
+        assert resultado['parametros']['hemoglobina']['referencia'] == '14 - 20 g/dL'
+        assert AnalysisService.GRUPOS_PARAMETROS == AnalysisService.GRUPOS_PARAMETROS_PADRAO
+
+def test_versao_publicada_por_outro_worker_e_recarregada(client, app, restaurar_referencias):
+    """Testa que a verificação antes da requisição carrega uma versão publicada diretamente no banco."""
+    with app.app_context():
+        conjunto = ReferenceSet(version=2, description='Outro worker')
+        conjunto.set_reference_values(_valores_com_hemoglobina(16, 20))
+        conjunto.set_parameter_groups(AnalysisService.GRUPOS_PARAMETROS_PADRAO)
+        db.session.add(conjunto)
+        db.session.commit()
+
+    response = client.get('/api/analysis/reference-values?especie=Cão')
+    data = json.loads(response.data)
+
+    assert data['data']['hemoglobina'] == '16-20 g/dL'
+    assert AnalysisService.versao_referencias_publicada() == 2
+
+def test_estratos_publicados_e_consultados_pela_rota(client, app, restaurar_referencias):
+    """Testa que os estratos fazem parte do conjunto publicado e da rota de referências."""
+    with app.app_context():
+        estratos = copy.deepcopy(AnalysisService.ESTRATOS_REFERENCIA_PADRAO)
+        estratos['Gato']['faixas_etarias'].append({'nome': 'idoso', 'min_meses': 120})
+        estratos['Gato']['intervalos'].append(
+            {'faixa_etaria': 'idoso', 'valores': {'hematocrito': {'min': 28, 'max': 45, 'unidade': '%'}}})
+        ReferenceService.publicar(AnalysisService.VALORES_REFERENCIA_PADRAO, estratos=estratos)
+
+        assert ReferenceService.obter(2).get_strata()['Gato']['faixas_etarias'][-1]['nome'] == 'idoso'
+
+    response = client.get('/api/analysis/reference-values?especie=Gato&idade=12 anos')
+    assert json.loads(response.data)['data']['hematocrito'] == '28-45 %'
+
+    response = client.get('/api/analysis/reference-values?especie=Cão&raca=Greyhound')
+    assert json.loads(response.data)['data']['hematocrito'] == '48-65 %'
+
+def test_publicar_referencias_invalidas(app, restaurar_referencias):
+    """Testa que faixas inconsistentes são rejeitadas sem publicar nova versão."""
+    with app.app_context():
+        with pytest.raises(ValueError):
+            ReferenceService.publicar(_valores_com_hemoglobina(20, 14))
+        with pytest.raises(ValueError):
+            ReferenceService.publicar({'Cão': {'hemoglobina': {'min': 12, 'max': 18}}})
+        with pytest.raises(ValueError):
+            ReferenceService.publicar(AnalysisService.VALORES_REFERENCIA_PADRAO, estratos={
+                'Cão': {'intervalos': [{'faixa_etaria': 'idoso', 'valores': {}}]}})
+
+        assert ReferenceService.versao_publicada() == 1
+
+def test_rota_publicar_exige_permissao(client, app, restaurar_referencias):
+    """Testa que apenas editores configurados podem publicar referências."""
+    _login(client)
+    corpo = {'valores': _valores_com_hemoglobina(14, 20), 'descricao': 'Nova faixa'}
+
+    response = client.post('/api/analysis/reference-sets', json=corpo)
+    assert response.status_code == 403
+
+    app.config['REFERENCIAS_EDITORES'] = {'teste@example.com'}
+    response = client.post('/api/analysis/reference-sets', json=corpo)
+    assert response.status_code == 201
+    assert json.loads(response.data)['data']['versao'] == 2
+
+    response = client.get('/api/analysis/reference-sets')
+    data = json.loads(response.data)
+    assert data['data']['versao_em_uso'] == 2
+    assert [c['versao'] for c in data['data']['conjuntos']] == [2, 1]
+
+def test_salvar_analise_registra_versao(app, restaurar_referencias):
+    """Testa que a análise salva registra a versão de referência que a produziu."""
+    with app.app_context():
+        user = User.query.filter_by(email='teste@example.com').first()
+        paciente = {'especie': 'Cão', 'nome_paciente': 'Rex', 'sexo': 'Macho'}
+        resultado = AnalysisService.analisar_hemograma({'hemoglobina': 15.0}, paciente)
+
+        analysis = AnalysisService.salvar_analise(user.id, {'hemoglobina': 15.0}, paciente, resultado)
+        salva = db.session.get(Analysis, analysis.id)
+
+        assert salva.reference_version == 1
+        assert salva.patient_name == 'Rex'
+        assert salva.patient_gender == 'Macho'
+        assert salva.get_analysis_result()['parametros']['hemoglobina']['status'] == 'normal'
+
+def test_colunas_novas_adicionadas_a_banco_existente(app):
+    """Testa que a inicialização adiciona reference_version a uma tabela analyses antiga."""
+    with app.app_context():
+        db.session.execute(db.text('DROP TABLE analyses'))
+        db.session.execute(db.text(
+            'CREATE TABLE analyses (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, analysis_result TEXT)'))
+        db.session.execute(db.text("INSERT INTO analyses (id, user_id, analysis_result) VALUES (1, 1, '{}')"))
+        db.session.commit()
+
+        assert 'analyses.reference_version' in adicionar_colunas_novas()
+        assert adicionar_colunas_novas() == []
+        colunas = {coluna['name'] for coluna in db.inspect(db.engine).get_columns('analyses')}
+        assert 'reference_version' in colunas
+        assert db.session.execute(db.text('SELECT reference_version FROM analyses')).scalar() is None
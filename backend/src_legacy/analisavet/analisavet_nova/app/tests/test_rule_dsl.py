@@ -0,0 +1,122 @@
+"""
+Testes para as regras diagnósticas configuráveis do aplicativo AnalisaVet.
+"""
+
+import math
+import time
+import numpy as np
+import pytest
+from services.analysis_service import AnalysisService
+from services.reference_service import ReferenceService
+from services.rule_dsl import AvaliadorRegras, RegraInvalida, compilar_expressao, validar_regras
+
+PARAMETROS = ('hematocrito', 'segmentados', 'linfocitos')
+MINIMOS = [37.0, 2700.0, 900.0]
+MAXIMOS = [55.0, 9400.0, 4700.0]
+
+def _avaliar(expressao, valores):
+    _, funcao, funcao_vetor = compilar_expressao(expressao, PARAMETROS)
+    escalar = funcao(valores, MINIMOS, MAXIMOS)
+    vetor = funcao_vetor(np.array([valores]), np.array(MINIMOS), np.array(MAXIMOS))
+    return escalar, np.broadcast_to(vetor, (1,))[0]
+
+@pytest.mark.parametrize('expressao, valores, esperado', [
+    ('segmentados : linfocitos > 5', [40.0, 12000.0, 2000.0], True),
+    ('segmentados / linfocitos > 5', [40.0, 12000.0, 3000.0], False),
+    ('hematocrito < MIN(hematocrito) or segmentados > max(segmentados) and linfocitos < MIN(linfocitos)',
+     [30.0, 5000.0, 2000.0], True),
+    ('(hematocrito < MIN(hematocrito) ou segmentados > 9000) e linfocitos >= 900', [40.0, 9500.0, 900.0], True),
+    ('hematocrito - MAX(hematocrito) * 0.5 > -(10)', [40.0, 0.0, 0.0], True),
+    ('hematocrito < 100', [math.nan, 1.0, 1.0], False),
+    ('segmentados / linfocitos >= 0', [40.0, 1.0, 0.0], False),
+])
+def test_expressoes_escalar_e_vetorizada(expressao, valores, esperado):
+    """Testa a avaliação das expressões e a igualdade entre as versões escalar e vetorizada."""
+    escalar, vetor = _avaliar(expressao, valores)
+    assert escalar == esperado
+    assert bool(vetor) == esperado
+
+@pytest.mark.parametrize('definicao', [
+    {'nome': 'x', 'condicao': 'hematocrito <'},
+    {'nome': 'x', 'condicao': 'hematocrito + 1'},
+    {'nome': 'x', 'condicao': 'hematocrito < 1 and 2'},
+    {'nome': 'x', 'condicao': 'hematocrito < 1; import os'},
+    {'nome': 'x', 'condicao': 'desconhecido > 1'},
+    {'nome': 'x', 'valor': 'hematocrito > 1', 'faixas': {'leve': 1}},
+    {'nome': 'x', 'valor': 'hematocrito', 'faixas': {'leve': 5, 'moderada': 3, 'grave': 8}},
+    {'nome': 'x', 'valor': 'hematocrito', 'faixas': {'critica': 5}},
+    {'nome': 'x'},
+])
+def test_regras_invalidas(definicao):
+    """Testa que expressões e definições inválidas são rejeitadas na compilação."""
+    with pytest.raises(RegraInvalida):
+        validar_regras([definicao], {'Cão': PARAMETROS})
+
+def test_faixas_de_gravidade():
+    """Testa a gravidade pelas faixas crescentes e decrescentes."""
+    avaliador = AvaliadorRegras([
+        {'nome': 'nl', 'valor': 'segmentados : linfocitos', 'faixas': {'leve': 5, 'moderada': 8, 'grave': 12}},
+        {'nome': 'ht', 'valor': 'hematocrito', 'faixas': {'leve': 30, 'grave': 20}},
+    ], 'Cão', PARAMETROS)
+
+    padroes = avaliador.avaliar([18.0, 9000.0, 1000.0], MINIMOS, MAXIMOS)
+
+    assert [(p['regra'], p['gravidade'], p['valor']) for p in padroes] == [('nl', 'moderada', 9.0), ('ht', 'grave', 18.0)]
+    assert avaliador.avaliar([35.0, 4000.0, 1000.0], MINIMOS, MAXIMOS) == []
+
+def test_regra_sem_parametro_da_especie_e_ignorada():
+    """Testa que a regra só é desativada nas espécies cuja tabela não tem o parâmetro."""
+    regras = [{'nome': 'ret', 'condicao': 'reticulocitos > 10'}]
+    validar_regras(regras, {'Cão': PARAMETROS + ('reticulocitos',), 'Gato': PARAMETROS})
+
+    assert len(AvaliadorRegras(regras, 'Gato', PARAMETROS)) == 0
+    assert len(AvaliadorRegras(regras, 'Cão', PARAMETROS + ('reticulocitos',))) == 1
+    assert len(AvaliadorRegras([dict(regras[0], especies=['Gato'])], 'Cão', PARAMETROS + ('reticulocitos',))) == 0
+
+def test_regras_padrao_na_analise_e_no_lote(gerar_hemogramas):
+    """Testa os padrões das regras de fábrica nas análises unitária e em lote."""
+    hemograma = {'hematocrito': 30.0, 'reticulocitos': 150.0, 'segmentados': 14000.0, 'linfocitos': 1000.0}
+    resultado = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})
+    regras = [p['regra'] for p in resultado['padroes_diagnosticos']]
+
+    assert regras == ['relacao_neutrofilo_linfocito', 'anemia_regenerativa']
+    assert resultado['padroes_diagnosticos'][0]['gravidade'] == 'grave'
+
+    hemogramas, pacientes = gerar_hemogramas(400, semente=5)
+    lote = AnalysisService.analisar_hemogramas_lote(hemogramas, pacientes)
+    assert any(r['padroes_diagnosticos'] for r in lote)
+    for hemograma, paciente, resultado in zip(hemogramas, pacientes, lote):
+        assert resultado['padroes_diagnosticos'] == \
+            AnalysisService.analisar_hemograma(hemograma, paciente)['padroes_diagnosticos']
+
+def test_publicar_regras_troca_padroes(app, restaurar_referencias):
+    """Testa que novas regras publicadas entram em uso e que regras inválidas são recusadas."""
+    with app.app_context():
+        hemograma = {'hematocrito': 30.0, 'plaquetas': 100000.0}
+        assert AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})['padroes_diagnosticos'] == []
+
+        regras = [{'nome': 'anemia_trombocitopenia', 'interpretacao': 'Investigar hemorragia.',
+                   'condicao': 'hematocrito < MIN(hematocrito) and plaquetas < MIN(plaquetas)'}]
+        conjunto = ReferenceService.publicar(AnalysisService.VALORES_REFERENCIA, regras=regras)
+        padroes = AnalysisService.analisar_hemograma(hemograma, {'especie': 'Cão'})['padroes_diagnosticos']
+
+        assert conjunto.get_rules() == regras
+        assert [p['regra'] for p in padroes] == ['anemia_trombocitopenia']
+        with pytest.raises(ValueError):
+            ReferenceService.publicar(AnalysisService.VALORES_REFERENCIA, regras=[{'nome': 'x', 'condicao': '>'}])
+
+def test_duzentas_regras_abaixo_de_um_milissegundo(gerar_hemogramas):
+    """Testa que 200 regras compiladas são avaliadas em menos de 1 ms por exame."""
+    parametros = tuple(AnalysisService.VALORES_REFERENCIA_PADRAO['Cão'])
+    modelos = [regra for regra in AnalysisService.REGRAS_DIAGNOSTICAS_PADRAO]
+    regras = [dict(modelos[i % len(modelos)], nome=f'regra_{i}') for i in range(200)]
+    avaliador = AvaliadorRegras(regras, 'Cão', parametros)
+    tabela = AnalysisService.obter_tabela_referencia('Cão')
+    minimos, maximos = tabela.minimos.tolist(), tabela.maximos.tolist()
+    hemogramas, _ = gerar_hemogramas(200, semente=9)
+    vetores = [[math.nan if h.get(p) is None else float(h[p]) for p in parametros] for h in hemogramas]
+
+    inicio = time.perf_counter()
+    for valores in vetores:
+        avaliador.avaliar(valores, minimos, maximos)
+    assert (time.perf_counter() - inicio) / len(vetores) < 0.001
@@ -0,0 +1,102 @@
+"""
+Testes para o recebimento de arquivos enviados ao aplicativo AnalisaVet.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+from flask import request
+from werkzeug.datastructures import FileStorage
+from utils.pdf_extraction import PoolExtracao
+from utils.pdf_parser import processar_arquivo_hemograma
+from utils.upload import receber_upload
+
+LAUDO = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                     'laudos_teste', 'laudo_tecnico_1.pdf')
+
+CSV = "Hemácias,Hemoglobina,Hematócrito,Leucócitos,Plaquetas\n6.5,15.2,45,12000,250000\n"
+
+def _arquivo(conteudo, nome):
+    return FileStorage(stream=io.BytesIO(conteudo), filename=nome)
+
+def test_upload_pequeno_fica_em_memoria():
+    """Testa que um arquivo abaixo do limite não é gravado em disco."""
+    conteudo = os.urandom(200 * 1024)
+    with receber_upload(_arquivo(conteudo, 'laudo.PDF')) as upload:
+        assert upload.em_memoria
+        assert upload.origem == conteudo
+        assert upload.extensao == 'pdf'
+        assert upload.resumo() == {'nome': 'laudo.PDF', 'tamanho_bytes': len(conteudo),
+                                   'sha256': hashlib.sha256(conteudo).hexdigest()}
+
+def test_upload_grande_vai_para_disco(tmp_path):
+    """Testa que um fluxo anônimo acima do limite é copiado para a pasta informada e removido ao fechar."""
+    conteudo = os.urandom(300 * 1024)
+    fluxo = tempfile.TemporaryFile()
+    fluxo.write(conteudo)
+    with receber_upload(FileStorage(stream=fluxo, filename='laudo.pdf'), limite_memoria=100 * 1024,
+                        pasta=str(tmp_path)) as upload:
+        assert not upload.em_memoria
+        assert os.path.dirname(upload.origem) == str(tmp_path)
+        with open(upload.origem, 'rb') as f:
+            assert f.read() == conteudo
+        assert upload.sha256 == hashlib.sha256(conteudo).hexdigest()
+
+    assert os.listdir(tmp_path) == []
+    fluxo.close()
+
+def test_upload_da_requisicao_sem_copia(app, tmp_path):
+    """Testa que os arquivos recebidos pelo Werkzeug são reaproveitados, em memória ou pelo caminho."""
+    pequeno = os.urandom(10 * 1024)
+    grande = os.urandom(300 * 1024)
+    app.config['UPLOAD_LIMITE_MEMORIA'] = 100 * 1024
+
+    for conteudo in (pequeno, grande):
+        with app.test_request_context('/', method='POST', content_type='multipart/form-data',
+                                      data={'file': (io.BytesIO(conteudo), 'laudo.pdf')}):
+            arquivo = request.files['file']
+            with receber_upload(arquivo, pasta=str(tmp_path)) as upload:
+                assert upload.sha256 == hashlib.sha256(conteudo).hexdigest()
+                if conteudo is pequeno:
+                    assert upload.em_memoria and upload.origem == conteudo
+                else:
+                    # O temporário do Werkzeug é entregue pelo caminho, sem nova cópia
+                    assert upload.origem == arquivo.stream.name
+                    assert upload.origem.endswith('.pdf')
+                    with open(upload.origem, 'rb') as f:
+                        assert f.read() == conteudo
+            if conteudo is grande:
+                # O temporário é do Werkzeug, que o remove ao final da requisição
+                assert os.path.exists(arquivo.stream.name)
+
+    assert os.listdir(tmp_path) == []
+
+def test_processar_arquivo_sem_temporarios(tmp_path):
+    """Testa o processamento de PDF e CSV enviados sem deixar arquivos temporários."""
+    with open(LAUDO, 'rb') as f:
+        pdf = f.read()
+
+    dados_pdf = processar_arquivo_hemograma(_arquivo(pdf, 'laudo.pdf'), diretorio_temp=str(tmp_path))
+    dados_csv = processar_arquivo_hemograma(_arquivo(CSV.encode('utf-8'), 'exame.csv'),
+                                            diretorio_temp=str(tmp_path))
+
+    assert dados_pdf['paciente']['nome'] == 'Rex'
+    assert dados_pdf['arquivo']['sha256'] == hashlib.sha256(pdf).hexdigest()
+    assert dados_csv['hemograma']['hemoglobina'] == 15.2
+    assert dados_csv['arquivo']['tamanho_bytes'] == len(CSV.encode('utf-8'))
+    assert os.listdir(tmp_path) == []
+
+def test_extracao_de_bytes_igual_a_do_caminho():
+    """Testa que o pool extrai o mesmo texto do conteúdo em memória e do arquivo."""
+    with open(LAUDO, 'rb') as f:
+        conteudo = f.read()
+    pool = PoolExtracao('pypdf', processos=1)
+    try:
+        do_caminho = pool.extrair(LAUDO)
+        da_memoria = pool.extrair(conteudo)
+
+        assert da_memoria.erro is None
+        assert da_memoria.texto == do_caminho.texto
+    finally:
+        pool.encerrar()
@@ -0,0 +1,205 @@
+"""
+Importação de hemogramas de arquivos CSV.
+
+O arquivo é lido linha a linha pelo módulo csv, gerando um hemograma por linha:
+exportações de laboratório com milhares de linhas são importadas com memória
+constante. O delimitador e o uso da vírgula decimal são detectados em uma amostra
+do início do arquivo, e os nomes das colunas são resolvidos uma única vez, pelo
+índice de apelidos montado a partir das tabelas de mapeamento.
+"""
+
+import csv
+import io
+import re
+import unicodedata
+
+from utils.pdf_extraction import TIPOS_CONTEUDO
+
+# Possíveis nomes de colunas (sem acentos, em minúsculas) de cada parâmetro do hemograma
+MAPEAMENTO_HEMOGRAMA = {
+    "hemacias": ["hemacias", "eritrocitos", "rbc"],
+    "hemoglobina": ["hemoglobina", "hb", "hgb"],
+    "hematocrito": ["hematocrito", "ht", "hct"],
+    "vcm": ["vcm", "mcv"],
+    "hcm": ["hcm", "mch"],
+    "chcm": ["chcm", "mchc"],
+    "reticulocitos": ["reticulocitos", "retic"],
+    "leucocitos": ["leucocitos", "leuco", "wbc"],
+    "segmentados": ["segmentados", "neutrofilos", "neutro", "seg"],
+    "linfocitos": ["linfocitos", "linfo", "lymph"],
+    "monocitos": ["monocitos", "mono"],
+    "eosinofilos": ["eosinofilos", "eosino", "eos"],
+    "basofilos": ["basofilos", "baso"],
+    "plaquetas": ["plaquetas", "plt"],
+    "proteina": ["proteina", "proteinas", "ppt", "tp"]
+}
+
+# Possíveis nomes de colunas das informações do paciente
+MAPEAMENTO_PACIENTE = {
+    "nome": ["nome", "paciente", "animal", "pet", "nome_paciente"],
+    "raca": ["raca", "breed"],
+    "idade": ["idade", "age"],
+    "sexo": ["sexo", "gender"],
+    "tutor": ["tutor", "proprietario", "dono", "responsavel", "owner"],
+    "especie": ["especie", "animal", "species"]
+}
+
+DELIMITADORES = ",;\t|"
+TAMANHO_AMOSTRA = 64 * 1024
+
+_VIRGULA_DECIMAL = re.compile(r"\d,\d")
+_MILHAR_COM_PONTO = re.compile(r"\d{1,3}(?:\.\d{3})+")
+
+
+def _indexar_apelidos():
+    """
+    Monta o índice dos apelidos de coluna a partir das tabelas de mapeamento.
+
+    Returns:
+        dict: {apelido: [(grupo, chave, prioridade)]}; a mesma coluna pode alimentar mais de um campo
+    """
+    indice = {}
+    for grupo, mapeamento in (("hemograma", MAPEAMENTO_HEMOGRAMA), ("paciente", MAPEAMENTO_PACIENTE)):
+        for chave, apelidos in mapeamento.items():
+            for prioridade, apelido in enumerate(apelidos):
+                indice.setdefault(apelido, []).append((grupo, chave, prioridade))
+    return indice
+
+
+_INDICE_APELIDOS = _indexar_apelidos()
+
+
+def _normalizar_coluna(nome):
+    """Nome da coluna em minúsculas, sem acentos e sem espaços nas pontas."""
+    decomposto = unicodedata.normalize("NFKD", nome.strip().lower())
+    return "".join(c for c in decomposto if not unicodedata.combining(c))
+
+
+def resolver_colunas(cabecalho):
+    """
+    Associa as colunas do cabeçalho aos campos do hemograma e do paciente.
+
+    Para cada campo vale o primeiro apelido da tabela de mapeamento presente no
+    cabeçalho (e, para o mesmo apelido, a primeira coluna).
+
+    Args:
+        cabecalho: Lista com os nomes das colunas
+
+    Returns:
+        list: Tuplas (grupo, chave, índice da coluna)
+    """
+    escolhidas = {}
+    for indice, nome in enumerate(cabecalho):
+        for grupo, chave, prioridade in _INDICE_APELIDOS.get(_normalizar_coluna(nome), ()):
+            atual = escolhidas.get((grupo, chave))
+            if atual is None or prioridade < atual[0]:
+                escolhidas[(grupo, chave)] = (prioridade, indice)
+    return [(grupo, chave, indice) for (grupo, chave), (_, indice) in escolhidas.items()]
+
+
+def detectar_formato(amostra):
+    """
+    Detecta o delimitador e o uso da vírgula decimal em uma amostra do arquivo.
+
+    Args:
+        amostra: Início do arquivo (linhas completas)
+
+    Returns:
+        tuple: (delimitador, vírgula decimal)
+    """
+    try:
+        delimitador = csv.Sniffer().sniff(amostra, delimiters=DELIMITADORES).delimiter
+    except csv.Error:
+        primeira_linha = amostra.split("\n", 1)[0]
+        delimitador = max(DELIMITADORES, key=primeira_linha.count)
+        if not primeira_linha.count(delimitador):
+            delimitador = ","
+    # Com a vírgula como delimitador, uma vírgula decimal só aparece entre aspas e é tratada valor a valor
+    virgula_decimal = delimitador != "," and _VIRGULA_DECIMAL.search(amostra) is not None
+    return delimitador, virgula_decimal
+
+
+def converter_numero(valor, virgula_decimal=False):
+    """
+    Converte o valor de uma célula para float.
+
+    Args:
+        valor: Texto da célula
+        virgula_decimal: Se o arquivo usa vírgula decimal (e ponto de milhar)
+
+    Returns:
+        float ou None se a célula estiver vazia ou não for numérica
+    """
+    valor = valor.strip()
+    if not valor:
+        return None
+    if virgula_decimal:
+        if "," in valor:
+            valor = valor.replace(".", "").replace(",", ".")
+        elif _MILHAR_COM_PONTO.fullmatch(valor):
+            valor = valor.replace(".", "")
+    try:
+        return float(valor)
+    except ValueError:
+        try:
+            return float(valor.replace(",", "."))
+        except ValueError:
+            return None
+
+
+def _normalizar_especie(valor):
+    """Converte a espécie informada para "Cão" ou "Gato" quando reconhecida."""
+    valor_str = valor.lower()
+    if "cão" in valor_str or "canin" in valor_str:
+        return "Cão"
+    if "gato" in valor_str or "felin" in valor_str:
+        return "Gato"
+    return valor
+
+
+def _abrir_texto(origem, encoding):
+    """Fluxo de texto do arquivo CSV (caminho ou conteúdo em bytes)."""
+    if isinstance(origem, TIPOS_CONTEUDO):
+        return io.TextIOWrapper(io.BytesIO(origem), encoding=encoding, newline="")
+    return open(origem, encoding=encoding, newline="")
+
+
+def ler_hemogramas_csv(origem, encoding="utf-8-sig"):
+    """
+    Lê um arquivo CSV de hemogramas, um hemograma por linha.
+
+    Args:
+        origem: Caminho do arquivo CSV ou seu conteúdo (bytes)
+        encoding: Codificação do arquivo
+
+    Yields:
+        dict: Dados de uma linha, separados em hemograma e paciente (linhas vazias são ignoradas)
+    """
+    with _abrir_texto(origem, encoding) as arquivo:
+        amostra = arquivo.read(TAMANHO_AMOSTRA)
+        if len(amostra) == TAMANHO_AMOSTRA and "\n" in amostra:
+            amostra = amostra[:amostra.rindex("\n")]  # A detecção usa apenas linhas completas
+        arquivo.seek(0)
+        delimitador, virgula_decimal = detectar_formato(amostra)
+
+        leitor = csv.reader(arquivo, delimiter=delimitador)
+        cabecalho = next(leitor, None)
+        if cabecalho is None:
+            return
+        colunas = resolver_colunas(cabecalho)
+
+        for linha in leitor:
+            if not any(celula.strip() for celula in linha):
+                continue
+            dados = {"hemograma": dict.fromkeys(MAPEAMENTO_HEMOGRAMA),
+                     "paciente": dict.fromkeys(MAPEAMENTO_PACIENTE)}
+            for grupo, chave, indice in colunas:
+                celula = linha[indice] if indice < len(linha) else ""
+                if grupo == "hemograma":
+                    dados["hemograma"][chave] = converter_numero(celula, virgula_decimal)
+                else:
+                    texto = celula.strip()
+                    if texto and chave == "especie":
+                        texto = _normalizar_especie(texto)
+                    dados["paciente"][chave] = texto or None
+            yield dados
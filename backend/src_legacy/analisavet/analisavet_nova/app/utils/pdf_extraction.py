@@ -0,0 +1,494 @@
+"""
+Extração de texto de PDFs por um pool persistente de processos.
+
+Cada processo do pool mantém um backend de extração carregado (a biblioteca
+pypdf/PyPDF2 ou o utilitário pdftotext) e atende um documento por vez; o número
+de processos limita as extrações simultâneas. Cada documento tem tempo máximo e
+limite de memória: um processo que excede o tempo é encerrado e substituído.
+O resultado informa o backend usado e a duração da extração.
+
+O documento pode ser um caminho ou o conteúdo em memória (bytes), enviado ao
+processo pela conexão sem passar pelo disco.
+
+As páginas são extraídas sob demanda e enviadas uma a uma: quem consome as
+páginas pode encerrar a extração antes do fim do documento, e um orçamento de
+páginas limita a leitura de laudos com muitos anexos.
+"""
+
+import importlib.util
+import io
+import itertools
+import multiprocessing
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: sem limite de memória por processo
+    resource = None
+
+# Padrões usados quando configurar_extracao não é chamada
+BACKEND_PADRAO = "auto"
+PROCESSOS_PADRAO = 2
+TIMEOUT_PADRAO = 30.0
+MEMORIA_MB_PADRAO = 512
+MAX_PAGINAS_PADRAO = 10  # Páginas lidas por documento (0: sem limite)
+DOCUMENTOS_POR_PROCESSO = 200  # O processo é reciclado após esse número de documentos
+
+# Tempo extra para o backend encerrar seus próprios subprocessos antes de o processo ser encerrado
+MARGEM_TIMEOUT = 1.0
+
+# Tipos de conteúdo em memória aceitos como documento
+TIPOS_CONTEUDO = (bytes, bytearray, memoryview)
+
+
+class ErroExtracao(Exception):
+    """Falha na extração de texto de um documento."""
+
+
+class BackendPypdf:
+    """Extrai o texto com a biblioteca pypdf (ou PyPDF2), dentro do processo do pool."""
+
+    nome = "pypdf"
+
+    def __init__(self, timeout=None):
+        try:
+            import pypdf as biblioteca
+        except ImportError:
+            import PyPDF2 as biblioteca
+        self._biblioteca = biblioteca
+
+    @staticmethod
+    def disponivel():
+        """Verifica se alguma das bibliotecas está instalada."""
+        return any(importlib.util.find_spec(nome) for nome in ("pypdf", "PyPDF2"))
+
+    def extrair(self, caminho_pdf):
+        """Retorna o texto de todas as páginas, uma por linha."""
+        return "".join(self.paginas(caminho_pdf))
+
+    def paginas(self, documento, max_paginas=None):
+        """
+        Extrai o texto página a página, apenas quando a página é pedida.
+
+        Args:
+            documento: Caminho do PDF ou seu conteúdo (o BytesIO compartilha os bytes, sem cópia)
+            max_paginas: Número máximo de páginas (None: todas)
+
+        Yields:
+            str: Texto de cada página, terminado por uma quebra de linha
+        """
+        with (io.BytesIO(documento) if isinstance(documento, TIPOS_CONTEUDO)
+              else open(documento, "rb")) as fluxo:
+            paginas = self._biblioteca.PdfReader(fluxo).pages
+            for indice in range(min(len(paginas), max_paginas or len(paginas))):
+                yield (paginas[indice].extract_text() or "") + "\n"
+
+
+class BackendPdftotext:
+    """Extrai o texto com o utilitário pdftotext (poppler), mantendo o layout."""
+
+    nome = "pdftotext"
+
+    def __init__(self, timeout=None):
+        self.timeout = timeout
+
+    @staticmethod
+    def disponivel():
+        """Verifica se o pdftotext está no PATH."""
+        return shutil.which("pdftotext") is not None
+
+    def extrair(self, caminho_pdf):
+        """Executa o pdftotext; o limite de memória do processo do pool vale também para ele."""
+        return self._executar(caminho_pdf)
+
+    def paginas(self, documento, max_paginas=None):
+        """
+        Extrai o texto das páginas, separadas pelo caractere de quebra de página do pdftotext.
+
+        O pdftotext converte de uma vez as páginas pedidas; o orçamento de páginas
+        é repassado a ele (-l) para que os anexos além do limite não sejam lidos.
+
+        Args:
+            documento: Caminho do PDF ou seu conteúdo (lido da entrada padrão)
+            max_paginas: Número máximo de páginas (None: todas)
+
+        Yields:
+            str: Texto de cada página
+        """
+        if isinstance(documento, TIPOS_CONTEUDO):
+            texto = self._executar("-", documento, max_paginas)
+        else:
+            texto = self._executar(documento, max_paginas=max_paginas)
+        paginas = texto.split("\f")
+        if paginas and not paginas[-1].strip():
+            paginas.pop()  # O pdftotext termina a última página com \f
+        yield from paginas
+
+    def _executar(self, entrada, conteudo=None, max_paginas=None):
+        comando = ["pdftotext", "-layout"]
+        if max_paginas:
+            comando += ["-l", str(max_paginas)]
+        try:
+            processo = subprocess.run(comando + [entrada, "-"], input=conteudo,
+                                      capture_output=True, check=True, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            raise ErroExtracao("Tempo de extração excedido.") from None
+        except subprocess.CalledProcessError as e:
+            raise ErroExtracao(e.stderr.decode("utf-8", "replace").strip() or str(e)) from None
+        return processo.stdout.decode("utf-8", "replace")
+
+
+# Backends disponíveis por nome (ver registrar_backend)
+BACKENDS = {
+    BackendPypdf.nome: BackendPypdf,
+    BackendPdftotext.nome: BackendPdftotext
+}
+
+# Ordem de preferência do backend "auto"
+PREFERENCIA_AUTO = ("pdftotext", "pypdf")
+
+
+def registrar_backend(classe):
+    """
+    Registra um backend de extração.
+
+    Args:
+        classe: Classe com o atributo nome, o método estático disponivel() e o
+            método extrair(caminho_pdf); o construtor recebe o timeout por documento.
+            O método opcional paginas(documento, max_paginas) extrai as páginas sob
+            demanda, de um caminho ou de bytes; sem ele, o documento inteiro é uma
+            única página. O método opcional extrair_conteudo(bytes) evita gravar em
+            disco os documentos em memória quando não há paginas
+    """
+    BACKENDS[classe.nome] = classe
+
+
+def resolver_backend(nome):
+    """
+    Obtém o nome do backend a usar.
+
+    Args:
+        nome: Nome de um backend registrado ou "auto" (o primeiro disponível de PREFERENCIA_AUTO)
+
+    Returns:
+        str: Nome do backend
+
+    Raises:
+        ValueError: Se o backend não existir ou não estiver disponível
+    """
+    if nome == "auto":
+        for candidato in PREFERENCIA_AUTO:
+            if candidato in BACKENDS and BACKENDS[candidato].disponivel():
+                return candidato
+        raise ValueError("Nenhum backend de extração de PDF disponível. Instale pypdf ou poppler-utils.")
+    if nome not in BACKENDS:
+        raise ValueError(f"Backend de extração desconhecido: {nome}")
+    if not BACKENDS[nome].disponivel():
+        raise ValueError(f"Backend de extração indisponível: {nome}")
+    return nome
+
+
+def _limitar_memoria(memoria_mb):
+    """Limita o espaço de endereçamento do processo ao uso atual mais memoria_mb."""
+    if resource is None or not memoria_mb:
+        return
+    try:
+        with open("/proc/self/statm") as arquivo:
+            atual = int(arquivo.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        atual = 0
+    _, maximo = resource.getrlimit(resource.RLIMIT_AS)
+    limite = atual + memoria_mb * 1024 * 1024
+    if maximo != resource.RLIM_INFINITY:
+        limite = min(limite, maximo)
+    resource.setrlimit(resource.RLIMIT_AS, (limite, maximo))
+
+
+def _extrair_conteudo(backend, conteudo):
+    """Extrai um documento em memória (por arquivo temporário se o backend só aceitar caminhos)."""
+    if hasattr(backend, "extrair_conteudo"):
+        return backend.extrair_conteudo(conteudo)
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as arquivo:
+        arquivo.write(conteudo)
+        arquivo.flush()
+        return backend.extrair(arquivo.name)
+
+
+def _paginas_documento(backend, caminho, conteudo, max_paginas):
+    """Páginas do documento sob demanda (o texto inteiro como uma página se o backend não paginar)."""
+    if hasattr(backend, "paginas"):
+        # O backend recebe o orçamento como indicação; islice o garante para qualquer backend
+        yield from itertools.islice(backend.paginas(caminho if conteudo is None else conteudo, max_paginas),
+                                    max_paginas)
+    elif conteudo is None:
+        yield backend.extrair(caminho)
+    else:
+        yield _extrair_conteudo(backend, conteudo)
+
+
+def _executar_processo(conexao, classe_backend, timeout, memoria_mb):
+    """
+    Laço do processo do pool.
+
+    Recebe (caminho, max_paginas), com caminho None quando o conteúdo em bytes
+    vem em seguida. Cada página é enviada como ("pagina", texto) e a seguinte só
+    é extraída se a resposta for True; o documento termina com ("fim", erro, reiniciar).
+    """
+    backend = classe_backend(timeout)
+    _limitar_memoria(memoria_mb)
+    while True:
+        try:
+            caminho, max_paginas = conexao.recv()
+            conteudo = conexao.recv_bytes() if caminho is None else None
+        except EOFError:
+            return
+
+        erro, reiniciar = None, False
+        paginas = _paginas_documento(backend, caminho, conteudo, max_paginas)
+        try:
+            for texto in paginas:
+                conexao.send(("pagina", texto))
+                if not conexao.recv():
+                    break
+        except EOFError:
+            return
+        except MemoryError:
+            # A memória pode ter ficado fragmentada: o processo é substituído
+            erro, reiniciar = "Limite de memória excedido.", True
+        except Exception as e:
+            erro = str(e) or e.__class__.__name__
+        finally:
+            paginas.close()
+        conexao.send(("fim", erro, reiniciar))
+
+
+class ResultadoExtracao:
+    """Texto extraído de um documento, com o backend usado, a duração e as páginas lidas."""
+
+    __slots__ = ("texto", "backend", "duracao_ms", "erro", "paginas")
+
+    def __init__(self, texto, backend, duracao_ms, erro=None, paginas=0):
+        """
+        Args:
+            texto: Texto extraído (None em caso de erro ou quando as páginas foram entregues a um consumidor)
+            backend: Nome do backend que processou o documento
+            duracao_ms: Duração da extração em milissegundos (incluindo a espera no processo)
+            erro: Mensagem de erro (None em caso de sucesso)
+            paginas: Número de páginas lidas
+        """
+        self.texto = texto
+        self.backend = backend
+        self.duracao_ms = duracao_ms
+        self.erro = erro
+        self.paginas = paginas
+
+    def to_dict(self):
+        """Resumo da extração, sem o texto."""
+        return {"backend": self.backend, "duracao_ms": round(self.duracao_ms, 1), "erro": self.erro,
+                "paginas": self.paginas}
+
+
+class _Processo:
+    """Processo do pool com a ponta da conexão usada pelo processo principal."""
+
+    __slots__ = ("processo", "conexao", "documentos")
+
+    def __init__(self, contexto, nome_backend, timeout, memoria_mb):
+        self.conexao, conexao_filho = contexto.Pipe()
+        # A classe (e não o nome) vai ao processo: backends registrados depois da importação também valem
+        self.processo = contexto.Process(
+            target=_executar_processo, args=(conexao_filho, BACKENDS[nome_backend], timeout, memoria_mb),
+            name=f"analisavet-pdf-{nome_backend}", daemon=True)
+        self.processo.start()
+        conexao_filho.close()
+        self.documentos = 0
+
+    def encerrar(self, forcar=False):
+        """Encerra o processo (imediatamente, se forcar for True)."""
+        # Fechar a conexão encerra o laço do processo (EOFError)
+        self.conexao.close()
+        if not forcar:
+            self.processo.join(timeout=5)
+        if self.processo.is_alive():
+            self.processo.kill()
+            self.processo.join()
+
+
+class PoolExtracao:
+    """
+    Pool persistente e limitado de processos de extração.
+
+    Os processos são criados sob demanda até o limite e mantidos entre documentos;
+    quando todos estão ocupados, a extração seguinte espera um ficar livre.
+    """
+
+    def __init__(self, backend=BACKEND_PADRAO, processos=PROCESSOS_PADRAO, timeout=TIMEOUT_PADRAO,
+                 memoria_mb=MEMORIA_MB_PADRAO, max_paginas=MAX_PAGINAS_PADRAO,
+                 documentos_por_processo=DOCUMENTOS_POR_PROCESSO, metodo_inicio="spawn"):
+        """
+        Args:
+            backend: Nome do backend ou "auto"
+            processos: Máximo de processos (e de extrações simultâneas)
+            timeout: Tempo máximo por documento, em segundos
+            memoria_mb: Memória adicional permitida a cada processo, em MB (0: sem limite)
+            max_paginas: Páginas lidas por documento (0: sem limite)
+            documentos_por_processo: Documentos atendidos antes de o processo ser reciclado
+            metodo_inicio: Método de início dos processos ("spawn", "forkserver" ou "fork")
+        """
+        self.backend = resolver_backend(backend)
+        self.processos = max(1, processos)
+        self.timeout = timeout
+        self.memoria_mb = memoria_mb
+        self.max_paginas = max_paginas or None
+        self.documentos_por_processo = documentos_por_processo
+        self._contexto = multiprocessing.get_context(metodo_inicio)
+        self._livres = queue.LifoQueue()
+        self._vagas = threading.BoundedSemaphore(self.processos)
+        self._trava = threading.Lock()
+        self._ativos = set()
+
+    def _obter_processo(self):
+        """Processo livre (mais recentemente usado) ou um novo, dentro da vaga já reservada."""
+        try:
+            return self._livres.get_nowait()
+        except queue.Empty:
+            processo = _Processo(self._contexto, self.backend, self.timeout, self.memoria_mb)
+            with self._trava:
+                self._ativos.add(processo)
+            return processo
+
+    def _descartar(self, processo, forcar=False):
+        with self._trava:
+            self._ativos.discard(processo)
+        processo.encerrar(forcar)
+
+    def extrair(self, documento, consumidor=None):
+        """
+        Extrai o texto de um PDF em um processo do pool, página a página.
+
+        Args:
+            documento: Caminho do arquivo PDF ou seu conteúdo (bytes)
+            consumidor: Função chamada com o texto de cada página, em ordem; se
+                retornar True, as páginas restantes não são extraídas. Sem
+                consumidor, as páginas lidas formam ResultadoExtracao.texto
+
+        Returns:
+            ResultadoExtracao: Texto, backend, duração e páginas lidas (com a mensagem de erro em caso de falha)
+        """
+        inicio = time.perf_counter()
+        partes = []
+        paginas, erro = 0, None
+        with self._vagas:
+            processo = self._obter_processo()
+            reiniciar = forcar = True
+            try:
+                if isinstance(documento, TIPOS_CONTEUDO):
+                    # send_bytes envia o buffer diretamente, sem serializá-lo
+                    processo.conexao.send((None, self.max_paginas))
+                    processo.conexao.send_bytes(documento)
+                else:
+                    processo.conexao.send((os.path.abspath(documento), self.max_paginas))
+                # O tempo máximo vale para o documento inteiro, não para cada página
+                prazo = time.perf_counter() + self.timeout + MARGEM_TIMEOUT
+                while True:
+                    if not processo.conexao.poll(max(0.0, prazo - time.perf_counter())):
+                        erro = f"Tempo de extração excedido ({self.timeout:g} s)."
+                        break
+                    mensagem = processo.conexao.recv()
+                    if mensagem[0] == "fim":
+                        _, erro, reiniciar = mensagem
+                        forcar = False
+                        break
+                    paginas += 1
+                    if consumidor is None:
+                        partes.append(mensagem[1])
+                        processo.conexao.send(True)
+                    else:
+                        processo.conexao.send(not consumidor(mensagem[1]))
+            except (EOFError, OSError):
+                # O processo terminou durante a extração (ex.: morto por falta de memória)
+                erro = "O processo de extração terminou inesperadamente."
+            finally:
+                processo.documentos += 1
+                if reiniciar or processo.documentos >= self.documentos_por_processo:
+                    self._descartar(processo, forcar)
+                else:
+                    self._livres.put(processo)
+
+        texto = "".join(partes) if consumidor is None and erro is None else None
+        return ResultadoExtracao(texto, self.backend, (time.perf_counter() - inicio) * 1000, erro, paginas)
+
+    def encerrar(self):
+        """Encerra todos os processos do pool."""
+        with self._trava:
+            ativos, self._ativos = self._ativos, set()
+        while True:
+            try:
+                self._livres.get_nowait()
+            except queue.Empty:
+                break
+        for processo in ativos:
+            processo.encerrar()
+
+
+# Pool usado por extrair_pdf (criado no primeiro uso ou por configurar_extracao)
+_pool = None
+_trava_pool = threading.Lock()
+_configuracao = {}
+
+
+def configurar_extracao(backend=BACKEND_PADRAO, processos=PROCESSOS_PADRAO, timeout=TIMEOUT_PADRAO,
+                        memoria_mb=MEMORIA_MB_PADRAO, max_paginas=MAX_PAGINAS_PADRAO):
+    """
+    Define o backend e os limites do pool de extração; o pool anterior é encerrado.
+
+    Os processos só são criados na primeira extração; um backend indisponível é
+    informado no erro de cada extração.
+
+    Args:
+        backend: Nome do backend ou "auto"
+        processos: Máximo de processos (e de extrações simultâneas)
+        timeout: Tempo máximo por documento, em segundos
+        memoria_mb: Memória adicional permitida a cada processo, em MB
+        max_paginas: Páginas lidas por documento (0: sem limite)
+    """
+    global _pool
+    with _trava_pool:
+        anterior, _pool = _pool, None
+        _configuracao.update(backend=backend, processos=processos, timeout=timeout, memoria_mb=memoria_mb,
+                             max_paginas=max_paginas)
+    if anterior is not None:
+        anterior.encerrar()
+
+
+def obter_pool():
+    """Pool de extração configurado (criado no primeiro uso)."""
+    global _pool
+    with _trava_pool:
+        if _pool is None:
+            _pool = PoolExtracao(**_configuracao)
+        return _pool
+
+
+def extrair_pdf(documento, consumidor=None):
+    """
+    Extrai o texto de um PDF pelo pool configurado.
+
+    Args:
+        documento: Caminho do arquivo PDF ou seu conteúdo (bytes)
+        consumidor: Função chamada com o texto de cada página; True encerra a extração
+
+    Returns:
+        ResultadoExtracao: Texto, backend, duração e páginas lidas (com a mensagem de erro em caso de falha)
+    """
+    try:
+        pool = obter_pool()
+    except ValueError as e:
+        return ResultadoExtracao(None, None, 0.0, str(e))
+    return pool.extrair(documento, consumidor)
@@ -0,0 +1,208 @@
+"""
+Registro dos layouts de laudos já conhecidos.
+
+A maior parte dos laudos vem de poucos laboratórios de referência, cada um com um
+layout fixo. A impressão do layout combina as palavras do cabeçalho com a
+geometria da primeira página; para cada impressão conhecida, o registro guarda a
+página, a linha e o rótulo de cada campo, aprendidos na primeira leitura pelo
+caminho genérico. Os rótulos são compilados uma vez por layout, e a leitura de um
+laudo conhecido consulta apenas as linhas dos campos.
+
+O registro é salvo em um arquivo JSON e sobrevive a reinícios do aplicativo.
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from datetime import datetime
+
+# Linhas do cabeçalho usadas na impressão do layout
+LINHAS_CABECALHO = 3
+
+# Campos do hemograma necessários para aprender um layout
+MIN_CAMPOS_LAYOUT = 5
+
+# Layouts mantidos no registro (os aprendidos há mais tempo saem primeiro)
+MAX_LAYOUTS = 500
+
+VERSAO_ARQUIVO = 1
+
+_PALAVRA = re.compile(r"[a-zà-öø-ÿ]{3,}")
+
+# O cabeçalho de cada linha termina no primeiro valor (dois-pontos, barra vertical ou dígito),
+# deixando de fora dados do paciente que estejam nas primeiras linhas
+_FIM_CABECALHO = re.compile(r"[:|\d]")
+
+
+def impressao_layout(texto):
+    """
+    Calcula a impressão do layout a partir do texto da primeira página.
+
+    Args:
+        texto: Texto da primeira página do laudo
+
+    Returns:
+        str: Impressão (hexadecimal) das palavras do cabeçalho e do número de linhas da página
+    """
+    linhas = texto.split("\n")
+    cabecalho = []
+    for linha in linhas:
+        fim = _FIM_CABECALHO.search(linha)
+        palavras = _PALAVRA.findall(linha[:fim.start()].lower() if fim else linha.lower())
+        if palavras:
+            cabecalho.append(" ".join(palavras))
+            if len(cabecalho) == LINHAS_CABECALHO:
+                break
+    assinatura = f"{len(linhas)}|{'/'.join(cabecalho)}"
+    return hashlib.sha1(assinatura.encode("utf-8")).hexdigest()[:16]
+
+
+def compilar_rotulo(rotulo):
+    """Padrão do rótulo como palavra inteira, sem diferenciar maiúsculas e com espaços flexíveis."""
+    padrao = re.escape(" ".join(rotulo.split())).replace(r"\ ", r"[^\S\n]+")
+    return re.compile(rf"(?<!\w){padrao}\b", re.IGNORECASE)
+
+
+class Layout:
+    """Posições dos campos de um layout conhecido, com os rótulos compilados."""
+
+    __slots__ = ("impressao", "campos", "aprendido_em", "ultima_pagina", "_por_pagina")
+
+    def __init__(self, impressao, campos, aprendido_em=None):
+        """
+        Args:
+            impressao: Impressão do layout
+            campos: Dicionário {campo: (página, linha, rótulo)}, com página e linha a partir de 0
+            aprendido_em: Data do aprendizado (ISO 8601)
+        """
+        self.impressao = impressao
+        self.campos = {campo: (int(pagina), int(linha), rotulo)
+                       for campo, (pagina, linha, rotulo) in campos.items()}
+        self.aprendido_em = aprendido_em or datetime.utcnow().isoformat()
+        self.ultima_pagina = max(pagina for pagina, _, _ in self.campos.values())
+        self._por_pagina = {}
+        for campo, (pagina, linha, rotulo) in sorted(self.campos.items(), key=lambda item: item[1][:2]):
+            self._por_pagina.setdefault(pagina, []).append((campo, linha, compilar_rotulo(rotulo)))
+
+    def campos_da_pagina(self, pagina):
+        """Lista de (campo, linha, padrão do rótulo) da página, em ordem de linha."""
+        return self._por_pagina.get(pagina, ())
+
+    def to_dict(self):
+        """Converte o layout para o formato do arquivo do registro."""
+        return {"campos": {campo: list(posicao) for campo, posicao in self.campos.items()},
+                "aprendido_em": self.aprendido_em}
+
+
+class RegistroLayouts:
+    """Layouts conhecidos por impressão, persistidos em um arquivo JSON."""
+
+    def __init__(self, caminho=None):
+        """
+        Args:
+            caminho: Arquivo JSON do registro (None: apenas em memória)
+        """
+        self.caminho = caminho
+        self._layouts = {}
+        self._trava = threading.Lock()
+        self.carregar()
+
+    def _ler_arquivo(self):
+        """Layouts salvos no arquivo (vazio se o arquivo não existir ou estiver inválido)."""
+        if not self.caminho or not os.path.exists(self.caminho):
+            return {}
+        try:
+            with open(self.caminho, encoding="utf-8") as arquivo:
+                conteudo = json.load(arquivo)
+            if conteudo.get("versao") != VERSAO_ARQUIVO:
+                return {}
+            return {impressao: Layout(impressao, dados["campos"], dados.get("aprendido_em"))
+                    for impressao, dados in conteudo.get("layouts", {}).items()}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Aviso: registro de layouts ignorado ({self.caminho}): {e}")
+            return {}
+
+    def carregar(self):
+        """Recarrega os layouts do arquivo."""
+        layouts = self._ler_arquivo()
+        with self._trava:
+            self._layouts = layouts
+
+    def obter(self, impressao):
+        """
+        Obtém o layout de uma impressão.
+
+        Args:
+            impressao: Impressão calculada por impressao_layout
+
+        Returns:
+            Layout ou None se a impressão for desconhecida
+        """
+        return self._layouts.get(impressao)
+
+    def aprender(self, impressao, campos):
+        """
+        Registra (ou substitui) o layout de uma impressão e salva o registro.
+
+        Args:
+            impressao: Impressão calculada por impressao_layout
+            campos: Dicionário {campo: (página, linha, rótulo)} lido pelo caminho genérico
+        """
+        layout = Layout(impressao, campos)
+        with self._trava:
+            # Outros processos podem ter aprendido layouts desde a última leitura do arquivo
+            layouts = self._ler_arquivo()
+            layouts.update((chave, valor) for chave, valor in self._layouts.items() if chave not in layouts)
+            layouts.pop(impressao, None)
+            layouts[impressao] = layout
+            while len(layouts) > MAX_LAYOUTS:
+                del layouts[next(iter(layouts))]
+            self._layouts = layouts
+            self._salvar()
+
+    def _salvar(self):
+        """Grava o arquivo do registro por substituição atômica."""
+        if not self.caminho:
+            return
+        conteudo = {"versao": VERSAO_ARQUIVO,
+                    "layouts": {impressao: layout.to_dict() for impressao, layout in self._layouts.items()}}
+        pasta = os.path.dirname(os.path.abspath(self.caminho))
+        os.makedirs(pasta, exist_ok=True)
+        descritor, temporario = tempfile.mkstemp(dir=pasta, prefix=".layouts_", suffix=".json")
+        try:
+            with os.fdopen(descritor, "w", encoding="utf-8") as arquivo:
+                json.dump(conteudo, arquivo, ensure_ascii=False, indent=1)
+            os.replace(temporario, self.caminho)
+        except BaseException:
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            raise
+
+    def __len__(self):
+        return len(self._layouts)
+
+    def __contains__(self, impressao):
+        return impressao in self._layouts
+
+
+# Registro usado na leitura dos laudos (apenas em memória até configurar_layouts)
+_registro = RegistroLayouts()
+
+
+def configurar_layouts(caminho):
+    """
+    Define o arquivo do registro de layouts e carrega os layouts salvos.
+
+    Args:
+        caminho: Arquivo JSON do registro (None: apenas em memória)
+    """
+    global _registro
+    _registro = RegistroLayouts(caminho)
+
+
+def obter_registro():
+    """Registro de layouts configurado."""
+    return _registro
@@ -1,19 +1,20 @@
 """
 Utilitários para extração e processamento de arquivos PDF e CSV.
 Versão melhorada com separação de dados de paciente e hemograma.
-Compatível com Windows usando PyPDF2.
+O texto dos PDFs é extraído por um pool persistente de processos (pypdf ou pdftotext).
+Laudos de layouts conhecidos (ver utils.pdf_layouts) são lidos apenas nas linhas dos campos.
 """
 
-import subprocess
 import re
-import pandas as pd
-import os
-import tempfile
-from werkzeug.utils import secure_filename
+
+from utils.csv_hemograma import converter_numero, ler_hemogramas_csv
+from utils.pdf_extraction import extrair_pdf
+from utils.pdf_layouts import MIN_CAMPOS_LAYOUT, impressao_layout, obter_registro
+from utils.upload import LIMITE_MEMORIA_PADRAO, receber_upload
 
 def extrair_texto_pdf(caminho_pdf):
     """
-    Extrai texto de um arquivo PDF usando PyPDF2 (compatível com Windows).
+    Extrai texto de um arquivo PDF pelo pool de extração (ver utils.pdf_extraction).
     
     Args:
         caminho_pdf: Caminho para o arquivo PDF
@@ -21,234 +22,400 @@ def extrair_texto_pdf(caminho_pdf):
     Returns:
         Texto extraído do PDF ou None em caso de erro
     """
-    try:
-        # Tentar usar pdftotext primeiro (se disponível)
-        processo = subprocess.run(["pdftotext", "-layout", caminho_pdf, "-"], 
-                                 capture_output=True, text=True, check=True, encoding="utf-8")
-        return processo.stdout
-    except (subprocess.CalledProcessError, FileNotFoundError) as e:
-        print(f"pdftotext não disponível, tentando PyPDF2: {e}")
-        # Fallback para PyPDF2
-        try:
-            import PyPDF2
-            texto = ""
-            with open(caminho_pdf, 'rb') as arquivo:
-                leitor = PyPDF2.PdfReader(arquivo)
-                for pagina in leitor.pages:
-                    texto += pagina.extract_text() + "\n"
-            return texto
-        except ImportError:
-            print("PyPDF2 não está instalado. Instale com: pip install PyPDF2")
-            return None
-        except Exception as e2:
-            print(f"Erro ao extrair texto com PyPDF2: {e2}")
-            return None
-    except Exception as e:
-        print(f"Erro inesperado ao extrair texto do PDF: {e}")
-        return None
+    resultado = extrair_pdf(caminho_pdf)
+    if resultado.erro:
+        print(f"Erro ao extrair texto do PDF ({resultado.backend}): {resultado.erro}")
+    return resultado.texto
 
-def extrair_dados_hemograma(texto):
+# Rótulos de cada parâmetro do hemograma
+ROTULOS_HEMOGRAMA = {
+    "hemacias": ("Hemácias", "Hemacias", "Eritrócitos", "Eritrocitos", "RBC"),
+    "hemoglobina": ("Hemoglobina", "HGB", "Hb"),
+    "hematocrito": ("Hematócrito", "Hematocrito", "HCT", "Ht"),
+    "vcm": ("VCM", "MCV"),
+    "hcm": ("HCM", "MCH"),
+    "chcm": ("CHCM", "MCHC"),
+    "reticulocitos": ("Reticulócitos", "Reticulocitos", "Retic"),
+    "leucocitos": ("Leucócitos", "Leucocitos", "Leuco", "WBC"),
+    "segmentados": ("Segmentados", "Neutrófilos", "Neutrofilos", "Neutro", "Seg"),
+    "linfocitos": ("Linfócitos", "Linfocitos", "Linfo", "Lymph"),
+    "monocitos": ("Monócitos", "Monocitos", "Mono"),
+    "eosinofilos": ("Eosinófilos", "Eosinofilos", "Eosino", "Eos"),
+    "basofilos": ("Basófilos", "Basofilos", "Baso"),
+    "plaquetas": ("Plaquetas", "PLT"),
+    "proteina": ("Proteína", "Proteinas", "Proteínas", "Proteina", "PPT", "TP")
+}
+
+# Rótulos das informações do paciente
+ROTULOS_PACIENTE = {
+    "nome": ("Nome do Paciente", "Nome da Paciente", "Nome Paciente", "Paciente", "Animal", "Nome"),
+    "especie": ("Espécie", "Especie"),
+    "raca": ("Raça", "Raca"),
+    "idade": ("Idade",),
+    "sexo": ("Sexo",),
+    "tutor": ("Proprietário", "Proprietario", "Tutor", "Responsável", "Responsavel", "Dono")
+}
+
+# Palavras que identificam a espécie em qualquer ponto do texto (o cão tem prioridade)
+PALAVRAS_ESPECIE = {
+    "Cão": ("Cão", "Cao", "Canino", "Canina", "Canine"),
+    "Gato": ("Gato", "Felino", "Felina", "Feline")
+}
+
+_LETRAS = "A-Za-zÀ-ÖØ-öø-ÿ"
+
+# Valor numérico: o primeiro número depois do rótulo, na mesma linha
+_VALOR_NUMERICO = re.compile(r"[^\d\n]*(\d[\d.,]*)")
+
+# Valor textual: palavras separadas por um espaço, até fim de linha, vírgula, barra vertical ou dois espaços
+_SEPARADOR = r"(?:[^\S\n]*[:|][^\S\n]*|[^\S\n]+)"
+_FIM_VALOR = r"[^\S\n]?(?=\n|,|\||[^\S\n]{2}|$)"
+_VALOR_TEXTO = re.compile(_SEPARADOR + rf"([{_LETRAS}]+(?:[^\S\n][{_LETRAS}]+)*)" + _FIM_VALOR)
+_UNIDADE_IDADE = r"(?:anos?|m[eê]s|meses|dias?|semanas?)"
+_VALOR_IDADE = re.compile(
+    _SEPARADOR + rf"(\d[\d,.]*(?:[^\S\n]*{_UNIDADE_IDADE}(?:[^\S\n]+e[^\S\n]+\d+[^\S\n]*{_UNIDADE_IDADE})?)?)"
+    + _FIM_VALOR, re.IGNORECASE)
+
+def _compilar_scanner():
     """
-    Extrai valores de hemograma e informações do paciente do texto usando regex.
-    
-    Args:
-        texto: Texto extraído do PDF
-        
+    Compila todos os rótulos em uma única alternância de literais em minúsculas.
+
+    O texto (em minúsculas) é percorrido uma vez. Sem IGNORECASE e sem grupos, o
+    mecanismo de regex descarta rapidamente as posições cujo caractere não inicia
+    nenhum rótulo; o campo vem do dicionário de rótulos.
+
     Returns:
-        Dicionário com dados do hemograma e informações do paciente separados
+        tuple: (padrão compilado, {rótulo em minúsculas: campo ou espécie})
+    """
+    campos = {}
+    for grupo in (ROTULOS_HEMOGRAMA, ROTULOS_PACIENTE, PALAVRAS_ESPECIE):
+        for campo, rotulos in grupo.items():
+            for rotulo in rotulos:
+                campos.setdefault(rotulo.lower(), campo)
+    # Mais longos primeiro: "hemoglobina" antes de "hb", "nome do paciente" antes de "nome"
+    rotulos = sorted(campos, key=len, reverse=True)
+    alternativas = "|".join(re.escape(rotulo).replace(r"\ ", r"[^\S\n]+") for rotulo in rotulos)
+    return re.compile(rf"(?<!\w)(?:{alternativas})\b"), campos
+
+_SCANNER, _CAMPO_DO_ROTULO = _compilar_scanner()
+
+def _converter_numero(valor_str, chave):
+    """
+    Converte o número de um laudo para float.
+
+    Com vírgula, o formato é o brasileiro (ponto de milhar, vírgula decimal); sem
+    vírgula, o ponto só é de milhar em grupos de três dígitos ("12.000"), e nos
+    demais casos é o ponto decimal ("35.0", "10000.0").
+    """
+    valor = converter_numero(valor_str, virgula_decimal=True)
+    if valor is None:
+        print(f"Aviso: Não foi possível converter '{valor_str}' para float para a chave '{chave}'.")
+    return valor
+
+def _normalizar_especie(valor):
+    """Converte a espécie informada para "Cão" ou "Gato" quando reconhecida."""
+    for match in _SCANNER.finditer(valor.lower()):
+        especie = _campo_do_match(match)
+        if especie in PALAVRAS_ESPECIE:
+            return especie
+    return valor
+
+def _campo_do_match(match):
+    """Campo (ou espécie) do rótulo encontrado pelo scanner."""
+    rotulo = match.group()
+    campo = _CAMPO_DO_ROTULO.get(rotulo)
+    if campo is None:
+        # Rótulos de várias palavras separadas por mais de um espaço
+        campo = _CAMPO_DO_ROTULO[" ".join(rotulo.split())]
+    return campo
+
+def _ler_valor(campo, texto, inicio, fim_linha):
+    """Valor do campo logo após o rótulo, na mesma linha (None se não houver)."""
+    if campo in ROTULOS_HEMOGRAMA:
+        valor = _VALOR_NUMERICO.match(texto, inicio, fim_linha)
+        return _converter_numero(valor.group(1), campo) if valor else None
+    padrao_valor = _VALOR_IDADE if campo == "idade" else _VALOR_TEXTO
+    valor = padrao_valor.match(texto, inicio, fim_linha)
+    return valor.group(1).strip() if valor else None
+
+# Palavras de espécie, para laudos de layout conhecido sem o campo espécie
+_PALAVRAS_ESPECIE = {
+    especie: re.compile(r"(?<!\w)(?:" + "|".join(map(re.escape, palavras)) + r")\b", re.IGNORECASE)
+    for especie, palavras in PALAVRAS_ESPECIE.items()
+}
+
+class LeitorHemograma:
+    """
+    Leitura incremental de um laudo, página a página.
+
+    Cada página passa uma única vez pelo scanner compilado na importação: cada
+    rótulo encontrado preenche seu campo (a primeira ocorrência com valor vence) e
+    o valor é procurado apenas na linha do rótulo. O leitor fica completo assim
+    que todos os campos do hemograma e do paciente estiverem preenchidos, e as
+    páginas seguintes não precisam ser lidas.
+
+    Com um registro de layouts, a impressão da primeira página identifica laudos
+    de layout conhecido: cada campo é lido apenas na sua linha, com o rótulo já
+    compilado, e a leitura termina na última página do layout. Se o laudo não
+    conferir com o layout, as páginas lidas voltam ao caminho genérico.
     """
-    dados_hemograma = {}
-    dados_paciente = {}
     
-    # Regex para parâmetros do hemograma - padrões mais flexíveis
-    padroes_hemograma = {
-        "hemacias": r"(?:Hemácias|Eritrócitos|RBC)[^\d]*([\d.,]+)",
-        "hemoglobina": r"(?:Hemoglobina|Hb|HGB)[^\d]*([\d.,]+)",
-        "hematocrito": r"(?:Hematócrito|Ht|HCT)[^\d]*([\d.,]+)",
-        "vcm": r"(?:VCM|MCV)[^\d]*([\d.,]+)",
-        "hcm": r"(?:HCM|MCH)[^\d]*([\d.,]+)",
-        "chcm": r"(?:CHCM|MCHC)[^\d]*([\d.,]+)",
-        "reticulocitos": r"(?:Reticulócitos|Retic)[^\d]*([\d.,]+)",
-        "leucocitos": r"(?:Leucócitos|Leuco|WBC)[^\d]*([\d.,]+)",
-        "segmentados": r"(?:Segmentados|Neutrófilos|Neutro|Seg)[^\d]*([\d.,]+)",
-        "linfocitos": r"(?:Linfócitos|Linfo|Lymph)[^\d]*([\d.,]+)",
-        "monocitos": r"(?:Monócitos|Mono)[^\d]*([\d.,]+)",
-        "eosinofilos": r"(?:Eosinófilos|Eosino|Eos)[^\d]*([\d.,]+)",
-        "basofilos": r"(?:Basófilos|Baso)[^\d]*([\d.,]+)",
-        "plaquetas": r"(?:Plaquetas|PLT)[^\d]*([\d.,]+)",
-        "proteina": r"(?:Proteína|Proteinas|PPT|TP)[^\d]*([\d.,]+)"
-    }
+    def __init__(self, registro=None):
+        """
+        Args:
+            registro: RegistroLayouts consultado e alimentado pela leitura (None: apenas o caminho genérico)
+        """
+        self.registro = registro
+        self.impressao = None
+        self.layout = None
+        self.caracteres = 0
+        self._pagina = -1
+        self._paginas_layout = []
+        self._reiniciar()
     
-    # Regex para informações do paciente - padrões mais robustos
-    padroes_paciente = {
-        "nome": r"(?:Nome.*?Paciente|Paciente|Animal|Nome)[:\s]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+?)(?:\n|,|\s{2,}|$)",
-        "especie": r"(?:Espécie|Especie)[:\s]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+?)(?:\n|,|\s{2,}|$)",
-        "raca": r"(?:Raça|Raca)[:\s]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+?)(?:\n|,|\s{2,}|$)",
-        "idade": r"(?:Idade)[:\s]\s*([0-9,.\s]+(?:anos?|meses?|dias?|semanas?))(?:\n|,|\s{2,}|$)",
-        "sexo": r"(?:Sexo)[:\s]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+?)(?:\n|,|\s{2,}|$)",
-        "tutor": r"(?:Proprietário|Tutor|Responsável|Responsavel|Dono)[:\s]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+?)(?:\n|,|\s{2,}|$)"
-    }
+    def _reiniciar(self):
+        self.hemograma = dict.fromkeys(ROTULOS_HEMOGRAMA)
+        self.paciente = dict.fromkeys(ROTULOS_PACIENTE)
+        self.pendentes = len(ROTULOS_HEMOGRAMA) + len(ROTULOS_PACIENTE)
+        self.especie_detectada = None
+        self.posicoes = {}  # {campo: (página, linha, rótulo)} lidos pelo caminho genérico
     
-    # Padrões alternativos para informações do paciente (formato tabular)
-    padroes_paciente_alt = {
-        "nome": r"(?:Nome|Paciente|Animal)\s*[:\|]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+)",
-        "especie": r"(?:Espécie|Especie)\s*[:\|]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+)",
-        "raca": r"(?:Raça|Raca)\s*[:\|]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+)",
-        "idade": r"(?:Idade)\s*[:\|]\s*([0-9,.\s]+(?:anos?|meses?|dias?|semanas?)?)",
-        "sexo": r"(?:Sexo)\s*[:\|]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+)",
-        "tutor": r"(?:Proprietário|Tutor|Responsável|Responsavel|Dono)\s*[:\|]\s*([A-Za-zÀ-ÖØ-öø-ÿ\s]+)"
-    }
+    @property
+    def completo(self):
+        """Indica se todos os campos já foram preenchidos."""
+        return not self.pendentes
     
-    # Tentar encontrar a espécie (simples)
-    if re.search(r"(?:Cão|Canino|Canine)", texto, re.IGNORECASE):
-        dados_paciente["especie"] = "Cão"
-    elif re.search(r"(?:Gato|Felino|Feline)", texto, re.IGNORECASE):
-        dados_paciente["especie"] = "Gato"
-    else:
-        dados_paciente["especie"] = None  # Não conseguiu identificar
+    def alimentar(self, texto):
+        """
+        Lê o texto de uma página (ou de um laudo inteiro).
+        
+        Args:
+            texto: Texto da página; rótulo e valor precisam estar na mesma linha
+            
+        Returns:
+            bool: True se a leitura pode parar (todos os campos preenchidos ou
+            fim das páginas do layout conhecido)
+        """
+        self._pagina += 1
+        self.caracteres += len(texto)
+        if self._pagina == 0 and self.registro is not None:
+            self.impressao = impressao_layout(texto)
+            self.layout = self.registro.obter(self.impressao)
+        
+        if self.layout is not None:
+            self._paginas_layout.append(texto)
+            if self._ler_pelo_layout(self._pagina, texto):
+                return self._pagina >= self.layout.ultima_pagina
+            # O laudo não confere com o layout
+            return self._voltar_ao_generico()
+        
+        return self._ler(self._pagina, texto)
     
-    # Extrair parâmetros do hemograma
-    for chave, padrao in padroes_hemograma.items():
-        match = re.search(padrao, texto, re.IGNORECASE | re.DOTALL)
-        if match:
-            valor_str = match.group(1).replace(".", "").replace(",", ".")  # Normalizar para ponto decimal
-            try:
-                dados_hemograma[chave] = float(valor_str)
-            except ValueError:
-                print(f"Aviso: Não foi possível converter '{match.group(1)}' para float para a chave '{chave}'.")
-                dados_hemograma[chave] = None
-        else:
-            dados_hemograma[chave] = None  # Não encontrou o padrão
+    def _voltar_ao_generico(self):
+        """Descarta o layout e relê as páginas já lidas pelo caminho genérico."""
+        paginas, self._paginas_layout, self.layout = self._paginas_layout, [], None
+        self._reiniciar()
+        for indice, pagina in enumerate(paginas):
+            if self._ler(indice, pagina):
+                return True
+        return False
+    
+    def _ler_pelo_layout(self, pagina, texto):
+        """Lê os campos da página nas linhas do layout; False se algum não for encontrado."""
+        campos = self.layout.campos_da_pagina(pagina)
+        if not campos:
+            return True
+        linhas = texto.split("\n")
+        for campo, indice, rotulo in campos:
+            if indice >= len(linhas):
+                return False
+            linha = linhas[indice]
+            match = rotulo.search(linha)
+            valor = _ler_valor(campo, linha, match.end(), len(linha)) if match else None
+            if valor is None:
+                return False
+            (self.hemograma if campo in self.hemograma else self.paciente)[campo] = valor
+            self.pendentes -= 1
+        return True
     
-    # Extrair informações do paciente
-    for chave, padrao in padroes_paciente.items():
-        match = re.search(padrao, texto, re.IGNORECASE | re.DOTALL)
-        if match:
-            dados_paciente[chave] = match.group(1).strip()
+    def _ler(self, pagina, texto):
+        """Lê uma página pelo scanner genérico; True se todos os campos foram preenchidos."""
+        if not self.pendentes:
+            return True
+        
+        # "İ" é o único caractere cuja minúscula tem dois caracteres; trocá-lo mantém as
+        # posições do texto em minúsculas iguais às do original, onde os valores são lidos
+        minusculas = texto.replace("\u0130", "I").lower()
+        
+        for match in _SCANNER.finditer(minusculas):
+            campo = _campo_do_match(match)
+            
+            if campo in PALAVRAS_ESPECIE:
+                if self.especie_detectada != "Cão":
+                    self.especie_detectada = campo
+                continue
+            
+            encontrado_em = self.hemograma if campo in self.hemograma else self.paciente
+            if encontrado_em[campo] is not None:
+                continue
+            
+            fim_linha = texto.find("\n", match.end())
+            if fim_linha < 0:
+                fim_linha = len(texto)
+            
+            valor = _ler_valor(campo, texto, match.end(), fim_linha)
+            if valor is None:
+                continue
+            encontrado_em[campo] = valor
+            self.posicoes[campo] = (pagina, texto.count("\n", 0, match.start()), match.group())
+            
+            self.pendentes -= 1
+            if not self.pendentes:
+                return True
+        return False
+    
+    def aprender_layout(self):
+        """
+        Registra o layout do laudo lido pelo caminho genérico.
+        
+        Returns:
+            bool: True se o layout foi registrado (impressão nova ou layout que não conferiu)
+        """
+        if self.registro is None or self.impressao is None or self.layout is not None:
+            return False
+        if sum(valor is not None for valor in self.hemograma.values()) < MIN_CAMPOS_LAYOUT:
+            return False
+        self.registro.aprender(self.impressao, self.posicoes)
+        return True
+    
+    def resultado(self):
+        """
+        Dados lidos até aqui.
+        
+        Returns:
+            Dicionário com dados do hemograma e informações do paciente separados
+        """
+        if self.layout is not None and self._pagina < self.layout.ultima_pagina:
+            # O laudo terminou antes da última página do layout
+            self._voltar_ao_generico()
+        paciente = dict(self.paciente)
+        if paciente["especie"] is not None:
+            paciente["especie"] = _normalizar_especie(paciente["especie"])
+        elif self.layout is not None:
+            paciente["especie"] = self._detectar_especie()
         else:
-            # Tentar padrão alternativo
-            alt_match = re.search(padroes_paciente_alt[chave], texto, re.IGNORECASE | re.DOTALL)
-            if alt_match:
-                dados_paciente[chave] = alt_match.group(1).strip()
-            else:
-                dados_paciente[chave] = None  # Não encontrou o padrão
+            paciente["especie"] = self.especie_detectada
+        
+        # Retornar dados separados em hemograma e paciente
+        return {
+            "hemograma": dict(self.hemograma),
+            "paciente": paciente
+        }
     
-    # Retornar dados separados em hemograma e paciente
-    return {
-        "hemograma": dados_hemograma,
-        "paciente": dados_paciente
-    }
+    def _detectar_especie(self):
+        """Espécie pelas palavras-chave das páginas lidas pelo layout (o cão tem prioridade)."""
+        for especie, padrao in _PALAVRAS_ESPECIE.items():
+            if any(padrao.search(pagina) for pagina in self._paginas_layout):
+                return especie
+        return None
+
+def extrair_dados_hemograma(texto):
+    """
+    Extrai valores de hemograma e informações do paciente do texto.
+    
+    Args:
+        texto: Texto extraído do PDF
+        
+    Returns:
+        Dicionário com dados do hemograma e informações do paciente separados
+    """
+    leitor = LeitorHemograma()
+    leitor.alimentar(texto)
+    return leitor.resultado()
 
 def parse_csv_hemograma(caminho_csv):
     """
-    Extrai valores de hemograma e informações do paciente de um arquivo CSV.
+    Extrai valores de hemograma e informações do paciente da primeira linha de um arquivo CSV.
+    
+    Apenas o cabeçalho e a primeira linha são lidos; para importar todas as
+    linhas, use utils.csv_hemograma.ler_hemogramas_csv.
     
     Args:
-        caminho_csv: Caminho para o arquivo CSV
+        caminho_csv: Caminho para o arquivo CSV ou seu conteúdo (bytes)
         
     Returns:
         Dicionário com dados do hemograma e informações do paciente separados
     """
     try:
-        df = pd.read_csv(caminho_csv, delimiter=None, engine="python")  # Tenta detectar delimitador
-        dados_hemograma = {}
-        dados_paciente = {}
-        
-        # Mapeamento flexível de possíveis nomes de colunas para nossas chaves
-        mapeamento_hemograma = {
-            "hemacias": ["hemacias", "eritrocitos", "rbc"],
-            "hemoglobina": ["hemoglobina", "hb", "hgb"],
-            "hematocrito": ["hematocrito", "ht", "hct"],
-            "vcm": ["vcm", "mcv"],
-            "hcm": ["hcm", "mch"],
-            "chcm": ["chcm", "mchc"],
-            "reticulocitos": ["reticulocitos", "retic"],
-            "leucocitos": ["leucocitos", "leuco", "wbc"],
-            "segmentados": ["segmentados", "neutrofilos", "neutro", "seg"],
-            "linfocitos": ["linfocitos", "linfo", "lymph"],
-            "monocitos": ["monocitos", "mono"],
-            "eosinofilos": ["eosinofilos", "eosino", "eos"],
-            "basofilos": ["basofilos", "baso"],
-            "plaquetas": ["plaquetas", "plt"],
-            "proteina": ["proteina", "proteinas", "ppt", "tp"]
-        }
-        
-        # Mapeamento para informações do paciente
-        mapeamento_paciente = {
-            "nome": ["nome", "paciente", "animal", "pet", "nome_paciente"],
-            "raca": ["raca", "breed"],
-            "idade": ["idade", "age"],
-            "sexo": ["sexo", "gender"],
-            "tutor": ["tutor", "proprietario", "dono", "responsavel", "owner"],
-            "especie": ["especie", "animal", "species"]
-        }
-        
-        df.columns = df.columns.str.lower().str.strip()  # Normalizar nomes das colunas
-        
-        # Assumir que os dados estão na primeira linha
-        if not df.empty:
-            primeira_linha = df.iloc[0]
-            
-            # Extrair dados do hemograma
-            for chave, nomes_possiveis in mapeamento_hemograma.items():
-                valor = None
-                for nome_coluna in nomes_possiveis:
-                    if nome_coluna in df.columns:
-                        valor_bruto = primeira_linha[nome_coluna]
-                        if pd.isna(valor_bruto):
-                            valor = None
-                            break
-                        try:
-                            # Tentar converter para float, tratando vírgula como decimal
-                            valor = float(str(valor_bruto).replace(",", "."))
-                        except (ValueError, TypeError):
-                            valor = None
-                        break  # Encontrou a coluna, para de procurar
-                dados_hemograma[chave] = valor
-            
-            # Extrair informações do paciente
-            for chave, nomes_possiveis in mapeamento_paciente.items():
-                valor = None
-                for nome_coluna in nomes_possiveis:
-                    if nome_coluna in df.columns:
-                        valor_bruto = primeira_linha[nome_coluna]
-                        if pd.isna(valor_bruto):
-                            valor = None
-                            break
-                        
-                        if chave == "especie":
-                            valor_str = str(valor_bruto).strip().lower()
-                            if "cão" in valor_str or "canino" in valor_str:
-                                valor = "Cão"
-                            elif "gato" in valor_str or "felino" in valor_str:
-                                valor = "Gato"
-                            else:
-                                valor = str(valor_bruto).strip()
-                        else:
-                            valor = str(valor_bruto).strip()
-                        break  # Encontrou a coluna, para de procurar
-                dados_paciente[chave] = valor
-        
-        # Retornar dados separados em hemograma e paciente
-        return {
-            "hemograma": dados_hemograma,
-            "paciente": dados_paciente
-        }
+        linhas = ler_hemogramas_csv(caminho_csv)
+        try:
+            # Assumir que os dados estão na primeira linha
+            return next(linhas, None) or {"hemograma": {}, "paciente": {}}
+        finally:
+            linhas.close()
     
     except Exception as e:
         print(f"Erro ao processar CSV: {e}")
         return None
 
-def processar_arquivo_hemograma(arquivo, diretorio_temp=None):
+def processar_caminho_hemograma(caminho, extensao):
+    """
+    Extrai os dados de um arquivo de hemograma (PDF ou CSV) já salvo em disco
+    ou recebido em memória.
+    
+    Args:
+        caminho: Caminho do arquivo ou seu conteúdo (bytes)
+        extensao: Extensão do arquivo ('pdf' ou 'csv')
+        
+    Returns:
+        Dicionário com dados extraídos separados em hemograma e paciente (PDFs
+        incluem "extracao": backend, duração em ms, erro e páginas lidas)
+    """
+    # Processar arquivo de acordo com o tipo
+    extracao = None
+    if extensao == 'pdf':
+        # As páginas são lidas à medida que chegam, sem uni-las; a extração para
+        # quando todos os campos forem encontrados
+        leitor = LeitorHemograma(obter_registro())
+        extracao = extrair_pdf(caminho, consumidor=leitor.alimentar)
+        if extracao.erro:
+            print(f"Erro ao extrair texto do PDF ({extracao.backend}): {extracao.erro}")
+        if leitor.caracteres:
+            dados = leitor.resultado()
+            if not extracao.erro:
+                leitor.aprender_layout()
+        else:
+            dados = {"hemograma": {}, "paciente": {}}
+    else:  # CSV
+        dados = parse_csv_hemograma(caminho)
+        if not dados:
+            dados = {"hemograma": {}, "paciente": {}}
+    
+    # Garantir que os dados estão no formato esperado pelo frontend
+    if "hemograma" not in dados:
+        dados = {"hemograma": {}, "paciente": {}}
+    
+    # Backend e duração da extração do PDF
+    if extracao is not None:
+        dados["extracao"] = extracao.to_dict()
+    
+    return dados
+
+def processar_arquivo_hemograma(arquivo, diretorio_temp=None, limite_memoria=LIMITE_MEMORIA_PADRAO):
     """
     Processa um arquivo de hemograma (PDF ou CSV) e extrai os dados.
     
+    O conteúdo recebido pelo Werkzeug é entregue à extração sem nova cópia (em
+    memória ou pelo caminho do temporário), com o SHA-256 calculado (ver receber_upload).
+    
     Args:
         arquivo: Objeto de arquivo do Flask (request.files)
-        diretorio_temp: Diretório temporário para salvar o arquivo (opcional)
+        diretorio_temp: Diretório do temporário, se o arquivo precisar ser copiado (opcional)
+        limite_memoria: Tamanho máximo mantido em memória na cópia, em bytes
         
     Returns:
-        Dicionário com dados extraídos separados em hemograma e paciente
+        Dicionário com dados extraídos separados em hemograma e paciente, com
+        "arquivo": nome, tamanho em bytes e SHA-256
     """
     if not arquivo or arquivo.filename == '':
         return None
@@ -258,42 +425,13 @@ def processar_arquivo_hemograma(arquivo, diretorio_temp=None):
     if extensao not in ['pdf', 'csv']:
         return None
     
-    # Criar diretório temporário se não fornecido
-    if diretorio_temp is None:
-        diretorio_temp = tempfile.mkdtemp()
-    
-    # Salvar arquivo temporariamente
-    nome_arquivo = secure_filename(arquivo.filename)
-    caminho_temp = os.path.join(diretorio_temp, nome_arquivo)
-    
     try:
-        arquivo.save(caminho_temp)
-        
-        # Processar arquivo de acordo com o tipo
-        if extensao == 'pdf':
-            texto = extrair_texto_pdf(caminho_temp)
-            if texto:
-                dados = extrair_dados_hemograma(texto)
-            else:
-                dados = {"hemograma": {}, "paciente": {}}
-        else:  # CSV
-            dados = parse_csv_hemograma(caminho_temp)
-            if not dados:
-                dados = {"hemograma": {}, "paciente": {}}
-        
-        # Limpar arquivo temporário
-        os.remove(caminho_temp)
-        
-        # Garantir que os dados estão no formato esperado pelo frontend
-        if "hemograma" not in dados:
-            dados = {"hemograma": {}, "paciente": {}}
-        
+        # O temporário da cópia (se houver) é removido ao sair do bloco
+        with receber_upload(arquivo, limite_memoria, diretorio_temp) as upload:
+            dados = processar_caminho_hemograma(upload.origem, extensao)
+            dados["arquivo"] = upload.resumo()
         return dados
     
     except Exception as e:
         print(f"Erro ao processar arquivo: {e}")
-        # Tentar limpar arquivo temporário em caso de erro
-        if os.path.exists(caminho_temp):
-            os.remove(caminho_temp)
         return {"hemograma": {}, "paciente": {}}
-
@@ -0,0 +1,189 @@
+"""
+Recebimento de arquivos enviados ao AnalisaVet.
+
+O Werkzeug grava cada arquivo do formulário ao interpretar a requisição; com
+RequisicaoUpload, arquivos de requisições até o limite ficam em memória e os
+maiores vão para um arquivo temporário com nome. receber_upload reaproveita esse
+conteúdo sem nova cópia: calcula o SHA-256 e entrega à extração os bytes em
+memória ou o caminho do arquivo. Só um arquivo temporário anônimo (sem
+RequisicaoUpload) é copiado, para a memória ou para um temporário próprio.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+
+from flask import Request, current_app
+
+# Arquivos até este tamanho ficam em memória
+LIMITE_MEMORIA_PADRAO = 4 * 1024 * 1024
+
+# Bytes lidos do arquivo por vez
+TAMANHO_BLOCO = 64 * 1024
+
+
+def _extensao(nome):
+    """Extensão do nome do arquivo, em minúsculas ('' se não houver)."""
+    return nome.rsplit(".", 1)[1].lower() if nome and "." in nome else ""
+
+
+class RequisicaoUpload(Request):
+    """
+    Requisição do Flask que recebe os arquivos no formato usado pela extração.
+
+    Com o total da requisição até UPLOAD_LIMITE_MEMORIA, os arquivos ficam em um
+    BytesIO; acima disso (ou sem tamanho informado), em um arquivo temporário com
+    nome, lido pela extração pelo caminho e removido quando o Werkzeug o fecha ao
+    final da requisição.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        limite = current_app.config.get("UPLOAD_LIMITE_MEMORIA", LIMITE_MEMORIA_PADRAO)
+        if total_content_length is not None and total_content_length <= limite:
+            return io.BytesIO()
+        extensao = _extensao(filename)
+        return tempfile.NamedTemporaryFile(prefix="upload_", suffix=f".{extensao}" if extensao else "")
+
+
+class UploadRecebido:
+    """Conteúdo de um arquivo enviado, em memória ou em um arquivo em disco."""
+
+    def __init__(self, nome, extensao, limite_memoria=LIMITE_MEMORIA_PADRAO, pasta=None):
+        """
+        Args:
+            nome: Nome original do arquivo
+            extensao: Extensão em minúsculas (ex.: 'pdf')
+            limite_memoria: Tamanho máximo mantido em memória na cópia, em bytes
+            pasta: Pasta do arquivo temporário da cópia (padrão: a pasta temporária do sistema)
+        """
+        self.nome = nome
+        self.extensao = extensao
+        self.limite_memoria = limite_memoria
+        self.pasta = pasta
+        self.tamanho = 0
+        self._hash = hashlib.sha256()
+        self._partes = []
+        self._conteudo = None
+        self._arquivo = None
+        self._temporario_proprio = False
+        self.caminho = None
+
+    def reaproveitar_memoria(self, conteudo):
+        """Usa o conteúdo já em memória (sem cópia)."""
+        self._hash.update(conteudo)
+        self.tamanho = len(conteudo)
+        self._conteudo = conteudo
+        return self
+
+    def reaproveitar_arquivo(self, fluxo, caminho):
+        """
+        Usa o arquivo já gravado em disco (lido uma vez para o SHA-256, sem cópia).
+
+        O arquivo pertence a quem o criou e não é removido por fechar().
+        """
+        fluxo.seek(0)
+        for bloco in iter(lambda: fluxo.read(TAMANHO_BLOCO), b""):
+            self._hash.update(bloco)
+            self.tamanho += len(bloco)
+        fluxo.seek(0)
+        self.caminho = caminho
+        return self
+
+    def escrever(self, bloco):
+        """Acrescenta um bloco à cópia do conteúdo."""
+        self._hash.update(bloco)
+        self.tamanho += len(bloco)
+        if self._arquivo is None and self.tamanho > self.limite_memoria:
+            self._arquivo = tempfile.NamedTemporaryFile(
+                dir=self.pasta, prefix="upload_", suffix=f".{self.extensao}", delete=False)
+            self._temporario_proprio = True
+            self.caminho = self._arquivo.name
+            for parte in self._partes:
+                self._arquivo.write(parte)
+            self._partes = []
+        if self._arquivo is not None:
+            self._arquivo.write(bloco)
+        else:
+            self._partes.append(bloco)
+
+    def finalizar(self):
+        """Conclui a cópia (junta os blocos em memória ou fecha o arquivo temporário)."""
+        if self._arquivo is not None:
+            self._arquivo.close()
+        else:
+            # Um único bloco é usado como está; vários são unidos uma única vez
+            self._conteudo = self._partes[0] if len(self._partes) == 1 else b"".join(self._partes)
+            self._partes = []
+        return self
+
+    @property
+    def sha256(self):
+        """SHA-256 do conteúdo, em hexadecimal."""
+        return self._hash.hexdigest()
+
+    @property
+    def em_memoria(self):
+        """Indica se o conteúdo está em memória."""
+        return self.caminho is None
+
+    @property
+    def origem(self):
+        """Conteúdo (bytes) em memória ou o caminho do arquivo, aceito pela extração."""
+        return self._conteudo if self.em_memoria else self.caminho
+
+    def resumo(self):
+        """Nome, tamanho e SHA-256 do arquivo."""
+        return {"nome": self.nome, "tamanho_bytes": self.tamanho, "sha256": self.sha256}
+
+    def fechar(self):
+        """Libera o conteúdo e remove o arquivo temporário criado pela cópia."""
+        self._conteudo = None
+        if self._arquivo is not None:
+            self._arquivo.close()
+        if self._temporario_proprio and self.caminho and os.path.exists(self.caminho):
+            os.remove(self.caminho)
+        self.caminho = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.fechar()
+
+
+def receber_upload(arquivo, limite_memoria=LIMITE_MEMORIA_PADRAO, pasta=None):
+    """
+    Prepara um arquivo enviado para a extração, calculando o SHA-256.
+
+    Um BytesIO é usado como está e um arquivo com nome é entregue pelo caminho
+    (ver RequisicaoUpload); outros fluxos são copiados, para a memória até
+    limite_memoria e acima disso para um arquivo temporário em pasta.
+
+    Args:
+        arquivo: Objeto de arquivo do Flask (request.files)
+        limite_memoria: Tamanho máximo mantido em memória na cópia, em bytes
+        pasta: Pasta do arquivo temporário da cópia
+
+    Returns:
+        UploadRecebido: Upload pronto (use em um bloco with para remover o temporário da cópia)
+    """
+    upload = UploadRecebido(arquivo.filename, _extensao(arquivo.filename), limite_memoria, pasta)
+    fluxo = arquivo.stream
+    if isinstance(fluxo, io.BytesIO):
+        return upload.reaproveitar_memoria(fluxo.getvalue())
+    caminho = getattr(fluxo, "name", None)
+    if isinstance(caminho, str) and os.path.isfile(caminho):
+        return upload.reaproveitar_arquivo(fluxo, caminho)
+
+    try:
+        fluxo.seek(0)
+        while True:
+            bloco = fluxo.read(TAMANHO_BLOCO)
+            if not bloco:
+                break
+            upload.escrever(bloco)
+        return upload.finalizar()
+    except BaseException:
+        upload.fechar()
+        raise